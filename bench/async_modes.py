@@ -0,0 +1,170 @@
+"""
+async_modes.py
+Banc d'essai reproductible des modes asynchrones de Socket.IO (threading, eventlet, gevent)
+pour l'application Canmore Incident Management.
+
+Pour chaque mode, un serveur est lancé sur une base temporaire (bench/serve.py), puis des
+clients Socket.IO sont connectés par paliers. À chaque palier, on mesure le nombre de clients
+effectivement connectés et la latence (p50, p99) des requêtes HTTP servies en parallèle
+(GET /api/incidents, POST /api/incidents). Les modes non installés sont ignorés.
+
+    python bench/async_modes.py --modes threading eventlet --steps 50 200 500 --output bench_output.txt
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import socketio
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Incident valide (dans la limite de Canmore) envoyé par les requêtes d'écriture
+INCIDENT = {'type': 'Nid de poule', 'description': 'Banc d essai', 'latitude': 51.089,
+            'longitude': -115.359, 'timestamp': '2024-02-02T10:00:00Z'}
+
+
+def mode_available(mode):
+    return mode == 'threading' or importlib.util.find_spec(mode) is not None
+
+
+def start_server(mode, port, data_dir):
+    '''
+    Lance bench/serve.py dans le mode demandé et attend que l'API réponde.
+    '''
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, CANMORE_DATA_DIR=data_dir)
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'serve.py'), str(port)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/incidents', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'Le serveur {mode} ne répond pas')
+
+
+def http_request(url, write):
+    '''
+    Envoie une requête et retourne sa latence en millisecondes (None en cas d'échec).
+    '''
+    start = time.perf_counter()
+    try:
+        if write:
+            body = json.dumps(INCIDENT).encode()
+            request = urllib.request.Request(url, body, {'Content-Type': 'application/json'})
+        else:
+            request = url
+        urllib.request.urlopen(request, timeout=30).read()
+    except OSError:
+        return None
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_latency(base_url, requests, concurrency):
+    '''
+    Envoie requests requêtes (une écriture pour quatre lectures) avec concurrency clients HTTP.
+    '''
+    url = base_url + '/api/incidents'
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(lambda i: http_request(url, i % 5 == 0), range(requests)))
+    ok = np.array([latency for latency in latencies if latency is not None])
+    return {
+        'requests': requests,
+        'errors': requests - len(ok),
+        'p50_ms': round(float(np.percentile(ok, 50)), 2) if len(ok) else None,
+        'p99_ms': round(float(np.percentile(ok, 99)), 2) if len(ok) else None,
+    }
+
+
+def client_transport():
+    # Sans websocket-client, le transport WebSocket n'est pas disponible côté banc d'essai
+    return 'websocket' if importlib.util.find_spec('websocket') else 'polling'
+
+
+def connect_clients(base_url, count, timeout):
+    '''
+    Connecte count clients Socket.IO ; retourne la liste des clients connectés.
+    '''
+    transports = [client_transport()]
+
+    def connect(_index):
+        client = socketio.Client(reconnection=False)
+        try:
+            client.connect(base_url, transports=transports, wait_timeout=timeout)
+            return client
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(32) as pool:
+        return [client for client in pool.map(connect, range(count)) if client is not None]
+
+
+def run_mode(mode, port, steps, requests, concurrency, timeout):
+    data_dir = tempfile.mkdtemp(prefix=f'canmore-bench-{mode}-')
+    process = start_server(mode, port, data_dir)
+    base_url = f'http://127.0.0.1:{port}'
+    clients = []
+    results = []
+    try:
+        for step in steps:
+            clients += connect_clients(base_url, step - len(clients), timeout)
+            result = {'target_clients': step, 'connected_clients': len(clients)}
+            result.update(measure_latency(base_url, requests, concurrency))
+            results.append(result)
+            print(f'{mode:>9} {step:>6} clients : {len(clients):>6} connectés, '
+                  f'p50 {result["p50_ms"]} ms, p99 {result["p99_ms"]} ms, {result["errors"]} erreurs')
+            if len(clients) < step:
+                break  # capacité atteinte
+    finally:
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        process.terminate()
+        process.wait(timeout=10)
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {'mode': mode, 'steps': results,
+            'capacity': max((r['connected_clients'] for r in results), default=0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare les modes asynchrones de Socket.IO')
+    parser.add_argument('--modes', nargs='+', default=['threading', 'eventlet', 'gevent'])
+    parser.add_argument('--steps', nargs='+', type=int, default=[50, 200, 500])
+    parser.add_argument('--requests', type=int, default=200, help='requêtes HTTP par palier')
+    parser.add_argument('--concurrency', type=int, default=16, help='clients HTTP simultanés')
+    parser.add_argument('--timeout', type=float, default=5.0, help='délai de connexion Socket.IO (s)')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--output', help='fichier JSON des résultats')
+    args = parser.parse_args()
+
+    report = {'python': sys.version.split()[0], 'cpus': os.cpu_count(), 'transport': client_transport(),
+              'requests': args.requests, 'concurrency': args.concurrency, 'modes': []}
+    for offset, mode in enumerate(args.modes):
+        if not mode_available(mode):
+            print(f'{mode} non installé : ignoré')
+            continue
+        report['modes'].append(run_mode(mode, args.port + offset, sorted(args.steps), args.requests,
+                                        args.concurrency, args.timeout))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
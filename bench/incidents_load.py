@@ -0,0 +1,328 @@
+"""
+incidents_load.py
+Banc d'essai de charge HTTP de l'API des incidents de l'application Canmore Incident Management.
+
+Pour chaque taille de base (10 000, 100 000, 1 000 000 incidents...), une base temporaire est
+remplie directement en SQLite, un vrai serveur WSGI est lancé dessus (gunicorn s'il est installé,
+sinon le serveur de bench/serve.py), puis des clients HTTP simultanés envoient un mélange de
+GET /api/incidents, POST, PATCH et DELETE pendant une durée fixe. Le rapport JSON donne, par
+opération, le débit et la latence p50/p95/p99, ainsi que la mémoire résidente maximale (RSS)
+du serveur. Avec --baseline, les résultats sont comparés à une référence enregistrée
+(--save-baseline) et le script sort en erreur si une mesure se dégrade au-delà de la tolérance.
+Une taille absente de la référence est signalée comme non comparée (erreur avec --require-baseline).
+
+    python bench/incidents_load.py --sizes 10000 100000 --duration 20 --output bench_output.txt
+    python bench/incidents_load.py --baseline bench/baseline_incidents.json
+
+La référence dépend de la machine : enregistrez-la sur la machine qui compare.
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from server.routes.incidents_api import configure_storage, init_db  # noqa: E402
+
+# Emprise des positions générées (Canmore)
+LATITUDES = (51.04, 51.12)
+LONGITUDES = (-115.40, -115.30)
+# Incident valide (dans la limite de Canmore) envoyé par les requêtes POST
+INCIDENT = {'type': 'Nid de poule', 'description': 'Banc d essai', 'latitude': 51.089,
+            'longitude': -115.359, 'timestamp': '2024-02-02T10:00:00Z'}
+# Répartition par défaut des opérations (poids relatifs)
+DEFAULT_MIX = {'get': 1, 'post': 4, 'patch': 4, 'delete': 1}
+# Mesures comparées à la référence : (nom, sens) ; 'higher' = plus grand est meilleur
+COMPARED = (('throughput_rps', 'higher'), ('p95_ms', 'lower'), ('p99_ms', 'lower'))
+# Taille des lots d'insertion lors du remplissage
+SEED_BATCH = 50000
+
+
+def seed_database(db_path, count, rng):
+    '''
+    Crée la base avec le schéma de l'application et y insère count incidents ; retourne la durée.
+    '''
+    start = time.perf_counter()
+    configure_storage(db_path)
+    init_db()
+    conn = sqlite3.connect(db_path)
+    statuses = ('unsolved', 'solved')
+    types = ('Nid de poule', 'Arbre tombé', 'Graffiti', 'Lampadaire')
+    for offset in range(0, count, SEED_BATCH):
+        size = min(SEED_BATCH, count - offset)
+        latitudes = rng.uniform(*LATITUDES, size)
+        longitudes = rng.uniform(*LONGITUDES, size)
+        conn.executemany(
+            'INSERT INTO incidents (type, description, latitude, longitude, timestamp, status) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            ((types[i % len(types)], f'Incident {offset + i}', float(latitudes[i]), float(longitudes[i]),
+              '2024-02-02T10:00:00Z', statuses[i % 2]) for i in range(size)))
+        conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+
+def server_command(kind, port, threads):
+    if kind == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '-k', 'gthread', '--threads', str(threads), '-w', '1',
+                '-b', f'127.0.0.1:{port}', 'wsgi:app']
+    return [sys.executable, os.path.join(BENCH_DIR, 'serve.py'), str(port)]
+
+
+def start_server(kind, port, data_dir, threads):
+    '''
+    Lance le serveur sur data_dir et attend qu'il réponde. La limitation des écritures et le
+    délestage sont coupés : le banc mesure la capacité de l'API, pas le contrôle d'admission.
+    '''
+    env = dict(os.environ, CANMORE_DATA_DIR=data_dir, CANMORE_CLIENT_RATE='0', CANMORE_GLOBAL_RATE='0',
+               CANMORE_SHED_MAX_IN_FLIGHT='0', CANMORE_SHED_P99_MS='0', CANMORE_WARM_UP='eager',
+               SOCKETIO_ASYNC_MODE='threading')
+    process = subprocess.Popen(server_command(kind, port, threads), cwd=PROJECT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Le serveur {kind} s\'est arrêté (code {process.returncode})')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/realtime/stats', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'Le serveur {kind} ne répond pas')
+
+
+def peak_rss_mb(pid):
+    '''
+    Mémoire résidente maximale (VmHWM) du processus et de ses enfants (workers), en Mo ;
+    None hors Linux.
+    '''
+    pids = [pid]
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+        total = 0
+        for process_id in pids:
+            with open(f'/proc/{process_id}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    except (OSError, StopIteration, ValueError, IndexError):
+        return None
+    return round(total / 1024, 1)
+
+
+class Workload:
+    '''
+    Choisit les opérations selon leurs poids et fournit les identifiants : PATCH sur la moitié
+    basse des incidents, DELETE sur la moitié haute (chaque incident n'est supprimé qu'une fois).
+    '''
+
+    def __init__(self, base_url, count, mix, seed):
+        self.base_url = base_url
+        self.count = count
+        self.operations = [name for name, weight in mix.items() for _ in range(weight)]
+        self.rng = random.Random(seed)
+        self.to_delete = itertools.count(count, -1)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            operation = self.rng.choice(self.operations)
+            if operation == 'patch':
+                return operation, self.rng.randint(1, max(1, self.count // 2))
+            if operation == 'delete':
+                return operation, max(1, next(self.to_delete))
+            return operation, None
+
+    def send(self, session, operation, incident_id):
+        url = self.base_url + '/api/incidents'
+        if operation == 'get':
+            return session.get(url, timeout=300)
+        if operation == 'post':
+            return session.post(url, json=INCIDENT, timeout=60)
+        if operation == 'patch':
+            return session.patch(f'{url}/{incident_id}', json={'status': 'solved'}, timeout=60)
+        return session.delete(f'{url}/{incident_id}', timeout=60)
+
+
+def drive(workload, duration, concurrency):
+    '''
+    concurrency clients HTTP (connexions persistantes) envoient des requêtes pendant duration
+    secondes ; retourne {opération: [(latence ms ou None si échec, code HTTP ou None)]} et la
+    durée réelle.
+    '''
+    latencies = {name: [] for name in DEFAULT_MIX}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(_index):
+        session = requests.Session()
+        local = {name: [] for name in DEFAULT_MIX}
+        while time.monotonic() < stop_at:
+            operation, incident_id = workload.next()
+            start = time.perf_counter()
+            try:
+                status = workload.send(session, operation, incident_id).status_code
+            except requests.RequestException:
+                status = None
+            latency = (time.perf_counter() - start) * 1000
+            local[operation].append((latency if status is not None and status < 400 else None, status))
+        with lock:
+            for name, values in local.items():
+                latencies[name].extend(values)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return latencies, time.monotonic() - start
+
+
+def summarize(values, elapsed):
+    ok = np.array([latency for latency, _status in values if latency is not None])
+    statuses = {}
+    for _latency, status in values:
+        key = str(status) if status is not None else 'échec'
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        'requests': len(values),
+        'errors': len(values) - len(ok),
+        'statuses': dict(sorted(statuses.items())),
+        'throughput_rps': round(len(ok) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(ok, 50)), 2) if len(ok) else None,
+        'p95_ms': round(float(np.percentile(ok, 95)), 2) if len(ok) else None,
+        'p99_ms': round(float(np.percentile(ok, 99)), 2) if len(ok) else None,
+    }
+
+
+def run_size(count, args, server, port):
+    data_dir = tempfile.mkdtemp(prefix=f'canmore-load-{count}-')
+    try:
+        seed_seconds = seed_database(os.path.join(data_dir, 'incidents.db'), count, np.random.default_rng(count))
+        process = start_server(server, port, data_dir, args.concurrency * 2)
+        try:
+            workload = Workload(f'http://127.0.0.1:{port}', count, args.mix, args.seed)
+            latencies, elapsed = drive(workload, args.duration, args.concurrency)
+            rss = peak_rss_mb(process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    operations = {name: summarize(values, elapsed) for name, values in latencies.items() if values}
+    total = sum(op['requests'] - op['errors'] for op in operations.values())
+    result = {'incidents': count, 'seed_seconds': round(seed_seconds, 2), 'duration_s': round(elapsed, 2),
+              'throughput_rps': round(total / elapsed, 1), 'peak_rss_mb': rss, 'operations': operations}
+    print(f'{count:>9} incidents : {result["throughput_rps"]} req/s, RSS max {rss} Mo, ' + ', '.join(
+        f'{name} p99 {op["p99_ms"]} ms' for name, op in operations.items()))
+    return result
+
+
+def compare(report, baseline, tolerance):
+    '''
+    Compare le rapport à la référence ; retourne (dégradations au-delà de tolerance (fraction),
+    mesures non comparées faute de référence pour leur taille ou leur opération).
+    '''
+    regressions = []
+    uncompared = []
+    reference = {entry['incidents']: entry for entry in baseline.get('sizes', [])}
+    for entry in report['sizes']:
+        base = reference.get(entry['incidents'])
+        if base is None:
+            uncompared.append(f'{entry["incidents"]} incidents')
+            continue
+        for name, op in entry['operations'].items():
+            base_op = base['operations'].get(name)
+            if base_op is None:
+                uncompared.append(f'{entry["incidents"]} incidents, {name}')
+                continue
+            for metric, direction in COMPARED:
+                value, expected = op.get(metric), base_op.get(metric)
+                if value is None or not expected:
+                    continue
+                change = (value - expected) / expected
+                if (direction == 'lower' and change > tolerance) or (direction == 'higher' and -change > tolerance):
+                    regressions.append(f'{entry["incidents"]} incidents, {name} {metric} : '
+                                       f'{value} contre {expected} ({change:+.0%})')
+    return regressions, uncompared
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'Opération inconnue : {name}')
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de charge de l'API des incidents")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000], help='incidents en base (10000 100000 1000000)')
+    parser.add_argument('--duration', type=float, default=15.0, help='durée de charge par taille (s)')
+    parser.add_argument('--concurrency', type=int, default=16, help='clients HTTP simultanés')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='poids des opérations, ex. get=1,post=4,patch=4,delete=1')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'werkzeug'], default='auto')
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='fichier JSON des résultats')
+    parser.add_argument('--baseline', help='référence JSON à comparer')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='dégradation tolérée (0.25 = 25 %%)')
+    parser.add_argument('--save-baseline', help='enregistre les résultats comme nouvelle référence')
+    parser.add_argument('--require-baseline', action='store_true',
+                        help='sort en erreur si une taille ou une opération est absente de la référence')
+    args = parser.parse_args()
+
+    server = args.server
+    if server == 'auto':
+        server = 'gunicorn' if importlib.util.find_spec('gunicorn') else 'werkzeug'
+    report = {'python': sys.version.split()[0], 'server': server, 'concurrency': args.concurrency,
+              'duration_s': args.duration, 'mix': args.mix, 'sizes': []}
+    for offset, count in enumerate(sorted(args.sizes)):
+        report['sizes'].append(run_size(count, args, server, args.port + offset))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions, uncompared = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'Régression : {regression}')
+        for missing in uncompared:
+            print(f'Avertissement : absent de la référence, non comparé : {missing}')
+        if regressions or (uncompared and args.require_baseline):
+            sys.exit(1)
+        if uncompared:
+            print('Aucune régression sur les mesures comparées (référence incomplète)')
+        else:
+            print('Aucune régression par rapport à la référence')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+serve.py
+Lance l'application Canmore Incident Management pour un banc d'essai, dans le mode asynchrone
+indiqué par SOCKETIO_ASYNC_MODE (threading, eventlet, gevent) :
+
+    SOCKETIO_ASYNC_MODE=eventlet python bench/serve.py 5101
+
+wsgi est importé en premier : en mode eventlet/gevent, la bibliothèque standard est rendue
+coopérative avant tout autre import.
+"""
+
+import os
+import sys
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wsgi  # noqa: E402
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5100
+    options = {}
+    if wsgi.app.socketio.async_mode == 'threading':
+        # Serveur de développement werkzeug (mode threading uniquement)
+        options['allow_unsafe_werkzeug'] = True
+    wsgi.app.socketio.run(wsgi.app, host='127.0.0.1', port=port, **options)
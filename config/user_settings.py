@@ -1,36 +1,199 @@
 '''
 user_settings.py
-Ce module gère la sauvegarde et le chargement des préférences utilisateur
-à l'aide de la sérialisation Pickle dans un fichier binaire.
+Ce module gère les préférences de chaque utilisateur (mode sombre, musique, etc.) dans la base
+SQLite de l'application, en JSON, une ligne par utilisateur. Les lectures passent par un cache
+LRU en mémoire ; les mises à jour sont fusionnées en mémoire puis écrites en une seule fois après
+un court délai, si bien que des bascules rapides ne produisent qu'une écriture.
 '''
 
-import pickle    # Sérialisation binaire Python
-import os        # Gestion des chemins de fichiers
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
 
-# Chemin vers le fichier de données (même dossier que ce module)
-SETTINGS_FILE = os.path.join(os.path.dirname(__file__), 'user_settings.pkl')
+logger = logging.getLogger(__name__)
 
-def save_user_settings(settings):
+# Nombre d'utilisateurs gardés dans le cache de lecture
+CACHE_SIZE = int(os.environ.get('CANMORE_SETTINGS_CACHE_SIZE', '1024'))
+# Délai de regroupement des écritures, en secondes
+WRITE_DELAY = int(os.environ.get('CANMORE_SETTINGS_WRITE_DELAY_MS', '500')) / 1000
+# Taille maximale des préférences d'un utilisateur, en JSON
+MAX_SETTINGS_BYTES = 4096
+
+# Magasins à écrire à l'arrêt du processus ; références faibles : un magasin libéré en sort seul
+_flush_at_exit = weakref.WeakSet()
+
+
+class SettingsError(ValueError):
     '''
-    Sauvegarde complète - Remplace tous les paramètres utilisateur.
+    Préférences refusées (pas un objet JSON, trop volumineuses).
     '''
-    with open(SETTINGS_FILE, 'wb') as f:    # 'wb' = écriture binaire
-        pickle.dump(settings, f)             # Sérialise dictionnaire → bytes
 
-def get_user_settings():
+
+class UserSettingsStore:
     '''
-    Charge et retourne les paramètres sauvegardés.
-    Retourne un dictionnaire vide si le fichier n'existe pas.
+    Préférences par utilisateur : cache LRU de lecture et écritures regroupées.
+    Les préférences modifiées restent en mémoire (et ne sont jamais évincées du cache) jusqu'à
+    leur écriture, au plus tard write_delay secondes après la première modification en attente.
+    run(fn) exécute le travail SQLite (pool de l'application) ; start_task et sleep viennent
+    du serveur Socket.IO.
     '''
-    if not os.path.exists(SETTINGS_FILE):   # Si fichier inexistant
-        return {}                            # → retourne dict vide
-    with open(SETTINGS_FILE, 'rb') as f:    # 'rb' = lecture binaire
-        return pickle.load(f)                # Désérialise bytes → dictionnaire
 
-def update_user_settings(new_settings):
+    def __init__(self, db_path, cache_size=CACHE_SIZE, write_delay=WRITE_DELAY,
+                 run=None, start_task=None, sleep=time.sleep):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.write_delay = write_delay
+        self.run = run or (lambda fn, *args: fn(*args))
+        self.start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self.sleep = sleep
+        self.cache = OrderedDict()
+        self.dirty = {}
+        self.scheduled = False
+        self.counters = {'hits': 0, 'misses': 0, 'updates': 0, 'writes': 0, 'flushes': 0}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_settings (
+                user_id TEXT PRIMARY KEY,
+                settings TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        return conn
+
+    def _read(self, user_id):
+        conn = self.connect()
+        try:
+            row = conn.execute('SELECT settings FROM user_settings WHERE user_id = ?', (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else {}
+
+    def _remember(self, user_id, settings):
+        self.cache[user_id] = settings
+        self.cache.move_to_end(user_id)
+        # Éviction des moins récents ; les modifications pas encore écrites restent en mémoire
+        for key in list(self.cache):
+            if len(self.cache) <= self.cache_size:
+                break
+            if key not in self.dirty:
+                del self.cache[key]
+
+    def get(self, user_id):
+        '''
+        Retourne une copie des préférences de l'utilisateur ({} s'il n'en a aucune).
+        '''
+        with self._lock:
+            settings = self.cache.get(user_id)
+            if settings is not None:
+                self.counters['hits'] += 1
+                self.cache.move_to_end(user_id)
+                return dict(settings)
+            self.counters['misses'] += 1
+        settings = self.run(self._read, user_id)
+        with self._lock:
+            # Une mise à jour arrivée pendant la lecture l'emporte sur la valeur lue
+            settings = self.cache.get(user_id, settings)
+            self._remember(user_id, settings)
+            return dict(settings)
+
+    def update(self, user_id, values):
+        '''
+        Fusionne values dans les préférences de l'utilisateur ; l'écriture est différée et regroupée.
+        '''
+        if not isinstance(values, dict):
+            raise SettingsError('Les préférences doivent être un objet JSON')
+        current = self.get(user_id)
+        with self._lock:
+            settings = dict(self.cache.get(user_id, current), **values)
+            if len(json.dumps(settings)) > MAX_SETTINGS_BYTES:
+                raise SettingsError(f'Préférences trop volumineuses (plus de {MAX_SETTINGS_BYTES} octets)')
+            self.counters['updates'] += 1
+            self.dirty[user_id] = settings
+            self._remember(user_id, settings)
+            schedule = self.write_delay > 0 and not self.scheduled
+            if schedule:
+                self.scheduled = True
+        if self.write_delay <= 0:
+            self.flush()
+        elif schedule:
+            self.start_task(self._wait_and_flush)
+        return dict(settings)
+
+    def _wait_and_flush(self):
+        self.sleep(self.write_delay)
+        self.flush()
+
+    def _write(self, rows):
+        conn = self.connect()
+        try:
+            conn.executemany('''
+                INSERT INTO user_settings (user_id, settings, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET settings = excluded.settings, updated_at = excluded.updated_at
+            ''', rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def flush(self):
+        '''
+        Écrit les préférences modifiées en une transaction ; retourne le nombre d'utilisateurs écrits.
+        '''
+        with self._write_lock:
+            with self._lock:
+                dirty, self.dirty = self.dirty, {}
+                self.scheduled = False
+                self.counters['flushes'] += 1
+            if not dirty:
+                return 0
+            updated_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+            rows = [(user_id, json.dumps(settings), updated_at) for user_id, settings in dirty.items()]
+            try:
+                self.run(self._write, rows)
+            except Exception:
+                # Écriture impossible (base verrouillée...) : les modifications restent en attente
+                with self._lock:
+                    for user_id, settings in dirty.items():
+                        self.dirty.setdefault(user_id, settings)
+                raise
+            with self._lock:
+                self.counters['writes'] += len(rows)
+            return len(rows)
+
+    def stats(self):
+        '''
+        Mesures du cache et des écritures : lectures servies par le cache, écritures regroupées, etc.
+        '''
+        with self._lock:
+            stats = dict(self.counters, cached=len(self.cache), pending=len(self.dirty),
+                         cache_size=self.cache_size, write_delay_ms=self.write_delay * 1000)
+        stats['coalesced'] = stats['updates'] - stats['writes'] - stats['pending']
+        return stats
+
+
+def flush_at_exit(store):
     '''
-    Mise à jour partielle - Fusionne les nouveaux paramètres avec les existants.
+    Fait écrire les préférences en attente de store à l'arrêt du processus. Le hook atexit est
+    unique pour le processus, quel que soit le nombre d'applications créées (tests, workers).
     '''
-    settings = get_user_settings()          # 1. Charge paramètres actuels
-    settings.update(new_settings)           # 2. Fusionne avec nouveaux
-    save_user_settings(settings)            # 3. Sauvegarde le tout
+    _flush_at_exit.add(store)
+
+
+def _flush_all():
+    for store in list(_flush_at_exit):
+        try:
+            store.flush()
+        except Exception:
+            logger.exception("Écriture des préférences utilisateur à l'arrêt impossible")
+
+
+atexit.register(_flush_all)
@@ -1,44 +1,37 @@
 """
 main.py
 Ce script initialise et lance l'application Flask Canmore Incident Management.
-Il configure les blueprints (routes), les APIs, et démarre le serveur en mode développement.
+L'application est construite par create_app() (server/app_factory.py) ; ce script démarre
+le serveur en mode développement. En production, utilisez wsgi.py.
+
+    python main.py --profile-startup   # durée des imports et des phases de démarrage, puis sortie
 """
 
+import sys
+
+# Profilage du démarrage : la mesure des imports doit être installée avant les imports de l'application
+from server.startup_profile import PROFILE_STARTUP, ImportTimer, report
+profile_startup = PROFILE_STARTUP or '--profile-startup' in sys.argv
+import_timer = ImportTimer().install() if profile_startup else None
+
 # Importation des modules nécessaires pour Flask et les routes de l'application
 from config.logging_config import configure_logging
 configure_logging()
 
-from flask import Flask, session, redirect, request, url_for
-from server.routes.home_route import home_bp  # Page d'accueil
-from server.routes.map_route import map_bp    # Page de la carte
-from server.routes.report_route import report_bp  # Page de rapport
-from server.routes.incident_types import incident_types_bp  # Types d'incidents
-from server.routes.incidents_api import incidents_api  # API incidents
-from server.routes.user_settings_api import user_settings_api  # API paramètres utilisateur
-from flask_socketio import SocketIO, emit
-import os
-
-# Initialisation de l'application principale Flask
-
-# Configuration de la clé secrète pour la gestion des sessions Flask
-# Par défaut, une clé de développement est utilisée.
-# Pour plus de sécurité en production, définissez la variable d'environnement FLASK_SECRET_KEY.
-app = Flask(__name__)
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-key-canmore')
-socketio = SocketIO(app, cors_allowed_origins="*")
-app.socketio = socketio
-
-# Enregistrement des blueprints (routes) dans l'application Flask
-from server.routes.info_route import info_bp  # Page d'informations
-app.register_blueprint(home_bp)              # Accueil
-app.register_blueprint(map_bp)               # Carte
-app.register_blueprint(report_bp)            # Rapport
-app.register_blueprint(incident_types_bp)    # Types d'incidents
-app.register_blueprint(incidents_api)        # API incidents
-app.register_blueprint(user_settings_api)    # API paramètres utilisateur
-app.register_blueprint(info_bp)              # Informations
+from server.app_factory import create_app
+
+# Initialisation de l'application principale Flask (configuration : variables d'environnement)
+# En profilage, le préchauffage est mesuré avant de servir la première requête
+app = create_app({'WARM_UP': 'eager'} if profile_startup else None)
+socketio = app.socketio
+
+if import_timer is not None:
+    import_timer.uninstall()
 
 # Démarrage du serveur Flask (en mode debug pour le développement)
 if __name__ == "__main__":
+    if profile_startup:
+        print(report(import_timer))
+        sys.exit(0)
     print("Running on http://127.0.0.1:5000/ (Press CTRL+C to quit)")
     socketio.run(app, debug=True)
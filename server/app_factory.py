@@ -0,0 +1,216 @@
+'''
+app_factory.py
+Ce module construit l'application Flask Canmore Incident Management (create_app) : configuration,
+base de données, Socket.IO, blueprints et travaux de démarrage. Aucun travail n'est fait à
+l'import : l'application, ses fichiers et ses tâches de fond ne sont créés qu'à l'appel de
+create_app(), ce qui permet de choisir la base (tests, workers) et l'ordre de démarrage.
+Les données de référence et les index sont chargés au premier usage ; le préchauffage
+(WARM_UP) les construit par avance, en arrière-plan par défaut.
+Une seule application par processus : la base et le catalogue de données sont partagés.
+'''
+
+import os
+import sqlite3
+from flask import Flask
+from flask_socketio import SocketIO
+from server.routes.home_route import home_bp  # Page d'accueil
+from server.routes.map_route import map_bp    # Page de la carte
+from server.routes.report_route import report_bp  # Page de rapport
+from server.routes.info_route import info_bp  # Page d'informations
+from server.routes.incident_types import incident_types_bp  # Types d'incidents
+from server.routes.incidents_api import incidents_api, configure_storage, init_db  # API incidents
+from server.routes.user_settings_api import user_settings_api  # API paramètres utilisateur
+from server.routes.static_assets import static_assets_bp  # Ressources statiques versionnées
+from server.routes.datasets_api import datasets_api  # API jeux de données de référence
+from server.routes.geofence_api import geofence_api  # API limite de Canmore
+from server.routes.geocode_api import geocode_api  # API géocodage inverse
+from server.routes.search_api import search_api  # API recherche du portail d'information
+from server.routes.projection_api import projection_api  # API conversion de coordonnées
+from server.routes.realtime_api import realtime_api  # API état du temps réel
+from server.routes.metrics_api import metrics_api  # Mesures au format Prometheus
+from server.routes.profiling_api import profiling_api  # Administration des profils de requêtes
+from server.dataset_catalog import catalog  # Catalogue des données en mémoire
+from server.geocoder import get_geocoder, schedule_enrichment  # Géocodage inverse
+from server.federated_search import warm_indexes  # Recherche globale
+from server.feature_index import backfill_nearest_features  # Éléments de référence les plus proches
+from server.feature_join import get_feature_join  # Jointure incidents ↔ éléments de référence
+from server import tasks  # Tâches de fond
+from server import realtime  # Abonnements temps réel par zone de la carte
+# Travail bloquant hors de la boucle d'événements
+from server.db_pool import BlockingPool, POOL_SIZE, patched_mode, set_process_pool
+from server.message_queue import MESSAGE_QUEUE, CHANNEL, socketio_options  # File de messages multi-worker
+from server.startup_profile import phase  # Durée des phases de démarrage
+from server import rate_limit  # Contrôle d'admission des écritures
+from server import metrics  # Instrumentation (route /metrics)
+from server import request_profiler  # Profilage à la demande des requêtes
+from config.user_settings import UserSettingsStore, flush_at_exit, CACHE_SIZE, WRITE_DELAY  # Préférences utilisateur
+
+# Racine du projet : dossiers templates/ et static/
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Configuration par défaut, surchargée par les variables d'environnement puis par create_app(config)
+DEFAULT_CONFIG = {
+    # Pour plus de sécurité en production, définissez la variable d'environnement FLASK_SECRET_KEY
+    'SECRET_KEY': os.environ.get('FLASK_SECRET_KEY', 'dev-key-canmore'),
+    # Dossier des données de l'application (base SQLite, CSV compilés)
+    'DATA_DIR': os.environ.get('CANMORE_DATA_DIR', os.path.join(PROJECT_DIR, 'server', 'data')),
+    # Fichier de la base des incidents (par défaut DATA_DIR/incidents.db)
+    'DB_PATH': os.environ.get('CANMORE_DB_PATH'),
+    # Dossier des CSV compilés (par défaut DATA_DIR/compiled)
+    'COMPILED_DIR': os.environ.get('CANMORE_COMPILED_DIR'),
+    # Mode asynchrone de Socket.IO : 'threading', 'eventlet', 'gevent' (par défaut : eventlet ou gevent si
+    # le processus a été monkey-patché, comme par wsgi.py ou un worker gunicorn, threading sinon)
+    'SOCKETIO_ASYNC_MODE': os.environ.get('SOCKETIO_ASYNC_MODE') or None,
+    # Nombre maximal d'appels simultanés à la base (threads système en mode eventlet/gevent)
+    'DB_POOL_SIZE': POOL_SIZE,
+    'SOCKETIO_MESSAGE_QUEUE': MESSAGE_QUEUE,
+    'SOCKETIO_CHANNEL': CHANNEL,
+    # Préférences utilisateur : taille du cache de lecture et délai de regroupement des écritures (s)
+    'SETTINGS_CACHE_SIZE': CACHE_SIZE,
+    'SETTINGS_WRITE_DELAY': WRITE_DELAY,
+    # Limitation des écritures : seaux de jetons (requêtes/s, rafale ; 0 désactive) et délestage
+    'RATE_LIMIT_STORE': rate_limit.RATE_LIMIT_STORE,
+    'CLIENT_RATE': rate_limit.CLIENT_RATE,
+    'CLIENT_BURST': rate_limit.CLIENT_BURST,
+    'GLOBAL_RATE': rate_limit.GLOBAL_RATE,
+    'GLOBAL_BURST': rate_limit.GLOBAL_BURST,
+    'SHED_MAX_IN_FLIGHT': rate_limit.SHED_MAX_IN_FLIGHT,
+    'SHED_P99_MS': rate_limit.SHED_P99_MS,
+    'TRUST_PROXY': rate_limit.TRUST_PROXY,
+    # Instrumentation des requêtes, de SQLite et de Socket.IO (route /metrics)
+    'METRICS': metrics.METRICS_ENABLED,
+    # Jeton des routes d'administration et du profilage à la demande (aucun : désactivés)
+    'ADMIN_TOKEN': request_profiler.ADMIN_TOKEN,
+    # Profilage des requêtes : fraction échantillonnée, nombre de profils gardés, dossier
+    # (par défaut DATA_DIR/profiles)
+    'PROFILE_SAMPLE_RATE': request_profiler.SAMPLE_RATE,
+    'PROFILE_KEEP': request_profiler.KEEP_PROFILES,
+    'PROFILE_DIR': os.environ.get('CANMORE_PROFILE_DIR'),
+    # Préchauffage des données de référence et des index : 'background' (tâche de fond),
+    # 'eager' (avant de servir la première requête) ou 'off' (au premier usage seulement)
+    'WARM_UP': os.environ.get('CANMORE_WARM_UP', 'background'),
+}
+
+# Valeurs acceptées pour WARM_UP
+WARM_UP_MODES = ('background', 'eager', 'off')
+
+# Blueprints (routes) de l'application
+BLUEPRINTS = (
+    home_bp,              # Accueil
+    map_bp,               # Carte
+    report_bp,            # Rapport
+    incident_types_bp,    # Types d'incidents
+    incidents_api,        # API incidents
+    user_settings_api,    # API paramètres utilisateur
+    info_bp,              # Informations
+    static_assets_bp,     # Ressources statiques versionnées
+    datasets_api,         # API jeux de données
+    geofence_api,         # API limite de Canmore
+    geocode_api,          # API géocodage inverse
+    search_api,           # API recherche
+    projection_api,       # API conversion de coordonnées
+    realtime_api,         # API état du temps réel
+    metrics_api,          # Mesures (Prometheus)
+    profiling_api,        # Administration des profils
+)
+
+
+def warm_up():
+    '''
+    Construit par avance ce qui serait sinon chargé à la première requête, puis lance les rattrapages.
+    '''
+    # Chargement unique des données de référence (static/data) en mémoire
+    with phase('warm_up: catalogue'):
+        catalog.load_all()
+
+    # Index des adresses, puis enrichissement des incidents existants
+    with phase('warm_up: géocodeur'):
+        get_geocoder()
+    schedule_enrichment()
+
+    # Index de la recherche globale
+    with phase('warm_up: index de recherche'):
+        warm_indexes()
+
+    # Rattrapage vectorisé de l'élément le plus proche des incidents existants
+    with phase('warm_up: éléments les plus proches'):
+        backfill_nearest_features()
+
+    # Jointure spatiale du rapport par élément, construite une fois puis tenue à jour
+    with phase('warm_up: jointure du rapport'):
+        get_feature_join()
+
+
+def create_app(config=None):
+    '''
+    Construit l'application Flask et son serveur Socket.IO (app.socketio).
+    config : dictionnaire qui surcharge DEFAULT_CONFIG (ex. {'DATA_DIR': ..., 'WARM_UP': 'off'}).
+    '''
+    app = Flask('main', root_path=PROJECT_DIR)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    data_dir = app.config['DATA_DIR']
+    app.config['DB_PATH'] = app.config['DB_PATH'] or os.path.join(data_dir, 'incidents.db')
+    app.config['COMPILED_DIR'] = app.config['COMPILED_DIR'] or os.path.join(data_dir, 'compiled')
+    app.config['PROFILE_DIR'] = app.config['PROFILE_DIR'] or os.path.join(data_dir, 'profiles')
+    app.secret_key = app.config['SECRET_KEY']
+    if app.config['WARM_UP'] not in WARM_UP_MODES:
+        raise ValueError(f"WARM_UP doit valoir {', '.join(WARM_UP_MODES)} : {app.config['WARM_UP']!r}")
+
+    # Base de données des incidents : dossier, tables et migrations
+    with phase('base de données'):
+        configure_storage(app.config['DB_PATH'],
+                          metrics.TimedConnection if app.config['METRICS'] else sqlite3.Connection)
+        init_db()
+    catalog.compiled_dir = app.config['COMPILED_DIR']
+
+    # Avec SOCKETIO_MESSAGE_QUEUE (ex. redis://localhost:6379/0), les émissions passent par la file
+    # de messages et atteignent les clients de tous les workers
+    with phase('Socket.IO'):
+        queue = app.config['SOCKETIO_MESSAGE_QUEUE']
+        # Sans monkey-patching, eventlet installé serait choisi d'office : tout appel bloquant figerait le serveur
+        async_mode = app.config['SOCKETIO_ASYNC_MODE'] or patched_mode() or 'threading'
+        socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_mode,
+                            **socketio_options(queue, app.config['SOCKETIO_CHANNEL']))
+        app.socketio = socketio
+        app.db_pool = BlockingPool(app.config['DB_POOL_SIZE'], socketio.async_mode)
+        # Tâches de fond et recherche parallèle (hors requête) passent par le même pool
+        set_process_pool(app.db_pool)
+
+        # Abonnements Socket.IO : chaque client ne reçoit que les incidents de sa zone et de ses filtres
+        realtime.register_handlers(app, socketio, shared=bool(queue))
+
+    # Préférences utilisateur (table user_settings) ; les écritures en attente sont faites à l'arrêt
+    app.user_settings = UserSettingsStore(
+        app.config['DB_PATH'], app.config['SETTINGS_CACHE_SIZE'], app.config['SETTINGS_WRITE_DELAY'],
+        run=app.db_pool.run, start_task=socketio.start_background_task, sleep=socketio.sleep)
+    flush_at_exit(app.user_settings)
+
+    # Mesures installées avant le contrôle d'admission, pour compter aussi les requêtes refusées
+    app.metrics = None
+    if app.config['METRICS']:
+        metrics.register_metrics(app)
+
+    # Écritures limitées par client et globalement ; délestage quand la base sature
+    rate_limit.register_admission_control(
+        app,
+        rate_limit.RateLimiter(rate_limit.bucket_store(app.config['RATE_LIMIT_STORE']),
+                               app.config['CLIENT_RATE'], app.config['CLIENT_BURST'],
+                               app.config['GLOBAL_RATE'], app.config['GLOBAL_BURST']),
+        rate_limit.LoadShedder(app.config['SHED_MAX_IN_FLIGHT'], app.config['SHED_P99_MS'] / 1000),
+        trust_proxy=app.config['TRUST_PROXY'])
+
+    # Profilage à la demande, installé en dernier pour ne mesurer que la route
+    request_profiler.register_profiler(app, request_profiler.RequestProfiler(
+        app.config['PROFILE_DIR'], app.config['ADMIN_TOKEN'], app.config['PROFILE_SAMPLE_RATE'],
+        app.config['PROFILE_KEEP']))
+
+    with phase('blueprints'):
+        for blueprint in BLUEPRINTS:
+            app.register_blueprint(blueprint)
+
+    if app.config['WARM_UP'] == 'eager':
+        warm_up()
+    elif app.config['WARM_UP'] == 'background':
+        tasks.submit(warm_up)
+    return app
@@ -0,0 +1,290 @@
+'''
+dataset_catalog.py
+Ce module charge une seule fois en mémoire les fichiers de données de référence (static/data)
+de l'application Canmore Incident Management : nombre d'entités, emprise (bbox), schéma des
+attributs et index FID → entité. Un jeu de données est rechargé de façon atomique lorsque
+la date de modification (mtime) de son fichier change. Les CSV sont servis depuis leur
+version binaire compilée (dataset_compiler), projetée en mémoire avec mmap.
+'''
+
+import os
+import time
+from server.geojson_stream import geometry_bbox, iter_features
+from server.dataset_compiler import CompiledTable, load_compiled, parse_floats
+from server.projection import mercator_to_wgs84
+from server.db_pool import native_lock
+
+# Dossier contenant les fichiers de données GeoJSON et CSV
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../static/data')
+
+# Dossier des CSV compilés (hors de static/ : non servis aux navigateurs)
+COMPILED_DIR = os.path.join(os.path.dirname(__file__), 'data', 'compiled')
+
+# Extensions prises en charge par le catalogue
+SUPPORTED_EXTENSIONS = ('.geojson', '.csv')
+
+
+class Dataset:
+    '''
+    Instantané immuable d'un fichier de données chargé en mémoire.
+    Un rechargement crée un nouvel instantané : les lecteurs qui détiennent
+    l'ancien gardent une vue cohérente.
+    '''
+
+    __slots__ = ('name', 'path', 'mtime', 'size', 'kind', 'records', 'index', 'count', 'bbox', 'schema', 'version')
+
+    def __init__(self, name, path, mtime, size, kind, records, bbox, schema, version):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.kind = kind
+        self.records = records
+        # Une table compilée porte son propre index trié des FID
+        self.index = records if isinstance(records, CompiledTable) else build_fid_index(records, kind)
+        self.count = len(records)
+        self.bbox = bbox
+        self.schema = schema
+        self.version = version
+
+    def get(self, fid):
+        '''
+        Retourne l'entité (GeoJSON) ou la ligne (CSV) dont le FID est donné, ou None.
+        '''
+        return self.index.get(fid)
+
+    def summary(self):
+        '''
+        Résumé sérialisable en JSON (sans les entités).
+        '''
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'count': self.count,
+            'bbox': self.bbox,
+            'schema': self.schema,
+            'mtime': self.mtime,
+            'version': self.version,
+        }
+
+
+def build_fid_index(records, kind):
+    '''
+    Construit l'index FID → entité pour un accès en O(1).
+    '''
+    index = {}
+    for record in records:
+        values = (record.get('properties') or {}) if kind == 'geojson' else record
+        fid = values.get('FID')
+        if fid in (None, ''):
+            continue
+        try:
+            index[int(fid)] = record
+        except (TypeError, ValueError):
+            continue
+    return index
+
+
+def value_type(value):
+    '''
+    Nom du type d'une valeur d'attribut pour le schéma.
+    '''
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    return 'str'
+
+
+def csv_value_type(value):
+    '''
+    Type d'une valeur CSV (toujours lue comme texte) : int, float ou str.
+    '''
+    for cast, name in ((int, 'int'), (float, 'float')):
+        try:
+            cast(value)
+            return name
+        except ValueError:
+            continue
+    return 'str'
+
+
+def merge_type(current, new):
+    '''
+    Fusionne deux types observés pour une même colonne (int + float → float, sinon str).
+    '''
+    if current is None or current == new:
+        return new
+    if {current, new} == {'int', 'float'}:
+        return 'float'
+    return 'str'
+
+
+def load_geojson(path):
+    '''
+    Lit un fichier GeoJSON entité par entité (lecture incrémentale) et retourne (entités, bbox, schéma).
+    '''
+    features = []
+    bbox = None
+    schema = {}
+    geometry_types = set()
+    for feature in iter_features(path):
+        features.append(feature)
+        geometry = feature.get('geometry')
+        if geometry:
+            geometry_types.add(geometry.get('type'))
+        bbox = geometry_bbox(geometry, bbox)
+        for key, value in (feature.get('properties') or {}).items():
+            if value is not None:
+                schema[key] = merge_type(schema.get(key), value_type(value))
+            else:
+                schema.setdefault(key, None)
+    schema = {'properties': schema, 'geometry_types': sorted(geometry_types)}
+    return features, bbox, schema
+
+
+def csv_schema(fieldnames, rows):
+    '''
+    Schéma d'un CSV : type déduit de chaque colonne à partir de ses valeurs non vides.
+    '''
+    schema = {name: None for name in fieldnames}
+    for row in rows:
+        for name in fieldnames:
+            value = row.get(name)
+            if value not in (None, ''):
+                schema[name] = merge_type(schema[name], csv_value_type(value))
+    return {'columns': schema}
+
+
+def wgs84_columns(fieldnames, rows):
+    '''
+    Colonnes longitude/latitude précalculées d'un CSV en Web Mercator (colonnes X, Y),
+    converties en une seule passe vectorisée ; aucune pour les autres CSV.
+    '''
+    if 'X' not in fieldnames or 'Y' not in fieldnames:
+        return {}
+    xs = parse_floats([(row.get('X') or '').strip() for row in rows])
+    ys = parse_floats([(row.get('Y') or '').strip() for row in rows])
+    if xs is None or ys is None:
+        return {}
+    lons, lats = mercator_to_wgs84(xs, ys)
+    return {'longitude': lons, 'latitude': lats}
+
+
+def load_csv(path, compiled_dir=None, stat=None):
+    '''
+    Charge un fichier CSV (BOM UTF-8 éventuel ignoré) sous forme de table compilée
+    et retourne (table, None, schéma). Avec compiled_dir, le fichier compilé est
+    réutilisé tant que le CSV ne change pas. Les CSV en Web Mercator reçoivent des
+    colonnes longitude/latitude précalculées (table.numbers('longitude')).
+    '''
+    table = load_compiled(path, csv_schema, compiled_dir, stat, derive=wgs84_columns)
+    return table, None, table.schema
+
+
+class DatasetCatalog:
+    '''
+    Catalogue des jeux de données de référence, indexé par nom de fichier
+    (ex. 'trails.geojson', 'Addresses.csv').
+    '''
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=1.0, compiled_dir=None):
+        self.data_dir = data_dir
+        # Dossier des CSV compilés ; sans dossier, la compilation se fait en mémoire
+        self.compiled_dir = compiled_dir
+        # Délai minimal (secondes) entre deux vérifications du mtime d'un même fichier
+        self.check_interval = check_interval
+        self._datasets = {}
+        self._checked_at = {}
+        self._lock = native_lock()
+        self._listeners = []
+        # Lectures servies par l'instantané en mémoire, et (re)chargements de fichiers
+        # (compteurs sans verrou : une lecture concurrente peut ne pas être comptée)
+        self.hits = 0
+        self.loads = 0
+
+    def names(self):
+        '''
+        Liste les fichiers de données pris en charge présents dans le dossier.
+        '''
+        return sorted(
+            name for name in os.listdir(self.data_dir)
+            if name.endswith(SUPPORTED_EXTENSIONS)
+        )
+
+    def load_all(self):
+        '''
+        Charge tous les jeux de données (appelé au démarrage de l'application).
+        '''
+        for name in self.names():
+            self.get(name)
+        return self
+
+    def on_reload(self, callback):
+        '''
+        Enregistre une fonction appelée avec le nouvel instantané après chaque (re)chargement.
+        '''
+        self._listeners.append(callback)
+
+    def get(self, name):
+        '''
+        Retourne l'instantané à jour d'un jeu de données.
+        Lève FileNotFoundError si le fichier n'existe pas.
+        '''
+        dataset = self._datasets.get(name)
+        now = time.monotonic()
+        if dataset is not None and now - self._checked_at.get(name, 0) < self.check_interval:
+            self.hits += 1
+            return dataset
+        path = os.path.join(self.data_dir, name)
+        if os.path.basename(name) != name or not name.endswith(SUPPORTED_EXTENSIONS):
+            raise FileNotFoundError(name)
+        stat = os.stat(path)
+        self._checked_at[name] = now
+        if dataset is not None and dataset.mtime == stat.st_mtime and dataset.size == stat.st_size:
+            self.hits += 1
+            return dataset
+        with self._lock:
+            # Un autre thread a peut-être déjà rechargé le fichier
+            dataset = self._datasets.get(name)
+            if dataset is not None and dataset.mtime == stat.st_mtime and dataset.size == stat.st_size:
+                return dataset
+            dataset = self._load(name, path, stat)
+            self.loads += 1
+            # Remplacement atomique de l'instantané
+            self._datasets[name] = dataset
+        for callback in self._listeners:
+            callback(dataset)
+        return dataset
+
+    def _load(self, name, path, stat):
+        '''
+        Lit le fichier et construit un nouvel instantané.
+        '''
+        if name.endswith('.geojson'):
+            kind = 'geojson'
+            records, bbox, schema = load_geojson(path)
+        else:
+            kind = 'csv'
+            records, bbox, schema = load_csv(path, self.compiled_dir, stat)
+        previous = self._datasets.get(name)
+        version = previous.version + 1 if previous else 1
+        return Dataset(name, path, stat.st_mtime, stat.st_size, kind, records, bbox, schema, version)
+
+    def stats(self):
+        '''
+        Jeux de données en mémoire, lectures servies par la mémoire et (re)chargements.
+        '''
+        return {'datasets': len(self._datasets), 'hits': self.hits, 'loads': self.loads}
+
+    def count(self, name):
+        '''
+        Nombre d'entités d'un jeu de données, servi depuis la mémoire.
+        '''
+        return self.get(name).count
+
+
+# Catalogue partagé par les routes de l'application
+catalog = DatasetCatalog(compiled_dir=COMPILED_DIR)
@@ -0,0 +1,394 @@
+'''
+dataset_compiler.py
+Ce module compile les fichiers CSV de référence (static/data) en un format binaire
+par colonnes pour l'application Canmore Incident Management. Les colonnes numériques
+sont stockées en tableaux compacts (int64, float64), les textes dans une table
+d'offsets suivie d'un bloc UTF-8, et un index trié des FID permet la recherche
+par clé. Le fichier compilé est ouvert avec mmap : les colonnes sont des vues
+NumPy sur le tampon projeté (aucune copie), et une ligne n'est reconstruite
+en dictionnaire qu'à la demande.
+'''
+
+import codecs
+import csv
+import json
+import logging
+import mmap
+import os
+import struct
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Signature et version du format binaire
+MAGIC = b'CIMCSV\x00\x02'
+
+# Alignement des sections (octets)
+ALIGNMENT = 8
+
+# Colonne utilisée pour l'index trié
+KEY_COLUMN = 'FID'
+
+
+def storage_type(values):
+    '''
+    Type de stockage d'une colonne : 'int64' ou 'float64' seulement si chaque valeur non vide
+    se relit à l'identique depuis le nombre (ex. '007' ou '1e3' restent du texte), sinon 'str'.
+    '''
+    present = [value for value in values if value != '']
+    if not present:
+        return 'str'
+    try:
+        if all(str(int(value)) == value for value in present):
+            if all(-2 ** 63 <= int(value) < 2 ** 63 for value in present):
+                return 'int64'
+            return 'str'
+    except ValueError:
+        pass
+    try:
+        if all(repr(float(value)) == value for value in present):
+            return 'float64'
+    except ValueError:
+        pass
+    return 'str'
+
+
+def parse_floats(values):
+    '''
+    Valeurs d'une colonne converties en float64 (NaN si vide), ou None si une valeur n'est pas un nombre.
+    '''
+    if all(value == '' for value in values):
+        return None
+    try:
+        return np.array([float(value) if value != '' else np.nan for value in values], dtype=np.float64)
+    except ValueError:
+        return None
+
+
+class _Writer:
+    '''
+    Accumule les sections binaires alignées et leurs positions.
+    '''
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, data):
+        data = bytes(data)
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.chunks.append(b'\x00' * padding)
+            self.size += padding
+        return [offset, len(data)]
+
+
+def compile_rows(fieldnames, rows, schema, source=None, derived=None):
+    '''
+    Encode des lignes CSV (dictionnaires de textes) et retourne le contenu du fichier compilé.
+    source : métadonnées du fichier d'origine, utilisées pour invalider le cache.
+    derived : colonnes float64 précalculées {nom: tableau} (ex. latitude/longitude), hors des lignes.
+    '''
+    writer = _Writer()
+    count = len(rows)
+    columns = []
+    for name in fieldnames:
+        # Valeur absente (ligne trop courte) : stockée comme texte vide
+        values = [row.get(name) or '' for row in rows]
+        kind = storage_type(values)
+        column = {'name': name, 'storage': kind, 'nulls': None}
+        if kind == 'str':
+            encoded = [value.encode('utf-8') for value in values]
+            offsets = np.zeros(count + 1, dtype=np.uint64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            column['offsets'] = writer.add(offsets.tobytes())
+            column['data'] = writer.add(b''.join(encoded))
+            # Nombres au format libre (ex. '-12837822' parmi des décimaux) : texte exact et copie float64
+            numbers = parse_floats(values)
+            column['numeric'] = writer.add(numbers.tobytes()) if numbers is not None else None
+        else:
+            empty = np.array([value == '' for value in values], dtype=np.uint8)
+            cast, missing = (int, 0) if kind == 'int64' else (float, np.nan)
+            data = np.array([cast(value) if value != '' else missing for value in values], dtype=kind)
+            column['data'] = writer.add(data.tobytes())
+            if empty.any():
+                column['nulls'] = writer.add(empty.tobytes())
+        columns.append(column)
+
+    # Index trié des FID entiers : (clés, numéros de ligne), tri stable pour garder la dernière ligne en double
+    key = None
+    if KEY_COLUMN in fieldnames:
+        pairs = []
+        for i, row in enumerate(rows):
+            try:
+                pairs.append((int(row.get(KEY_COLUMN)), i))
+            except (TypeError, ValueError):
+                continue
+        pairs.sort(key=lambda pair: pair[0])
+        key = {
+            'column': KEY_COLUMN,
+            'keys': writer.add(np.array([pair[0] for pair in pairs], dtype=np.int64).tobytes()),
+            'rows': writer.add(np.array([pair[1] for pair in pairs], dtype=np.int64).tobytes()),
+        }
+
+    derived_sections = {
+        name: writer.add(np.asarray(values, dtype=np.float64).tobytes())
+        for name, values in (derived or {}).items()
+    }
+
+    header = json.dumps({
+        'rows': count,
+        'fieldnames': list(fieldnames),
+        'schema': schema,
+        'columns': columns,
+        'key': key,
+        'derived': derived_sections,
+        'source': source,
+    }).encode('utf-8')
+    start = len(MAGIC) + 8 + len(header)
+    start += -start % ALIGNMENT
+    prefix = MAGIC + struct.pack('<II', len(header), start) + header
+    return prefix + b'\x00' * (start - len(prefix)) + b''.join(writer.chunks)
+
+
+def read_csv(path):
+    '''
+    Lit un fichier CSV (BOM UTF-8 éventuel ignoré) et retourne (noms de colonnes, lignes).
+    '''
+    with codecs.open(path, encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile)
+        rows = list(reader)
+        return reader.fieldnames or [], rows
+
+
+def read_header(buffer):
+    '''
+    Lit l'en-tête d'un fichier compilé ; lève ValueError si le format est inconnu.
+    '''
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Format de fichier compilé inconnu')
+    length, start = struct.unpack_from('<II', buffer, len(MAGIC))
+    offset = len(MAGIC) + 8
+    return json.loads(bytes(buffer[offset:offset + length]).decode('utf-8')), start
+
+
+class StringColumn:
+    '''
+    Colonne de textes : offsets et bloc UTF-8 lus directement dans le tampon.
+    '''
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return str(self.data[start:end], 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class CompiledTable:
+    '''
+    Table CSV compilée : séquence de lignes (dictionnaires reconstruits à la demande),
+    colonnes typées sans copie et recherche par FID dans l'index trié.
+    '''
+
+    def __init__(self, buffer, mapping=None):
+        self.buffer = buffer
+        # Conserve la projection mmap ouverte tant que la table est utilisée
+        self._mapping = mapping
+        header, start = read_header(buffer)
+        self.header = header
+        self.fieldnames = header['fieldnames']
+        self.schema = header['schema']
+        self.source = header['source']
+        self._count = header['rows']
+        view = memoryview(buffer)
+        self._columns = {}
+        self._nulls = {}
+        self._numbers = {}
+        for column in header['columns']:
+            name = column['name']
+            offset, length = column['data']
+            if column['storage'] == 'str':
+                offsets_at, offsets_length = column['offsets']
+                offsets = np.frombuffer(buffer, dtype=np.uint64, count=offsets_length // 8, offset=start + offsets_at)
+                self._columns[name] = StringColumn(offsets, view[start + offset:start + offset + length])
+                if column.get('numeric'):
+                    numeric_at, numeric_length = column['numeric']
+                    self._numbers[name] = np.frombuffer(buffer, dtype=np.float64, count=numeric_length // 8,
+                                                        offset=start + numeric_at)
+            else:
+                dtype = np.dtype(column['storage'])
+                self._columns[name] = np.frombuffer(buffer, dtype=dtype, count=length // dtype.itemsize,
+                                                    offset=start + offset)
+                self._numbers[name] = self._columns[name]
+                if column['nulls']:
+                    nulls_at, nulls_length = column['nulls']
+                    self._nulls[name] = np.frombuffer(buffer, dtype=np.uint8, count=nulls_length,
+                                                      offset=start + nulls_at).view(bool)
+        for name, (derived_at, derived_length) in header['derived'].items():
+            self._numbers[name] = np.frombuffer(buffer, dtype=np.float64, count=derived_length // 8,
+                                                offset=start + derived_at)
+        self._keys = self._key_rows = None
+        if header['key']:
+            keys_at, keys_length = header['key']['keys']
+            rows_at, rows_length = header['key']['rows']
+            self._keys = np.frombuffer(buffer, dtype=np.int64, count=keys_length // 8, offset=start + keys_at)
+            self._key_rows = np.frombuffer(buffer, dtype=np.int64, count=rows_length // 8, offset=start + rows_at)
+
+    def __len__(self):
+        return self._count
+
+    def column(self, name):
+        '''
+        Colonne brute : tableau NumPy (vue sur le tampon) pour les nombres, StringColumn pour les textes.
+        '''
+        return self._columns[name]
+
+    def numbers(self, name):
+        '''
+        Valeurs numériques d'une colonne ou d'une colonne précalculée (vue NumPy sur le tampon) ;
+        lève KeyError si la colonne contient du texte. Les cellules vides valent NaN en float64
+        (voir nulls() pour int64).
+        '''
+        if name not in self._numbers:
+            raise KeyError(name)
+        return self._numbers[name]
+
+    def nulls(self, name):
+        '''
+        Masque des valeurs vides d'une colonne numérique (None si aucune).
+        '''
+        return self._nulls.get(name)
+
+    def value(self, name, i):
+        '''
+        Valeur d'une cellule, sous forme de texte comme dans le CSV d'origine.
+        '''
+        column = self._columns[name]
+        if isinstance(column, StringColumn):
+            return column[i]
+        mask = self._nulls.get(name)
+        if mask is not None and mask[i]:
+            return ''
+        value = column[i].item()
+        return str(value) if isinstance(value, int) else repr(value)
+
+    def row(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return {name: self.value(name, i) for name in self.fieldnames}
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(*i.indices(self._count))]
+        return self.row(i)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self.row(i)
+
+    def find(self, fid):
+        '''
+        Numéro de la ligne dont le FID est donné (recherche binaire dans l'index trié), ou None.
+        '''
+        if self._keys is None:
+            return None
+        try:
+            fid = int(fid)
+        except (TypeError, ValueError):
+            return None
+        i = int(np.searchsorted(self._keys, fid, side='right')) - 1
+        if i < 0 or self._keys[i] != fid:
+            return None
+        return int(self._key_rows[i])
+
+    def get(self, fid):
+        '''
+        Ligne (dictionnaire) dont le FID est donné, ou None.
+        '''
+        i = self.find(fid)
+        return None if i is None else self.row(i)
+
+    def close(self):
+        self.buffer = None
+        self._columns = {}
+        self._nulls = {}
+        self._numbers = {}
+        self._keys = self._key_rows = None
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # Des vues sont encore utilisées : la projection sera libérée avec elles
+                pass
+            self._mapping = None
+
+
+def map_file(path):
+    '''
+    Ouvre un fichier compilé en lecture seule avec mmap.
+    '''
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return CompiledTable(mapping, mapping)
+
+
+def source_info(path, stat):
+    '''
+    Métadonnées du CSV d'origine enregistrées dans le fichier compilé.
+    '''
+    return {'path': os.path.abspath(path), 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def compiled_path(compiled_dir, name):
+    return os.path.join(compiled_dir, name + '.bin')
+
+
+def load_compiled(path, schema_of, compiled_dir=None, stat=None, derive=None):
+    '''
+    Retourne la table compilée d'un CSV. Avec compiled_dir, le fichier compilé est réutilisé
+    s'il correspond au CSV (chemin, mtime, taille), sinon recompilé puis projeté en mémoire ;
+    sans compiled_dir (ou si l'écriture échoue), la table est construite en mémoire.
+    schema_of(noms de colonnes, lignes) calcule le schéma enregistré dans l'en-tête ;
+    derive(noms de colonnes, lignes), facultatif, retourne les colonnes précalculées.
+    '''
+    stat = stat or os.stat(path)
+    source = source_info(path, stat)
+    target = compiled_path(compiled_dir, os.path.basename(path)) if compiled_dir else None
+    if target and os.path.exists(target):
+        try:
+            table = map_file(target)
+            if table.source == source:
+                return table
+            table.close()
+        except (OSError, ValueError) as e:
+            logger.warning("Fichier compilé %s ignoré: %s", target, e)
+
+    fieldnames, rows = read_csv(path)
+    derived = derive(fieldnames, rows) if derive else None
+    data = compile_rows(fieldnames, rows, schema_of(fieldnames, rows), source, derived)
+    if target:
+        try:
+            os.makedirs(compiled_dir, exist_ok=True)
+            # Écriture dans un fichier temporaire puis remplacement atomique (plusieurs processus)
+            tmp = f'{target}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target)
+            return map_file(target)
+        except OSError as e:
+            logger.warning("Écriture du fichier compilé %s impossible: %s", target, e)
+    return CompiledTable(data)
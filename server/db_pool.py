@@ -0,0 +1,131 @@
+'''
+db_pool.py
+Ce module exécute le travail bloquant (SQLite) des requêtes dans un pool de threads borné pour
+l'application Canmore Incident Management. En mode asynchrone (eventlet, gevent), les appels
+SQLite sont du code C qui bloquerait la boucle d'événements et tous les WebSockets : ils sont
+confiés à de vrais threads système (tpool d'eventlet, threadpool du hub gevent). En mode
+threading, chaque requête a déjà son thread ; le pool borne seulement le nombre d'appels
+simultanés à la base.
+Hors requête (tâches de fond, recherche parallèle), run_blocking utilise le pool de l'application
+du processus. Les caches partagés par ce travail (index, taxonomie, catalogue) se protègent avec
+native_lock() : un verrou coopératif d'eventlet ne fonctionne pas entre threads système.
+'''
+
+import importlib
+import os
+import sys
+import threading
+from flask import current_app, has_app_context
+
+# Nombre maximal d'appels simultanés à la base
+POOL_SIZE = int(os.environ.get('CANMORE_DB_POOL_SIZE', '8'))
+
+
+class BlockingPool:
+    '''
+    Exécute fn(*args, **kwargs) hors de la boucle d'événements (selon le mode Socket.IO),
+    au plus size à la fois, et retourne son résultat (les exceptions sont propagées).
+    '''
+
+    def __init__(self, size=POOL_SIZE, async_mode='threading'):
+        self.size = size
+        self.async_mode = async_mode
+        if async_mode in ('eventlet', 'gevent'):
+            # Seul le thread de la boucle d'événements (celui qui crée le pool) délègue : un thread
+            # système (pool, tâches de fond) exécute directement, sans attendre la boucle
+            self._native_ident = original('_thread', 'get_ident')
+            self._loop_thread = self._native_ident()
+            self._run = self._run_outside_loop
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            tpool.set_num_threads(size)
+            self._offload = tpool.execute
+        elif async_mode == 'gevent':
+            import gevent
+            threadpool = gevent.get_hub().threadpool
+            threadpool.maxsize = size
+            self._offload = lambda fn, *args, **kwargs: threadpool.apply(fn, args, kwargs)
+        else:
+            self._slots = threading.BoundedSemaphore(size)
+            self._inside = threading.local()
+            self._run = self._run_bounded
+
+    def _run_bounded(self, fn, *args, **kwargs):
+        # Appel imbriqué (ex. tâche de fond qui lit la base) : la place est déjà prise par ce thread
+        if getattr(self._inside, 'active', False):
+            return fn(*args, **kwargs)
+        with self._slots:
+            self._inside.active = True
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._inside.active = False
+
+    def _run_outside_loop(self, fn, *args, **kwargs):
+        if self._native_ident() != self._loop_thread:
+            return fn(*args, **kwargs)
+        return self._offload(fn, *args, **kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        return self._run(fn, *args, **kwargs)
+
+
+# Pool de l'application du processus (une seule application par processus), pour le travail hors requête
+_process_pool = None
+
+
+def set_process_pool(pool):
+    '''
+    Désigne le pool utilisé par run_blocking hors du contexte d'une application (appelé par create_app).
+    '''
+    global _process_pool
+    _process_pool = pool
+
+
+def run_blocking(fn, *args, **kwargs):
+    '''
+    Exécute fn dans le pool de l'application courante (app.db_pool) ou, hors requête, dans celui
+    du processus ; directement s'il n'y a pas de pool.
+    '''
+    pool = getattr(current_app, 'db_pool', None) if has_app_context() else _process_pool
+    if pool is None:
+        return fn(*args, **kwargs)
+    return pool.run(fn, *args, **kwargs)
+
+
+def patched_mode():
+    '''
+    'eventlet' ou 'gevent' si cette bibliothèque a rendu threading coopératif (monkey-patching), sinon None.
+    '''
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return 'eventlet'
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return 'gevent'
+    return None
+
+
+def original(module, name):
+    '''
+    Attribut de la bibliothèque standard tel qu'avant le monkey-patching d'eventlet ou de gevent.
+    '''
+    mode = patched_mode()
+    if mode == 'eventlet':
+        from eventlet import patcher
+        return getattr(patcher.original(module), name)
+    if mode == 'gevent':
+        from gevent import monkey
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+
+def native_lock():
+    '''
+    Verrou de threads système, même quand eventlet ou gevent a remplacé threading.Lock : les
+    threads du pool se le disputent. À ne tenir que pour du travail exécuté dans le pool (ou bref),
+    un green thread qui l'attend bloquant toute la boucle d'événements.
+    '''
+    return original('_thread', 'allocate_lock')()
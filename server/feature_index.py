@@ -0,0 +1,330 @@
+'''
+feature_index.py
+Ce module associe chaque incident à l'élément de référence le plus proche (sentier, parc,
+bâtiment ou terrain de sport) pour l'application Canmore Incident Management.
+Les géométries des quatre couches GeoJSON sont découpées en segments, projetés en mètres
+et regroupés en feuilles par la méthode STR (Sort-Tile-Recursive) : une requête parcourt
+les feuilles par distance croissante de leur emprise et s'arrête dès qu'aucune ne peut
+contenir un segment plus proche. Un point situé dans un polygone est à distance nulle.
+Un mode vectorisé (NumPy) traite les imports en lot et le rattrapage des incidents existants.
+'''
+
+import math
+import numpy as np
+from server.dataset_catalog import catalog
+from server.geofence import Geofence, polygon_rings
+from server.projection import LocalProjection
+from server.db_pool import native_lock
+
+# Couches de référence indexées : nom de la couche → fichier dans static/data
+FEATURE_LAYERS = {
+    'trails': 'trails.geojson',
+    'parcs': 'parcs.geojson',
+    'buildings': 'buildings.geojson',
+    'sports_fields': 'sports_fields.geojson',
+}
+
+# Nombre de segments par feuille de l'arbre STR
+LEAF_SIZE = 16
+
+# Nombre maximal de paires point-feuille évaluées à la fois en mode vectorisé
+BATCH_ELEMENTS = 1 << 20
+
+
+def line_parts(geometry):
+    '''
+    Retourne les listes de positions [(x, y), ...] d'une géométrie : lignes, ou anneaux des polygones.
+    '''
+    if not geometry:
+        return []
+    kind = geometry.get('type')
+    coordinates = geometry.get('coordinates') or []
+    if kind == 'LineString':
+        return [coordinates]
+    if kind == 'MultiLineString':
+        return list(coordinates)
+    if kind in ('Polygon', 'MultiPolygon'):
+        return polygon_rings(geometry)
+    if kind == 'Point':
+        return [[coordinates]]
+    if kind == 'MultiPoint':
+        return [[point] for point in coordinates]
+    return []
+
+
+def segment_distances(px, py, x1, y1, x2, y2):
+    '''
+    Distances exactes entre des points et des segments (tableaux NumPy diffusables).
+    '''
+    dx = x2 - x1
+    dy = y2 - y1
+    length2 = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = ((px - x1) * dx + (py - y1) * dy) / length2
+    # Segment de longueur nulle : distance au point lui-même
+    t = np.clip(np.nan_to_num(t, nan=0.0, posinf=0.0, neginf=0.0), 0.0, 1.0)
+    return np.hypot(x1 + t * dx - px, y1 + t * dy - py)
+
+
+class FeatureIndex:
+    '''
+    Index spatial des éléments de référence : segments regroupés en feuilles STR et polygones.
+    '''
+
+    def __init__(self, layers, leaf_size=LEAF_SIZE):
+        # layers : {nom de la couche: liste d'entités GeoJSON}
+        self.features = []
+        segments = []
+        polygons = []
+        for layer, records in layers.items():
+            for record in records:
+                geometry = record.get('geometry')
+                parts = line_parts(geometry)
+                if not parts:
+                    continue
+                feature = len(self.features)
+                self.features.append((layer, (record.get('properties') or {}).get('FID')))
+                for part in parts:
+                    points = [(p[0], p[1]) for p in part]
+                    if len(points) == 1:
+                        points = points * 2
+                    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+                        segments.append((x1, y1, x2, y2, feature))
+                if geometry['type'] in ('Polygon', 'MultiPolygon'):
+                    polygons.append((feature, polygon_rings(geometry)))
+
+        # Projection locale en mètres centrée sur les données
+        lonlat = np.array(segments, dtype=float).reshape(-1, 5)
+        self.projection = LocalProjection.centered_on(lonlat[:, [0, 2]], lonlat[:, [1, 3]])
+        self.lon0, self.lat0 = self.projection.lon0, self.projection.lat0
+        self.kx, self.ky = self.projection.kx, self.projection.ky
+        x1, y1 = self.projection.forward(lonlat[:, 0], lonlat[:, 1])
+        x2, y2 = self.projection.forward(lonlat[:, 2], lonlat[:, 3])
+        owner = lonlat[:, 4].astype(np.int64)
+
+        # Regroupement STR : tranches verticales triées en x, puis feuilles triées en y dans chaque tranche
+        n = len(owner)
+        cx = (x1 + x2) / 2
+        cy = (y1 + y2) / 2
+        leaf_count = max(1, math.ceil(n / leaf_size))
+        slab_size = leaf_size * max(1, math.ceil(math.sqrt(leaf_count)))
+        by_x = np.argsort(cx, kind='stable')
+        order = np.concatenate([
+            slab[np.argsort(cy[slab], kind='stable')] for slab in np.split(by_x, range(slab_size, n, slab_size))
+        ]) if n else by_x
+        self.x1, self.y1, self.x2, self.y2 = x1[order], y1[order], x2[order], y2[order]
+        self.owner = owner[order]
+        self.leaf_starts = np.arange(0, n, leaf_size)
+        self.leaf_ends = np.minimum(self.leaf_starts + leaf_size, n)
+        if n:
+            minx = np.minimum(self.x1, self.x2)
+            maxx = np.maximum(self.x1, self.x2)
+            miny = np.minimum(self.y1, self.y2)
+            maxy = np.maximum(self.y1, self.y2)
+            self.leaf_bbox = np.column_stack([
+                np.minimum.reduceat(minx, self.leaf_starts), np.minimum.reduceat(miny, self.leaf_starts),
+                np.maximum.reduceat(maxx, self.leaf_starts), np.maximum.reduceat(maxy, self.leaf_starts),
+            ])
+        else:
+            self.leaf_bbox = np.zeros((0, 4))
+
+        # Polygones triés par aire croissante : le plus précis l'emporte si plusieurs contiennent le point
+        self.polygons = sorted(
+            ((self._ring_area(rings), feature, Geofence(rings, grid_size=8)) for feature, rings in polygons),
+            key=lambda entry: entry[0]
+        )
+
+    def __len__(self):
+        return len(self.features)
+
+    def _ring_area(self, rings):
+        area = 0.0
+        for ring in rings:
+            xs, ys = self.projection.forward([p[0] for p in ring], [p[1] for p in ring])
+            area += abs(float(np.dot(np.roll(xs, 1), ys) - np.dot(xs, np.roll(ys, 1)))) / 2
+        return area
+
+    def _result(self, feature, distance):
+        layer, fid = self.features[feature]
+        return {'layer': layer, 'feature_id': fid, 'distance_m': round(float(distance), 1)}
+
+    def nearest(self, latitude, longitude):
+        '''
+        Retourne {'layer', 'feature_id', 'distance_m'} de l'élément le plus proche, ou None si l'index est vide.
+        '''
+        for _area, feature, polygon in self.polygons:
+            if polygon.contains(longitude, latitude):
+                return self._result(feature, 0.0)
+        if not len(self.owner):
+            return None
+        x = (longitude - self.lon0) * self.kx
+        y = (latitude - self.lat0) * self.ky
+        bbox = self.leaf_bbox
+        dx = np.maximum(np.maximum(bbox[:, 0] - x, x - bbox[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(bbox[:, 1] - y, y - bbox[:, 3]), 0.0)
+        leaf_distances = np.hypot(dx, dy)
+        best, best_segment = math.inf, -1
+        for leaf in np.argsort(leaf_distances).tolist():
+            # Les feuilles suivantes sont toutes plus loin que le meilleur segment trouvé
+            if leaf_distances[leaf] >= best:
+                break
+            start, end = self.leaf_starts[leaf], self.leaf_ends[leaf]
+            distances = segment_distances(x, y, self.x1[start:end], self.y1[start:end],
+                                          self.x2[start:end], self.y2[start:end])
+            i = int(distances.argmin())
+            if distances[i] < best:
+                best, best_segment = float(distances[i]), start + i
+        return self._result(int(self.owner[best_segment]), best)
+
+    def features_within(self, latitude, longitude, radius_m):
+        '''
+        Retourne {(couche, FID): distance en mètres} des éléments situés à moins de radius_m du point ;
+        un polygone qui contient le point est à distance nulle. Seules les feuilles dont l'emprise
+        est à moins de radius_m sont parcourues.
+        '''
+        found = {}
+        for _area, feature, polygon in self.polygons:
+            if polygon.contains(longitude, latitude):
+                found[self.features[feature]] = 0.0
+        if not len(self.owner):
+            return found
+        x = (longitude - self.lon0) * self.kx
+        y = (latitude - self.lat0) * self.ky
+        bbox = self.leaf_bbox
+        dx = np.maximum(np.maximum(bbox[:, 0] - x, x - bbox[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(bbox[:, 1] - y, y - bbox[:, 3]), 0.0)
+        for leaf in np.flatnonzero(dx * dx + dy * dy <= radius_m * radius_m).tolist():
+            start, end = self.leaf_starts[leaf], self.leaf_ends[leaf]
+            distances = segment_distances(x, y, self.x1[start:end], self.y1[start:end],
+                                          self.x2[start:end], self.y2[start:end])
+            for i in np.flatnonzero(distances <= radius_m).tolist():
+                key = self.features[int(self.owner[start + i])]
+                distance = round(float(distances[i]), 1)
+                if distance < found.get(key, math.inf):
+                    found[key] = distance
+        return found
+
+    def nearest_many(self, latitudes, longitudes):
+        '''
+        Version vectorisée : retourne une liste de résultats (ou None) alignée sur les points.
+        Pour chaque point, la distance au coin le plus éloigné d'une feuille borne la distance
+        au segment le plus proche ; seules les feuilles dont l'emprise est sous cette borne
+        sont développées en segments, et toutes les distances sont calculées d'un coup.
+        '''
+        lats = np.asarray(latitudes, dtype=float).ravel()
+        lons = np.asarray(longitudes, dtype=float).ravel()
+        count = len(lats)
+        if not len(self.owner):
+            return [None] * count
+        feature = np.full(count, -1, dtype=np.int64)
+        distance = np.full(count, np.inf)
+        xs, ys = self.projection.forward(lons, lats)
+        bbox = self.leaf_bbox
+        chunk = max(1, BATCH_ELEMENTS // len(bbox))
+        for start in range(0, count, chunk):
+            px = xs[start:start + chunk, None]
+            py = ys[start:start + chunk, None]
+            # Distances au carré : écarts aux deux bords de chaque emprise, réutilisés pour les deux bornes
+            left, right = bbox[:, 0] - px, px - bbox[:, 2]
+            below, above = bbox[:, 1] - py, py - bbox[:, 3]
+            near_x = np.maximum(np.maximum(left, right), 0.0)
+            near_y = np.maximum(np.maximum(below, above), 0.0)
+            far_x = np.maximum(np.abs(left), np.abs(right))
+            far_y = np.maximum(np.abs(below), np.abs(above))
+            upper = (far_x * far_x + far_y * far_y).min(axis=1)
+            points, leaves = np.nonzero(near_x * near_x + near_y * near_y <= upper[:, None])
+
+            # Développe chaque paire (point, feuille) en paires (point, segment)
+            counts = self.leaf_ends[leaves] - self.leaf_starts[leaves]
+            firsts = np.cumsum(counts) - counts
+            segments = np.repeat(self.leaf_starts[leaves] - firsts, counts) + np.arange(counts.sum())
+            owners = np.repeat(points, counts)
+            distances = segment_distances(xs[start + owners], ys[start + owners], self.x1[segments],
+                                          self.y1[segments], self.x2[segments], self.y2[segments])
+
+            # Plus petite distance de chaque point (les paires sont groupées par point)
+            order = np.lexsort((distances, owners))
+            firsts = order[np.r_[0, np.flatnonzero(np.diff(owners[order])) + 1]]
+            feature[start + owners[firsts]] = self.owner[segments[firsts]]
+            distance[start + owners[firsts]] = distances[firsts]
+        # Points à l'intérieur d'un polygone : distance nulle, le plus petit polygone d'abord
+        inside = np.zeros(count, dtype=bool)
+        for _area, polygon_feature, polygon in self.polygons:
+            hits = polygon.contains_many(lons, lats) & ~inside
+            feature[hits] = polygon_feature
+            distance[hits] = 0.0
+            inside |= hits
+        return [self._result(f, d) for f, d in zip(feature.tolist(), distance.tolist())]
+
+
+_feature_index = None
+_feature_sources = None
+_feature_lock = native_lock()
+
+
+def get_feature_index():
+    '''
+    Retourne l'index des éléments de référence, reconstruit seulement si l'une des couches a changé.
+    '''
+    global _feature_index, _feature_sources
+    datasets = tuple(catalog.get(name) for name in FEATURE_LAYERS.values())
+    index = _feature_index
+    if index is not None and all(a is b for a, b in zip(_feature_sources, datasets)):
+        return index
+    with _feature_lock:
+        if _feature_index is None or not all(a is b for a, b in zip(_feature_sources, datasets)):
+            _feature_index = FeatureIndex({
+                layer: dataset.records for layer, dataset in zip(FEATURE_LAYERS, datasets)
+            })
+            _feature_sources = datasets
+        return _feature_index
+
+
+def nearest_feature(latitude, longitude):
+    '''
+    Élément le plus proche d'un point, ou None si les couches sont indisponibles.
+    '''
+    try:
+        return get_feature_index().nearest(latitude, longitude)
+    except FileNotFoundError:
+        return None
+
+
+def nearest_features(latitudes, longitudes):
+    '''
+    Éléments les plus proches d'une liste de points (mode vectorisé), None si les couches sont indisponibles.
+    '''
+    try:
+        return get_feature_index().nearest_many(latitudes, longitudes)
+    except FileNotFoundError:
+        return [None] * len(latitudes)
+
+
+def backfill_nearest_features():
+    '''
+    Renseigne nearest_feature_id, feature_layer et distance_m des incidents existants qui n'en ont pas,
+    en un seul calcul vectorisé. Retourne le nombre d'incidents mis à jour.
+    '''
+    # Import local : incidents_api importe ce module
+    from server.routes.incidents_api import get_db_connection
+    conn = get_db_connection()
+    try:
+        # Les anciennes lignes aux coordonnées non numériques sont ignorées
+        rows = conn.execute(
+            'SELECT id, latitude, longitude FROM incidents WHERE feature_layer IS NULL '
+            "AND typeof(latitude) IN ('real', 'integer') AND typeof(longitude) IN ('real', 'integer')"
+        ).fetchall()
+        if not rows:
+            return 0
+        found = nearest_features([row['latitude'] for row in rows], [row['longitude'] for row in rows])
+        updates = [
+            (result['feature_id'], result['layer'], result['distance_m'], row['id'])
+            for row, result in zip(rows, found) if result is not None
+        ]
+        conn.executemany(
+            'UPDATE incidents SET nearest_feature_id = ?, feature_layer = ?, distance_m = ? WHERE id = ?', updates
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(updates)
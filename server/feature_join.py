@@ -0,0 +1,207 @@
+'''
+feature_join.py
+Ce module maintient la jointure spatiale entre les incidents et les éléments de référence
+(parcs, sentiers, bâtiments, terrains de sport) pour l'application Canmore Incident Management.
+Un incident est rattaché à chaque polygone qui le contient et à chaque sentier situé à moins
+de la zone tampon de sa couche. Les compteurs (incidents ouverts et total par élément) sont
+construits une fois à partir de la base via l'index spatial des couches, puis mis à jour
+avant chaque rapport à partir du journal des modifications (ajouts, suppressions, changements
+de statut faits par n'importe quel worker) : le rapport ne recalcule rien.
+'''
+
+from server.dataset_catalog import catalog
+from server.feature_index import FEATURE_LAYERS, get_feature_index
+from server.incident_changes import read_snapshot, read_changes, rows_by_id
+from server.db_pool import native_lock
+
+# Zone tampon (mètres) de chaque couche : les sentiers sont des lignes, les autres des polygones
+JOIN_BUFFERS = {
+    'trails': 15.0,
+    'parcs': 0.0,
+    'buildings': 0.0,
+    'sports_fields': 0.0,
+}
+
+# Propriétés utilisées comme nom d'un élément, par ordre de préférence
+NAME_FIELDS = {
+    'trails': ('NAME1', 'ASSETID'),
+    'parcs': ('PARK_NAME',),
+    'buildings': ('FAC_NAME',),
+    'sports_fields': ('Location',),
+}
+
+# Statuts d'un incident fermé
+CLOSED_STATUSES = ('solved', 'résolu')
+
+
+def is_open(status):
+    '''
+    Un incident est ouvert tant qu'il n'est pas marqué résolu.
+    '''
+    return status not in CLOSED_STATUSES
+
+
+class IncidentFeatureJoin:
+    '''
+    Jointure incidents ↔ éléments de référence et compteurs par élément.
+    '''
+
+    def __init__(self, index, last_change=0):
+        self.index = index
+        self.radius = max(JOIN_BUFFERS.values())
+        # Identifiant d'incident → éléments rattachés [(couche, FID)] et état ouvert
+        self.matches = {}
+        self.open = {}
+        # Couche → {FID: [incidents ouverts, total]}
+        self.counts = {layer: {} for layer in FEATURE_LAYERS}
+        # Numéro de la dernière modification du journal appliquée
+        self.last_change = last_change
+        self._lock = native_lock()
+
+    def _join(self, latitude, longitude):
+        found = self.index.features_within(latitude, longitude, self.radius)
+        return [key for key, distance in found.items() if distance <= JOIN_BUFFERS.get(key[0], 0.0)]
+
+    def _count(self, incident_id, delta_open, delta_total):
+        for layer, fid in self.matches.get(incident_id, ()):
+            counts = self.counts[layer].setdefault(fid, [0, 0])
+            counts[0] += delta_open
+            counts[1] += delta_total
+
+    def add_rows(self, rows):
+        '''
+        Joint des lignes (id, latitude, longitude, status) ; les coordonnées non numériques sont ignorées.
+        Un incident déjà joint n'est pas compté deux fois : seul son statut est mis à jour.
+        '''
+        with self._lock:
+            for row in rows:
+                incident_id = row['id']
+                if incident_id in self.matches:
+                    self._set_status(incident_id, row['status'])
+                    continue
+                latitude, longitude = row['latitude'], row['longitude']
+                if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+                    continue
+                self.matches[incident_id] = self._join(latitude, longitude)
+                self.open[incident_id] = is_open(row['status'])
+                self._count(incident_id, int(self.open[incident_id]), 1)
+
+    def remove(self, incident_id):
+        with self._lock:
+            if incident_id in self.matches:
+                self._count(incident_id, -int(self.open[incident_id]), -1)
+                del self.matches[incident_id]
+                del self.open[incident_id]
+
+    def set_status(self, incident_id, status):
+        with self._lock:
+            self._set_status(incident_id, status)
+
+    def _set_status(self, incident_id, status):
+        if incident_id in self.matches:
+            now_open = is_open(status)
+            self._count(incident_id, int(now_open) - int(self.open[incident_id]), 0)
+            self.open[incident_id] = now_open
+
+    def layer_counts(self, layer):
+        '''
+        Copie des compteurs {FID: (ouverts, total)} d'une couche.
+        '''
+        with self._lock:
+            return {fid: tuple(counts) for fid, counts in self.counts[layer].items()}
+
+
+_join = None
+_join_lock = native_lock()
+
+JOIN_COLUMNS = 'SELECT id, latitude, longitude, status FROM incidents'
+
+
+def _build_join(index):
+    # Import local : incidents_api importe ce module
+    from server.routes.incidents_api import get_db_connection
+    conn = get_db_connection()
+    try:
+        last_change, rows = read_snapshot(conn, JOIN_COLUMNS)
+    finally:
+        conn.close()
+    join = IncidentFeatureJoin(index, last_change)
+    join.add_rows(rows)
+    return join
+
+
+def _sync(join):
+    '''
+    Applique les modifications du journal postérieures à la jointure ; retourne False si le journal
+    ne remonte plus assez loin (la jointure doit être reconstruite).
+    '''
+    from server.routes.incidents_api import get_db_connection
+    conn = get_db_connection()
+    try:
+        changes = read_changes(conn, join.last_change)
+        if changes is None:
+            return False
+        last_change, changed = changes
+        rows = rows_by_id(conn, JOIN_COLUMNS, [incident_id for incident_id, deleted in changed.items() if not deleted])
+    finally:
+        conn.close()
+    present = {row['id'] for row in rows}
+    for incident_id in changed:
+        if incident_id not in present:
+            join.remove(incident_id)
+    join.add_rows(rows)
+    join.last_change = last_change
+    return True
+
+
+def get_feature_join():
+    '''
+    Retourne la jointure à jour : construite depuis la base à la première demande (ou si l'une
+    des couches a été rechargée), puis mise à jour avec les modifications du journal.
+    '''
+    global _join
+    index = get_feature_index()
+    with _join_lock:
+        if _join is None or _join.index is not index or not _sync(_join):
+            _join = _build_join(index)
+        return _join
+
+
+def reset_feature_join():
+    '''
+    Oublie la jointure (ex. après un changement de base) ; elle sera reconstruite à la demande.
+    '''
+    global _join
+    with _join_lock:
+        _join = None
+
+
+def feature_name(layer, properties):
+    '''
+    Nom lisible d'un élément à partir de ses propriétés GeoJSON.
+    '''
+    for field in NAME_FIELDS.get(layer, ()):
+        if properties.get(field):
+            return properties[field]
+    return None
+
+
+def incidents_by_feature(layer):
+    '''
+    Retourne le nombre d'incidents ouverts et total de chaque élément d'une couche,
+    triés par incidents ouverts puis total décroissants.
+    '''
+    counts = get_feature_join().layer_counts(layer)
+    features = []
+    for record in catalog.get(FEATURE_LAYERS[layer]).records:
+        properties = record.get('properties') or {}
+        fid = properties.get('FID')
+        open_count, total = counts.get(fid, (0, 0))
+        features.append({
+            'feature_id': fid,
+            'name': feature_name(layer, properties),
+            'open': open_count,
+            'total': total,
+        })
+    features.sort(key=lambda feature: (-feature['open'], -feature['total'], feature['feature_id']))
+    return features
@@ -0,0 +1,378 @@
+'''
+federated_search.py
+Ce module fournit la recherche globale du portail d'information pour l'application
+Canmore Incident Management : une requête interroge en parallèle chaque jeu de données
+consultable et les incidents, chaque source ayant son propre budget de temps et de résultats.
+Les résultats sont fusionnés par score, et les requêtes fréquentes sont servies depuis un
+cache LRU, vidé dès qu'un jeu de données est rechargé ou qu'un incident change. L'index des
+incidents est mis à jour ligne par ligne depuis le journal des modifications, avant chaque
+recherche : une écriture ne le fait jamais reconstruire, quel que soit le worker qui l'a faite.
+'''
+
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from server.dataset_catalog import catalog
+from server.fuzzy_search import fold, TrigramIndex
+from server.search_index import get_search_index, SEARCH_DATASETS
+from server import tasks
+from server.incident_changes import read_snapshot, read_changes, rows_by_id
+from server.db_pool import native_lock, run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Budget de temps (secondes) accordé à chaque source ; une source en retard est ignorée
+SOURCE_BUDGETS = {
+    'parcs': 0.1,
+    'buildings': 0.1,
+    'trails': 0.1,
+    'sports_fields': 0.1,
+    'addresses': 0.25,
+    'incidents': 0.25,
+}
+
+# Nombre maximal de résultats retenus par source
+SOURCE_LIMIT = 5
+
+# Nombre de requêtes conservées dans le cache
+CACHE_SIZE = 256
+
+# Lignes ajoutées à l'index des incidents (ajouts et modifications) avant un compactage en arrière-plan,
+# au minimum ; au-delà, le seuil est la taille de l'index à sa construction
+COMPACT_MIN = 1000
+
+_executor = ThreadPoolExecutor(max_workers=len(SOURCE_BUDGETS), thread_name_prefix='canmore-search')
+
+
+class SearchCache:
+    '''
+    Cache LRU des réponses de la recherche globale, partagé entre les threads.
+    '''
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = native_lock()
+        # Incrémenté à chaque invalidation : une réponse calculée avant ne doit pas être stockée
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+search_cache = SearchCache()
+
+# Un jeu de données rechargé rend les réponses en cache obsolètes
+catalog.on_reload(lambda dataset: search_cache.clear())
+
+
+def invalidate_search_cache():
+    '''
+    Vide le cache des réponses de la recherche globale, sans toucher à l'index des incidents
+    (tenu à jour par sync_incident_index).
+    '''
+    search_cache.clear()
+
+
+def score(query, value, distance):
+    '''
+    Score de pertinence d'un résultat : moins de fautes d'abord, avec un bonus
+    pour une valeur qui commence par la requête ou dont un mot commence par elle.
+    '''
+    value = fold(value)
+    result = 1.0 - distance / (len(query) + 1)
+    if value.startswith(query):
+        result += 0.2
+    elif (' ' + query) in (' ' + value):
+        result += 0.1
+    return round(result, 3)
+
+
+def search_dataset(name, query, limit):
+    '''
+    Source « jeu de données » : recherche approximative dans l'index de la colonne configurée.
+    '''
+    index = get_search_index(name)
+    hits = []
+    for value, distance in index.fuzzy(query, limit):
+        record = index.exact(value) or {}
+        hit = {
+            'type': name,
+            'value': value,
+            'fid': record.get('FID'),
+            'distance': distance,
+            'score': score(query, value, distance),
+        }
+        # Position des adresses (colonnes WGS84 précalculées du catalogue)
+        if 'latitude' in record:
+            hit['latitude'] = record['latitude']
+            hit['longitude'] = record['longitude']
+        hits.append(hit)
+    return hits
+
+
+def incident_text(incident):
+    '''
+    Texte indexé d'un incident : sujet, détail et adresse la plus proche, normalisés.
+    '''
+    parts = [incident.get('type'), incident.get('description'), incident.get('nearest_address')]
+    return fold(' — '.join(str(part) for part in parts if part))
+
+
+class IncidentIndex:
+    '''
+    Index de trigrammes des incidents (sujet, détail, adresse la plus proche), construit une fois
+    depuis la base puis tenu à jour ligne par ligne à partir du journal des modifications
+    (incident_changes), qui couvre les écritures de tous les workers. Une ligne dont le texte change
+    est retirée puis ajoutée à nouveau ; la reconstruction complète (compactage) ne se fait qu'en
+    arrière-plan, quand les lignes ajoutées dépassent la taille initiale.
+    '''
+
+    def __init__(self, incidents, last_change=0):
+        # Position dans l'index → incident (None une fois retiré) ; identifiant → position
+        self.incidents = list(incidents)
+        self.positions = {incident['id']: i for i, incident in enumerate(self.incidents)}
+        self.trigrams = TrigramIndex([incident_text(incident) for incident in self.incidents])
+        self.built_size = len(self.incidents)
+        # Numéro de la dernière modification du journal appliquée
+        self.last_change = last_change
+        self._lock = native_lock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def needs_compaction(self):
+        return len(self.incidents) - self.built_size > max(COMPACT_MIN, self.built_size)
+
+    def upsert(self, incidents):
+        '''
+        Ajoute ou met à jour des incidents complets.
+        '''
+        with self._lock:
+            for incident in incidents:
+                text = incident_text(incident)
+                position = self.positions.get(incident['id'])
+                if position is not None:
+                    if text == self.trigrams.values[position]:
+                        # Texte inchangé (ex. changement de statut) : mise à jour sur place
+                        self.incidents[position] = incident
+                        continue
+                    self.trigrams.discard(position)
+                    self.incidents[position] = None
+                self.positions[incident['id']] = self.trigrams.add(text)
+                self.incidents.append(incident)
+
+    def remove(self, incident_ids):
+        with self._lock:
+            for incident_id in incident_ids:
+                position = self.positions.pop(incident_id, None)
+                if position is not None:
+                    self.trigrams.discard(position)
+                    self.incidents[position] = None
+
+    def search(self, query, limit):
+        '''
+        Retourne [(incident, texte indexé, distance)] triés par pertinence.
+        '''
+        with self._lock:
+            return [(self.incidents[i], self.trigrams.values[i], distance)
+                    for i, distance in self.trigrams.search(query, limit)]
+
+
+_incident_index = None
+# Une seule construction et une seule synchronisation à la fois
+_build_lock = native_lock()
+_sync_lock = native_lock()
+_compaction_scheduled = False
+
+
+def build_incident_index():
+    '''
+    Construit l'index des incidents depuis la base et le met en service. L'index courant reste
+    servi pendant la lecture ; les modifications suivantes sont appliquées par sync_incident_index.
+    '''
+    global _incident_index, _compaction_scheduled
+    # Imports locaux : incidents_api importe ce module
+    from server.routes.incidents_api import get_db_connection
+    from server.incident_taxonomy import decode_incidents
+    with _build_lock:
+        try:
+            conn = get_db_connection()
+            try:
+                last_change, rows = read_snapshot(conn, 'SELECT * FROM incidents')
+            finally:
+                conn.close()
+            index = _incident_index = IncidentIndex(decode_incidents(rows), last_change)
+        finally:
+            _compaction_scheduled = False
+    return index
+
+
+def reset_incident_index():
+    '''
+    Oublie l'index des incidents (ex. après un changement de base) ; il sera reconstruit à la demande.
+    '''
+    global _incident_index
+    with _sync_lock, _build_lock:
+        _incident_index = None
+    search_cache.clear()
+
+
+def get_incident_index():
+    '''
+    Retourne l'index des incidents, construit à la première demande seulement.
+    '''
+    index = _incident_index
+    if index is not None:
+        return index
+    with _build_lock:
+        index = _incident_index
+    return index if index is not None else build_incident_index()
+
+
+def sync_incident_index():
+    '''
+    Applique à l'index les modifications du journal qu'il n'a pas encore vues (écritures de ce
+    worker ou des autres) et vide alors le cache des réponses. Ne construit pas l'index.
+    '''
+    global _compaction_scheduled
+    from server.routes.incidents_api import get_db_connection
+    from server.incident_taxonomy import decode_incidents
+    with _sync_lock:
+        index = _incident_index
+        if index is None:
+            return
+        conn = get_db_connection()
+        try:
+            changes = read_changes(conn, index.last_change)
+            if changes is not None:
+                last_change, changed = changes
+                rows = rows_by_id(conn, 'SELECT * FROM incidents',
+                                  [incident_id for incident_id, deleted in changed.items() if not deleted])
+        finally:
+            conn.close()
+        if changes is None:
+            # Journal purgé au-delà de l'index : reconstruction complète
+            build_incident_index()
+        elif changed:
+            incidents = decode_incidents(rows)
+            present = {incident['id'] for incident in incidents}
+            index.remove([incident_id for incident_id in changed if incident_id not in present])
+            index.upsert(incidents)
+            index.last_change = last_change
+            compact = index.needs_compaction and not _compaction_scheduled
+            if compact:
+                _compaction_scheduled = True
+                tasks.submit(build_incident_index)
+        else:
+            return
+    search_cache.clear()
+
+
+def search_incidents(query, limit):
+    '''
+    Source « incidents » : sujet, détail et adresse la plus proche de chaque incident.
+    '''
+    hits = []
+    for incident, text, distance in get_incident_index().search(query, limit):
+        hits.append({
+            'type': 'incidents',
+            'value': ' — '.join(str(part) for part in (incident.get('type'), incident.get('description')) if part),
+            'id': incident['id'],
+            'latitude': incident.get('latitude'),
+            'longitude': incident.get('longitude'),
+            'status': incident.get('status'),
+            'nearest_address': incident.get('nearest_address'),
+            'distance': distance,
+            'score': score(query, text, distance),
+        })
+    return hits
+
+
+def run_source(name, query, limit):
+    '''
+    Exécute la recherche d'une source (exécutée dans le pool de threads).
+    '''
+    if name == 'incidents':
+        return search_incidents(query, limit)
+    return search_dataset(name, query, limit)
+
+
+def warm_indexes():
+    '''
+    Construit à l'avance les index de trigrammes de toutes les sources (tâche de fond au démarrage),
+    pour que la première recherche respecte les budgets de temps.
+    '''
+    for name in SEARCH_DATASETS:
+        try:
+            get_search_index(name).fuzzy('warm up', 1)
+        except FileNotFoundError:
+            pass
+    get_incident_index()
+
+
+def federated_search(query, limit=10):
+    '''
+    Interroge toutes les sources en parallèle et retourne
+    {'results': [résultats typés triés par score], 'sources': {source: état}}.
+    Une source qui dépasse son budget ou échoue est signalée et ignorée ;
+    seules les réponses complètes sont mises en cache.
+    '''
+    query = fold(query)
+    key = (query, limit)
+    # Modifications d'incidents (de tous les workers) appliquées avant de consulter le cache
+    run_blocking(sync_incident_index)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = search_cache.generation
+
+    start = time.monotonic()
+    # Chaque source s'exécute dans le pool du travail bloquant (threads système en mode eventlet/gevent)
+    futures = {name: _executor.submit(run_blocking, run_source, name, query, SOURCE_LIMIT)
+               for name in SOURCE_BUDGETS}
+    hits = []
+    sources = {}
+    for name, future in futures.items():
+        remaining = start + SOURCE_BUDGETS[name] - time.monotonic()
+        try:
+            found = future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            future.cancel()
+            sources[name] = {'status': 'timeout'}
+            continue
+        except Exception:
+            logger.exception("Recherche dans %s échouée", name)
+            sources[name] = {'status': 'error'}
+            continue
+        sources[name] = {'status': 'ok', 'count': len(found)}
+        hits.extend(found)
+
+    hits.sort(key=lambda hit: (-hit['score'], len(hit['value']), hit['type']))
+    response = {'results': hits[:limit], 'sources': sources}
+    if all(source['status'] == 'ok' for source in sources.values()):
+        search_cache.put(key, response, generation)
+    return response
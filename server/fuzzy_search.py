@@ -0,0 +1,147 @@
+'''
+fuzzy_search.py
+Ce module fournit la recherche approximative (tolérante aux fautes de frappe) des jeux de
+données de référence pour l'application Canmore Incident Management. Les valeurs sont
+normalisées (accents, casse, espaces), découpées en trigrammes et indexées dans des listes
+inversées : une requête ne compte que les trigrammes communs (NumPy bincount) au lieu de
+parcourir toutes les lignes, puis les meilleurs candidats sont vérifiés par une distance
+d'édition bornée, calculée contre la meilleure sous-chaîne de chaque valeur.
+'''
+
+import unicodedata
+import numpy as np
+
+# Nombre de candidats (les plus riches en trigrammes communs) vérifiés par distance d'édition
+MAX_CANDIDATES = 64
+
+# Distance d'édition maximale acceptée, quelle que soit la longueur de la requête
+MAX_DISTANCE = 3
+
+
+def fold(text):
+    '''
+    Normalise un texte pour la comparaison : accents retirés, casse ignorée, espaces réduits.
+    '''
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def trigrams(text):
+    '''
+    Ensemble des trigrammes d'un texte normalisé, précédé d'un espace pour marquer le début des mots.
+    '''
+    padded = ' ' + text
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def allowed_distance(query):
+    '''
+    Nombre de fautes tolérées selon la longueur de la requête (aucune pour moins de 4 caractères).
+    '''
+    if len(query) < 4:
+        return 0
+    return min(MAX_DISTANCE, max(1, len(query) // 4))
+
+
+def substring_distance(query, text, max_distance):
+    '''
+    Distance d'édition entre la requête et la sous-chaîne de text qui lui ressemble le plus
+    (algorithme de Sellers). Seules les lignes encore sous la borne sont calculées (coupure d'Ukkonen) ;
+    retourne None si la distance dépasse max_distance.
+    '''
+    m = len(query)
+    over = max_distance + 1
+    # column[i] : distance entre query[:i] et la meilleure sous-chaîne se terminant au caractère courant
+    column = [min(i, over) for i in range(m + 1)]
+    # Dernière ligne dont la valeur est encore dans la borne
+    last = min(max_distance, m)
+    best = column[m] if last == m else over
+    for char in text:
+        top = min(last + 1, m)
+        current = [0]
+        for i in range(1, top + 1):
+            cost = 0 if query[i - 1] == char else 1
+            current.append(min(column[i] + 1, current[i - 1] + 1, column[i - 1] + cost, over))
+        current.extend([over] * (m - top))
+        column = current
+        last = top
+        while last > 0 and column[last] > max_distance:
+            last -= 1
+        if last == m and column[m] < best:
+            best = column[m]
+            if best == 0:
+                return 0
+    return best if best <= max_distance else None
+
+
+class TrigramIndex:
+    '''
+    Index inversé trigramme → identifiants des valeurs qui le contiennent.
+    '''
+
+    def __init__(self, values):
+        # values : liste de textes déjà normalisés (fold)
+        self.values = values
+        postings = {}
+        for i, value in enumerate(values):
+            for gram in trigrams(value):
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        # Valeurs ajoutées après la construction (listes Python) et identifiants retirés
+        self.added = {}
+        self.removed = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        '''
+        Ajoute une valeur normalisée après la construction ; retourne son identifiant.
+        '''
+        i = len(self.values)
+        self.values.append(value)
+        for gram in trigrams(value):
+            self.added.setdefault(gram, []).append(i)
+        return i
+
+    def discard(self, i):
+        '''
+        Retire une valeur : son identifiant n'est plus jamais retourné ni réutilisé.
+        '''
+        if self.values[i] is not None:
+            self.values[i] = None
+            self.removed.append(i)
+
+    def candidates(self, query, count=MAX_CANDIDATES):
+        '''
+        Retourne les identifiants des valeurs partageant le plus de trigrammes avec la requête.
+        '''
+        grams = trigrams(query)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        lists.extend(np.array(self.added[gram], dtype=np.int32) for gram in grams if gram in self.added)
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.values))
+        if self.removed:
+            shared[self.removed] = 0
+        hits = np.flatnonzero(shared)
+        if len(hits) > count:
+            hits = hits[np.argpartition(-shared[hits], count - 1)[:count]]
+        return hits.tolist()
+
+    def search(self, query, limit=10):
+        '''
+        Retourne au plus limit paires (identifiant, distance), triées par pertinence :
+        distance d'édition, puis correspondance en début de valeur, puis longueur.
+        '''
+        query = fold(query)
+        max_distance = allowed_distance(query)
+        ranked = []
+        for i in self.candidates(query):
+            value = self.values[i]
+            distance = substring_distance(query, value, max_distance)
+            if distance is not None:
+                ranked.append((distance, not value.startswith(query), len(value), value, i))
+        ranked.sort()
+        return [(entry[4], entry[0]) for entry in ranked[:limit]]
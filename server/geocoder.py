@@ -0,0 +1,225 @@
+'''
+geocoder.py
+Ce module fait le géocodage inverse (coordonnées → adresse civique la plus proche)
+pour l'application Canmore Incident Management. Les ~14 000 adresses de Addresses.csv
+(Web Mercator X, Y) sont lues depuis les colonnes latitude/longitude précalculées du catalogue,
+puis indexées dans un arbre k-d en mètres : une requête ne parcourt que les branches
+qui peuvent encore contenir une adresse plus proche que les k meilleures trouvées.
+'''
+
+import heapq
+import math
+import numpy as np
+from server.dataset_catalog import catalog
+from server import tasks
+from server.projection import LocalProjection
+from server.db_pool import native_lock
+
+# Fichier des adresses civiques dans static/data
+ADDRESSES_FILE = 'Addresses.csv'
+
+# Nombre maximal de positions dans une feuille de l'arbre k-d
+LEAF_SIZE = 8
+
+# Nombre maximal d'adresses retournées par requête
+MAX_RESULTS = 20
+
+# Valeur de nearest_address d'un incident sans adresse trouvée (déjà traité, à ne pas réessayer)
+NO_ADDRESS = ''
+
+
+class ReverseGeocoder:
+    '''
+    Index spatial des adresses : arbre k-d équilibré sur les positions distinctes, dans une projection
+    locale en mètres. Les adresses d'un même bâtiment (unités) partagent une seule position de l'arbre.
+    '''
+
+    def __init__(self, addresses, lons, lats, leaf_size=LEAF_SIZE):
+        # addresses : liste de dictionnaires {'address', 'fid'} alignée sur lons et lats
+        self.addresses = addresses
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.leaf_size = leaf_size
+        self.projection = LocalProjection.centered_on(self.lons, self.lats)
+        self.lon0, self.lat0 = self.projection.lon0, self.projection.lat0
+        self.kx, self.ky = self.projection.kx, self.projection.ky
+        xs, ys = self.projection.forward(self.lons, self.lats)
+
+        # Positions distinctes et adresses de chacune
+        points, inverse = np.unique(np.column_stack((xs, ys)), axis=0, return_inverse=True)
+        members = [[] for _ in range(len(points))]
+        for i, p in enumerate(inverse.ravel().tolist()):
+            members[p].append(i)
+
+        # Arbre implicite : chaque plage [lo, hi) a son pivot au milieu, l'axe alterne x/y avec la profondeur
+        order = np.arange(len(points))
+        self._build(points, order, 0, len(points), 0)
+        self.xs = points[order, 0].tolist()
+        self.ys = points[order, 1].tolist()
+        self.members = [members[p] for p in order.tolist()]
+
+    def _build(self, points, order, lo, hi, axis):
+        if hi - lo <= self.leaf_size:
+            return
+        mid = (lo + hi) // 2
+        values = points[order[lo:hi], axis]
+        order[lo:hi] = order[lo:hi][np.argpartition(values, mid - lo)]
+        self._build(points, order, lo, mid, 1 - axis)
+        self._build(points, order, mid + 1, hi, 1 - axis)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def _search(self, x, y, k, lo, hi, axis, heap, rd, off):
+        '''
+        Parcours de l'arbre : heap conserve les k positions les plus proches (distance² négative).
+        rd est la distance² minimale entre le point et la région [lo, hi), off ses composantes par axe.
+        '''
+        xs, ys = self.xs, self.ys
+        if hi - lo <= self.leaf_size:
+            for i in range(lo, hi):
+                d = (xs[i] - x) ** 2 + (ys[i] - y) ** 2
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d, i))
+                elif d < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d, i))
+            return
+        mid = (lo + hi) // 2
+        diff = (x - xs[mid]) if axis == 0 else (y - ys[mid])
+        d = (xs[mid] - x) ** 2 + (ys[mid] - y) ** 2
+        if len(heap) < k:
+            heapq.heappush(heap, (-d, mid))
+        elif d < -heap[0][0]:
+            heapq.heapreplace(heap, (-d, mid))
+        near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+        self._search(x, y, k, near[0], near[1], 1 - axis, heap, rd, off)
+        # Le demi-espace opposé n'est visité que s'il peut contenir une position plus proche
+        far_rd = rd - off[axis] ** 2 + diff * diff
+        if len(heap) < k or far_rd < -heap[0][0]:
+            far_off = list(off)
+            far_off[axis] = diff
+            self._search(x, y, k, far[0], far[1], 1 - axis, heap, far_rd, far_off)
+
+    def nearest(self, latitude, longitude, k=1):
+        '''
+        Retourne les k adresses les plus proches du point, triées par distance croissante :
+        [{'address', 'fid', 'latitude', 'longitude', 'distance_m'}].
+        '''
+        if not self.addresses or k < 1:
+            return []
+        x = (longitude - self.lon0) * self.kx
+        y = (latitude - self.lat0) * self.ky
+        # Les k positions les plus proches contiennent au moins k adresses
+        heap = []
+        self._search(x, y, k, 0, len(self.xs), 0, heap, 0.0, [0.0, 0.0])
+        found = sorted((-d, self.members[p]) for d, p in heap)
+        results = []
+        for d, members in found:
+            distance = round(math.sqrt(d), 1)
+            for i in members:
+                results.append({
+                    'address': self.addresses[i]['address'],
+                    'fid': self.addresses[i]['fid'],
+                    'latitude': float(self.lats[i]),
+                    'longitude': float(self.lons[i]),
+                    'distance_m': distance,
+                })
+                if len(results) == k:
+                    return results
+        return results
+
+
+def build_geocoder(dataset):
+    '''
+    Construit l'index à partir de l'instantané de Addresses.csv (lignes sans coordonnées ignorées).
+    Les longitudes et latitudes sont lues directement dans les colonnes précalculées de la table compilée.
+    '''
+    table = dataset.records
+    lons, lats = table.numbers('longitude'), table.numbers('latitude')
+    rows = np.flatnonzero(np.isfinite(lons) & np.isfinite(lats)).tolist()
+    addresses_column = table.column('FullCivicA')
+    addresses = []
+    for i in rows:
+        fid = table.value('FID', i)
+        addresses.append({
+            'address': addresses_column[i].strip(),
+            'fid': int(fid) if fid.isdigit() else fid,
+        })
+    return ReverseGeocoder(addresses, lons[rows], lats[rows])
+
+
+_geocoder = None
+_geocoder_source = None
+_geocoder_lock = native_lock()
+
+
+def get_geocoder():
+    '''
+    Retourne le géocodeur inverse, reconstruit seulement si Addresses.csv a changé.
+    '''
+    global _geocoder, _geocoder_source
+    dataset = catalog.get(ADDRESSES_FILE)
+    if _geocoder is not None and _geocoder_source is dataset:
+        return _geocoder
+    with _geocoder_lock:
+        if _geocoder is None or _geocoder_source is not dataset:
+            _geocoder = build_geocoder(dataset)
+            _geocoder_source = dataset
+    return _geocoder
+
+
+_enrich_scheduled = False
+_enrich_lock = native_lock()
+
+
+def enrich_incidents():
+    '''
+    Renseigne l'adresse la plus proche (nearest_address, nearest_address_m) des incidents
+    qui n'en ont pas encore. Retourne le nombre d'incidents enrichis.
+    Les incidents sans adresse trouvée (ou aux coordonnées non numériques) reçoivent NO_ADDRESS :
+    ils ne sont plus relus à chaque passe.
+    '''
+    global _enrich_scheduled
+    with _enrich_lock:
+        _enrich_scheduled = False
+    # Import local : incidents_api importe ce module
+    from server.routes.incidents_api import get_db_connection
+    geocoder = get_geocoder()
+    conn = get_db_connection()
+    try:
+        # Seuls les incidents de l'index partiel idx_incidents_unenriched sont lus
+        rows = conn.execute(
+            'SELECT id, latitude, longitude FROM incidents WHERE nearest_address IS NULL'
+        ).fetchall()
+        updates = []
+        misses = []
+        for row in rows:
+            latitude, longitude = row['latitude'], row['longitude']
+            # Les anciennes lignes aux coordonnées non numériques sont ignorées
+            numeric = isinstance(latitude, (int, float)) and isinstance(longitude, (int, float))
+            found = geocoder.nearest(latitude, longitude) if numeric else []
+            if found:
+                updates.append((found[0]['address'], found[0]['distance_m'], row['id']))
+            else:
+                misses.append((NO_ADDRESS, None, row['id']))
+        conn.executemany(
+            'UPDATE incidents SET nearest_address = ?, nearest_address_m = ? WHERE id = ?', updates + misses
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    # Les adresses ajoutées passent par le journal des modifications (recherche globale)
+    return len(updates)
+
+
+def schedule_enrichment():
+    '''
+    Planifie l'enrichissement en arrière-plan. Les demandes reçues avant que la tâche
+    ne démarre sont regroupées en une seule passe.
+    '''
+    global _enrich_scheduled
+    with _enrich_lock:
+        if _enrich_scheduled:
+            return
+        _enrich_scheduled = True
+    tasks.submit(enrich_incidents)
@@ -0,0 +1,197 @@
+'''
+geofence.py
+Ce module vérifie côté serveur qu'un point (longitude, latitude) se trouve à l'intérieur
+de la limite de Canmore (city_boundary.geojson) pour l'application Canmore Incident Management.
+Le test point-dans-polygone combine un préfiltre sur l'emprise (bbox) et une grille précalculée :
+les cellules entièrement dedans ou dehors répondent en O(1), seules les cellules traversées
+par la limite font un lancer de rayon exact, limité aux arêtes de leur bande horizontale.
+Un mode vectorisé (NumPy) valide des milliers de points à la fois.
+'''
+
+import math
+import numpy as np
+from server.dataset_catalog import catalog
+from server.db_pool import native_lock
+
+# Fichier de la limite municipale dans static/data
+BOUNDARY_FILE = 'city_boundary.geojson'
+
+# Résolution de la grille (cellules par côté)
+GRID_SIZE = 64
+
+# Statut des cellules de la grille
+OUTSIDE, INSIDE, BORDER = 0, 1, 2
+
+# Nombre maximal de points traités ensemble par le lancer de rayon vectorisé
+BATCH_CHUNK = 4096
+
+
+def polygon_rings(geometry):
+    '''
+    Retourne la liste des anneaux [(x, y), ...] d'une géométrie Polygon ou MultiPolygon.
+    Avec la règle pair-impair, les trous et les polygones multiples sont gérés sans distinction.
+    '''
+    if not geometry:
+        return []
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        return []
+    return [[(p[0], p[1]) for p in ring] for polygon in polygons for ring in polygon]
+
+
+def ray_cast(x, y, edges):
+    '''
+    Test pair-impair exact : compte les arêtes croisées par le rayon horizontal partant de (x, y).
+    '''
+    inside = False
+    for x1, y1, x2, y2 in edges:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+class Geofence:
+    '''
+    Index point-dans-polygone d'un ensemble d'anneaux.
+    '''
+
+    def __init__(self, rings, grid_size=GRID_SIZE):
+        edges = []
+        for ring in rings:
+            for i in range(len(ring)):
+                (x1, y1), (x2, y2) = ring[i - 1], ring[i]
+                if (x1, y1) != (x2, y2):
+                    edges.append((x1, y1, x2, y2))
+        if not edges:
+            raise ValueError('La limite ne contient aucun polygone')
+        self.edges = edges
+        self.edge_array = np.array(edges, dtype=float)
+        xs = self.edge_array[:, [0, 2]]
+        ys = self.edge_array[:, [1, 3]]
+        self.bbox = (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+        self.cols = self.rows = grid_size
+        self.dx = (self.bbox[2] - self.bbox[0]) / self.cols or 1.0
+        self.dy = (self.bbox[3] - self.bbox[1]) / self.rows or 1.0
+
+        # Arêtes de chaque bande horizontale : seules candidates au croisement d'un rayon dans la bande
+        self.band_edges = [[] for _ in range(self.rows)]
+        border = np.zeros((self.rows, self.cols), dtype=bool)
+        for edge in edges:
+            x1, y1, x2, y2 = edge
+            r0, r1 = self._row(min(y1, y2)), self._row(max(y1, y2))
+            c0, c1 = self._col(min(x1, x2)), self._col(max(x1, x2))
+            for r in range(r0, r1 + 1):
+                self.band_edges[r].append(edge)
+            # Les cellules couvertes par l'emprise de l'arête sont marquées « frontière » (conservateur)
+            border[r0:r1 + 1, c0:c1 + 1] = True
+
+        # Les cellules sans arête sont entièrement dedans ou dehors : on teste leur centre une fois
+        status = np.full((self.rows, self.cols), BORDER, dtype=np.int8)
+        for r in range(self.rows):
+            cy = self.bbox[1] + (r + 0.5) * self.dy
+            for c in range(self.cols):
+                if not border[r, c]:
+                    cx = self.bbox[0] + (c + 0.5) * self.dx
+                    status[r, c] = INSIDE if ray_cast(cx, cy, self.band_edges[r]) else OUTSIDE
+        self.status = status
+        # Copie en listes Python : l'indexation scalaire y est plus rapide qu'avec NumPy
+        self._status_rows = status.tolist()
+
+    def _row(self, y):
+        return min(max(int((y - self.bbox[1]) / self.dy), 0), self.rows - 1)
+
+    def _col(self, x):
+        return min(max(int((x - self.bbox[0]) / self.dx), 0), self.cols - 1)
+
+    def contains(self, lon, lat):
+        '''
+        Retourne True si le point (lon, lat) est à l'intérieur de la limite.
+        '''
+        minx, miny, maxx, maxy = self.bbox
+        if not (minx <= lon <= maxx and miny <= lat <= maxy):
+            return False
+        row = self._row(lat)
+        cell = self._status_rows[row][self._col(lon)]
+        if cell != BORDER:
+            return cell == INSIDE
+        return ray_cast(lon, lat, self.band_edges[row])
+
+    def contains_many(self, lons, lats):
+        '''
+        Version vectorisée : retourne un tableau booléen NumPy pour des tableaux de longitudes et latitudes.
+        Les valeurs non finies (NaN, inf) sont considérées hors limite.
+        '''
+        x = np.asarray(lons, dtype=float).ravel()
+        y = np.asarray(lats, dtype=float).ravel()
+        if x.shape != y.shape:
+            raise ValueError('Les tableaux de longitudes et de latitudes doivent avoir la même taille')
+        minx, miny, maxx, maxy = self.bbox
+        result = np.zeros(x.shape, dtype=bool)
+        candidates = np.nonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))[0]
+        if not len(candidates):
+            return result
+        rows = np.clip(((y[candidates] - miny) / self.dy).astype(int), 0, self.rows - 1)
+        cols = np.clip(((x[candidates] - minx) / self.dx).astype(int), 0, self.cols - 1)
+        cells = self.status[rows, cols]
+        result[candidates[cells == INSIDE]] = True
+
+        # Cellules frontière : lancer de rayon exact vectorisé sur toutes les arêtes, par paquets
+        border = candidates[cells == BORDER]
+        x1, y1, x2, y2 = (self.edge_array[:, i] for i in range(4))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for start in range(0, len(border), BATCH_CHUNK):
+                idx = border[start:start + BATCH_CHUNK]
+                px = x[idx][:, None]
+                py = y[idx][:, None]
+                spans = (y1 > py) != (y2 > py)
+                crossings = spans & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+                result[idx] = crossings.sum(axis=1) % 2 == 1
+        return result
+
+
+_geofence = None
+_geofence_source = None
+_geofence_lock = native_lock()
+
+
+def get_geofence():
+    '''
+    Retourne le geofence de Canmore, reconstruit seulement si city_boundary.geojson a changé.
+    '''
+    global _geofence, _geofence_source
+    dataset = catalog.get(BOUNDARY_FILE)
+    if _geofence is not None and _geofence_source is dataset:
+        return _geofence
+    with _geofence_lock:
+        if _geofence is None or _geofence_source is not dataset:
+            rings = [ring for feature in dataset.records for ring in polygon_rings(feature.get('geometry'))]
+            _geofence = Geofence(rings)
+            _geofence_source = dataset
+    return _geofence
+
+
+def is_valid_coordinate(latitude, longitude):
+    '''
+    Vérifie que la latitude et la longitude sont des nombres finis dans les plages géographiques.
+    '''
+    for value in (latitude, longitude):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            return False
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+def is_inside_canmore(latitude, longitude):
+    '''
+    Retourne True si le point est à l'intérieur de la limite de Canmore.
+    '''
+    return get_geofence().contains(longitude, latitude)
+
+
+def are_inside_canmore(latitudes, longitudes):
+    '''
+    Tableau de booléens : chaque point est-il à l'intérieur de la limite de Canmore (appel vectorisé).
+    '''
+    return get_geofence().contains_many(longitudes, latitudes)
@@ -0,0 +1,252 @@
+'''
+geojson_stream.py
+Ce module lit les fichiers GeoJSON de façon incrémentale : les entités de "features"
+sont produites une à une à partir d'un tampon de taille bornée, sans jamais construire
+le document complet en mémoire. Le nombre d'entités et l'emprise (bbox) d'une couche se
+calculent en mémoire constante, quelle que soit la taille du fichier ; le comptage passe
+les entités sans les décoder.
+'''
+
+import json
+import re
+
+# Taille (en caractères) des blocs lus dans le fichier
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+# Texte d'un objet sauté jusqu'à la prochaine accolade hors chaîne (chaînes complètes comprises)
+_SKIP_RUN = re.compile(r'[^"{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}]*)*', re.DOTALL)
+
+
+class GeoJSONStreamError(ValueError):
+    '''
+    Erreur levée lorsque le fichier n'est pas une FeatureCollection GeoJSON valide.
+    '''
+
+
+class _StreamBuffer:
+    '''
+    Tampon de lecture : conserve uniquement la portion du fichier pas encore consommée.
+    '''
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        '''
+        Lit un bloc supplémentaire et libère la partie déjà consommée du tampon.
+        Retourne False en fin de fichier.
+        '''
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''
+        Retourne le prochain caractère significatif (espaces ignorés) sans le consommer,
+        ou '' en fin de fichier.
+        '''
+        while True:
+            buf = self.buf
+            pos = self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return ''
+
+    def next_char(self):
+        '''
+        Consomme et retourne le prochain caractère significatif.
+        '''
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def expect(self, expected):
+        '''
+        Consomme le prochain caractère significatif et vérifie qu'il est celui attendu.
+        '''
+        char = self.next_char()
+        if char != expected:
+            raise GeoJSONStreamError(f"'{expected}' attendu, '{char}' trouvé")
+
+    def decode(self):
+        '''
+        Décode la prochaine valeur JSON complète du flux.
+        Le tampon est agrandi (en doublant la lecture) tant que la valeur est incomplète,
+        ce qui garde un coût linéaire même pour une entité plus grande qu'un bloc.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if not self.fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                    raise GeoJSONStreamError(f'JSON invalide : {e}') from e
+                continue
+            # Un nombre en fin de tampon peut être tronqué : on relit avant de conclure
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        '''
+        Passe la prochaine valeur JSON. Un objet est sauté sans construire d'objets Python :
+        une expression régulière franchit d'un coup tout le texte (chaînes, nombres, tableaux)
+        entre deux accolades, seules les accolades sont comptées. La structure n'est vérifiée
+        qu'à l'équilibre des accolades près. Les autres valeurs sont décodées.
+        '''
+        if self.peek() != '{':
+            self.decode()
+            return
+        depth = 0
+        while True:
+            self.pos = _SKIP_RUN.match(self.buf, self.pos).end()
+            # Fin du tampon, ou chaîne coupée par la fin du tampon : on relit depuis ce point
+            if self.pos == len(self.buf) or self.buf[self.pos] == '"':
+                if not self.fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                    raise GeoJSONStreamError('JSON invalide : fin de fichier inattendue')
+                continue
+            char = self.buf[self.pos]
+            self.pos += 1
+            if char == '{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+
+def iter_geojson(path, chunk_size=CHUNK_SIZE, read_feature=_StreamBuffer.decode):
+    '''
+    Parcourt une FeatureCollection et produit des paires (clé, valeur) :
+    ('feature', entité) pour chaque entité, puis (clé, valeur) pour les autres
+    membres de premier niveau (type, name, crs...).
+    read_feature(tampon) lit une entité (par défaut décodée entièrement).
+    '''
+    with open(path, encoding='utf-8-sig') as f:
+        stream = _StreamBuffer(f, chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.decode()
+            if not isinstance(key, str):
+                raise GeoJSONStreamError('Clé de premier niveau invalide')
+            stream.expect(':')
+            if key == 'features':
+                stream.expect('[')
+                if stream.peek() == ']':
+                    stream.next_char()
+                else:
+                    while True:
+                        yield 'feature', read_feature(stream)
+                        char = stream.next_char()
+                        if char == ']':
+                            break
+                        if char != ',':
+                            raise GeoJSONStreamError(f"',' ou ']' attendu, '{char}' trouvé")
+            else:
+                yield key, stream.decode()
+            char = stream.next_char()
+            if char == '}':
+                return
+            if char != ',':
+                raise GeoJSONStreamError(f"',' ou '}}' attendu, '{char}' trouvé")
+
+
+def iter_features(path, chunk_size=CHUNK_SIZE):
+    '''
+    Produit les entités d'un fichier GeoJSON une à une, en mémoire constante.
+    '''
+    for key, value in iter_geojson(path, chunk_size):
+        if key == 'feature':
+            yield value
+
+
+def geometry_bbox(geometry, bbox=None):
+    '''
+    Étend la bbox [minx, miny, maxx, maxy] avec les positions d'une géométrie
+    (GeometryCollection comprise). Retourne None si la géométrie est vide.
+    '''
+    if not geometry:
+        return bbox
+    parts = geometry.get('geometries')
+    if parts is not None:
+        for part in parts:
+            bbox = geometry_bbox(part, bbox)
+        return bbox
+    stack = [geometry.get('coordinates')]
+    while stack:
+        coordinates = stack.pop()
+        if not coordinates:
+            continue
+        if isinstance(coordinates[0], (int, float)):
+            x, y = coordinates[0], coordinates[1]
+            if bbox is None:
+                bbox = [x, y, x, y]
+                continue
+            if x < bbox[0]:
+                bbox[0] = x
+            elif x > bbox[2]:
+                bbox[2] = x
+            if y < bbox[1]:
+                bbox[1] = y
+            elif y > bbox[3]:
+                bbox[3] = y
+        else:
+            stack.extend(coordinates)
+    return bbox
+
+
+def scan(path, chunk_size=CHUNK_SIZE):
+    '''
+    Parcourt le fichier une seule fois et retourne (nombre d'entités, bbox),
+    sans conserver les entités.
+    '''
+    count = 0
+    bbox = None
+    for feature in iter_features(path, chunk_size):
+        count += 1
+        bbox = geometry_bbox(feature.get('geometry'), bbox)
+    return count, bbox
+
+
+def count_features(path, chunk_size=CHUNK_SIZE):
+    '''
+    Chemin rapide : nombre d'entités d'un fichier GeoJSON, en mémoire constante.
+    Les entités sont sautées sans être décodées.
+    '''
+    count = 0
+    for key, _value in iter_geojson(path, chunk_size, _StreamBuffer.skip):
+        if key == 'feature':
+            count += 1
+    return count
+
+
+def compute_bbox(path, chunk_size=CHUNK_SIZE):
+    '''
+    Emprise [minx, miny, maxx, maxy] d'un fichier GeoJSON, en mémoire constante.
+    Les entités sont décodées une à une (la géométrie est nécessaire et les propriétés des
+    couches sont courtes : les sauter coûte plus cher que les décoder).
+    '''
+    bbox = None
+    for feature in iter_features(path, chunk_size):
+        bbox = geometry_bbox(feature.get('geometry'), bbox)
+    return bbox
@@ -0,0 +1,96 @@
+'''
+incident_changes.py
+Ce module tient le journal des modifications de la table incidents pour l'application Canmore
+Incident Management. Des déclencheurs SQLite ajoutent une ligne (numéro croissant, identifiant
+de l'incident, suppression ou non) à chaque ajout, modification ou suppression, quel que soit
+le processus qui écrit. Les caches en mémoire d'un worker (index de la recherche globale,
+jointure du rapport par élément) retiennent le dernier numéro appliqué et relisent seulement
+les modifications suivantes avant de servir : les écritures des autres workers sont vues sans
+file de messages. Le journal ne garde que les CHANGE_LOG_KEEP dernières modifications ; un cache
+plus en retard se reconstruit depuis la table.
+'''
+
+# Nombre de modifications conservées dans le journal
+CHANGE_LOG_KEEP = 10000
+
+# Nombre maximal d'identifiants par requête IN (limite des paramètres SQLite)
+IDS_PER_QUERY = 500
+
+
+def init_change_log(conn):
+    '''
+    Crée le journal et les déclencheurs qui l'alimentent (appelé par init_db).
+    '''
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS incident_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            incident_id INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS incidents_log_insert AFTER INSERT ON incidents BEGIN
+            INSERT INTO incident_changes (incident_id) VALUES (NEW.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS incidents_log_update AFTER UPDATE ON incidents BEGIN
+            INSERT INTO incident_changes (incident_id) VALUES (NEW.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS incidents_log_delete AFTER DELETE ON incidents BEGIN
+            INSERT INTO incident_changes (incident_id, deleted) VALUES (OLD.id, 1);
+        END
+    ''')
+    # Purge au fil de l'eau : chaque modification retire celle qui sort de la fenêtre conservée
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS incident_changes_prune AFTER INSERT ON incident_changes BEGIN
+            DELETE FROM incident_changes WHERE seq <= NEW.seq - {CHANGE_LOG_KEEP};
+        END
+    ''')
+
+
+def read_snapshot(conn, sql, params=()):
+    '''
+    Exécute sql et lit le dernier numéro du journal dans la même transaction de lecture :
+    retourne (numéro, lignes), les lignes reflétant exactement les modifications jusqu'à ce numéro.
+    '''
+    # Une transaction déjà ouverte par l'appelant garantit déjà une lecture cohérente
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute('BEGIN')
+    try:
+        seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM incident_changes').fetchone()[0]
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        if own_transaction:
+            conn.rollback()
+    return seq, rows
+
+
+def read_changes(conn, after):
+    '''
+    Modifications postérieures au numéro after : retourne (dernier numéro, {identifiant: supprimé}),
+    la plus récente modification de chaque incident l'emportant, ou None si le journal ne remonte
+    plus jusqu'à after (le cache doit être reconstruit).
+    '''
+    rows = conn.execute('SELECT seq, incident_id, deleted FROM incident_changes WHERE seq > ? ORDER BY seq',
+                        (after,)).fetchall()
+    if not rows:
+        return after, {}
+    # Les numéros se suivent (AUTOINCREMENT, écritures sérialisées) : un trou signifie une purge
+    if rows[0][0] != after + 1:
+        return None
+    return rows[-1][0], {incident_id: bool(deleted) for _seq, incident_id, deleted in rows}
+
+
+def rows_by_id(conn, sql, ids):
+    '''
+    Lignes de « sql WHERE id IN (...) » pour une liste d'identifiants, par paquets.
+    '''
+    rows = []
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        chunk = ids[start:start + IDS_PER_QUERY]
+        rows.extend(conn.execute(f"{sql} WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+    return rows
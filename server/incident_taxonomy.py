@@ -0,0 +1,206 @@
+'''
+incident_taxonomy.py
+Ce module gère la taxonomie des types d'incidents (sujets et détails de incident_types.csv)
+pour l'application Canmore Incident Management. Le CSV est lu une seule fois via le catalogue
+des données (rechargé si son mtime change) et chaque sujet/détail reçoit un identifiant entier
+stable, conservé dans les tables de correspondance SQLite incident_subjects et incident_details.
+Les incidents stockent ces identifiants compacts au lieu de répéter le texte dans chaque ligne.
+'''
+
+import hashlib
+import json
+from server.dataset_catalog import catalog
+from server.db_pool import native_lock
+
+# Fichier source de la taxonomie dans static/data
+TAXONOMY_FILE = 'incident_types.csv'
+
+
+class TaxonomyError(ValueError):
+    '''
+    Erreur levée lorsque le CSV de la taxonomie n'a pas les colonnes attendues.
+    '''
+
+
+class Taxonomy:
+    '''
+    Instantané de la taxonomie : liste ordonnée pour le frontend, version et tables de correspondance.
+    '''
+
+    def __init__(self, subjects, subject_names, detail_names, source):
+        # Liste [{'id', 'subject', 'details', 'detail_ids'}] dans l'ordre du CSV
+        self.subjects = subjects
+        # Tous les identifiants connus (y compris ceux retirés du CSV) → texte
+        self.subject_names = subject_names
+        self.detail_names = detail_names
+        self.subject_ids = {entry['subject']: entry['id'] for entry in subjects}
+        self.detail_ids = {
+            (entry['id'], detail): detail_id
+            for entry in subjects
+            for detail, detail_id in zip(entry['details'], entry['detail_ids'])
+        }
+        # Instantané du catalogue à partir duquel la taxonomie a été construite
+        self.source = source
+        payload = json.dumps(subjects, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        self.version = hashlib.sha256(payload).hexdigest()[:12]
+
+    def encode(self, subject, detail):
+        '''
+        Retourne (type_id, detail_id) pour un sujet et un détail, None pour une valeur inconnue.
+        '''
+        type_id = self.subject_ids.get(subject)
+        detail_id = self.detail_ids.get((type_id, detail)) if type_id is not None else None
+        return type_id, detail_id
+
+
+_taxonomy = None
+_taxonomy_lock = native_lock()
+
+
+def read_subjects(dataset):
+    '''
+    Regroupe les lignes du CSV en {sujet: [détails]} en conservant l'ordre d'apparition.
+    '''
+    columns = dataset.schema['columns']
+    fieldnames = {name.strip().upper(): name for name in columns}
+    subject_key = fieldnames.get('SUBJECT')
+    detail_key = fieldnames.get('DETAILS')
+    if not subject_key or not detail_key:
+        raise TaxonomyError('Le CSV doit contenir les colonnes SUBJECT et DETAILS')
+    subjects = {}
+    for row in dataset.records:
+        subject = row[subject_key]
+        detail = row[detail_key]
+        # Ignore une éventuelle ligne d'en-tête dans les données
+        if subject.strip().upper() == 'SUBJECT':
+            continue
+        details = subjects.setdefault(subject, [])
+        if detail not in details:
+            details.append(detail)
+    return subjects
+
+
+def assign_ids(conn, subjects):
+    '''
+    Enregistre les sujets et détails dans les tables de correspondance (identifiants jamais réutilisés)
+    et retourne la liste ordonnée avec leurs identifiants.
+    '''
+    conn.executemany('INSERT OR IGNORE INTO incident_subjects (name) VALUES (?)', [(s,) for s in subjects])
+    subject_ids = dict(conn.execute('SELECT name, id FROM incident_subjects').fetchall())
+    conn.executemany(
+        'INSERT OR IGNORE INTO incident_details (subject_id, name) VALUES (?, ?)',
+        [(subject_ids[s], d) for s, details in subjects.items() for d in details]
+    )
+    detail_ids = {
+        (subject_id, name): detail_id
+        for detail_id, subject_id, name in conn.execute('SELECT id, subject_id, name FROM incident_details')
+    }
+    conn.commit()
+    return [
+        {
+            'id': subject_ids[subject],
+            'subject': subject,
+            'details': details,
+            'detail_ids': [detail_ids[(subject_ids[subject], d)] for d in details],
+        }
+        for subject, details in subjects.items()
+    ]
+
+
+def encode_existing_incidents(conn, taxonomy):
+    '''
+    Convertit les incidents encore stockés en texte vers les identifiants de la taxonomie.
+    '''
+    for entry in taxonomy.subjects:
+        for detail, detail_id in zip(entry['details'], entry['detail_ids']):
+            conn.execute(
+                "UPDATE incidents SET type_id = ?, detail_id = ?, type = '', description = NULL "
+                'WHERE type_id IS NULL AND type = ? AND description = ?',
+                (entry['id'], detail_id, entry['subject'], detail)
+            )
+        conn.execute(
+            "UPDATE incidents SET type_id = ?, type = '' WHERE type_id IS NULL AND type = ?",
+            (entry['id'], entry['subject'])
+        )
+    conn.commit()
+
+
+def get_taxonomy():
+    '''
+    Retourne la taxonomie à jour. Elle n'est reconstruite que si le CSV a changé
+    (le catalogue vérifie son mtime). Lève FileNotFoundError ou TaxonomyError.
+    '''
+    global _taxonomy
+    dataset = catalog.get(TAXONOMY_FILE)
+    taxonomy = _taxonomy
+    if taxonomy is not None and taxonomy.source is dataset:
+        return taxonomy
+    with _taxonomy_lock:
+        if _taxonomy is not None and _taxonomy.source is dataset:
+            return _taxonomy
+        # Import local : incidents_api importe ce module
+        from server.routes.incidents_api import get_db_connection
+        subjects = read_subjects(dataset)
+        conn = get_db_connection()
+        try:
+            entries = assign_ids(conn, subjects)
+            subject_names = {i: n for i, n in conn.execute('SELECT id, name FROM incident_subjects')}
+            detail_names = {i: n for i, n in conn.execute('SELECT id, name FROM incident_details')}
+            taxonomy = Taxonomy(entries, subject_names, detail_names, dataset)
+            encode_existing_incidents(conn, taxonomy)
+        finally:
+            conn.close()
+        _taxonomy = taxonomy
+    return taxonomy
+
+
+def reset_taxonomy():
+    '''
+    Oublie la taxonomie en mémoire (appelé quand la base change) : ses identifiants viennent des
+    tables de correspondance de l'ancienne base et seront réattribués dans la nouvelle.
+    '''
+    global _taxonomy
+    with _taxonomy_lock:
+        _taxonomy = None
+
+
+def load_names():
+    '''
+    Retourne (sujets, détails) {id: texte} directement depuis les tables de correspondance,
+    utilisé lorsque le CSV de la taxonomie est indisponible.
+    '''
+    from server.routes.incidents_api import get_db_connection
+    conn = get_db_connection()
+    try:
+        subjects = {i: n for i, n in conn.execute('SELECT id, name FROM incident_subjects')}
+        details = {i: n for i, n in conn.execute('SELECT id, name FROM incident_details')}
+    except Exception:
+        subjects, details = {}, {}
+    finally:
+        conn.close()
+    return subjects, details
+
+
+def decode_incidents(rows, taxonomy=None):
+    '''
+    Convertit des lignes de la table incidents en dictionnaires, en remplaçant les identifiants
+    compacts (type_id, detail_id) par le texte du sujet et du détail.
+    taxonomy : taxonomie déjà obtenue (ex. celle qui a encodé les lignes) ; sans elle, get_taxonomy()
+    est appelée et peut reconstruire la taxonomie, ce qui écrit dans la base.
+    '''
+    incidents = [dict(row) for row in rows]
+    if not any(inc.get('type_id') is not None or inc.get('detail_id') is not None for inc in incidents):
+        return incidents
+    try:
+        taxonomy = taxonomy or get_taxonomy()
+        subject_names, detail_names = taxonomy.subject_names, taxonomy.detail_names
+    except (FileNotFoundError, TaxonomyError):
+        subject_names, detail_names = load_names()
+    for incident in incidents:
+        type_id = incident.get('type_id')
+        detail_id = incident.get('detail_id')
+        if type_id is not None:
+            incident['type'] = subject_names.get(type_id, incident.get('type'))
+        if detail_id is not None:
+            incident['description'] = detail_names.get(detail_id, incident.get('description'))
+    return incidents
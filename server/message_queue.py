@@ -0,0 +1,75 @@
+'''
+message_queue.py
+Ce module configure la file de messages de Flask-SocketIO pour l'application Canmore Incident
+Management. Avec plusieurs workers (ou plusieurs serveurs), un événement émis par un worker doit
+atteindre les clients connectés aux autres : les émissions passent alors par une file partagée
+(Redis, RabbitMQ/Kombu, Kafka, ZeroMQ) indiquée par la variable d'environnement
+SOCKETIO_MESSAGE_QUEUE. Le schéma « local:// » fournit une file en mémoire partagée par les
+serveurs Socket.IO d'un même processus (tests, développement sans Redis).
+'''
+
+import os
+import queue
+import threading
+import socketio
+
+# URL de la file de messages (ex. redis://localhost:6379/0) ; absente : un seul worker
+MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+# Canal partagé par les workers d'un même déploiement (un canal distinct par déploiement)
+CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'canmore-incidents')
+
+# Schéma de la file en mémoire
+LOCAL_SCHEME = 'local://'
+
+
+class LocalQueueManager(socketio.PubSubManager):
+    '''
+    Gestionnaire Socket.IO dont la file est en mémoire : chaque instance abonnée à un canal
+    reçoit les messages publiés par les autres instances du même processus.
+    '''
+    name = 'local'
+
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, url=LOCAL_SCHEME, channel=CHANNEL, write_only=False, logger=None):
+        # local://<canal> remplace le canal par défaut
+        channel = url[len(LOCAL_SCHEME):] or channel
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.inbox = queue.Queue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(self.channel, []).append(self.inbox)
+
+    def _publish(self, data):
+        with self._channels_lock:
+            inboxes = list(self._channels.get(self.channel, ()))
+        for inbox in inboxes:
+            if inbox is not self.inbox:
+                inbox.put(data)
+
+    def _listen(self):
+        while True:
+            yield self.inbox.get()
+
+    def close(self):
+        '''
+        Retire l'instance de son canal (fin d'un test ou d'un worker).
+        '''
+        with self._channels_lock:
+            inboxes = self._channels.get(self.channel, [])
+            if self.inbox in inboxes:
+                inboxes.remove(self.inbox)
+
+
+def socketio_options(url=MESSAGE_QUEUE, channel=CHANNEL):
+    '''
+    Options à passer à SocketIO(app, ...) : file locale, file externe (message_queue + channel)
+    ou aucune option (un seul worker).
+    '''
+    if not url:
+        return {}
+    if url.startswith(LOCAL_SCHEME):
+        return {'client_manager': LocalQueueManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,305 @@
+'''
+metrics.py
+Ce module instrumente l'application Canmore Incident Management et expose ses mesures au format
+texte de Prometheus (route /metrics) : requêtes HTTP par route (nombre, codes de statut,
+histogramme de latence), requêtes SQLite (durée et lignes retournées par type d'instruction et
+table), émissions Socket.IO (trames, taille de diffusion), caches (catalogue, préférences) et
+contrôle d'admission. Les compteurs sont de simples additions en mémoire ; les mesures tenues
+par d'autres modules (statistiques) ne sont lues qu'au moment du scrape.
+Avec CANMORE_METRICS=0, rien n'est installé : ni crochets de requête, ni connexions chronométrées.
+'''
+
+import os
+import re
+import sqlite3
+import time
+from flask import request, g
+from server.dataset_catalog import catalog
+from server.db_pool import native_lock
+
+# Instrumentation activée (CANMORE_METRICS=0 la désactive complètement)
+METRICS_ENABLED = os.environ.get('CANMORE_METRICS', '1') != '0'
+
+# Bornes (secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bornes du nombre de destinataires d'un événement Socket.IO
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+# Type d'instruction et table d'une requête SQL (étiquettes de cardinalité bornée)
+SQL_OPERATION = re.compile(r'^\s*(\w+)')
+SQL_TABLE = re.compile(r'\b(?:table_info|FROM|INTO|UPDATE|TABLE)\s*\(?\s*(\w+)', re.IGNORECASE)
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    '''
+    Compteur par combinaison d'étiquettes : inc(('GET', '/api/incidents', '200')).
+    '''
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = native_lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+
+
+class Histogram:
+    '''
+    Histogramme cumulatif par combinaison d'étiquettes (séries _bucket, _sum et _count).
+    '''
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = native_lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                # Un compteur par borne (+Inf compris), puis la somme
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def lines(self):
+        with self._lock:
+            values = sorted((labels, list(series)) for labels, series in self.values.items())
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                yield f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(series[-1])}'
+            yield f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Registry:
+    '''
+    Ensemble des mesures d'une application. Les collecteurs sont des fonctions appelées au
+    scrape, qui retournent [(nom, type, aide, [(étiquettes, valeur)])] pour les mesures tenues
+    ailleurs (statistiques des caches, du regroupement des événements...).
+    '''
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        '''
+        Toutes les mesures au format texte de Prometheus (version 0.0.4).
+        '''
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.lines())
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f'{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Mesures SQLite : la base est propre au processus (incidents_api.DB_PATH), ces mesures aussi
+SQLITE_QUERY_SECONDS = Histogram('canmore_sqlite_query_duration_seconds',
+                                 "Durée d'exécution des requêtes SQLite", ('operation', 'table'))
+SQLITE_ROWS = Counter('canmore_sqlite_rows_returned_total', 'Lignes lues par les requêtes SQLite',
+                      ('operation', 'table'))
+
+
+def statement_labels(sql):
+    '''
+    ('SELECT', 'incidents') pour "SELECT ... FROM incidents ..." ; les valeurs ne deviennent
+    jamais des étiquettes.
+    '''
+    operation = SQL_OPERATION.match(sql)
+    table = SQL_TABLE.search(sql)
+    return (operation.group(1).upper() if operation else 'AUTRE', table.group(1) if table else '')
+
+
+class TimedCursor(sqlite3.Cursor):
+    '''
+    Curseur qui mesure la durée de chaque requête et compte les lignes lues.
+    '''
+
+    labels = ('AUTRE', '')
+
+    def execute(self, sql, parameters=()):
+        self.labels = statement_labels(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, self.labels)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.labels = statement_labels(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, self.labels)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            SQLITE_ROWS.inc(self.labels)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        SQLITE_ROWS.inc(self.labels, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        SQLITE_ROWS.inc(self.labels, len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        SQLITE_ROWS.inc(self.labels)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    '''
+    Connexion SQLite dont les curseurs (y compris ceux de conn.execute) sont chronométrés.
+    '''
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def route_label():
+    '''
+    Route Flask de la requête (modèle, ex. /api/incidents/<int:incident_id>) ; les URL inconnues
+    sont regroupées pour que leur nombre n'augmente pas celui des séries.
+    '''
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'inconnue'
+
+
+def register_metrics(app):
+    '''
+    Installe les mesures de l'application (app.metrics) : crochets des requêtes HTTP,
+    histogramme de diffusion des événements, et collecteurs lus au scrape.
+    '''
+    registry = app.metrics = Registry()
+    requests_total = registry.counter('canmore_http_requests_total', 'Requêtes HTTP traitées',
+                                      ('method', 'route', 'status'))
+    latency = registry.histogram('canmore_http_request_duration_seconds', 'Durée des requêtes HTTP',
+                                 ('method', 'route'))
+    registry.register(SQLITE_QUERY_SECONDS)
+    registry.register(SQLITE_ROWS)
+    app.event_coalescer.fanout = registry.histogram(
+        'canmore_socketio_event_fanout', "Destinataires (salons ou clients) d'un événement d'incident",
+        buckets=FANOUT_BUCKETS)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started_at = g.pop('metrics_started_at', None)
+        if started_at is not None:
+            route = route_label()
+            latency.observe(time.perf_counter() - started_at, (request.method, route))
+            requests_total.inc((request.method, route, str(response.status_code)))
+        return response
+
+    registry.add_collector(lambda: collect_app(app))
+    return registry
+
+
+def collect_app(app):
+    '''
+    Mesures tenues par les autres modules : regroupement des événements, préférences,
+    contrôle d'admission, catalogue des jeux de données.
+    '''
+    events = app.event_coalescer.stats()
+    settings = app.user_settings.stats()
+    admission = app.load_shedder.stats()
+    datasets = catalog.stats()
+    return [
+        ('canmore_socketio_frames_total', 'counter', 'Trames incidents_batch émises',
+         [({}, events['frames'])]),
+        ('canmore_incident_events_total', 'counter', "Événements d'incidents reçus, envoyés, fusionnés",
+         [({'stage': 'received'}, events['events']), ({'stage': 'sent'}, events['sent']),
+          ({'stage': 'coalesced'}, events['coalesced'])]),
+        ('canmore_socketio_subscribers', 'gauge', 'Clients Socket.IO abonnés',
+         [({}, len(app.subscriptions.subscriptions))]),
+        ('canmore_user_settings_cache_total', 'counter', 'Lectures des préférences (cache)',
+         [({'result': 'hit'}, settings['hits']), ({'result': 'miss'}, settings['misses'])]),
+        ('canmore_user_settings_writes_total', 'counter', 'Préférences écrites en base',
+         [({}, settings['writes'])]),
+        ('canmore_dataset_cache_total', 'counter', 'Lectures du catalogue des jeux de données',
+         [({'result': 'hit'}, datasets['hits']), ({'result': 'load'}, datasets['loads'])]),
+        ('canmore_write_admission_total', 'counter', "Écritures admises, limitées (429), délestées (503)",
+         [({'outcome': outcome}, admission[outcome]) for outcome in ('admitted', 'limited', 'shed')]),
+        ('canmore_writes_in_flight', 'gauge', 'Écritures en cours', [({}, admission['in_flight'])]),
+    ]
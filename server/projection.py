@@ -0,0 +1,103 @@
+'''
+projection.py
+Ce module regroupe les conversions de coordonnées de l'application Canmore Incident Management :
+Web Mercator (EPSG:3857, X/Y de Addresses.csv) ↔ WGS84 (EPSG:4326, longitude/latitude des
+incidents et des couches GeoJSON), et projection locale en mètres utilisée par les index
+spatiaux (géocodeur, éléments de référence). Toutes les fonctions convertissent des colonnes
+NumPy entières en une seule passe.
+'''
+
+import math
+import numpy as np
+
+# Systèmes de coordonnées pris en charge
+WEB_MERCATOR = 'EPSG:3857'
+WGS84 = 'EPSG:4326'
+
+# Rayon de la sphère Web Mercator (EPSG:3857), en mètres
+EARTH_RADIUS = 6378137.0
+
+# Latitude maximale représentable en Web Mercator
+MAX_LATITUDE = 85.0511287798066
+
+# Mètres par degré de latitude (approximation locale suffisante à l'échelle de Canmore)
+METERS_PER_DEGREE = 111320.0
+
+
+def mercator_to_wgs84(xs, ys):
+    '''
+    Convertit des tableaux de coordonnées Web Mercator (mètres) en (longitudes, latitudes) en degrés.
+    '''
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    lons = np.degrees(xs / EARTH_RADIUS)
+    lats = np.degrees(2.0 * np.arctan(np.exp(ys / EARTH_RADIUS)) - math.pi / 2.0)
+    return lons, lats
+
+
+def wgs84_to_mercator(lons, lats):
+    '''
+    Convertit des tableaux (longitudes, latitudes) en degrés en coordonnées Web Mercator (mètres).
+    Les latitudes sont bornées à ±MAX_LATITUDE.
+    '''
+    lons = np.asarray(lons, dtype=float)
+    lats = np.clip(np.asarray(lats, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    xs = EARTH_RADIUS * np.radians(lons)
+    ys = EARTH_RADIUS * np.log(np.tan(math.pi / 4.0 + np.radians(lats) / 2.0))
+    return xs, ys
+
+
+# Conversions disponibles : (source, cible) → fonction
+TRANSFORMS = {
+    (WEB_MERCATOR, WGS84): mercator_to_wgs84,
+    (WGS84, WEB_MERCATOR): wgs84_to_mercator,
+}
+
+
+def transform(xs, ys, source, target):
+    '''
+    Convertit des colonnes de coordonnées d'un système à un autre (première composante : X ou longitude).
+    Lève ValueError pour une conversion non prise en charge.
+    '''
+    if source == target:
+        return np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+    try:
+        return TRANSFORMS[(source, target)](xs, ys)
+    except KeyError:
+        raise ValueError(f'Conversion non prise en charge : {source} → {target}')
+
+
+class LocalProjection:
+    '''
+    Projection équirectangulaire locale en mètres centrée sur (lon0, lat0) :
+    exacte à quelques millimètres près à l'échelle de la ville.
+    '''
+
+    def __init__(self, lon0, lat0):
+        self.lon0 = float(lon0)
+        self.lat0 = float(lat0)
+        self.kx = METERS_PER_DEGREE * math.cos(math.radians(self.lat0))
+        self.ky = METERS_PER_DEGREE
+
+    @classmethod
+    def centered_on(cls, lons, lats):
+        '''
+        Projection centrée sur la moyenne des positions (origine 0, 0 si aucune position).
+        '''
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        if not lons.size:
+            return cls(0.0, 0.0)
+        return cls(lons.mean(), lats.mean())
+
+    def forward(self, lons, lats):
+        '''
+        (longitudes, latitudes) → (x, y) en mètres ; accepte des scalaires ou des tableaux.
+        '''
+        return (np.subtract(lons, self.lon0) * self.kx, np.subtract(lats, self.lat0) * self.ky)
+
+    def inverse(self, xs, ys):
+        '''
+        (x, y) en mètres → (longitudes, latitudes).
+        '''
+        return (np.divide(xs, self.kx) + self.lon0, np.divide(ys, self.ky) + self.lat0)
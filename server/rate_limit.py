@@ -0,0 +1,276 @@
+'''
+rate_limit.py
+Ce module protège les routes d'écriture de l'application Canmore Incident Management
+(POST, PATCH, DELETE sur /api/incidents) : contrôle d'admission par seaux de jetons (un par
+client et un global) et délestage quand l'écriture SQLite sature (trop de requêtes en cours ou
+p99 de latence trop élevé). Les requêtes refusées reçoivent 429 (limite dépassée) ou 503
+(délestage), avec un en-tête Retry-After, au lieu d'attendre jusqu'à l'expiration.
+Les seaux sont gardés en mémoire du processus ; avec plusieurs workers, CANMORE_RATE_LIMIT_STORE
+(ex. redis://localhost:6379/1) les partage entre workers.
+'''
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import request, jsonify, g
+
+# Débit soutenu (requêtes/s) et rafale maximale par client ; un débit de 0 désactive le seau
+CLIENT_RATE = float(os.environ.get('CANMORE_CLIENT_RATE', '10'))
+CLIENT_BURST = float(os.environ.get('CANMORE_CLIENT_BURST', '60'))
+# Débit soutenu et rafale maximale pour l'ensemble des clients
+GLOBAL_RATE = float(os.environ.get('CANMORE_GLOBAL_RATE', '200'))
+GLOBAL_BURST = float(os.environ.get('CANMORE_GLOBAL_BURST', '400'))
+# Délestage : nombre maximal d'écritures en cours, et p99 de latence (ms) au-delà duquel on refuse
+SHED_MAX_IN_FLIGHT = int(os.environ.get('CANMORE_SHED_MAX_IN_FLIGHT', '64'))
+SHED_P99_MS = float(os.environ.get('CANMORE_SHED_P99_MS', '2000'))
+# Magasin des seaux : 'memory' (par processus) ou URL redis:// (partagé entre workers)
+RATE_LIMIT_STORE = os.environ.get('CANMORE_RATE_LIMIT_STORE', 'memory')
+# Derrière un proxy (nginx), le client est la première adresse de X-Forwarded-For
+TRUST_PROXY = os.environ.get('CANMORE_TRUST_PROXY') == '1'
+
+# Méthodes HTTP soumises au contrôle d'admission
+WRITE_METHODS = frozenset({'POST', 'PATCH', 'PUT', 'DELETE'})
+# Blueprints dont les écritures sont contrôlées
+LIMITED_BLUEPRINTS = frozenset({'incidents_api'})
+
+
+class MemoryBucketStore:
+    '''
+    Seaux de jetons en mémoire du processus : {clé: (jetons, instant de la dernière mise à jour)},
+    du moins au plus récemment utilisé. Au-delà de max_keys seaux, le moins récemment utilisé est
+    oublié (il repartira plein) : des adresses toujours nouvelles ne font pas grossir la mémoire.
+    '''
+
+    def __init__(self, clock=time.monotonic, max_keys=100000):
+        self.clock = clock
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        '''
+        Prend un jeton du seau key ; retourne 0 si la requête est admise, sinon le délai
+        (secondes) avant qu'un jeton soit disponible.
+        '''
+        return self.take_all([(key, rate, burst)])
+
+    def take_all(self, buckets):
+        '''
+        Prend un jeton de chacun des seaux [(clé, débit, rafale)], seulement si tous en ont un :
+        retourne 0 si la requête est admise, sinon le plus long délai avant qu'ils en aient tous un.
+        Un seau qui refuse ne fait rien dépenser aux autres.
+        '''
+        with self._lock:
+            now = self.clock()
+            levels = []
+            for key, rate, burst in buckets:
+                tokens, updated_at = self.buckets.get(key, (burst, now))
+                levels.append(min(burst, tokens + (now - updated_at) * rate))
+            waits = [(1 - tokens) / rate for tokens, (_key, rate, _burst) in zip(levels, buckets) if tokens < 1]
+            wait = max(waits, default=0)
+            spent = 0 if wait else 1
+            for (key, _rate, _burst), tokens in zip(buckets, levels):
+                self.buckets[key] = (tokens - spent, now)
+                self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+# Script Lua : même calcul que MemoryBucketStore.take_all, atomique dans Redis
+# (ARGV : instant, puis débit et rafale de chaque seau de KEYS)
+REDIS_TAKE = '''
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+  local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+  local tokens = tonumber(bucket[1]) or burst
+  local updated_at = tonumber(bucket[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+  if tokens < 1 then wait = math.max(wait, (1 - tokens) / rate) end
+  levels[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+  local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+  local tokens = levels[i]
+  if wait == 0 then tokens = tokens - 1 end
+  redis.call('HSET', key, 'tokens', tokens, 'updated_at', now)
+  redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return tostring(wait)
+'''
+
+
+class RedisBucketStore:
+    '''
+    Seaux de jetons partagés entre workers dans Redis (nécessite pip install redis).
+    '''
+
+    def __init__(self, url, prefix='canmore-rate:'):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.redis.register_script(REDIS_TAKE)
+
+    def take(self, key, rate, burst):
+        return self.take_all([(key, rate, burst)])
+
+    def take_all(self, buckets):
+        args = [time.time()]
+        for _key, rate, burst in buckets:
+            args += [rate, burst]
+        return float(self._take(keys=[self.prefix + key for key, _rate, _burst in buckets], args=args))
+
+
+def bucket_store(url=RATE_LIMIT_STORE):
+    '''
+    Magasin de seaux selon la configuration : 'memory' ou une URL redis://.
+    '''
+    if not url or url == 'memory':
+        return MemoryBucketStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBucketStore(url)
+    raise ValueError(f'Magasin de limitation inconnu : {url!r}')
+
+
+class RateLimiter:
+    '''
+    Seau par client et seau global. check(client) retourne 0 si la requête est admise,
+    sinon le délai conseillé (secondes) avant de réessayer. Les deux seaux sont vérifiés ensemble :
+    une requête refusée par la limite globale ne coûte rien au client.
+    '''
+
+    def __init__(self, store, client_rate=CLIENT_RATE, client_burst=CLIENT_BURST,
+                 global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST):
+        self.store = store
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+
+    def check(self, client):
+        buckets = []
+        if self.client_rate > 0:
+            buckets.append(('client:' + client, self.client_rate, self.client_burst))
+        if self.global_rate > 0:
+            buckets.append(('global', self.global_rate, self.global_burst))
+        return self.store.take_all(buckets) if buckets else 0
+
+
+class LoadShedder:
+    '''
+    Suit les écritures en cours et la latence des écritures récentes (fenêtre glissante).
+    shed() est vrai quand max_in_flight écritures sont déjà en cours, ou quand le p99 de latence
+    de la fenêtre dépasse p99_limit : mieux vaut refuser tout de suite que laisser expirer.
+    Les mesures expirent avec la fenêtre, si bien que le délestage cesse de lui-même.
+    '''
+
+    def __init__(self, max_in_flight=SHED_MAX_IN_FLIGHT, p99_limit=SHED_P99_MS / 1000,
+                 window=10.0, min_samples=20, max_samples=1000, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.p99_limit = p99_limit
+        self.window = window
+        self.min_samples = min_samples
+        self.clock = clock
+        self.in_flight = 0
+        self.samples = deque(maxlen=max_samples)
+        self.counters = {'admitted': 0, 'limited': 0, 'shed': 0}
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def p99(self):
+        '''
+        99e centile de la latence des écritures de la fenêtre (None si trop peu de mesures).
+        '''
+        with self._lock:
+            self._expire(self.clock())
+            durations = sorted(duration for _, duration in self.samples)
+        if len(durations) < self.min_samples:
+            return None
+        return durations[min(len(durations) - 1, math.ceil(0.99 * len(durations)) - 1)]
+
+    def shed(self):
+        with self._lock:
+            if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                return True
+        p99 = self.p99() if self.p99_limit > 0 else None
+        return p99 is not None and p99 > self.p99_limit
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+            self.counters['admitted'] += 1
+
+    def finish(self, duration):
+        with self._lock:
+            self.in_flight -= 1
+            now = self.clock()
+            self.samples.append((now, duration))
+            self._expire(now)
+
+    def count(self, outcome):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self):
+        p99 = self.p99()
+        with self._lock:
+            return dict(self.counters, in_flight=self.in_flight, max_in_flight=self.max_in_flight,
+                        p99_ms=None if p99 is None else round(p99 * 1000, 1),
+                        p99_limit_ms=self.p99_limit * 1000)
+
+
+def client_id(trust_proxy=TRUST_PROXY):
+    '''
+    Identifiant du client : adresse IP (première adresse de X-Forwarded-For derrière un proxy).
+    '''
+    if trust_proxy:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'inconnu'
+
+
+def refused(message, status, wait):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def register_admission_control(app, limiter, shedder, trust_proxy=TRUST_PROXY):
+    '''
+    Contrôle d'admission des écritures des blueprints limités : délestage (503), puis seaux
+    de jetons (429). Le limiteur et le délesteur sont attachés à l'application
+    (app.rate_limiter, app.load_shedder).
+    '''
+    app.rate_limiter = limiter
+    app.load_shedder = shedder
+
+    @app.before_request
+    def admit_write():
+        if request.method not in WRITE_METHODS or request.blueprint not in LIMITED_BLUEPRINTS:
+            return None
+        if shedder.shed():
+            shedder.count('shed')
+            return refused('Service surchargé, réessayez plus tard', 503, 1)
+        wait = limiter.check(client_id(trust_proxy))
+        if wait:
+            shedder.count('limited')
+            return refused("Trop de requêtes d'écriture, réessayez plus tard", 429, wait)
+        shedder.start()
+        g.admitted_at = time.perf_counter()
+        return None
+
+    @app.teardown_request
+    def finish_write(exc=None):
+        admitted_at = g.pop('admitted_at', None)
+        if admitted_at is not None:
+            shedder.finish(time.perf_counter() - admitted_at)
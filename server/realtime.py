@@ -0,0 +1,399 @@
+'''
+realtime.py
+Ce module achemine les notifications temps réel (Socket.IO) des incidents pour l'application
+Canmore Incident Management. Chaque client peut enregistrer un abonnement (emprise de la carte,
+statuts, types) ; il rejoint alors les salons des cellules d'une grille spatiale qui couvrent
+son emprise. Un événement n'est envoyé qu'au salon de la cellule de l'incident (et au salon
+« all » des clients sans emprise), puis filtré par statut et type : le coût d'envoi dépend
+du nombre de clients intéressés et non du nombre de clients connectés.
+Avec une file de messages entre workers, les abonnés des autres workers ne sont pas connus de
+l'émetteur : chaque client rejoint alors des salons de groupe « salon|statut|type » et l'événement
+ne vise que les groupes qui l'acceptent, le filtre est donc appliqué par le worker du client.
+Les événements sont regroupés sur une courte fenêtre (EventCoalescer) : les mises à jour
+successives d'un même incident sont fusionnées et envoyées dans une seule trame « incidents_batch ».
+'''
+
+import math
+import os
+import time
+import threading
+from flask import current_app, request
+
+# Taille d'une cellule de la grille (degrés) : ~1,1 km en latitude, ~0,7 km en longitude à Canmore
+CELL_SIZE = 0.01
+
+# Au-delà de ce nombre de cellules, l'abonnement rejoint le salon « all » et l'emprise est filtrée à l'envoi
+MAX_CELLS = 256
+
+# Salon des clients sans emprise (ou à l'emprise trop grande)
+ALL_ROOM = 'all'
+
+# Valeur d'un filtre absent (tous les statuts ou tous les types) dans un salon de groupe
+ANY = '*'
+
+# Nombre maximal de statuts ou de types d'un abonnement (borne le nombre de salons de groupe)
+MAX_FILTER_VALUES = 16
+
+# Espace de noms Socket.IO utilisé par l'application
+NAMESPACE = '/'
+
+# Fenêtre de regroupement des événements (attente après le dernier événement) et délai maximal
+# depuis le premier événement en attente, en secondes ; une fenêtre de 0 envoie immédiatement
+EVENT_WINDOW = float(os.environ.get('CANMORE_EVENT_WINDOW_MS', '200')) / 1000.0
+EVENT_MAX_DELAY = float(os.environ.get('CANMORE_EVENT_MAX_DELAY_MS', '1000')) / 1000.0
+
+# Nom de la trame qui transporte les événements regroupés
+BATCH_EVENT = 'incidents_batch'
+
+
+class SubscriptionError(ValueError):
+    '''
+    Abonnement invalide (emprise, statuts ou types mal formés).
+    '''
+
+
+def cell_of(latitude, longitude):
+    '''
+    Indices (colonne, ligne) de la cellule contenant un point.
+    '''
+    return math.floor(longitude / CELL_SIZE), math.floor(latitude / CELL_SIZE)
+
+
+def cell_room(cell):
+    return f'cell:{cell[0]}:{cell[1]}'
+
+
+def group_room(room, status=ANY, incident_type=ANY):
+    '''
+    Salon de groupe (mode partagé) : clients d'un salon qui acceptent ce statut et ce type.
+    '''
+    return f'{room}|{status}|{incident_type}'
+
+
+def parse_filter(values, name):
+    if values is None:
+        return None
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise SubscriptionError(f'{name} doit être une liste de textes')
+    if len(values) > MAX_FILTER_VALUES:
+        raise SubscriptionError(f'{name} contient plus de {MAX_FILTER_VALUES} valeurs')
+    return frozenset(values)
+
+
+class Subscription:
+    '''
+    Abonnement d'un client : emprise [min_lon, min_lat, max_lon, max_lat], statuts et types (None = tous).
+    shared : rejoint les salons de groupe (statut, type) au lieu des salons de cellule.
+    '''
+
+    def __init__(self, sid, bbox=None, statuses=None, types=None, shared=False):
+        self.sid = sid
+        self.bbox = bbox
+        self.statuses = statuses
+        self.types = types
+        self.rooms = self._group_rooms() if shared else self._rooms()
+
+    @classmethod
+    def from_message(cls, sid, data, shared=False):
+        '''
+        Construit un abonnement à partir du message du client ; lève SubscriptionError.
+        '''
+        data = data or {}
+        if not isinstance(data, dict):
+            raise SubscriptionError("L'abonnement doit être un objet")
+        bbox = data.get('bbox')
+        if bbox is not None:
+            try:
+                bbox = [float(value) for value in bbox]
+            except (TypeError, ValueError):
+                raise SubscriptionError('bbox doit contenir quatre nombres')
+            if len(bbox) != 4 or not all(math.isfinite(value) for value in bbox) \
+                    or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise SubscriptionError('bbox doit être [min_lon, min_lat, max_lon, max_lat]')
+        return cls(sid, bbox, parse_filter(data.get('statuses'), 'statuses'), parse_filter(data.get('types'), 'types'),
+                   shared)
+
+    def _rooms(self):
+        if self.bbox is None:
+            return {ALL_ROOM}
+        min_x, min_y = cell_of(self.bbox[1], self.bbox[0])
+        max_x, max_y = cell_of(self.bbox[3], self.bbox[2])
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > MAX_CELLS:
+            return {ALL_ROOM}
+        return {cell_room((x, y)) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)}
+
+    def _group_rooms(self):
+        groups = [(status, incident_type)
+                  for status in (sorted(self.statuses) if self.statuses is not None else [ANY])
+                  for incident_type in (sorted(self.types) if self.types is not None else [ANY])]
+        rooms = self._rooms()
+        if len(rooms) * len(groups) > MAX_CELLS:
+            rooms = {ALL_ROOM}
+        return {group_room(room, status, incident_type) for room in rooms for status, incident_type in groups}
+
+    def matches(self, latitude, longitude, statuses, incident_type):
+        '''
+        True si un incident (position, statuts concernés, type) intéresse ce client.
+        '''
+        if self.bbox is not None and latitude is not None and longitude is not None:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            if not (min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat):
+                return False
+        if self.statuses is not None and not self.statuses.intersection(statuses):
+            return False
+        if self.types is not None and incident_type not in self.types:
+            return False
+        return True
+
+
+class SubscriptionRegistry:
+    '''
+    Abonnements des clients connectés et membres de chaque salon (miroir des salons Socket.IO).
+    '''
+
+    def __init__(self, shared=False):
+        self.subscriptions = {}
+        self.members = {}
+        # File de messages entre workers : les abonnés des autres workers ne sont pas connus ici
+        self.shared = shared
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscription):
+        '''
+        Enregistre (ou remplace) l'abonnement d'un client ; retourne (salons à rejoindre, salons à quitter).
+        '''
+        with self._lock:
+            previous = self.subscriptions.get(subscription.sid)
+            old_rooms = previous.rooms if previous else set()
+            self.subscriptions[subscription.sid] = subscription
+            for room in old_rooms - subscription.rooms:
+                self._leave(subscription.sid, room)
+            for room in subscription.rooms - old_rooms:
+                self.members.setdefault(room, set()).add(subscription.sid)
+            return subscription.rooms - old_rooms, old_rooms - subscription.rooms
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            subscription = self.subscriptions.pop(sid, None)
+            for room in (subscription.rooms if subscription else ()):
+                self._leave(sid, room)
+
+    def _leave(self, sid, room):
+        members = self.members.get(room)
+        if members is not None:
+            members.discard(sid)
+            if not members:
+                del self.members[room]
+
+    def route(self, latitude, longitude, statuses, incident_type):
+        '''
+        Destinataires d'un événement : un salon entier si tous ses membres sont intéressés,
+        sinon les identifiants des clients intéressés un par un. En mode partagé, les membres
+        peuvent être connectés à un autre worker : l'unique destinataire est la liste des salons
+        de groupe qui acceptent le statut et le type (le filtre d'emprise reste à la cellule près).
+        '''
+        rooms = [ALL_ROOM]
+        if latitude is not None and longitude is not None:
+            rooms.append(cell_room(cell_of(latitude, longitude)))
+        if self.shared:
+            status_keys = [ANY] + sorted(status for status in statuses if status is not None)
+            type_keys = [ANY] + ([incident_type] if incident_type is not None else [])
+            # Une seule émission vers tous les groupes : un client membre de plusieurs groupes la reçoit une fois
+            return [tuple(group_room(room, status, key) for room in rooms for status in status_keys
+                          for key in type_keys)]
+        targets = []
+        with self._lock:
+            for room in rooms:
+                members = self.members.get(room)
+                if not members:
+                    continue
+                interested = [sid for sid in members
+                              if self.subscriptions[sid].matches(latitude, longitude, statuses, incident_type)]
+                if len(interested) == len(members):
+                    targets.append(room)
+                else:
+                    targets.extend(interested)
+        return targets
+
+
+
+def incident_position(incident):
+    latitude, longitude = incident.get('latitude'), incident.get('longitude')
+    if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        return None, None
+    return latitude, longitude
+
+
+class EventCoalescer:
+    '''
+    Regroupe les événements d'incidents avant envoi. Les événements reçus pendant la fenêtre sont
+    fusionnés par identifiant (ajout puis mise à jour → ajout ; ajout puis suppression → rien ;
+    mises à jour successives → la dernière), puis chaque destinataire reçoit une seule trame
+    {'count', 'events': [{'type', 'incident'}]}. La trame part au plus tard max_delay secondes
+    après le premier événement en attente, même si les événements continuent d'arriver.
+    send(destinataire, trame) effectue l'envoi ; start_task et sleep viennent du serveur Socket.IO.
+    '''
+
+    def __init__(self, send, registry, window=EVENT_WINDOW, max_delay=EVENT_MAX_DELAY,
+                 start_task=None, sleep=time.sleep, clock=time.monotonic):
+        self.send = send
+        self.registry = registry
+        self.window = window
+        self.max_delay = max(max_delay, window)
+        self.start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self.sleep = sleep
+        self.clock = clock
+        self.pending = {}
+        self.first_at = None
+        self.last_at = None
+        self.scheduled = False
+        self.counters = {'events': 0, 'sent': 0, 'frames': 0, 'flushes': 0}
+        self.max_latency = 0.0
+        # Histogramme du nombre de destinataires par événement (installé par server/metrics.py)
+        self.fanout = None
+        self._lock = threading.Lock()
+
+    def add(self, event, incident, statuses=None):
+        self.add_many([(event, incident, statuses)])
+
+    def add_many(self, events):
+        '''
+        Met en attente une liste de (événement, incident, statuts concernés).
+        '''
+        with self._lock:
+            now = self.clock()
+            for event, incident, statuses in events:
+                self.counters['events'] += 1
+                self._merge(event, incident, set(statuses or (incident.get('status'),)))
+            if self.first_at is None:
+                self.first_at = now
+            self.last_at = now
+            schedule = self.window > 0 and not self.scheduled
+            if schedule:
+                self.scheduled = True
+        if self.window <= 0:
+            self.flush()
+        elif schedule:
+            self.start_task(self._wait_and_flush)
+
+    def _merge(self, event, incident, statuses):
+        key = incident.get('id')
+        current = self.pending.pop(key, None)
+        if current is not None:
+            if event == 'incident_deleted' and current['type'] == 'incident_added':
+                # Ajouté puis supprimé dans la même fenêtre : les clients n'ont rien à voir
+                return
+            if event == 'incident_updated':
+                event = current['type']
+                incident = dict(current['incident'], **incident)
+            statuses |= current['statuses']
+        self.pending[key] = {'type': event, 'incident': incident, 'statuses': statuses}
+
+    def deadline(self):
+        return min(self.last_at + self.window, self.first_at + self.max_delay)
+
+    def _wait_and_flush(self):
+        while True:
+            with self._lock:
+                remaining = self.deadline() - self.clock() if self.first_at is not None else 0
+            if remaining <= 0:
+                break
+            self.sleep(remaining)
+        self.flush()
+
+    def flush(self):
+        '''
+        Envoie les événements en attente ; retourne le nombre de trames envoyées.
+        '''
+        with self._lock:
+            pending = list(self.pending.values())
+            if self.first_at is not None:
+                self.max_latency = max(self.max_latency, self.clock() - self.first_at)
+            self.pending = {}
+            self.first_at = self.last_at = None
+            self.scheduled = False
+            self.counters['flushes'] += 1
+        frames = {}
+        for entry in pending:
+            incident = entry['incident']
+            latitude, longitude = incident_position(incident)
+            targets = self.registry.route(latitude, longitude, entry['statuses'], incident.get('type'))
+            for target in targets:
+                frames.setdefault(target, []).append({'type': entry['type'], 'incident': incident})
+            if self.fanout is not None:
+                self.fanout.observe(len(targets))
+        for target, events in frames.items():
+            self.send(target, {'count': len(events), 'events': events})
+        with self._lock:
+            self.counters['sent'] += len(pending)
+            self.counters['frames'] += len(frames)
+        return len(frames)
+
+    def stats(self):
+        '''
+        Mesures du regroupement : événements reçus, événements envoyés après fusion, trames, etc.
+        '''
+        with self._lock:
+            stats = dict(self.counters, pending=len(self.pending), window_ms=self.window * 1000,
+                         max_delay_ms=self.max_delay * 1000, max_latency_ms=round(self.max_latency * 1000, 1))
+        stats['coalesced'] = stats['events'] - stats['sent'] - stats['pending']
+        return stats
+
+
+def publish(event, incident, statuses=None):
+    '''
+    Met en attente un événement d'incident ; il sera envoyé (regroupé) aux seuls clients abonnés
+    à sa position, son statut et son type.
+    statuses : statuts concernés (ex. ancien et nouveau statut d'une mise à jour).
+    '''
+    coalescer = getattr(current_app, 'event_coalescer', None)
+    if coalescer is not None:
+        coalescer.add(event, incident, statuses)
+
+
+def publish_many(event, incidents):
+    '''
+    Met en attente le même événement pour une liste d'incidents (ex. import en lot).
+    '''
+    coalescer = getattr(current_app, 'event_coalescer', None)
+    if coalescer is not None:
+        coalescer.add_many([(event, incident, None) for incident in incidents])
+
+
+def register_handlers(app, socketio, shared=False):
+    '''
+    Enregistre les gestionnaires Socket.IO : abonnement par défaut à la connexion,
+    message « subscribe » pour changer d'emprise ou de filtres, nettoyage à la déconnexion.
+    Le registre des abonnements et le regroupeur d'événements sont attachés à l'application
+    (app.subscriptions, app.event_coalescer).
+    shared : True si les émissions passent par une file de messages entre plusieurs workers.
+    '''
+    registry = app.subscriptions = SubscriptionRegistry(shared)
+    app.event_coalescer = EventCoalescer(
+        lambda target, frame: socketio.emit(BATCH_EVENT, frame, to=target, namespace=NAMESPACE),
+        registry, start_task=socketio.start_background_task, sleep=socketio.sleep)
+
+    def apply(subscription):
+        joined, left = registry.subscribe(subscription)
+        for room in left:
+            socketio.server.leave_room(subscription.sid, room, namespace=NAMESPACE)
+        for room in joined:
+            socketio.server.enter_room(subscription.sid, room, namespace=NAMESPACE)
+
+    @socketio.on('connect')
+    def on_connect(auth=None):
+        # Sans abonnement explicite, le client reçoit tous les événements (page de rapport)
+        apply(Subscription(request.sid, shared=shared))
+
+    @socketio.on('subscribe')
+    def on_subscribe(data=None):
+        try:
+            subscription = Subscription.from_message(request.sid, data, shared)
+        except SubscriptionError as e:
+            return {'ok': False, 'error': str(e)}
+        apply(subscription)
+        return {'ok': True, 'rooms': len(subscription.rooms)}
+
+    @socketio.on('disconnect')
+    def on_disconnect(*args):
+        registry.unsubscribe(request.sid)
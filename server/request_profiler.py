@@ -0,0 +1,163 @@
+'''
+request_profiler.py
+Ce module profile à la demande une requête de l'application Canmore Incident Management, en
+production : cProfile est activé pour la seule requête demandée (en-tête X-Profile: 1 ou
+paramètre ?_profile=1, avec le jeton d'administration dans X-Admin-Token) ou pour une fraction
+tirée au hasard des requêtes (CANMORE_PROFILE_SAMPLE_RATE). Le profil est enregistré au format
+pstats (snakeviz, flameprof, gprof2dot) sous un nom qui contient l'horodatage et la route ; les
+profils récents sont listés par /api/admin/profiles. Sans déclenchement, une requête ne coûte
+qu'un test d'en-tête ; sans jeton ni échantillonnage, aucun crochet n'est installé.
+'''
+
+import cProfile
+import hmac
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from flask import request, g
+
+# Jeton d'administration (aucun jeton : profilage à la demande et routes d'administration désactivés)
+ADMIN_TOKEN = os.environ.get('CANMORE_ADMIN_TOKEN') or None
+# Fraction des requêtes profilées sans demande explicite (0 : jamais)
+SAMPLE_RATE = float(os.environ.get('CANMORE_PROFILE_SAMPLE_RATE', '0'))
+# Nombre de profils gardés sur disque
+KEEP_PROFILES = int(os.environ.get('CANMORE_PROFILE_KEEP', '50'))
+
+# En-têtes et paramètre de déclenchement
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY = '_profile'
+TOKEN_HEADER = 'X-Admin-Token'
+
+# Caractères gardés dans le nom de fichier d'un profil
+UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def is_admin(admin_token=ADMIN_TOKEN):
+    '''
+    Vrai si la requête porte le jeton d'administration (comparaison à temps constant).
+    '''
+    token = request.headers.get(TOKEN_HEADER)
+    return admin_token is not None and token is not None and hmac.compare_digest(token, admin_token)
+
+
+class RequestProfiler:
+    '''
+    Décide quelles requêtes profiler, enregistre leurs profils dans directory et garde
+    l'index des keep profils les plus récents.
+    '''
+
+    def __init__(self, directory, admin_token=ADMIN_TOKEN, sample_rate=SAMPLE_RATE,
+                 keep=KEEP_PROFILES, rand=random.random, clock=time.time):
+        self.directory = directory
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.rand = rand
+        self.clock = clock
+        self.profiles = deque()
+        # Numéro de séquence : deux profils de la même seconde ont des noms distincts
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.admin_token is not None or self.sample_rate > 0
+
+    def requested(self):
+        '''
+        'demande' (en-tête ou paramètre avec le bon jeton), 'échantillon', ou None.
+        '''
+        if request.headers.get(PROFILE_HEADER) == '1' or request.args.get(PROFILE_QUERY) == '1':
+            if is_admin(self.admin_token):
+                return 'demande'
+        if self.sample_rate > 0 and self.rand() < self.sample_rate:
+            return 'échantillon'
+        return None
+
+    def start(self):
+        reason = self.requested()
+        if reason is None:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif dans ce processus (ex. une autre requête)
+            return None
+        g.request_profile = (profile, reason, time.perf_counter())
+        return profile
+
+    def finish(self, status=None):
+        '''
+        Arrête le profil de la requête courante (s'il y en a un) et l'enregistre ; retourne son index.
+        '''
+        current = g.pop('request_profile', None)
+        if current is None:
+            return None
+        profile, reason, started_at = current
+        profile.disable()
+        duration = time.perf_counter() - started_at
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        timestamp = self.clock()
+        profile_id = '{}_{:04d}_{}_{}'.format(
+            time.strftime('%Y%m%dT%H%M%S', time.gmtime(timestamp)), next(self._sequence) % 10000,
+            request.method, UNSAFE_CHARS.sub('_', rule).strip('_') or 'racine')
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, profile_id + '.pstats')
+        profile.dump_stats(path)
+        entry = {'id': profile_id, 'method': request.method, 'route': rule, 'path': request.path,
+                 'status': status, 'reason': reason, 'duration_ms': round(duration * 1000, 1),
+                 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))}
+        with self._lock:
+            self.profiles.append(entry)
+            removed = [self.profiles.popleft() for _ in range(max(0, len(self.profiles) - self.keep))]
+        for old in removed:
+            try:
+                os.remove(self.path(old['id']))
+            except OSError:
+                pass
+        return entry
+
+    def path(self, profile_id):
+        return os.path.join(self.directory, profile_id + '.pstats')
+
+    def recent(self):
+        '''
+        Profils enregistrés, du plus récent au plus ancien.
+        '''
+        with self._lock:
+            return list(reversed(self.profiles))
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((entry for entry in self.profiles if entry['id'] == profile_id), None)
+
+
+def register_profiler(app, profiler):
+    '''
+    Attache le profileur à l'application (app.profiler) et, s'il peut se déclencher, installe
+    ses crochets. À enregistrer en dernier : le profil couvre la route, pas les autres crochets.
+    '''
+    app.profiler = profiler
+    if not profiler.enabled:
+        return
+
+    @app.before_request
+    def start_profile():
+        profiler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        entry = profiler.finish(response.status_code)
+        if entry is not None:
+            response.headers['X-Profile-Id'] = entry['id']
+        return response
+
+    @app.teardown_request
+    def abort_profile(exc=None):
+        # Exception non gérée : le profil est tout de même enregistré
+        profiler.finish()
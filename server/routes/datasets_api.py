@@ -0,0 +1,37 @@
+'''
+datasets_api.py
+Ce module définit les routes API Flask pour consulter les jeux de données de référence
+(résumés et recherche d'une entité par FID), servis depuis le catalogue en mémoire
+de l'application Canmore Incident Management.
+'''
+
+from flask import Blueprint, jsonify
+from server.dataset_catalog import catalog
+from server.db_pool import run_blocking
+
+# Création d'un blueprint pour l'API des jeux de données
+datasets_api = Blueprint('datasets_api', __name__)
+
+def summaries():
+    return {name: catalog.get(name).summary() for name in catalog.names()}
+
+@datasets_api.route('/api/datasets', methods=['GET'])
+def list_datasets():
+    '''
+    Retourne le résumé (nombre, bbox, schéma) de chaque jeu de données.
+    '''
+    return jsonify(run_blocking(summaries))
+
+@datasets_api.route('/api/datasets/<name>/<int:fid>', methods=['GET'])
+def get_feature(name, fid):
+    '''
+    Retourne l'entité (GeoJSON) ou la ligne (CSV) correspondant au FID, en O(1).
+    '''
+    try:
+        dataset = run_blocking(catalog.get, name)
+    except FileNotFoundError:
+        return jsonify({'error': 'Jeu de données introuvable'}), 404
+    record = dataset.get(fid)
+    if record is None:
+        return jsonify({'error': 'Entité introuvable'}), 404
+    return jsonify(record)
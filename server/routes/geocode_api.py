@@ -0,0 +1,35 @@
+'''
+geocode_api.py
+Ce module définit la route API Flask de géocodage inverse (adresse civique la plus proche
+d'une position) pour l'application Canmore Incident Management.
+'''
+
+from flask import Blueprint, request, jsonify
+from server.geocoder import get_geocoder, MAX_RESULTS
+from server.geofence import is_valid_coordinate
+from server.db_pool import run_blocking
+
+# Création d'un blueprint pour l'API de géocodage
+geocode_api = Blueprint('geocode_api', __name__)
+
+def nearest_addresses(lat, lon, k):
+    return get_geocoder().nearest(lat, lon, k)
+
+@geocode_api.route('/api/geocode/reverse', methods=['GET'])
+def reverse_geocode():
+    '''
+    Retourne les k adresses les plus proches de ?lat=&lon= (k=1 par défaut, au plus MAX_RESULTS),
+    triées par distance en mètres.
+    '''
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    k = request.args.get('k', default=1, type=int)
+    if lat is None or lon is None or not is_valid_coordinate(lat, lon):
+        return jsonify({'error': 'Paramètres lat et lon invalides'}), 400
+    if k is None or not 1 <= k <= MAX_RESULTS:
+        return jsonify({'error': f'k doit être entre 1 et {MAX_RESULTS}'}), 400
+    try:
+        results = run_blocking(nearest_addresses, lat, lon, k)
+    except FileNotFoundError:
+        return jsonify({'error': 'Fichier des adresses non trouvé'}), 404
+    return jsonify({'results': results})
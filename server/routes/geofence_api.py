@@ -0,0 +1,30 @@
+'''
+geofence_api.py
+Ce module définit la route API Flask de validation en lot des positions par rapport
+à la limite de Canmore (geofence vectorisé) pour l'application Canmore Incident Management.
+'''
+
+from flask import Blueprint, request, jsonify
+from server.geofence import are_inside_canmore
+from server.db_pool import run_blocking
+
+# Création d'un blueprint pour l'API du geofence
+geofence_api = Blueprint('geofence_api', __name__)
+
+@geofence_api.route('/api/geofence/contains', methods=['POST'])
+def contains_points():
+    '''
+    Reçoit {"points": [[latitude, longitude], ...]} et retourne {"inside": [booléens]}
+    dans le même ordre, calculés en un seul appel vectorisé.
+    '''
+    data = request.get_json()
+    points = data.get('points') if isinstance(data, dict) else None
+    if not isinstance(points, list):
+        return jsonify({'error': 'Champ points manquant'}), 400
+    try:
+        lats = [float(point[0]) for point in points]
+        lons = [float(point[1]) for point in points]
+    except (TypeError, ValueError, IndexError):
+        return jsonify({'error': 'Chaque point doit être [latitude, longitude]'}), 400
+    inside = run_blocking(are_inside_canmore, lats, lons)
+    return jsonify({'inside': inside.tolist()})
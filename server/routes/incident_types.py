@@ -1,66 +1,53 @@
 '''
 incident_types.py
 Ce module définit une API Flask pour récupérer les types d'incidents et leurs détails
-depuis un fichier CSV pour l'application Canmore Incident Management.
+pour l'application Canmore Incident Management. La liste provient de la taxonomie en mémoire
+(incident_types.csv lu une seule fois) et la réponse est versionnée pour être mise en cache.
 '''
 
-from flask import Blueprint, jsonify
-import csv
-import os
-import codecs
+from flask import Blueprint, jsonify, request, url_for
+from server.incident_taxonomy import get_taxonomy, TaxonomyError
+from server.db_pool import run_blocking
 
 
 # Création d'un blueprint pour l'API des types d'incidents
 incident_types_bp = Blueprint('incident_types', __name__)
 
+# Cache permanent pour une URL versionnée (?v=<version>) : son contenu ne change jamais
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+@incident_types_bp.app_template_global()
+def incident_types_url():
+    '''
+    Helper Jinja : URL versionnée de l'API des types d'incidents, à mettre en cache par le navigateur.
+    '''
+    try:
+        return url_for('incident_types.get_incident_types', v=run_blocking(get_taxonomy).version)
+    except (FileNotFoundError, TaxonomyError):
+        return url_for('incident_types.get_incident_types')
+
 @incident_types_bp.route('/api/incident_types', methods=['GET'])
 def get_incident_types():
     '''
-    Lit le fichier CSV des types d'incidents, regroupe les sujets et détails,
-    et retourne la liste structurée au format JSON pour le frontend.
+    Retourne la liste structurée des sujets (avec leurs identifiants) et de leurs détails
+    au format JSON pour le frontend. La version de la taxonomie sert d'ETag.
     '''
-    # Chemin du fichier CSV
-    csv_path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-        'static', 'data', 'incident_types.csv'
-    )
-
-    subjects = {}  # Dictionnaire pour regrouper les sujets et leurs détails
-
-    # Ouvre le fichier CSV en gérant le BOM éventuel (utf-8-sig) avec gestion d'erreur
     try:
-        with codecs.open(csv_path, encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile)
-            # Affiche les noms de colonnes pour le débogage
-            print("Noms des colonnes CSV :", reader.fieldnames)
-            # Normalise les noms de colonnes pour gérer la casse et les espaces
-            fieldnames = {name.strip().upper(): name for name in reader.fieldnames}
-            subject_key = fieldnames.get('SUBJECT')
-            detail_key = fieldnames.get('DETAILS')
-            if not subject_key or not detail_key:
-                # Erreur si les en-têtes ne sont pas corrects
-                return jsonify({'error': 'Le CSV doit contenir les colonnes SUBJECT et DETAILS'}), 400
-            for row in reader:
-                subject = row[subject_key]
-                detail = row[detail_key]
-                # Ignore une éventuelle ligne d'en-tête dans les données
-                if subject.strip().upper() == 'SUBJECT':
-                    continue
-                # Ajoute le sujet s'il n'existe pas encore
-                if subject not in subjects:
-                    subjects[subject] = []
-                # Ajoute le détail s'il n'est pas déjà présent pour ce sujet
-                if detail not in subjects[subject]:
-                    subjects[subject].append(detail)
+        taxonomy = run_blocking(get_taxonomy)
     except FileNotFoundError:
         return jsonify({'error': 'Fichier CSV non trouvé'}), 404
+    except TaxonomyError as e:
+        # Erreur si les en-têtes ne sont pas corrects
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Erreur lecture CSV: {str(e)}'}), 500
 
-    # Transforme le dictionnaire en liste de dictionnaires pour le frontend
-    result = [
-        {'subject': subject, 'details': details}
-        for subject, details in subjects.items()
-    ]
-    # Retourne la liste au format JSON
-    return jsonify(result)
\ No newline at end of file
+    response = jsonify(taxonomy.subjects)
+    response.headers['X-Taxonomy-Version'] = taxonomy.version
+    response.set_etag(taxonomy.version)
+    if request.args.get('v') == taxonomy.version:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        # URL non versionnée ou périmée : le navigateur revalide avec l'ETag (réponse 304)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
@@ -5,32 +5,80 @@ ajout, modification, suppression et récupération des incidents dans la base SQ
 pour l'application Canmore Incident Management.
 '''
 
-import requests
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
+import logging
 import sqlite3
 import os
+from server.incident_taxonomy import get_taxonomy, decode_incidents, reset_taxonomy, TaxonomyError
+from server.geofence import are_inside_canmore, is_inside_canmore, is_valid_coordinate
+from server.geocoder import schedule_enrichment
+from server.feature_index import nearest_feature, nearest_features
+from server.federated_search import reset_incident_index
+from server.incident_changes import init_change_log
+from server import feature_join
+from server import realtime
+from server.db_pool import run_blocking
 
-# Chemin du fichier de base de données SQLite des incidents
-# Assure que le répertoire data/ existe
+# Chemin par défaut du fichier de base de données SQLite des incidents ;
+# create_app() le remplace selon sa configuration (DATA_DIR, DB_PATH) via configure_storage()
 DATA_DIR = os.path.join(os.path.dirname(__file__), '../data')
-os.makedirs(DATA_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(DATA_DIR, 'incidents.db')
 
+# Classe des connexions SQLite (connexions chronométrées quand les mesures sont activées)
+CONNECTION_FACTORY = sqlite3.Connection
+
+logger = logging.getLogger(__name__)
+
 # Création d'un blueprint pour l'API incidents
 incidents_api = Blueprint('incidents_api', __name__)
 
+# Message retourné pour un incident signalé hors de la limite de Canmore
+OUTSIDE_BOUNDARY_ERROR = "Vous ne pouvez signaler un incident qu'à l'intérieur de Canmore"
+
+def configure_storage(db_path, connection_factory=sqlite3.Connection):
+    '''
+    Change le fichier de base de données utilisé par toutes les connexions (et crée son dossier).
+    connection_factory : classe des connexions (ex. metrics.TimedConnection).
+    '''
+    global DB_PATH, CONNECTION_FACTORY
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    DB_PATH = db_path
+    CONNECTION_FACTORY = connection_factory
+    # La taxonomie (identifiants), l'index de la recherche globale et la jointure du rapport
+    # décrivent l'ancienne base
+    reset_taxonomy()
+    reset_incident_index()
+    feature_join.reset_feature_join()
+
 def get_db_connection():
     '''
     Ouvre une connexion à la base de données SQLite et configure le retour sous forme de dictionnaire.
     '''
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=CONNECTION_FACTORY)
     conn.row_factory = sqlite3.Row
     return conn
 
+def add_column_if_missing(conn, table, column, definition):
+    '''
+    Ajoute une colonne à une table existante si elle n'y est pas déjà (migration légère).
+    '''
+    columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def read_incidents(conn, where='', params=(), taxonomy=None):
+    '''
+    Lit des incidents complets (sujet et détail décodés), ex. pour les notifications temps réel.
+    taxonomy : taxonomie déjà obtenue, utilisée pour le décodage (voir decode_incidents).
+    '''
+    return decode_incidents(conn.execute(f'SELECT * FROM incidents {where}', params).fetchall(), taxonomy)
+
 def init_db():
     '''
-    Initialise la base de données : crée la table incidents si besoin et ajoute la colonne status si absente.
+    Initialise la base de données : crée la table incidents et les tables de correspondance
+    de la taxonomie si besoin, et ajoute les colonnes manquantes (status, identifiants de type,
+    adresse et élément de référence les plus proches).
     '''
     conn = get_db_connection()
     conn.execute('''
@@ -44,94 +92,252 @@ def init_db():
             status TEXT DEFAULT 'unsolved'
         )
     ''')
-    try:
-        conn.execute("ALTER TABLE incidents ADD COLUMN status TEXT DEFAULT 'unsolved'")
-    except Exception:
-        print("ALTER TABLE incidents: colonne 'status' déjà présente ou erreur ignorée.")
+    # Tables de correspondance des sujets et détails (identifiants stables, jamais réutilisés)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS incident_subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS incident_details (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL REFERENCES incident_subjects(id),
+            name TEXT NOT NULL,
+            UNIQUE (subject_id, name)
+        )
+    ''')
+    add_column_if_missing(conn, 'incidents', 'status', "TEXT DEFAULT 'unsolved'")
+    add_column_if_missing(conn, 'incidents', 'type_id', 'INTEGER REFERENCES incident_subjects(id)')
+    add_column_if_missing(conn, 'incidents', 'detail_id', 'INTEGER REFERENCES incident_details(id)')
+    # Adresse civique la plus proche, renseignée en arrière-plan après l'insertion
+    add_column_if_missing(conn, 'incidents', 'nearest_address', 'TEXT')
+    add_column_if_missing(conn, 'incidents', 'nearest_address_m', 'REAL')
+    # Index partiel des incidents encore à enrichir : l'enrichissement ne parcourt pas toute la table
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_incidents_unenriched ON incidents(id) '
+                 'WHERE nearest_address IS NULL')
+    # Élément de référence le plus proche (sentier, parc, bâtiment, terrain de sport)
+    add_column_if_missing(conn, 'incidents', 'nearest_feature_id', 'INTEGER')
+    add_column_if_missing(conn, 'incidents', 'feature_layer', 'TEXT')
+    add_column_if_missing(conn, 'incidents', 'distance_m', 'REAL')
+    # Journal des modifications : les caches de chaque worker (recherche, rapport) s'y mettent à jour
+    init_change_log(conn)
     conn.commit()
     conn.close()
 
-# Initialisation de la base de données au démarrage du module
-init_db()
-
-@incidents_api.route('/api/incidents/<int:incident_id>', methods=['DELETE'])
-def delete_incident(incident_id):
+def delete_incident_row(incident_id):
     '''
-    Supprime un incident de la base de données à partir de son ID.
+    Supprime un incident et retourne sa ligne (liste vide si absent).
     '''
     conn = get_db_connection()
+    # Position lue avant suppression : l'événement est acheminé aux clients abonnés à cette zone
+    deleted = read_incidents(conn, 'WHERE id = ?', (incident_id,))
     conn.execute('DELETE FROM incidents WHERE id = ?', (incident_id,))
     conn.commit()
     conn.close()
-    # Notifie les clients en temps réel via Flask-SocketIO
+    return deleted
+
+@incidents_api.route('/api/incidents/<int:incident_id>', methods=['DELETE'])
+def delete_incident(incident_id):
+    '''
+    Supprime un incident de la base de données à partir de son ID.
+    '''
+    deleted = run_blocking(delete_incident_row, incident_id)
+    # Notifie les clients abonnés en temps réel via Flask-SocketIO
     try:
-        current_app.socketio.emit('incident_deleted', {'id': incident_id})
+        event = {'id': incident_id}
+        if deleted:
+            event.update({key: deleted[0][key] for key in ('latitude', 'longitude', 'status', 'type')})
+        realtime.publish('incident_deleted', event)
     except Exception as e:
-        print(f"Socket.IO notification failed: {e}")
+        logger.warning("Socket.IO notification failed: %s", e)
     return jsonify({'message': 'Incident supprimé avec succès'}), 200
 
+def update_status_row(incident_id, status):
+    '''
+    Change le statut d'un incident ; retourne (ancienne ligne de statut, incident mis à jour).
+    '''
+    conn = get_db_connection()
+    previous = conn.execute('SELECT status FROM incidents WHERE id = ?', (incident_id,)).fetchone()
+    conn.execute('UPDATE incidents SET status = ? WHERE id = ?', (status, incident_id))
+    conn.commit()
+    updated = read_incidents(conn, 'WHERE id = ?', (incident_id,))
+    conn.close()
+    return previous, updated
+
 @incidents_api.route('/api/incidents/<int:incident_id>', methods=['PATCH'])
 def update_incident_status(incident_id):
     '''
     Met à jour le statut (résolu/non résolu) d'un incident existant.
     '''
-    import sys
-    print(f"PATCH /api/incidents/{incident_id} appelé", file=sys.stderr)
     data = request.get_json()
-    print(f"Données reçues : {data}", file=sys.stderr)
+    logger.debug("PATCH /api/incidents/%s : %s", incident_id, data)
     if 'status' not in data:
-        print("Champ status manquant", file=sys.stderr)
         return jsonify({'error': 'Champ status manquant'}), 400
-    conn = get_db_connection()
-    conn.execute('UPDATE incidents SET status = ? WHERE id = ?', (data['status'], incident_id))
-    conn.commit()
-    conn.close()
-    print("Statut de l'incident mis à jour avec succès", file=sys.stderr)
-    # Notifie les clients en temps réel via Flask-SocketIO
+    previous, updated = run_blocking(update_status_row, incident_id, data['status'])
+    # Notifie les clients abonnés en temps réel via Flask-SocketIO
     try:
-        current_app.socketio.emit('incident_updated', {'id': incident_id, 'status': data['status']})
+        # Incident complet : les clients le mettent à jour sur place. Les abonnés à l'ancien
+        # statut le reçoivent aussi, pour retirer un incident qui ne les concerne plus.
+        statuses = (data['status'], previous['status'] if previous else None)
+        realtime.publish('incident_updated', updated[0] if updated else {'id': incident_id, 'status': data['status']},
+                         statuses)
     except Exception as e:
-        print(f"Socket.IO notification failed: {e}")
+        logger.warning("Socket.IO notification failed: %s", e)
     return jsonify({'message': "Statut de l'incident mis à jour avec succès"}), 200
 
-@incidents_api.route('/api/incidents', methods=['POST'])
-def add_incident():
+REQUIRED_FIELDS = ['type', 'description', 'latitude', 'longitude', 'timestamp']
+
+INSERT_INCIDENT_SQL = (
+    'INSERT INTO incidents (type, description, latitude, longitude, timestamp, status, type_id, detail_id, '
+    'nearest_feature_id, feature_layer, distance_m) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+def get_taxonomy_or_none():
     '''
-    Ajoute un nouvel incident à la base de données.
+    Retourne la taxonomie, ou None si le CSV est indisponible (les types restent alors en texte).
     '''
-    data = request.get_json()
-    required_fields = ['type', 'description', 'latitude', 'longitude', 'timestamp']
-    if not all(field in data for field in required_fields):
-        return jsonify({'error': 'Champs manquants'}), 400
+    try:
+        return get_taxonomy()
+    except (FileNotFoundError, TaxonomyError):
+        return None
+
+def validate_incident(data):
+    '''
+    Vérifie les champs obligatoires et le format des coordonnées d'un incident.
+    Retourne un message d'erreur, ou None si l'incident est valide (hors contrôle de la limite).
+    '''
+    if not isinstance(data, dict) or not all(field in data for field in REQUIRED_FIELDS):
+        return 'Champs manquants'
+    if not is_valid_coordinate(data['latitude'], data['longitude']):
+        return 'Latitude et longitude doivent être des nombres valides'
+    return None
+
+def incident_values(data, taxonomy, feature):
+    '''
+    Construit les valeurs à insérer pour un incident.
+    Encodage compact : le texte connu de la taxonomie est remplacé par son identifiant.
+    feature est l'élément de référence le plus proche ({'layer', 'feature_id', 'distance_m'}) ou None.
+    '''
+    type_text, description = data['type'], data['description']
+    type_id, detail_id = taxonomy.encode(type_text, description) if taxonomy else (None, None)
+    if type_id is not None:
+        type_text = ''
+    if detail_id is not None:
+        description = None
     status = data.get('status', 'unsolved')
+    feature = feature or {}
+    return (type_text, description, data['latitude'], data['longitude'], data['timestamp'], status, type_id, detail_id,
+            feature.get('feature_id'), feature.get('layer'), feature.get('distance_m'))
+
+def insert_incident(data):
+    '''
+    Enregistre un incident validé (avec son élément de référence le plus proche) et le retourne complet.
+    '''
+    taxonomy = get_taxonomy_or_none()
+    conn = get_db_connection()
+    feature = nearest_feature(data['latitude'], data['longitude'])
+    cursor = conn.execute(INSERT_INCIDENT_SQL, incident_values(data, taxonomy, feature))
+    conn.commit()
+    # Relu après la validation : un rechargement de la taxonomie écrit dans la base avec une autre
+    # connexion et attendrait le verrou de cette transaction
+    incident = read_incidents(conn, 'WHERE id = ?', (cursor.lastrowid,), taxonomy)[0]
+    conn.close()
+    return incident
+
+def insert_incidents(valid):
+    '''
+    Enregistre un lot d'incidents validés en une seule transaction et retourne les lignes insérées.
+    '''
+    taxonomy = get_taxonomy_or_none()
     conn = get_db_connection()
-    conn.execute(
-        'INSERT INTO incidents (type, description, latitude, longitude, timestamp, status) VALUES (?, ?, ?, ?, ?, ?)',
-        (data['type'], data['description'], data['latitude'], data['longitude'], data['timestamp'], status)
-    )
+    # Éléments les plus proches de tout le lot en un seul calcul vectorisé
+    features = nearest_features([incident['latitude'] for incident in valid],
+                                [incident['longitude'] for incident in valid])
+    # Verrou d'écriture pris avant de lire le dernier id : les lignes insérées sont exactement celles au-delà
+    conn.execute('BEGIN IMMEDIATE')
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM incidents').fetchone()[0]
+    conn.executemany(INSERT_INCIDENT_SQL, [
+        incident_values(incident, taxonomy, feature) for incident, feature in zip(valid, features)
+    ])
     conn.commit()
+    # Relu après la validation (voir insert_incident) : les lignes du lot sont les premières au-delà
+    # de last_id, celles des écritures suivantes viennent après
+    inserted = read_incidents(conn, 'WHERE id > ? ORDER BY id LIMIT ?', (last_id, len(valid)), taxonomy)
     conn.close()
-    # Notifie les clients en temps réel via Flask-SocketIO
+    return inserted
+
+@incidents_api.route('/api/incidents', methods=['POST'])
+def add_incident():
+    '''
+    Ajoute un nouvel incident à la base de données, après avoir vérifié qu'il est dans Canmore.
+    '''
+    data = request.get_json()
+    error = validate_incident(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if not run_blocking(is_inside_canmore, data['latitude'], data['longitude']):
+        return jsonify({'error': OUTSIDE_BOUNDARY_ERROR}), 400
+    incident = run_blocking(insert_incident, data)
+    # La recherche globale et le rapport par élément suivent le journal des modifications
+    # (incident_changes) : rien à invalider ici, y compris pour les autres workers
+    # L'adresse la plus proche est calculée hors du chemin critique de la requête
+    schedule_enrichment()
+    # Notifie les clients abonnés en temps réel via Flask-SocketIO (incident complet, avec son id)
     try:
-        current_app.socketio.emit('incident_added', {
-            'type': data['type'],
-            'description': data['description'],
-            'latitude': data['latitude'],
-            'longitude': data['longitude'],
-            'timestamp': data['timestamp'],
-            'status': status
-        })
+        realtime.publish('incident_added', incident)
     except Exception as e:
-        print(f"Socket.IO notification failed: {e}")
-    return jsonify({'message': 'Incident ajouté avec succès'}), 201
+        logger.warning("Socket.IO notification failed: %s", e)
+    return jsonify({'message': 'Incident ajouté avec succès', 'id': incident['id'], 'incident': incident}), 201
+
+@incidents_api.route('/api/incidents/bulk', methods=['POST'])
+def add_incidents_bulk():
+    '''
+    Importe une liste d'incidents en une seule transaction.
+    Toutes les positions sont validées en un seul appel vectorisé au geofence ;
+    les incidents invalides ou hors de Canmore sont rejetés individuellement.
+    '''
+    data = request.get_json()
+    if not isinstance(data, list):
+        return jsonify({'error': 'Une liste d\'incidents est attendue'}), 400
+    rejected = []
+    valid = []
+    for index, incident in enumerate(data):
+        error = validate_incident(incident)
+        if error:
+            rejected.append({'index': index, 'error': error})
+        else:
+            valid.append((index, incident))
+    if valid:
+        inside = run_blocking(
+            are_inside_canmore,
+            [incident['latitude'] for _index, incident in valid],
+            [incident['longitude'] for _index, incident in valid]
+        )
+        rejected.extend({'index': index, 'error': OUTSIDE_BOUNDARY_ERROR}
+                        for (index, _incident), ok in zip(valid, inside) if not ok)
+        valid = [incident for (_index, incident), ok in zip(valid, inside) if ok]
+    if valid:
+        inserted = run_blocking(insert_incidents, valid)
+        schedule_enrichment()
+        # Notifie les clients abonnés en temps réel : chacun reçoit la partie du lot qui le concerne
+        try:
+            realtime.publish_many('incident_added', inserted)
+        except Exception as e:
+            logger.warning("Socket.IO notification failed: %s", e)
+    rejected.sort(key=lambda item: item['index'])
+    return jsonify({'inserted': len(valid), 'rejected': rejected}), 201 if valid else 400
+
+def read_all_incidents():
+    conn = get_db_connection()
+    incidents_list = read_incidents(conn)
+    conn.close()
+    return incidents_list
 
 @incidents_api.route('/api/incidents', methods=['GET'])
 def get_incidents():
     '''
     Retourne la liste de tous les incidents enregistrés dans la base de données.
     '''
-    conn = get_db_connection()
-    incidents = conn.execute('SELECT * FROM incidents').fetchall()
-    conn.close()
-    incidents_list = [dict(row) for row in incidents]
-    return jsonify(incidents_list)
+    return jsonify(run_blocking(read_all_incidents))
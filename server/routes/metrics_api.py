@@ -0,0 +1,23 @@
+'''
+metrics_api.py
+Ce module expose les mesures de l'application Canmore Incident Management au format texte
+de Prometheus (route /metrics), pour un scrape périodique.
+'''
+
+from flask import Blueprint, Response, current_app, abort
+
+# Création d'un blueprint pour les mesures
+metrics_api = Blueprint('metrics_api', __name__)
+
+# Type de contenu du format texte de Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@metrics_api.route('/metrics', methods=['GET'])
+def metrics():
+    '''
+    Retourne toutes les mesures (404 si l'instrumentation est désactivée, CANMORE_METRICS=0).
+    '''
+    registry = getattr(current_app, 'metrics', None)
+    if registry is None:
+        abort(404)
+    return Response(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,59 @@
+'''
+profiling_api.py
+Ce module définit les routes d'administration des profils de requêtes de l'application
+Canmore Incident Management : liste des profils récents, téléchargement au format pstats
+et résumé texte des fonctions les plus coûteuses. Toutes les routes exigent le jeton
+d'administration (en-tête X-Admin-Token) ; sans jeton configuré, elles n'existent pas (404).
+'''
+
+import io
+import pstats
+from flask import Blueprint, Response, jsonify, current_app, abort, request, send_file
+from server.request_profiler import is_admin
+
+# Création d'un blueprint pour l'administration des profils
+profiling_api = Blueprint('profiling_api', __name__)
+
+# Nombre de fonctions du résumé texte
+TOP_FUNCTIONS = 40
+
+@profiling_api.before_request
+def require_admin():
+    '''
+    Refuse les requêtes sans jeton d'administration valide.
+    '''
+    profiler = current_app.profiler
+    if profiler.admin_token is None:
+        abort(404)
+    if not is_admin(profiler.admin_token):
+        return jsonify({'error': "Jeton d'administration manquant ou invalide"}), 403
+    return None
+
+@profiling_api.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    '''
+    Retourne les profils récents (route, méthode, statut, durée, horodatage), du plus récent au plus ancien.
+    '''
+    profiler = current_app.profiler
+    return jsonify({'sample_rate': profiler.sample_rate, 'profiles': profiler.recent()})
+
+@profiling_api.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    '''
+    Retourne un profil : fichier pstats par défaut, résumé texte avec ?format=text
+    (tri par temps cumulé, ou ?sort=tottime, ncalls...).
+    '''
+    profiler = current_app.profiler
+    if profiler.get(profile_id) is None:
+        return jsonify({'error': 'Profil introuvable'}), 404
+    path = profiler.path(profile_id)
+    if request.args.get('format') == 'text':
+        output = io.StringIO()
+        try:
+            stats = pstats.Stats(path, stream=output)
+            stats.sort_stats(request.args.get('sort', 'cumulative')).print_stats(TOP_FUNCTIONS)
+        except KeyError:
+            return jsonify({'error': 'Tri inconnu'}), 400
+        return Response(output.getvalue(), mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=profile_id + '.pstats')
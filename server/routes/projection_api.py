@@ -0,0 +1,48 @@
+'''
+projection_api.py
+Ce module définit la route API Flask de conversion en lot de coordonnées entre
+Web Mercator (EPSG:3857) et WGS84 (EPSG:4326) pour l'application Canmore Incident Management.
+'''
+
+import numpy as np
+from flask import Blueprint, request, jsonify
+from server.projection import transform, WEB_MERCATOR, WGS84
+
+# Création d'un blueprint pour l'API de projection
+projection_api = Blueprint('projection_api', __name__)
+
+# Nombre maximal de points par requête
+MAX_POINTS = 100000
+
+@projection_api.route('/api/projection', methods=['POST'])
+def project_points():
+    '''
+    Reçoit {"from": "EPSG:3857", "to": "EPSG:4326", "points": [[x, y], ...]} et retourne
+    {"points": [[x, y], ...]} dans le même ordre, convertis en un seul appel vectorisé.
+    En WGS84, x est la longitude et y la latitude (ordre GeoJSON).
+    '''
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('points'), list):
+        return jsonify({'error': 'Champ points manquant'}), 400
+    source = data.get('from', WEB_MERCATOR)
+    target = data.get('to', WGS84)
+    supported = (WEB_MERCATOR, WGS84)
+    if source not in supported or target not in supported:
+        return jsonify({'error': f"Systèmes pris en charge : {', '.join(supported)}"}), 400
+    points = data['points']
+    if len(points) > MAX_POINTS:
+        return jsonify({'error': f'Au plus {MAX_POINTS} points par requête'}), 400
+    try:
+        xs = [float(point[0]) for point in points]
+        ys = [float(point[1]) for point in points]
+    except (TypeError, ValueError, IndexError, KeyError):
+        return jsonify({'error': 'Chaque point doit être [x, y]'}), 400
+    # float() accepte « nan », « inf » et « 1e400 », que le JSON ne sait pas représenter
+    if not (np.isfinite(xs).all() and np.isfinite(ys).all()):
+        return jsonify({'error': 'Les coordonnées doivent être des nombres finis'}), 400
+    # Un débordement donne ±inf, refusé juste après : pas d'avertissement NumPy
+    with np.errstate(over='ignore', invalid='ignore'):
+        xs, ys = transform(xs, ys, source, target)
+    if not (np.isfinite(xs).all() and np.isfinite(ys).all()):
+        return jsonify({'error': f'Coordonnées hors du domaine de {target}'}), 400
+    return jsonify({'points': [[x, y] for x, y in zip(xs.tolist(), ys.tolist())]})
@@ -0,0 +1,23 @@
+'''
+realtime_api.py
+Ce module expose l'état des notifications temps réel (Socket.IO) de l'application
+Canmore Incident Management : abonnements connectés et mesures du regroupement des événements.
+'''
+
+from flask import Blueprint, jsonify, current_app
+
+# Création d'un blueprint pour l'API temps réel
+realtime_api = Blueprint('realtime_api', __name__)
+
+@realtime_api.route('/api/realtime/stats', methods=['GET'])
+def realtime_stats():
+    '''
+    Retourne le nombre d'abonnés et de salons, et les mesures du regroupement des événements
+    (événements reçus, envoyés après fusion, trames, latence maximale observée).
+    '''
+    registry = current_app.subscriptions
+    return jsonify({
+        'subscribers': len(registry.subscriptions),
+        'rooms': len(registry.members),
+        'coalescing': current_app.event_coalescer.stats(),
+    })
@@ -4,23 +4,29 @@ Ce module définit les routes Flask pour la page de rapport et les statistiques
 dans l'application Canmore Incident Management.
 '''
 
-from flask import Blueprint, render_template, jsonify
-import json
-import os
+from flask import Blueprint, render_template, jsonify, request
+from server.dataset_catalog import catalog
+from server.feature_index import FEATURE_LAYERS
+from server.feature_join import incidents_by_feature, JOIN_BUFFERS
+from server.db_pool import run_blocking
 
 # Création d'un blueprint pour la page de rapport
 report_bp = Blueprint('report', __name__)
 
-# Chemin du dossier contenant les fichiers de données GeoJSON
-DATA_DIR = os.path.join(os.path.dirname(__file__), '../../static/data')
-
 def count_features(filename):
     '''
-    Ouvre un fichier GeoJSON et retourne le nombre d'éléments dans "features".
+    Retourne le nombre d'éléments dans "features" d'un fichier GeoJSON,
+    servi depuis le catalogue en mémoire (rechargé si le fichier change).
     '''
-    with open(os.path.join(DATA_DIR, filename), encoding='utf-8') as f:
-        data = json.load(f)
-        return len(data['features'])
+    return catalog.count(filename)
+
+def category_counts():
+    return {
+        'buildings': count_features('buildings.geojson'),
+        'parcs': count_features('parcs.geojson'),
+        'sports_fields': count_features('sports_fields.geojson'),
+        'trails': count_features('trails.geojson')
+    }
 
 @report_bp.route('/report')
 def report():
@@ -34,9 +40,23 @@ def category_totals():
     '''
     Retourne le nombre d'entités pour chaque catégorie de données (bâtiments, parcs, terrains de sport, sentiers).
     '''
+    return jsonify(run_blocking(category_counts))
+
+@report_bp.route('/report/incidents_by_feature')
+def incidents_by_feature_report():
+    '''
+    Retourne, pour chaque élément d'une couche (?layer=parcs|trails|buildings|sports_fields),
+    le nombre d'incidents ouverts et total qui lui sont rattachés par jointure spatiale.
+    '''
+    layer = request.args.get('layer', '')
+    if layer not in FEATURE_LAYERS:
+        return jsonify({'error': f"Couche inconnue : choisir parmi {', '.join(FEATURE_LAYERS)}"}), 400
+    try:
+        features = run_blocking(incidents_by_feature, layer)
+    except FileNotFoundError:
+        return jsonify({'error': 'Couche indisponible'}), 404
     return jsonify({
-        'buildings': count_features('buildings.geojson'),
-        'parcs': count_features('parcs.geojson'),
-        'sports_fields': count_features('sports_fields.geojson'),
-        'trails': count_features('trails.geojson')
+        'layer': layer,
+        'buffer_m': JOIN_BUFFERS[layer],
+        'features': features
     })
@@ -0,0 +1,57 @@
+'''
+search_api.py
+Ce module définit les routes API Flask de recherche du portail d'information
+(correspondance exacte et suggestions par préfixe) pour l'application Canmore Incident Management.
+'''
+
+from flask import Blueprint, request, jsonify
+from server.search_index import get_search_index, SEARCH_DATASETS, DEFAULT_LIMIT, MAX_LIMIT
+from server.federated_search import federated_search
+from server.db_pool import run_blocking
+
+# Création d'un blueprint pour l'API de recherche
+search_api = Blueprint('search_api', __name__)
+
+@search_api.route('/api/search', methods=['GET'])
+def search_all():
+    '''
+    ?q=&limit= : recherche globale dans tous les jeux de données et les incidents,
+    résultats typés ({'type', 'value', 'score', ...}) triés par score.
+    '''
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Paramètre q manquant'}), 400
+    limit = request.args.get('limit', default=DEFAULT_LIMIT, type=int)
+    if limit is None or not 1 <= limit <= MAX_LIMIT:
+        return jsonify({'error': f'limit doit être entre 1 et {MAX_LIMIT}'}), 400
+    return jsonify(federated_search(query, limit))
+
+@search_api.route('/api/search/<dataset>', methods=['GET'])
+def search_dataset(dataset):
+    '''
+    ?prefix=&limit= : retourne les suggestions commençant par le préfixe.
+    ?exact= : retourne l'enregistrement dont la clé correspond exactement (404 sinon).
+    ?q=&limit= : recherche tolérante aux fautes, avec la distance d'édition de chaque résultat.
+    '''
+    if dataset not in SEARCH_DATASETS:
+        return jsonify({'error': 'Jeu de données introuvable'}), 404
+    try:
+        index = run_blocking(get_search_index, dataset)
+    except FileNotFoundError:
+        return jsonify({'error': 'Fichier CSV non trouvé'}), 404
+
+    exact = request.args.get('exact')
+    if exact is not None:
+        record = run_blocking(index.exact, exact)
+        if record is None:
+            return jsonify({'error': 'Aucun résultat exact'}), 404
+        return jsonify(record)
+
+    limit = request.args.get('limit', default=DEFAULT_LIMIT, type=int)
+    if limit is None or not 1 <= limit <= MAX_LIMIT:
+        return jsonify({'error': f'limit doit être entre 1 et {MAX_LIMIT}'}), 400
+    query = request.args.get('q')
+    if query is not None:
+        matches = run_blocking(index.fuzzy, query, limit)
+        return jsonify({'results': [{'value': value, 'distance': distance} for value, distance in matches]})
+    return jsonify({'results': run_blocking(index.prefix, request.args.get('prefix', ''), limit)})
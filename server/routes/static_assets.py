@@ -0,0 +1,110 @@
+'''
+static_assets.py
+Ce module construit un manifeste des fichiers statiques (empreinte du contenu)
+et fournit le helper Jinja asset_url() utilisé par les templates pour générer
+des URLs versionnées. Les réponses versionnées sont servies avec un cache
+navigateur permanent (immutable) pour l'application Canmore Incident Management.
+'''
+
+from flask import Blueprint, current_app, request, url_for
+import hashlib
+import os
+import threading
+
+# Création d'un blueprint pour les ressources statiques versionnées
+static_assets_bp = Blueprint('static_assets', __name__)
+
+# Dossier des fichiers statiques de l'application
+STATIC_DIR = os.path.join(os.path.dirname(__file__), '../../static')
+
+# Nombre de caractères hexadécimaux conservés dans l'empreinte
+HASH_LENGTH = 12
+
+# En-têtes de cache pour les URLs versionnées : le contenu ne change jamais pour une empreinte donnée
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Manifeste : chemin relatif → (mtime, empreinte)
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def file_hash(path):
+    '''
+    Calcule l'empreinte SHA-256 (tronquée) du contenu d'un fichier, lu par blocs.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def build_manifest(static_dir=STATIC_DIR):
+    '''
+    Parcourt le dossier static/ et retourne le manifeste {chemin relatif: (mtime, empreinte)}.
+    '''
+    manifest = {}
+    for root, _dirs, files in os.walk(static_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            manifest[filename] = (os.path.getmtime(path), file_hash(path))
+    return manifest
+
+
+def get_manifest():
+    '''
+    Retourne le manifeste, construit une seule fois au premier appel.
+    '''
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = build_manifest()
+    return _manifest
+
+
+def asset_hash(filename):
+    '''
+    Retourne l'empreinte d'un fichier statique, ou None s'il est absent du dossier static/.
+    En mode debug, l'empreinte est recalculée si le fichier a été modifié depuis le manifeste.
+    '''
+    manifest = get_manifest()
+    entry = manifest.get(filename)
+    if current_app.debug:
+        path = os.path.join(STATIC_DIR, filename)
+        if not os.path.isfile(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if entry is None or entry[0] != mtime:
+            entry = (mtime, file_hash(path))
+            manifest[filename] = entry
+    return entry[1] if entry else None
+
+
+@static_assets_bp.app_template_global()
+def asset_url(filename):
+    '''
+    Helper Jinja : retourne l'URL d'un fichier statique suffixée de son empreinte (?v=...).
+    Un fichier inconnu du manifeste retourne l'URL statique simple.
+    '''
+    digest = asset_hash(filename)
+    if digest is None:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=filename, v=digest)
+
+
+@static_assets_bp.after_app_request
+def set_static_cache_headers(response):
+    '''
+    Applique un cache permanent aux fichiers statiques demandés avec la bonne empreinte.
+    Une empreinte périmée (ancien déploiement) est servie sans cache pour forcer la revalidation.
+    '''
+    if request.endpoint != 'static' or 'v' not in request.args:
+        return response
+    filename = (request.view_args or {}).get('filename')
+    if response.status_code in (200, 304) and filename and request.args['v'] == asset_hash(filename):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
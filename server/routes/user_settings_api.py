@@ -3,27 +3,59 @@ user_settings_api.py
 Ce module définit les routes API Flask pour la gestion et la récupération
 des préférences utilisateur (mode sombre, musique, etc.)
 dans l'application Canmore Incident Management.
+Chaque navigateur est identifié par un identifiant aléatoire gardé dans la session Flask ;
+les préférences sont lues et écrites via le magasin de l'application (app.user_settings).
 '''
 
-from flask import Blueprint, request, jsonify
-from config.user_settings import update_user_settings, get_user_settings
+import uuid
+from flask import Blueprint, request, jsonify, session, current_app
+from config.user_settings import SettingsError
 
 # Création d'un blueprint pour l'API des paramètres utilisateur
 user_settings_api = Blueprint('user_settings_api', __name__)
 
+# Clé de la session Flask qui contient l'identifiant de l'utilisateur
+SESSION_KEY = 'settings_id'
+
+
+def current_user_id(create=False):
+    '''
+    Identifiant de l'utilisateur courant (None s'il n'en a pas encore et que create est faux).
+    '''
+    user_id = session.get(SESSION_KEY)
+    if user_id is None and create:
+        user_id = session[SESSION_KEY] = uuid.uuid4().hex
+        session.permanent = True
+    return user_id
+
+
 @user_settings_api.route('/save_user_settings', methods=['POST'])
 def save_settings():
     '''
     Enregistre ou met à jour les préférences utilisateur reçues en JSON.
     '''
-    data = request.get_json()
-    update_user_settings(data)
+    data = request.get_json(silent=True)
+    try:
+        current_app.user_settings.update(current_user_id(create=True), data)
+    except SettingsError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify({'status': 'ok'})
 
+
 @user_settings_api.route('/get_user_settings', methods=['GET'])
 def get_settings():
     '''
     Retourne les préférences utilisateur enregistrées.
     '''
-    settings = get_user_settings()
-    return jsonify(settings)
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({})
+    return jsonify(current_app.user_settings.get(user_id))
+
+
+@user_settings_api.route('/api/user_settings/stats', methods=['GET'])
+def settings_stats():
+    '''
+    Retourne les mesures du cache et des écritures regroupées des préférences.
+    '''
+    return jsonify(current_app.user_settings.stats())
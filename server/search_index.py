@@ -0,0 +1,159 @@
+'''
+search_index.py
+Ce module construit, côté serveur, les index de recherche du portail d'information
+(parcs, bâtiments, sentiers, terrains de sport, adresses) pour l'application Canmore
+Incident Management. Chaque index est une liste triée de clés normalisées : la recherche
+exacte et les suggestions par préfixe se font par recherche binaire (bisect), sans envoyer
+le CSV au navigateur ; la recherche approximative utilise un index de trigrammes construit
+à la première requête. Un index n'est reconstruit que si son CSV a changé.
+'''
+
+from bisect import bisect_left
+import numpy as np
+from server.dataset_catalog import catalog
+from server.fuzzy_search import TrigramIndex, fold
+from server.db_pool import native_lock
+
+# Configuration des jeux de données consultables : fichier, colonne de recherche, champs retournés
+SEARCH_DATASETS = {
+    'parcs': {'file': 'parcs.csv', 'key': 'PARK_NAME', 'fields': ['PARK_NAME', 'FID', 'Shape_area', 'Shape_len']},
+    'buildings': {'file': 'buildings.csv', 'key': 'FAC_NAME', 'fields': ['FID', 'FAC_TYPE', 'FAC_NAME']},
+    'trails': {'file': 'trails.csv', 'key': 'NAME1', 'fields': ['FID', 'NAME1', 'WIDTH', 'MATERIAL', 'Shape_len']},
+    'sports_fields': {'file': 'sports_fields.csv', 'key': 'Location', 'fields': ['FID', 'Location', 'Shape_area', 'Shape_len']},
+    'addresses': {'file': 'Addresses.csv', 'key': 'FullCivicA', 'fields': ['FullCivicA', 'FID', 'UnitNumber', 'AddressNum', 'StreetName']},
+}
+
+# Nombre de suggestions par défaut et maximal
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(text):
+    '''
+    Clé de comparaison : espaces superflus retirés, insensible à la casse et aux accents.
+    '''
+    return fold(text)
+
+
+class PrefixIndex:
+    '''
+    Index trié d'une colonne : keys[i] est la clé normalisée de records[i].
+    '''
+
+    def __init__(self, records, key, fields, source=None, coordinates=None):
+        # coordinates : colonnes (longitudes, latitudes) alignées sur records, ajoutées à chaque enregistrement
+        entries = []
+        for i, row in enumerate(records):
+            value = (row.get(key) or '').strip()
+            if value:
+                record = {field: row.get(field, '') for field in fields}
+                if coordinates is not None and np.isfinite(coordinates[0][i]) and np.isfinite(coordinates[1][i]):
+                    record['longitude'] = round(float(coordinates[0][i]), 6)
+                    record['latitude'] = round(float(coordinates[1][i]), 6)
+                entries.append((normalize(value), value, record))
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        self.keys = [entry[0] for entry in entries]
+        self.values = [entry[1] for entry in entries]
+        self.records = [entry[2] for entry in entries]
+        # Instantané du catalogue à partir duquel l'index a été construit
+        self.source = source
+        self._trigrams = None
+        self._trigram_positions = None
+        self._lock = native_lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def exact(self, query):
+        '''
+        Retourne le premier enregistrement dont la clé est égale à la requête (casse ignorée), ou None.
+        '''
+        target = normalize(query)
+        i = bisect_left(self.keys, target)
+        if i < len(self.keys) and self.keys[i] == target:
+            return self.records[i]
+        return None
+
+    def prefix(self, prefix, limit=DEFAULT_LIMIT):
+        '''
+        Retourne au plus limit valeurs distinctes commençant par le préfixe, dans l'ordre alphabétique.
+        '''
+        target = normalize(prefix)
+        if not target:
+            return []
+        results = []
+        i = bisect_left(self.keys, target)
+        keys, values = self.keys, self.values
+        while i < len(keys) and len(results) < limit and keys[i].startswith(target):
+            if not results or results[-1] != values[i]:
+                results.append(values[i])
+            i += 1
+        return results
+
+    def _trigram_index(self):
+        '''
+        Index de trigrammes des clés distinctes, construit une seule fois à la première recherche approximative.
+        '''
+        if self._trigrams is None:
+            with self._lock:
+                if self._trigrams is None:
+                    keys, positions = [], []
+                    for i, key in enumerate(self.keys):
+                        if not keys or keys[-1] != key:
+                            keys.append(key)
+                            positions.append(i)
+                    self._trigram_positions = positions
+                    self._trigrams = TrigramIndex(keys)
+        return self._trigrams
+
+    def fuzzy(self, query, limit=DEFAULT_LIMIT):
+        '''
+        Recherche tolérante aux fautes : retourne au plus limit paires (valeur, distance d'édition),
+        les plus pertinentes d'abord. Les correspondances par préfixe passent en premier ;
+        une requête trop courte pour former un trigramme se limite à la recherche par préfixe.
+        '''
+        results = [(value, 0) for value in self.prefix(query, limit)]
+        if len(results) == limit or len(normalize(query)) < 3:
+            return results
+        seen = {value for value, _distance in results}
+        index = self._trigram_index()
+        for i, distance in index.search(query, limit + len(results)):
+            value = self.values[self._trigram_positions[i]]
+            if value not in seen:
+                seen.add(value)
+                results.append((value, distance))
+                if len(results) == limit:
+                    break
+        return results
+
+
+def wgs84_coordinates(dataset):
+    '''
+    Colonnes (longitudes, latitudes) précalculées d'un CSV en Web Mercator, ou None.
+    '''
+    try:
+        return dataset.records.numbers('longitude'), dataset.records.numbers('latitude')
+    except (AttributeError, KeyError):
+        return None
+
+
+_indexes = {}
+_indexes_lock = native_lock()
+
+
+def get_search_index(name):
+    '''
+    Retourne l'index d'un jeu de données consultable, reconstruit seulement si son CSV a changé.
+    Lève KeyError pour un nom inconnu et FileNotFoundError si le fichier est absent.
+    '''
+    config = SEARCH_DATASETS[name]
+    dataset = catalog.get(config['file'])
+    index = _indexes.get(name)
+    if index is not None and index.source is dataset:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.source is not dataset:
+            index = PrefixIndex(dataset.records, config['key'], config['fields'], dataset, wgs84_coordinates(dataset))
+            _indexes[name] = index
+    return index
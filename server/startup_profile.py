@@ -0,0 +1,109 @@
+'''
+startup_profile.py
+Ce module mesure le démarrage de l'application Canmore Incident Management : durée d'import de
+chaque module (cumulée, imports imbriqués compris) et durée de chaque phase d'initialisation
+(base de données, Socket.IO, blueprints, préchauffage). Les phases sont toujours mesurées (coût
+négligeable) ; la mesure des imports s'active avec --profile-startup ou CANMORE_PROFILE_STARTUP=1.
+'''
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Mesure des imports activée par variable d'environnement (python main.py --profile-startup l'active aussi)
+PROFILE_STARTUP = os.environ.get('CANMORE_PROFILE_STARTUP') == '1'
+
+
+class TimedLoader:
+    '''
+    Enveloppe le chargeur d'un module pour mesurer la durée de son exécution.
+    '''
+
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer.imports[module.__name__] = time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTimer:
+    '''
+    Chercheur de modules (sys.meta_path) qui délègue aux autres chercheurs et mesure
+    la durée cumulée d'exécution de chaque module importé.
+    '''
+
+    def __init__(self):
+        self.imports = {}
+        self._local = threading.local()
+
+    def find_spec(self, name, path=None, target=None):
+        if getattr(self._local, 'busy', False):
+            return None
+        self._local.busy = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                        spec.loader = TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._local.busy = False
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+# Durées des phases d'initialisation, dans l'ordre : [(nom, secondes)]
+phases = []
+_phases_lock = threading.Lock()
+
+
+@contextmanager
+def phase(name):
+    '''
+    Mesure la durée d'une phase de démarrage (ex. with phase('init_db'): ...).
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _phases_lock:
+            phases.append((name, time.perf_counter() - start))
+
+
+def report(import_timer=None, top=25):
+    '''
+    Rapport texte : modules les plus lents à importer, puis phases d'initialisation.
+    '''
+    lines = []
+    if import_timer is not None:
+        lines.append(f'Imports les plus lents (cumulés, {len(import_timer.imports)} modules) :')
+        slowest = sorted(import_timer.imports.items(), key=lambda item: item[1], reverse=True)[:top]
+        lines.extend(f'  {seconds * 1000:9.1f} ms  {name}' for name, seconds in slowest)
+    lines.append("Phases d'initialisation :")
+    with _phases_lock:
+        recorded = list(phases)
+    lines.extend(f'  {seconds * 1000:9.1f} ms  {name}' for name, seconds in recorded)
+    return '\n'.join(lines)
@@ -0,0 +1,62 @@
+'''
+tasks.py
+Ce module exécute des tâches de fond hors du chemin critique des requêtes
+(ex. enrichissement des incidents) pour l'application Canmore Incident Management.
+Un seul thread de travail traite les tâches dans l'ordre de soumission. C'est un vrai thread
+système, même en mode eventlet/gevent : une tâche (index, SQLite) ne bloque pas la boucle
+d'événements, et une tâche peut en soumettre une autre depuis n'importe quel thread.
+'''
+
+import logging
+import time
+from server.db_pool import native_lock, original
+
+logger = logging.getLogger(__name__)
+
+# File des tâches, sans verrou coopératif : alimentée par la boucle d'événements comme par le pool
+_queue = original('queue', 'SimpleQueue')()
+_pending = 0
+_pending_lock = native_lock()
+_worker_started = False
+
+
+def _work():
+    global _pending
+    while True:
+        fn, args, kwargs = _queue.get()
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            logger.exception("Tâche de fond %s échouée", getattr(fn, '__name__', fn))
+        finally:
+            with _pending_lock:
+                _pending -= 1
+
+
+def submit(fn, *args, **kwargs):
+    '''
+    Planifie fn(*args, **kwargs) en arrière-plan (le thread de travail démarre à la première tâche).
+    Les exceptions sont journalisées (avec la trace) sans interrompre le thread de travail.
+    '''
+    global _pending, _worker_started
+    with _pending_lock:
+        _pending += 1
+        start = not _worker_started
+        _worker_started = True
+    _queue.put((fn, args, kwargs))
+    if start:
+        original('_thread', 'start_new_thread')(_work, ())
+
+
+def drain(timeout=None, interval=0.01):
+    '''
+    Attend la fin de toutes les tâches soumises (utile aux tests et à l'arrêt).
+    Retourne True si toutes les tâches sont terminées avant le délai.
+    '''
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while _pending:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        # time.sleep coopératif en mode eventlet/gevent : la boucle continue de tourner
+        time.sleep(interval)
+    return True
@@ -6,7 +6,36 @@
 // Connexion et état Socket.IO
 const socket = io(); // Se connecte automatiquement à l'origine du site (Flask)
 
+// Zone de la carte à laquelle le client est abonné (null : tous les incidents, ex. page de rapport)
+var subscribedBounds = null;
+
+// Abonne le client à la zone visible de la carte, avec une marge d'une demi-vue autour de l'écran.
+// Le serveur n'envoie plus que les incidents de cette zone : si la vue en sort, l'abonnement est
+// renouvelé et les marqueurs sont resynchronisés (événements manqués hors de l'ancienne zone).
+function subscribeToMapView(force) {
+    if (!window.map || typeof window.map.getBounds !== 'function') return;
+    var view = window.map.getBounds();
+    if (!force && subscribedBounds && subscribedBounds.contains(view)) return;
+    var resync = subscribedBounds !== null;
+    subscribedBounds = view.pad(0.5);
+    socket.emit('subscribe', {
+        bbox: [subscribedBounds.getWest(), subscribedBounds.getSouth(),
+               subscribedBounds.getEast(), subscribedBounds.getNorth()]
+    });
+    if (resync && typeof window.displayAllIncidents === 'function') {
+        window.displayAllIncidents(window.map);
+    }
+}
+
+window.addEventListener('load', function() {
+    if (!window.map || typeof window.map.on !== 'function') return;
+    window.map.on('moveend', function() { subscribeToMapView(false); });
+    if (socket.connected) subscribeToMapView(false);
+});
+
 socket.on('connect', function() {
+    // Reconnexion : nouvel identifiant de socket, l'abonnement est renvoyé
+    subscribeToMapView(true);
     const wsMsg = document.createElement('div');
     wsMsg.textContent = 'Mise à jour en temps réel ACTIVÉE (Socket.IO)';
     wsMsg.style.position = 'fixed';
@@ -66,10 +95,8 @@ socket.on('message', function(msg) {
     }
 });
 
-socket.on('incident_added', function(data) {
-    if (typeof window.displayAllIncidents === 'function' && window.map) {
-        window.displayAllIncidents(window.map);
-    }
+// Recharge le tableau et le résumé de la page de rapport
+function refreshReport() {
     if (typeof updateTable === 'function' && typeof updateSummary === 'function') {
         fetch('/api/incidents')
             .then(res => res.json())
@@ -79,36 +106,31 @@ socket.on('incident_added', function(data) {
                 updateSummary(data);
             });
     }
-});
+}
 
-socket.on('incident_updated', function(data) {
-    if (typeof window.displayAllIncidents === 'function' && window.map) {
+// Applique un incident complet sur la carte (ajout ou mise à jour sur place)
+function applyIncidentToMap(incident) {
+    if (!window.map) return;
+    if (typeof window.upsertIncident === 'function' && incident && incident.id !== undefined) {
+        window.upsertIncident(window.map, incident);
+    } else if (typeof window.displayAllIncidents === 'function') {
         window.displayAllIncidents(window.map);
     }
-    if (typeof updateTable === 'function' && typeof updateSummary === 'function') {
-        fetch('/api/incidents')
-            .then(res => res.json())
-            .then(data => {
-                allIncidents = data;
-                updateTable(data);
-                updateSummary(data);
-            });
-    }
-});
+}
 
-socket.on('incident_deleted', function(data) {
-    if (typeof window.displayAllIncidents === 'function' && window.map) {
-        window.displayAllIncidents(window.map);
-    }
-    if (typeof updateTable === 'function' && typeof updateSummary === 'function') {
-        fetch('/api/incidents')
-            .then(res => res.json())
-            .then(data => {
-                allIncidents = data;
-                updateTable(data);
-                updateSummary(data);
-            });
-    }
+// Trame regroupée : les événements d'une courte fenêtre, déjà fusionnés par incident côté serveur.
+// Les marqueurs sont mis à jour un par un, le rapport n'est rechargé qu'une fois par trame.
+socket.on('incidents_batch', function(batch) {
+    (batch.events || []).forEach(function(event) {
+        if (event.type === 'incident_deleted') {
+            if (window.map && typeof window.removeIncident === 'function') {
+                window.removeIncident(window.map, event.incident.id);
+            }
+        } else {
+            applyIncidentToMap(event.incident);
+        }
+    });
+    refreshReport();
 });
 
 // Utilitaires
@@ -45,10 +45,10 @@ window.setupIncidentReporting = function(map) {
     // Affiche tous les incidents existants au chargement de la carte
     window.displayAllIncidents(map);
 
-    // Ajoute les écouteurs sur les filtres incidents
+    // Ajoute les écouteurs sur les filtres incidents (visibilité des groupes, sans rechargement)
     document.querySelectorAll('.incident-filter').forEach(function(checkbox) {
         checkbox.addEventListener('change', function() {
-            window.displayAllIncidents(map);
+            window.applyIncidentFilters(map);
         });
     });
 
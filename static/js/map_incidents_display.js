@@ -1,131 +1,230 @@
 /**
  * map_incidents_display.js
  * Affichage et gestion (CRUD) des incidents sur la carte
+ * Les marqueurs sont indexés par identifiant et mis à jour sur place à chaque événement
  */
 
-// Stockage des marqueurs d'incidents
-var incidentMarkers = [];
+// Marqueurs d'incidents indexés par identifiant (Map<id, marqueur>)
+var incidentMarkers = new Map();
 
-// Affiche tous les incidents sur la carte avec filtrage
-window.displayAllIncidents = function(map) {
-    // Supprime les anciens marqueurs
-    incidentMarkers.forEach(function(m) { map.removeLayer(m); });
-    incidentMarkers = [];
-    fetch('/api/incidents')
-        .then(res => res.json())
-        .then(incidents => {
-            // Lit les filtres cochés (résolu/non résolu)
-            var showUnsolved = document.querySelector('.incident-filter[data-status="unsolved"]').checked;
-            var showSolved = document.querySelector('.incident-filter[data-status="solved"]').checked;
-            incidents.forEach(incident => {
-                var isSolved = (incident.status === 'solved' || incident.status === 'résolu');
-                if ((isSolved && !showSolved) || (!isSolved && !showUnsolved)) {
-                    return; // Ne pas afficher ce marqueur
-                }
-                var iconUrl = isSolved
-                    ? 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png'
-                    : 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png';
-                var markerIcon = L.icon({
-                    iconUrl: iconUrl,
-                    shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png',
-                    iconSize: [25, 41],
-                    iconAnchor: [12, 41],
-                    popupAnchor: [1, -34],
-                    shadowSize: [41, 41]
+// Un groupe de couches par statut : les filtres masquent ou affichent un groupe entier
+var incidentLayers = {
+    unsolved: L.layerGroup(),
+    solved: L.layerGroup()
+};
+
+// Au-delà de ce nombre d'incidents, les marqueurs sont dessinés sur un canvas (cercles)
+var CANVAS_MARKER_THRESHOLD = 1000;
+var canvasRenderer = null;
+var useCanvasMarkers = false;
+
+// Une seule icône par statut, partagée par tous les marqueurs
+function makeIncidentIcon(color) {
+    return L.icon({
+        iconUrl: 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-' + color + '.png',
+        shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png',
+        iconSize: [25, 41],
+        iconAnchor: [12, 41],
+        popupAnchor: [1, -34],
+        shadowSize: [41, 41]
+    });
+}
+var incidentIcons = {
+    unsolved: makeIncidentIcon('red'),
+    solved: makeIncidentIcon('grey')
+};
+
+// Styles des cercles en mode canvas
+var incidentCircleStyles = {
+    unsolved: { radius: 6, color: '#8b0000', weight: 1, fillColor: '#d32f2f', fillOpacity: 0.9 },
+    solved: { radius: 6, color: '#555555', weight: 1, fillColor: '#9e9e9e', fillOpacity: 0.9 }
+};
+
+// Libellés des couches de référence (élément le plus proche d'un incident)
+var featureLayerLabels = {
+    trails: 'Sentier',
+    parcs: 'Parc',
+    buildings: 'Bâtiment',
+    sports_fields: 'Terrain de sport'
+};
+
+// Statut normalisé d'un incident : 'solved' ou 'unsolved'
+function incidentStatusKey(incident) {
+    return (incident.status === 'solved' || incident.status === 'résolu') ? 'solved' : 'unsolved';
+}
+
+// Construit le HTML du popup (appelé seulement à l'ouverture du popup)
+function incidentPopupHtml(incident) {
+    var isSolved = incidentStatusKey(incident) === 'solved';
+    // Formate le timestamp pour un affichage convivial
+    var formattedTime = '';
+    if (incident.timestamp) {
+        var date = new Date(incident.timestamp);
+        var options = { year: 'numeric', month: 'long', day: 'numeric', hour: '2-digit', minute: '2-digit' };
+        formattedTime = date.toLocaleDateString('fr-FR', options);
+    }
+    var popupHtml = '<b>Incident signalé</b><br>' +
+        'Sujet : ' + (incident.type || '') + '<br>' +
+        'Détail : ' + (incident.description || '') + '<br>' +
+        (incident.nearest_address ? 'Adresse la plus proche : ' + incident.nearest_address +
+            ' (' + Math.round(incident.nearest_address_m) + ' m)<br>' : '') +
+        (incident.feature_layer ? 'Élément le plus proche : ' + (featureLayerLabels[incident.feature_layer] || incident.feature_layer) +
+            ' n° ' + incident.nearest_feature_id + ' (' + Math.round(incident.distance_m) + ' m)<br>' : '') +
+        'Horodatage : ' + (formattedTime || incident.timestamp || '') + '<br>';
+
+    // Si admin, ajoute le menu déroulant de statut et le bouton de mise à jour
+    if (window.isAdmin) {
+        popupHtml +=
+            '<div style="margin-top:8px">' +
+            '<label for="status-select-' + incident.id + '">Statut :</label> ' +
+            '<select id="status-select-' + incident.id + '" style="margin-left:4px;padding:4px 8px;border-radius:4px;border:1px solid #ccc !important;background:#fff !important;color:#333 !important;">' +
+            '<option value="unsolved"' + (!isSolved ? ' selected' : '') + '>Non résolu</option>' +
+            '<option value="solved"' + (isSolved ? ' selected' : '') + '>Résolu</option>' +
+            '</select><br><br>' +
+            '<button id="update-status-btn-' + incident.id + '" class="admin-status-btn" style="background:#6c757d !important;color:white !important;border:none !important;padding:6px 12px;border-radius:4px;cursor:pointer;font-weight:500;">Mettre à jour le statut</button> ' +
+            '<button id="delete-incident-btn-' + incident.id + '" class="admin-delete-btn" style="background:#d32f2f !important;color:white !important;border:none !important;padding:6px 12px;border-radius:4px;cursor:pointer;font-weight:500;">Supprimer</button>' +
+            '</div>';
+    }
+    return popupHtml;
+}
+
+// Branche les boutons admin du popup ouvert (l'incident est relu sur le marqueur : toujours à jour)
+function bindAdminActions(map, marker) {
+    var incident = marker.incident;
+    var btn = document.getElementById('update-status-btn-' + incident.id);
+    var select = document.getElementById('status-select-' + incident.id);
+    var delBtn = document.getElementById('delete-incident-btn-' + incident.id);
+    if (btn && select) {
+        btn.onclick = function() {
+            var newStatus = select.value;
+            // Envoie la mise à jour du statut au backend
+            fetch('/api/incidents/' + incident.id, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ status: newStatus })
+            })
+            .then(res => {
+                if (!res.ok) throw new Error('Erreur lors de la mise à jour du statut');
+                return res.json();
+            })
+            .then(data => {
+                marker.closePopup(); // Ferme le popup après la mise à jour
+                window.upsertIncident(map, Object.assign({}, marker.incident, { status: newStatus }));
+            })
+            .catch(err => {
+                alert('Erreur lors de la mise à jour du statut: ' + err.message);
+            });
+        };
+    }
+    if (delBtn) {
+        delBtn.onclick = function() {
+            if (confirm('Êtes-vous sûr de vouloir supprimer cet incident ?')) {
+                fetch('/api/incidents/' + incident.id, {
+                    method: 'DELETE'
+                })
+                .then(res => {
+                    if (!res.ok) throw new Error('Erreur lors de la suppression');
+                    return res.json();
+                })
+                .then(data => {
+                    window.removeIncident(map, incident.id); // Retire le marqueur après suppression
+                })
+                .catch(err => {
+                    alert('Erreur lors de la suppression: ' + err.message);
                 });
-                var marker = L.marker([incident.latitude, incident.longitude], {icon: markerIcon}).addTo(map);
-                incidentMarkers.push(marker);
+            }
+        };
+    }
+}
 
-                // Formate le timestamp pour un affichage convivial
-                var formattedTime = '';
-                if (incident.timestamp) {
-                    var date = new Date(incident.timestamp);
-                    var options = { year: 'numeric', month: 'long', day: 'numeric', hour: '2-digit', minute: '2-digit' };
-                    formattedTime = date.toLocaleDateString('fr-FR', options);
-                }
+// Crée le marqueur d'un incident (icône partagée, ou cercle sur canvas pour les grands volumes)
+function createIncidentMarker(map, incident) {
+    var status = incidentStatusKey(incident);
+    var latlng = [incident.latitude, incident.longitude];
+    var marker = useCanvasMarkers
+        ? L.circleMarker(latlng, Object.assign({ renderer: canvasRenderer }, incidentCircleStyles[status]))
+        : L.marker(latlng, { icon: incidentIcons[status] });
+    marker.incident = incident;
+    marker.statusKey = status;
+    marker.bindPopup(function() { return incidentPopupHtml(marker.incident); });
+    if (window.isAdmin) {
+        marker.on('popupopen', function() { bindAdminActions(map, marker); });
+    }
+    incidentLayers[status].addLayer(marker);
+    return marker;
+}
 
-                // Construit le HTML du popup pour chaque incident
-                var popupHtml = '<b>Incident signalé</b><br>' +
-                    'Sujet : ' + (incident.type || '') + '<br>' +
-                    'Détail : ' + (incident.description || '') + '<br>' +
-                    'Horodatage : ' + (formattedTime || incident.timestamp || '') + '<br>';
+// Ajoute ou met à jour un incident sur place (position, statut, contenu du popup)
+window.upsertIncident = function(map, incident) {
+    if (incident.id === undefined || incident.id === null) return;
+    var marker = incidentMarkers.get(incident.id);
+    if (!marker) {
+        incidentMarkers.set(incident.id, createIncidentMarker(map, incident));
+        return;
+    }
+    incident = Object.assign({}, marker.incident, incident);
+    marker.incident = incident;
+    if (incident.latitude !== undefined && incident.longitude !== undefined) {
+        marker.setLatLng([incident.latitude, incident.longitude]);
+    }
+    var status = incidentStatusKey(incident);
+    if (status !== marker.statusKey) {
+        // Change de groupe (visibilité du filtre) et de style partagé
+        incidentLayers[marker.statusKey].removeLayer(marker);
+        if (useCanvasMarkers) {
+            marker.setStyle(incidentCircleStyles[status]);
+        } else {
+            marker.setIcon(incidentIcons[status]);
+        }
+        marker.statusKey = status;
+        incidentLayers[status].addLayer(marker);
+    }
+};
 
-                // Si admin, ajoute le menu déroulant de statut et le bouton de mise à jour
-                if (window.isAdmin) {
-                    popupHtml +=
-                        '<div style="margin-top:8px">' +
-                        '<label for="status-select-' + incident.id + '">Statut :</label> ' +
-                        '<select id="status-select-' + incident.id + '" style="margin-left:4px;padding:4px 8px;border-radius:4px;border:1px solid #ccc !important;background:#fff !important;color:#333 !important;">' +
-                        '<option value="unsolved"' + (!isSolved ? ' selected' : '') + '>Non résolu</option>' +
-                        '<option value="solved"' + (isSolved ? ' selected' : '') + '>Résolu</option>' +
-                        '</select><br><br>' +
-                        '<button id="update-status-btn-' + incident.id + '" class="admin-status-btn" style="background:#6c757d !important;color:white !important;border:none !important;padding:6px 12px;border-radius:4px;cursor:pointer;font-weight:500;">Mettre à jour le statut</button> ' +
-                        '<button id="delete-incident-btn-' + incident.id + '" class="admin-delete-btn" style="background:#d32f2f !important;color:white !important;border:none !important;padding:6px 12px;border-radius:4px;cursor:pointer;font-weight:500;">Supprimer</button>' +
-                        '</div>';
-                }
+// Retire un incident de la carte
+window.removeIncident = function(map, id) {
+    var marker = incidentMarkers.get(id);
+    if (marker) {
+        incidentLayers[marker.statusKey].removeLayer(marker);
+        incidentMarkers.delete(id);
+    }
+};
 
-                marker.bindPopup(popupHtml);
+// Affiche ou masque les groupes selon les filtres cochés (résolu/non résolu), sans recréer de marqueur
+window.applyIncidentFilters = function(map) {
+    Object.keys(incidentLayers).forEach(function(status) {
+        var checkbox = document.querySelector('.incident-filter[data-status="' + status + '"]');
+        var visible = !checkbox || checkbox.checked;
+        if (visible && !map.hasLayer(incidentLayers[status])) {
+            incidentLayers[status].addTo(map);
+        } else if (!visible && map.hasLayer(incidentLayers[status])) {
+            map.removeLayer(incidentLayers[status]);
+        }
+    });
+};
 
-                // Ajoute un écouteur d'événement pour la mise à jour du statut si admin
-                if (window.isAdmin) {
-                    marker.on('popupopen', function() {
-                        var btn = document.getElementById('update-status-btn-' + incident.id);
-                        var select = document.getElementById('status-select-' + incident.id);
-                        var delBtn = document.getElementById('delete-incident-btn-' + incident.id);
-                        if (btn && select) {
-                            btn.onclick = function() {
-                                var newStatus = select.value;
-                                // Envoie la mise à jour du statut au backend
-                                fetch('/api/incidents/' + incident.id, {
-                                    method: 'PATCH',
-                                    headers: { 'Content-Type': 'application/json' },
-                                    body: JSON.stringify({ status: newStatus })
-                                })
-                                .then(res => {
-                                    if (!res.ok) throw new Error('Erreur lors de la mise à jour du statut');
-                                    return res.json();
-                                })
-                                .then(data => {
-                                    var newIconUrl = newStatus === 'solved'
-                                        ? 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-grey.png'
-                                        : 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png';
-                                    marker.setIcon(L.icon({
-                                        iconUrl: newIconUrl,
-                                        shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png',
-                                        iconSize: [25, 41],
-                                        iconAnchor: [12, 41],
-                                        popupAnchor: [1, -34],
-                                        shadowSize: [41, 41]
-                                    }));
-                                    marker.closePopup(); // Ferme le popup après la mise à jour
-                                })
-                                .catch(err => {
-                                    alert('Erreur lors de la mise à jour du statut: ' + err.message);
-                                });
-                            };
-                        }
-                        if (delBtn) {
-                            delBtn.onclick = function() {
-                                if (confirm('Êtes-vous sûr de vouloir supprimer cet incident ?')) {
-                                    fetch('/api/incidents/' + incident.id, {
-                                        method: 'DELETE'
-                                    })
-                                    .then(res => {
-                                        if (!res.ok) throw new Error('Erreur lors de la suppression');
-                                        return res.json();
-                                    })
-                                    .then(data => {
-                                        marker.remove(); // Retire le marqueur après suppression
-                                    })
-                                    .catch(err => {
-                                        alert('Erreur lors de la suppression: ' + err.message);
-                                    });
-                                }
-                            };
-                        }
-                    });
-                }
+// Charge tous les incidents et synchronise les marqueurs (ajouts, mises à jour, suppressions)
+window.displayAllIncidents = function(map) {
+    fetch('/api/incidents')
+        .then(res => res.json())
+        .then(incidents => {
+            var canvas = incidents.length > CANVAS_MARKER_THRESHOLD;
+            if (canvas !== useCanvasMarkers) {
+                // Changement de rendu : les marqueurs existants sont recréés une seule fois
+                useCanvasMarkers = canvas;
+                if (canvas && !canvasRenderer) canvasRenderer = L.canvas({ padding: 0.5 });
+                Object.keys(incidentLayers).forEach(function(status) { incidentLayers[status].clearLayers(); });
+                incidentMarkers.clear();
+            }
+            var seen = new Set();
+            incidents.forEach(function(incident) {
+                seen.add(incident.id);
+                window.upsertIncident(map, incident);
+            });
+            Array.from(incidentMarkers.keys()).forEach(function(id) {
+                if (!seen.has(id)) window.removeIncident(map, id);
             });
+            window.applyIncidentFilters(map);
         })
         .catch(err => {
             console.error('Erreur lors du chargement des incidents :', err);
@@ -3,11 +3,29 @@
  * Gestion du formulaire de signalement d'incident
  */
 
+// Types d'incidents chargés une seule fois par page (promesse partagée entre les clics)
+var incidentTypesPromise = null;
+
+// Retourne la liste des types d'incidents, récupérée depuis l'URL versionnée au premier appel
+window.loadIncidentTypes = function() {
+    if (!incidentTypesPromise) {
+        incidentTypesPromise = fetch(window.INCIDENT_TYPES_URL || '/api/incident_types')
+            .then(res => {
+                if (!res.ok) throw new Error('Erreur lors du chargement des types d\'incidents');
+                return res.json();
+            })
+            .catch(err => {
+                incidentTypesPromise = null; // Réessaie au prochain clic
+                throw err;
+            });
+    }
+    return incidentTypesPromise;
+};
+
 // Affiche le formulaire de signalement d'incident
 window.showIncidentForm = function(map, latlng) {
-    // Récupère les types d'incidents depuis l'API et affiche le formulaire
-    fetch('/api/incident_types')
-        .then(res => res.json())
+    // Récupère les types d'incidents (en cache) et affiche le formulaire
+    window.loadIncidentTypes()
         .then(function(incidentTypes) {
             var subjectOptions = `<option value="" disabled selected>Choisissez un sujet</option>` +
                 incidentTypes.map(function(type, idx) {
@@ -113,8 +131,17 @@ window.showIncidentForm = function(map, latlng) {
                             headers: { 'Content-Type': 'application/json' },
                             body: JSON.stringify(incidentData)
                         })
-                        .then(res => res.json())
-                        .then(data => {
+                        .then(res => res.json().then(data => ({ ok: res.ok, data: data })))
+                        .then(result => {
+                            // Le marqueur provisoire est remplacé par celui de l'incident enregistré
+                            map.removeLayer(marker);
+                            if (result.ok && result.data.incident && typeof window.upsertIncident === 'function') {
+                                window.upsertIncident(map, result.data.incident);
+                            }
+                            // Le serveur valide aussi la limite : alerte si l'incident est refusé
+                            if (!result.ok) {
+                                alert(result.data.error || 'Le signalement a été refusé.');
+                            }
                         })
                         .catch(err => {
                         });
@@ -4,6 +4,37 @@
  * Gestion universelle du mode sombre (dark mode) et des préférences utilisateur.
  */
 
+// Préférences en attente d'envoi : les changements rapprochés (bascules répétées) sont
+// fusionnés et envoyés en une seule requête après un court délai
+var pendingUserSettings = {};
+var userSettingsTimer = null;
+var USER_SETTINGS_DELAY_MS = 400;
+
+function saveUserSettings(values) {
+    Object.assign(pendingUserSettings, values);
+    clearTimeout(userSettingsTimer);
+    userSettingsTimer = setTimeout(flushUserSettings, USER_SETTINGS_DELAY_MS);
+}
+
+function flushUserSettings(keepalive) {
+    clearTimeout(userSettingsTimer);
+    userSettingsTimer = null;
+    if (Object.keys(pendingUserSettings).length === 0) return;
+    var body = JSON.stringify(pendingUserSettings);
+    pendingUserSettings = {};
+    fetch('/save_user_settings', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: body,
+        keepalive: keepalive === true
+    });
+}
+
+// Envoie les préférences en attente si la page est quittée avant la fin du délai
+window.addEventListener('pagehide', function() {
+    flushUserSettings(true);
+});
+
 function initThemeToggle({darkCss, storageKey, icon, iconClass, defaultMode = 'light'}) {
     // Création du bouton paramètres et du modal si absents
     storageKey = storageKey || 'darkModeGlobal';
@@ -124,11 +155,7 @@ function initThemeToggle({darkCss, storageKey, icon, iconClass, defaultMode = 'l
                 }
                 if (closeBtn) closeBtn.style.color = '#e0e0e0';
                 localStorage.setItem(storageKey, 'true');
-                fetch('/save_user_settings', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ [storageKey]: true })
-                });
+                saveUserSettings({ [storageKey]: true });
             } else {
                 if (headerDarkCss) headerDarkCss.disabled = true;
                 if (pageDarkCss) {
@@ -137,7 +164,8 @@ function initThemeToggle({darkCss, storageKey, icon, iconClass, defaultMode = 'l
                     darkLink.remove();
                     darkLink = null;
                 } else if (darkCss) {
-                    var links = document.querySelectorAll('link[href$="' + darkCss.split('/').pop() + '"]');
+                    // Ignore l'empreinte de version (?v=...) ajoutée par asset_url()
+                    var links = document.querySelectorAll('link[href*="' + darkCss.split('/').pop().split('?')[0] + '"]');
                     links.forEach(l => l.remove());
                 }
                 document.body.classList.remove('dark-mode');
@@ -148,11 +176,7 @@ function initThemeToggle({darkCss, storageKey, icon, iconClass, defaultMode = 'l
                 }
                 if (closeBtn) closeBtn.style.color = '#333333';
                 localStorage.setItem(storageKey, 'false');
-                fetch('/save_user_settings', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ [storageKey]: false })
-                });
+                saveUserSettings({ [storageKey]: false });
             }
         }
 
@@ -88,8 +88,8 @@ class TestAPIEndpoints(unittest.TestCase):
         incident_data = {
             'type': 'Nid de poule',
             'description': 'Grand trou dans la route',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'timestamp': '2024-02-02T10:00:00Z'
         }
         
@@ -110,8 +110,8 @@ class TestAPIEndpoints(unittest.TestCase):
         incident_data = {
             'type': 'Pothole',
             'description': 'Test incident',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'timestamp': '2024-02-02T10:00:00Z'
         }
         
@@ -138,7 +138,7 @@ class TestAPIEndpoints(unittest.TestCase):
         incident_data = {
             'type': 'Nid de poule',
             'description': 'Grand trou',
-            'longitude': -115.3667,  # latitude manquante
+            'longitude': -115.359,  # latitude manquante
             'timestamp': '2024-02-02T10:00:00Z'
         }
         
@@ -158,7 +158,7 @@ class TestAPIEndpoints(unittest.TestCase):
         incident_data = {
             'type': 'Arbre tombé',
             'description': 'Grand arbre en travers de la route',
-            'latitude': 51.0447,
+            'latitude': 51.089,
             'timestamp': '2024-02-02T10:00:00Z'
             # longitude manquante
         }
@@ -178,8 +178,8 @@ class TestAPIEndpoints(unittest.TestCase):
         """
         incident_data = {
             'description': 'Un problème',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'timestamp': '2024-02-02T10:00:00Z'
             # type manquant
         }
@@ -236,8 +236,8 @@ class TestAPIEndpoints(unittest.TestCase):
         incident_data = {
             'type': 'Test',
             'description': 'Test',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'timestamp': '2024-02-02T10:00:00Z'
         }
         
@@ -265,8 +265,8 @@ class TestAPIEndpoints(unittest.TestCase):
         incident_data = {
             'type': 'Integration Test',
             'description': 'Test d\'intégration POST/GET',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'timestamp': '2024-02-02T10:00:00Z'
         }
         
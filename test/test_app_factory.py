@@ -0,0 +1,104 @@
+"""
+test_app_factory.py
+Tests pour la fabrique d'application - Configuration de la base, démarrage différé
+
+Importance: Les workers de production et les tests doivent pouvoir construire l'application sur
+une base choisie, sans que l'import des modules crée des fichiers ou lance des travaux. Ces
+tests vérifient que create_app() applique sa configuration et que l'import reste sans effet.
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.app_factory import create_app, PROJECT_DIR
+from server.dataset_catalog import catalog
+from server.routes import incidents_api
+from config import user_settings
+
+
+class TestAppFactory(unittest.TestCase):
+    """
+    Tests de create_app() sur un dossier de données temporaire
+
+    Vérifie que:
+    - La base est créée dans le dossier configuré
+    - Les routes lisent cette base
+    - L'import des modules ne crée aucun fichier
+    - create_app() n'ajoute pas de hook atexit à chaque appel
+    """
+
+    def setUp(self):
+        """Dossier temporaire ; la base et le catalogue de l'application principale sont restaurés"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(incidents_api.configure_storage, incidents_api.DB_PATH)
+        self.addCleanup(setattr, catalog, 'compiled_dir', catalog.compiled_dir)
+
+    def test_configured_storage(self):
+        """
+        Test: create_app() crée la base dans DATA_DIR et les routes la lisent
+        Importance: Vérifie qu'un test ou un worker peut utiliser sa propre base
+        """
+        data = os.path.join(self.tmp_dir, 'data')
+        factory_app = create_app({'DATA_DIR': data, 'WARM_UP': 'off', 'TESTING': True})
+        db_path = os.path.join(data, 'incidents.db')
+        self.assertEqual(factory_app.config['DB_PATH'], db_path)
+        self.assertEqual(catalog.compiled_dir, os.path.join(data, 'compiled'))
+        conn = sqlite3.connect(db_path)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        self.assertTrue({'incidents', 'incident_subjects', 'incident_details'} <= tables)
+        client = factory_app.test_client()
+        self.assertEqual(client.get('/api/incidents').get_json(), [])
+        self.assertIsNot(factory_app.event_coalescer, app.event_coalescer)
+        self.assertEqual(client.get('/api/realtime/stats').get_json()['subscribers'], 0)
+
+    def test_no_atexit_hook_per_app(self):
+        """
+        Test: create_app() ne fait qu'inscrire ses préférences utilisateur auprès du hook d'arrêt unique
+        Importance: Des applications créées en boucle (tests) ne gardent pas chacune un hook et son magasin
+        """
+        with mock.patch('atexit.register') as register:
+            factory_app = create_app({'DATA_DIR': os.path.join(self.tmp_dir, 'data'), 'WARM_UP': 'off'})
+        register.assert_not_called()
+        self.assertIn(factory_app.user_settings, user_settings._flush_at_exit)
+
+    def test_import_has_no_side_effects(self):
+        """
+        Test: Importer la fabrique ne crée pas le dossier de données ; create_app() le crée
+        Importance: Vérifie que le démarrage est différé jusqu'à la création de l'application
+        """
+        data = os.path.join(self.tmp_dir, 'sub')
+        env = dict(os.environ, CANMORE_DATA_DIR=data)
+        code = ('import os, sys; import server.app_factory as f; '
+                'assert not os.path.exists(sys.argv[1]); '
+                "f.create_app({'WARM_UP': 'off'}); "
+                "assert os.path.exists(os.path.join(sys.argv[1], 'incidents.db'))")
+        result = subprocess.run([sys.executable, '-c', code, data], cwd=PROJECT_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
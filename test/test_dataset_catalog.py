@@ -0,0 +1,189 @@
+"""
+test_dataset_catalog.py
+Tests pour le catalogue des données de référence - Chargement unique, index FID, rechargement
+
+Importance: Les tests du catalogue vérifient que les fichiers de static/data sont lus une seule fois,
+que les totaux et les recherches par FID sont servis depuis la mémoire, et qu'un fichier modifié
+est rechargé sans jamais exposer un état à moitié construit.
+"""
+
+import unittest
+import json
+import sys
+import os
+import tempfile
+import shutil
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.dataset_catalog import DatasetCatalog
+
+
+def write_geojson(path, features):
+    """Écrit une FeatureCollection minimale dans un fichier."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def point_feature(fid, lon, lat, name):
+    """Construit une entité Point GeoJSON."""
+    return {
+        'type': 'Feature',
+        'properties': {'FID': fid, 'NAME': name},
+        'geometry': {'type': 'Point', 'coordinates': [lon, lat]}
+    }
+
+
+class TestDatasetCatalog(unittest.TestCase):
+    """
+    Tests du catalogue sur un dossier temporaire
+
+    Vérifie que:
+    - Le nombre d'entités, la bbox et le schéma sont calculés au chargement
+    - L'index FID retourne la bonne entité
+    - Un fichier modifié est rechargé dans un nouvel instantané
+    """
+
+    def setUp(self):
+        """Crée un dossier de données temporaire"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'points.geojson')
+        write_geojson(self.path, [
+            point_feature(1, -115.40, 51.05, 'A'),
+            point_feature(2, -115.30, 51.10, 'B'),
+        ])
+        with open(os.path.join(self.tmp_dir, 'rows.csv'), 'w', encoding='utf-8-sig') as f:
+            f.write('FID,NAME,LEN\n1,Alpha,1.5\n2,Beta,2\n')
+        self.catalog = DatasetCatalog(self.tmp_dir, check_interval=0)
+
+    def tearDown(self):
+        """Supprime le dossier temporaire"""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_count_bbox_and_schema(self):
+        """
+        Test: Le résumé contient le nombre d'entités, la bbox et le schéma
+        Importance: Vérifie les métadonnées mises en cache au chargement
+        """
+        dataset = self.catalog.get('points.geojson')
+        self.assertEqual(dataset.count, 2)
+        self.assertEqual(dataset.bbox, [-115.40, 51.05, -115.30, 51.10])
+        self.assertEqual(dataset.schema['properties'], {'FID': 'int', 'NAME': 'str'})
+        self.assertEqual(dataset.schema['geometry_types'], ['Point'])
+
+    def test_fid_lookup(self):
+        """
+        Test: L'index FID retourne l'entité correspondante
+        Importance: Vérifie la recherche en O(1) des entités
+        """
+        dataset = self.catalog.get('points.geojson')
+        self.assertEqual(dataset.get(2)['properties']['NAME'], 'B')
+        self.assertIsNone(dataset.get(99))
+
+    def test_csv_rows_and_schema(self):
+        """
+        Test: Un CSV est indexé par FID avec des types de colonnes déduits
+        Importance: Vérifie que les CSV de référence passent aussi par le catalogue
+        """
+        dataset = self.catalog.get('rows.csv')
+        self.assertEqual(dataset.get(1)['NAME'], 'Alpha')
+        self.assertEqual(dataset.schema['columns'], {'FID': 'int', 'NAME': 'str', 'LEN': 'float'})
+
+    def test_same_snapshot_when_unchanged(self):
+        """
+        Test: Un fichier inchangé n'est pas relu
+        Importance: Vérifie que les requêtes sont servies depuis la mémoire
+        """
+        self.assertIs(self.catalog.get('points.geojson'), self.catalog.get('points.geojson'))
+
+    def test_reload_on_mtime_change(self):
+        """
+        Test: Un fichier modifié est rechargé dans un nouvel instantané
+        Importance: Vérifie le rechargement à chaud et que l'ancien instantané reste cohérent
+        """
+        old = self.catalog.get('points.geojson')
+        write_geojson(self.path, [point_feature(1, -115.40, 51.05, 'A')])
+        os.utime(self.path, (old.mtime + 10, old.mtime + 10))
+        new = self.catalog.get('points.geojson')
+        self.assertIsNot(old, new)
+        self.assertEqual(new.count, 1)
+        self.assertEqual(new.version, old.version + 1)
+        self.assertEqual(old.count, 2)
+
+    def test_unknown_dataset_raises(self):
+        """
+        Test: Un nom de fichier inconnu ou hors du dossier lève FileNotFoundError
+        Importance: Vérifie que le catalogue ne lit que les fichiers de données
+        """
+        with self.assertRaises(FileNotFoundError):
+            self.catalog.get('absent.geojson')
+        with self.assertRaises(FileNotFoundError):
+            self.catalog.get('../points.geojson')
+
+
+class TestDatasetRoutes(unittest.TestCase):
+    """
+    Tests des routes servies depuis le catalogue
+
+    Vérifie que:
+    - /report/category_totals retourne les nombres d'entités réels
+    - /api/datasets/<nom>/<fid> retourne une entité ou 404
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_category_totals(self):
+        """
+        Test: Les totaux par catégorie correspondent aux fichiers GeoJSON
+        Importance: Vérifie que le résultat est identique à l'ancien comptage sur disque
+        """
+        data = self.client.get('/report/category_totals').get_json()
+        self.assertEqual(data, {'buildings': 4, 'parcs': 10, 'sports_fields': 13, 'trails': 644})
+
+    def test_feature_lookup_by_fid(self):
+        """
+        Test: GET /api/datasets/parcs.geojson/1 retourne le parc FID 1
+        Importance: Vérifie la recherche détaillée servie depuis la mémoire
+        """
+        response = self.client.get('/api/datasets/parcs.geojson/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['properties']['FID'], 1)
+
+    def test_feature_lookup_unknown_returns_404(self):
+        """
+        Test: Un FID ou un jeu de données inconnu retourne 404
+        Importance: Vérifie la gestion des erreurs de l'API
+        """
+        self.assertEqual(self.client.get('/api/datasets/parcs.geojson/9999').status_code, 404)
+        self.assertEqual(self.client.get('/api/datasets/absent.geojson/1').status_code, 404)
+
+    def test_list_datasets(self):
+        """
+        Test: GET /api/datasets retourne un résumé par fichier
+        Importance: Vérifie que les schémas et bbox sont exposés
+        """
+        data = self.client.get('/api/datasets').get_json()
+        self.assertIn('trails.geojson', data)
+        self.assertEqual(data['trails.geojson']['count'], 644)
+        self.assertEqual(len(data['city_boundary.geojson']['bbox']), 4)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,196 @@
+"""
+test_dataset_compiler.py
+Tests pour le compilateur des CSV de référence - Format binaire par colonnes, mmap, index des FID
+
+Importance: Les tests du compilateur vérifient que la version binaire d'un CSV redonne exactement
+les mêmes lignes que le texte d'origine, que les colonnes numériques sont lues sans copie depuis
+le fichier projeté en mémoire, et qu'un CSV modifié est recompilé.
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+from unittest import mock
+import numpy as np
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server import dataset_compiler
+from server.dataset_compiler import load_compiled, read_csv, storage_type, compiled_path
+from server.dataset_catalog import DatasetCatalog, DATA_DIR, csv_schema, catalog
+
+CSV_TEXT = (
+    'FID,NAME,LEN,CODE,X\n'
+    '3,École,1.5,007,-12837822\n'
+    '1,Alpha,,1e3,-12839092.5419\n'
+    '2,"Beta, sud",2.25,,\n'
+    '3,Doublon,0.5,12,-12840713.2\n'
+)
+
+
+class TestDatasetCompiler(unittest.TestCase):
+    """
+    Tests du format compilé sur un dossier temporaire
+
+    Vérifie que:
+    - Les lignes relues sont identiques à celles du CSV
+    - Les colonnes numériques sont des vues sur le fichier projeté
+    - Le fichier compilé est réutilisé, puis recompilé si le CSV change
+    - Un fichier compilé illisible est signalé et recompilé
+    """
+
+    def setUp(self):
+        """Crée un CSV et un dossier de fichiers compilés temporaires"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.compiled_dir = os.path.join(self.tmp_dir, 'compiled')
+        self.path = os.path.join(self.tmp_dir, 'rows.csv')
+        with open(self.path, 'w', encoding='utf-8-sig') as f:
+            f.write(CSV_TEXT)
+
+    def tearDown(self):
+        """Supprime le dossier temporaire"""
+        shutil.rmtree(self.tmp_dir)
+
+    def load(self):
+        return load_compiled(self.path, csv_schema, self.compiled_dir)
+
+    def test_rows_round_trip(self):
+        """
+        Test: Chaque ligne relue est identique à celle de csv.DictReader
+        Importance: Vérifie que les consommateurs voient les mêmes textes qu'avant
+        """
+        _fieldnames, rows = read_csv(self.path)
+        table = self.load()
+        self.assertEqual(list(table), rows)
+        self.assertEqual(table[-1]['NAME'], 'Doublon')
+        self.assertEqual(len(table), 4)
+
+    def test_storage_types(self):
+        """
+        Test: Seules les colonnes relues à l'identique sont stockées en nombres
+        Importance: Vérifie que '007' ou '1e3' ne deviennent pas 7 ou 1000.0
+        """
+        self.assertEqual(storage_type(['1', '', '22']), 'int64')
+        self.assertEqual(storage_type(['1.5', '2.25']), 'float64')
+        self.assertEqual(storage_type(['007', '12']), 'str')
+        self.assertEqual(storage_type(['1e3']), 'str')
+        self.assertEqual(storage_type(['', '']), 'str')
+
+    def test_zero_copy_columns(self):
+        """
+        Test: Les colonnes numériques sont des vues sur la projection mmap
+        Importance: Vérifie qu'aucune copie n'est faite au chargement
+        """
+        table = self.load()
+        fid = table.column('FID')
+        self.assertEqual(fid.tolist(), [3, 1, 2, 3])
+        self.assertFalse(fid.flags.owndata)
+        self.assertIs(table._mapping, table.buffer)
+        self.assertTrue(np.isnan(table.numbers('LEN')[1]))
+        self.assertEqual(table.nulls('LEN').tolist(), [False, True, False, False])
+        # Colonne texte aux nombres de formats variés : texte exact et copie float64
+        self.assertEqual(table.value('X', 0), '-12837822')
+        self.assertEqual(table.numbers('X')[3], -12840713.2)
+        with self.assertRaises(KeyError):
+            table.numbers('NAME')
+
+    def test_fid_lookup(self):
+        """
+        Test: La recherche par FID retourne la dernière ligne en cas de doublon, None si absent
+        Importance: Vérifie l'index trié (même résultat que l'ancien dictionnaire)
+        """
+        table = self.load()
+        self.assertEqual(table.get(3)['NAME'], 'Doublon')
+        self.assertEqual(table.get('1')['NAME'], 'Alpha')
+        self.assertIsNone(table.get(99))
+        self.assertIsNone(table.get('abc'))
+
+    def test_cache_reused_then_recompiled(self):
+        """
+        Test: Un CSV inchangé n'est pas relu ; un CSV modifié est recompilé
+        Importance: Vérifie l'invalidation par chemin, mtime et taille
+        """
+        self.load()
+        self.assertTrue(os.path.exists(compiled_path(self.compiled_dir, 'rows.csv')))
+        with mock.patch.object(dataset_compiler, 'read_csv', side_effect=AssertionError('CSV relu')):
+            self.assertEqual(self.load().get(2)['NAME'], 'Beta, sud')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('4,Delta,3.5,1,1\n')
+        table = self.load()
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.get(4)['NAME'], 'Delta')
+
+    def test_corrupt_file_recompiled(self):
+        """
+        Test: Un fichier compilé illisible est signalé par un avertissement puis recompilé
+        Importance: Vérifie qu'un fichier tronqué ne bloque pas le chargement et reste visible dans les journaux
+        """
+        os.makedirs(self.compiled_dir)
+        with open(compiled_path(self.compiled_dir, 'rows.csv'), 'wb') as f:
+            f.write(b'pas un fichier compile')
+        with self.assertLogs('server.dataset_compiler', 'WARNING') as logs:
+            table = self.load()
+        self.assertIn('ignoré', logs.output[0])
+        self.assertEqual(table.get(2)['NAME'], 'Beta, sud')
+        self.assertIsNotNone(table._mapping)
+
+    def test_memory_fallback(self):
+        """
+        Test: Sans dossier de fichiers compilés, la table est construite en mémoire
+        Importance: Vérifie le fonctionnement sur un disque en lecture seule
+        """
+        table = load_compiled(self.path, csv_schema)
+        self.assertIsNone(table._mapping)
+        self.assertEqual(table.get(1)['LEN'], '')
+
+    def test_catalog_schema_unchanged(self):
+        """
+        Test: Le catalogue expose le même schéma et la même recherche par FID
+        Importance: Vérifie que /api/datasets ne change pas
+        """
+        dataset = DatasetCatalog(self.tmp_dir, check_interval=0, compiled_dir=self.compiled_dir).get('rows.csv')
+        self.assertEqual(dataset.schema['columns'], {'FID': 'int', 'NAME': 'str', 'LEN': 'float', 'CODE': 'float',
+                                                     'X': 'float'})
+        self.assertEqual(dataset.count, 4)
+        self.assertEqual(dataset.get(1)['CODE'], '1e3')
+
+
+class TestReferenceCsvCompiled(unittest.TestCase):
+    """
+    Tests sur les CSV de static/data
+
+    Vérifie que:
+    - Les adresses compilées sont identiques au CSV
+    - Le catalogue partagé sert les CSV depuis un fichier projeté
+    """
+
+    def test_addresses_round_trip(self):
+        """
+        Test: Les ~14 000 adresses relues sont identiques à csv.DictReader
+        Importance: Vérifie le plus gros jeu de données
+        """
+        path = os.path.join(DATA_DIR, 'Addresses.csv')
+        _fieldnames, rows = read_csv(path)
+        table = catalog.get('Addresses.csv').records
+        self.assertEqual(len(table), len(rows))
+        self.assertEqual(list(table), rows)
+        self.assertIsNotNone(table._mapping)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,211 @@
+"""
+test_db_pool.py
+Tests pour le pool du travail bloquant - Appels SQLite bornés hors de la boucle d'événements
+
+Importance: En mode asynchrone, un appel SQLite exécuté dans la boucle d'événements bloque tous
+les WebSockets du worker. Ces tests vérifient que le pool borne les appels simultanés, propage
+résultats et exceptions, que les routes passent par lui et, avec eventlet installé, que le
+travail bloquant des routes et des tâches de fond laisse tourner la boucle d'événements.
+"""
+
+import unittest
+import importlib.util
+import json
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.app_factory import PROJECT_DIR
+from server.db_pool import BlockingPool, run_blocking, set_process_pool
+from server import tasks
+
+# Serveur eventlet dans un processus neuf (monkey-patching avant tout import) : pendant que des
+# requêtes et une tâche de fond bloquent un thread système (sommeil d'origine, non coopératif),
+# un green thread compte les tours de la boucle d'événements
+EVENTLET_SCRIPT = """
+import eventlet
+eventlet.monkey_patch()
+import json, sys, time
+from server.app_factory import create_app
+from server.db_pool import original
+from server import tasks, incident_taxonomy
+from server.routes import incident_types
+
+blocking_sleep = original('time', 'sleep')
+native_ident = original('_thread', 'get_ident')
+loop_thread = native_ident()
+app = create_app({'DATA_DIR': sys.argv[1], 'WARM_UP': 'off', 'SOCKETIO_ASYNC_MODE': 'eventlet'})
+threads = []
+real_get_taxonomy = incident_taxonomy.get_taxonomy
+
+def slow_get_taxonomy():
+    threads.append(native_ident())
+    blocking_sleep(0.2)
+    return real_get_taxonomy()
+
+def slow_task():
+    threads.append(native_ident())
+    blocking_sleep(0.2)
+    # Une tâche soumise depuis un thread système est exécutée elle aussi
+    tasks.submit(threads.append, 'suivante')
+
+incident_types.get_taxonomy = slow_get_taxonomy
+ticks = [0]
+
+def ticker():
+    while True:
+        ticks[0] += 1
+        eventlet.sleep(0.005)
+
+eventlet.spawn(ticker)
+client = app.test_client()
+start = time.perf_counter()
+tasks.submit(slow_task)
+urls = ['/api/incident_types'] * 4 + ['/api/search?q=parc', '/report/incidents_by_feature?layer=parcs']
+requests = [eventlet.spawn(client.get, url) for url in urls]
+statuses = [request.wait().status_code for request in requests]
+drained = tasks.drain(timeout=10)
+print(json.dumps({'mode': app.socketio.async_mode, 'statuses': statuses, 'drained': drained,
+                  'elapsed': time.perf_counter() - start, 'ticks': ticks[0],
+                  'on_loop': sum(ident == loop_thread for ident in threads if ident != 'suivante'),
+                  'threads': len(threads), 'followed': 'suivante' in threads}))
+"""
+
+
+class TestBlockingPool(unittest.TestCase):
+    """
+    Tests du pool en mode threading
+
+    Vérifie que:
+    - Au plus size appels s'exécutent en même temps
+    - Les résultats et les exceptions sont transmis à l'appelant
+    - L'application utilise le pool pour lire les incidents
+    - Les échecs des tâches de fond sont journalisés
+    """
+
+    def test_bounded_concurrency(self):
+        """
+        Test: 16 appels simultanés sur un pool de 3 ne dépassent jamais 3 en parallèle
+        Importance: Vérifie que la base n'est pas saturée de connexions simultanées
+        """
+        pool = BlockingPool(3, 'threading')
+        running = [0, 0]
+        lock = threading.Lock()
+
+        def work(value):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return value * 2
+
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda value: pool.run(work, value), range(16)))
+        self.assertEqual(results, [value * 2 for value in range(16)])
+        self.assertLessEqual(running[1], 3)
+
+    def test_exception_propagated(self):
+        """
+        Test: Une exception levée dans le pool est relancée chez l'appelant et libère la place
+        Importance: Vérifie qu'une erreur SQLite reste visible et ne bloque pas le pool
+        """
+        pool = BlockingPool(1, 'threading')
+        with self.assertRaises(ZeroDivisionError):
+            pool.run(lambda: 1 / 0)
+        self.assertEqual(pool.run(lambda: 'ok'), 'ok')
+
+    def test_routes_use_pool(self):
+        """
+        Test: GET /api/incidents passe par app.db_pool
+        Importance: Vérifie que le travail bloquant des routes est confié au pool
+        """
+        self.assertEqual(app.db_pool.size, app.config['DB_POOL_SIZE'])
+        with mock.patch.object(app.db_pool, 'run', wraps=app.db_pool.run) as run:
+            response = app.test_client().get('/api/incidents')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(run.call_count, 1)
+
+    def test_nested_calls_and_process_pool(self):
+        """
+        Test: Hors requête, run_blocking utilise le pool du processus ; un appel imbriqué ne reprend pas de place
+        Importance: Une tâche de fond qui lit la base depuis le pool ne doit pas s'interbloquer avec lui
+        """
+        pool = BlockingPool(1, 'threading')
+        set_process_pool(pool)
+        self.addCleanup(set_process_pool, app.db_pool)
+        with ThreadPoolExecutor(1) as executor:
+            result = executor.submit(run_blocking, run_blocking, lambda: 'imbriqué').result(timeout=5)
+        self.assertEqual(result, 'imbriqué')
+
+    def test_task_failure_logged(self):
+        """
+        Test: Une tâche de fond qui échoue est journalisée avec sa trace, la suivante s'exécute
+        Importance: Vérifie qu'une erreur d'enrichissement reste visible dans les journaux du serveur
+        """
+        done = []
+        with self.assertLogs('server.tasks', 'ERROR') as logs:
+            tasks.submit(lambda: 1 / 0)
+            tasks.submit(done.append, 'ok')
+            self.assertTrue(tasks.drain(timeout=5))
+        self.assertEqual(done, ['ok'])
+        self.assertIn('ZeroDivisionError', logs.output[0])
+
+
+@unittest.skipUnless(importlib.util.find_spec('eventlet'), 'eventlet non installé')
+class TestEventletPool(unittest.TestCase):
+    """
+    Tests du mode eventlet dans un processus monkey-patché
+
+    Vérifie que:
+    - Le travail bloquant des routes et des tâches de fond s'exécute sur des threads système
+    - La boucle d'événements continue de tourner pendant ce travail
+    - Les verrous des caches partagés fonctionnent entre threads système (pas d'interblocage)
+    """
+
+    def test_blocking_work_leaves_loop_running(self):
+        """
+        Test: 4 requêtes et une tâche de fond bloquent chacune 0,2 s sans arrêter la boucle, pendant
+        une recherche globale et un rapport par élément
+        Importance: Un seul appel bloquant dans la boucle figerait tous les WebSockets du worker
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        result = subprocess.run([sys.executable, '-c', EVENTLET_SCRIPT, tmp_dir], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(report['mode'], 'eventlet')
+        self.assertEqual(report['statuses'], [200] * 6)
+        self.assertTrue(report['drained'])
+        self.assertTrue(report['followed'])
+        self.assertEqual(report['threads'], 6)
+        self.assertEqual(report['on_loop'], 0)
+        # Boucle figée : aucun tour pendant les 0,2 s de chaque appel bloquant
+        self.assertGreater(report['ticks'], report['elapsed'] / 0.005 / 4)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,202 @@
+"""
+test_feature_index.py
+Tests pour l'élément de référence le plus proche - Index STR, distance point-segment, polygones, rattrapage
+
+Importance: Les tests de l'index des éléments vérifient que chaque incident est rattaché au sentier,
+parc, bâtiment ou terrain de sport le plus proche, que l'élagage par feuilles ne change aucun résultat
+et que le mode vectorisé utilisé pour les lots et le rattrapage donne les mêmes réponses.
+"""
+
+import unittest
+import json
+import random
+import sqlite3
+import sys
+import os
+import numpy as np
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.feature_index import (FeatureIndex, get_feature_index, segment_distances,
+                                  backfill_nearest_features)
+from server.dataset_catalog import catalog
+
+
+def feature(fid, kind, coordinates):
+    """Construit une entité GeoJSON de test"""
+    return {'type': 'Feature', 'properties': {'FID': fid}, 'geometry': {'type': kind, 'coordinates': coordinates}}
+
+
+class TestFeatureIndex(unittest.TestCase):
+    """
+    Tests de l'index STR
+
+    Vérifie que:
+    - La distance point-segment est exacte
+    - Un point dans un polygone est à distance nulle
+    - L'index et le mode vectorisé correspondent à une recherche exhaustive
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.index = get_feature_index()
+
+    def test_segment_distance(self):
+        """
+        Test: Distance à l'intérieur, au-delà des extrémités et pour un segment nul
+        Importance: Vérifie la projection bornée sur le segment
+        """
+        d = segment_distances(np.array([5.0, -3.0, 13.0, 1.0]), np.array([2.0, 4.0, 0.0, 1.0]),
+                              np.array([0.0, 0.0, 0.0, 0.0]), np.array([0.0, 0.0, 0.0, 0.0]),
+                              np.array([10.0, 10.0, 10.0, 0.0]), np.array([0.0, 0.0, 0.0, 0.0]))
+        np.testing.assert_allclose(d, [2.0, 5.0, 3.0, np.sqrt(2)])
+
+    def test_polygon_and_line(self):
+        """
+        Test: Un point dans un parc est à 0 m, un point près d'un sentier est rattaché au sentier
+        Importance: Vérifie l'affinage exact polygone et segment
+        """
+        index = FeatureIndex({
+            'trails': [feature(7, 'LineString', [[-115.36, 51.08], [-115.35, 51.08]])],
+            'parcs': [feature(3, 'Polygon', [[[-115.34, 51.07], [-115.33, 51.07], [-115.33, 51.075],
+                                              [-115.34, 51.075], [-115.34, 51.07]]])],
+        })
+        self.assertEqual(index.nearest(51.072, -115.335), {'layer': 'parcs', 'feature_id': 3, 'distance_m': 0.0})
+        found = index.nearest(51.0801, -115.355)
+        self.assertEqual((found['layer'], found['feature_id']), ('trails', 7))
+        self.assertAlmostEqual(found['distance_m'], 11.1, delta=0.2)
+
+    def test_smallest_polygon_wins(self):
+        """
+        Test: Un point dans un terrain de sport situé dans un parc est rattaché au terrain
+        Importance: Vérifie que l'élément le plus précis est retenu
+        """
+        square = lambda size: [[[-115.34, 51.07], [-115.34 + size, 51.07], [-115.34 + size, 51.07 + size],
+                                [-115.34, 51.07 + size], [-115.34, 51.07]]]
+        index = FeatureIndex({
+            'parcs': [feature(1, 'Polygon', square(0.01))],
+            'sports_fields': [feature(2, 'Polygon', square(0.002))],
+        })
+        self.assertEqual(index.nearest(51.071, -115.339)['layer'], 'sports_fields')
+        self.assertEqual(index.nearest_many([51.071], [-115.339])[0]['layer'], 'sports_fields')
+
+    def test_matches_brute_force(self):
+        """
+        Test: L'index et le mode vectorisé donnent la distance d'une recherche exhaustive
+        Importance: Vérifie que l'élagage des feuilles ne manque aucun segment
+        """
+        rng = random.Random(5)
+        points = [(rng.uniform(51.04, 51.12), rng.uniform(-115.39, -115.30)) for _ in range(300)]
+        batch = self.index.nearest_many([p[0] for p in points], [p[1] for p in points])
+        for (lat, lon), vectorized in zip(points, batch):
+            scalar = self.index.nearest(lat, lon)
+            self.assertEqual(scalar['distance_m'], vectorized['distance_m'])
+            if scalar['distance_m'] > 0:
+                x = (lon - self.index.lon0) * self.index.kx
+                y = (lat - self.index.lat0) * self.index.ky
+                expected = segment_distances(x, y, self.index.x1, self.index.y1, self.index.x2, self.index.y2).min()
+                self.assertEqual(scalar['distance_m'], round(float(expected), 1))
+
+    def test_all_layers_indexed(self):
+        """
+        Test: Toutes les entités des quatre couches sont indexées
+        Importance: Vérifie qu'aucune couche n'est oubliée
+        """
+        expected = sum(catalog.count(name) for name in
+                       ('trails.geojson', 'parcs.geojson', 'buildings.geojson', 'sports_fields.geojson'))
+        self.assertEqual(len(self.index), expected)
+
+
+class TestIncidentFeatureEnrichment(unittest.TestCase):
+    """
+    Tests de l'enregistrement de l'élément le plus proche
+
+    Vérifie que:
+    - Un incident ajouté reçoit nearest_feature_id, feature_layer et distance_m
+    - L'import en lot et le rattrapage remplissent les mêmes colonnes
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            from server.routes.incidents_api import init_db, DB_PATH
+            self.db_path = DB_PATH
+            init_db()
+
+    def last_rows(self, count):
+        """Retourne les dernières lignes de la table incidents"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute('SELECT * FROM incidents ORDER BY id DESC LIMIT ?', (count,)).fetchall()
+        conn.close()
+        return rows
+
+    def incident(self, latitude, longitude):
+        """Construit un incident de test"""
+        return {'type': 'Nid de poule', 'description': 'Test élément', 'latitude': latitude,
+                'longitude': longitude, 'timestamp': '2024-02-02T10:00:00Z'}
+
+    def test_insert_sets_feature(self):
+        """
+        Test: POST /api/incidents enregistre l'élément le plus proche
+        Importance: Vérifie le calcul au moment de l'insertion
+        """
+        self.client.post('/api/incidents', data=json.dumps(self.incident(51.089, -115.359)),
+                         content_type='application/json')
+        row = self.last_rows(1)[0]
+        expected = get_feature_index().nearest(51.089, -115.359)
+        self.assertEqual(row['feature_layer'], expected['layer'])
+        self.assertEqual(row['nearest_feature_id'], expected['feature_id'])
+        self.assertAlmostEqual(row['distance_m'], expected['distance_m'])
+
+    def test_bulk_sets_features(self):
+        """
+        Test: L'import en lot enregistre l'élément le plus proche de chaque incident
+        Importance: Vérifie le chemin vectorisé
+        """
+        points = [(51.089, -115.359), (51.08, -115.35)]
+        self.client.post('/api/incidents/bulk', data=json.dumps([self.incident(*p) for p in points]),
+                         content_type='application/json')
+        rows = list(reversed(self.last_rows(2)))
+        for row, (lat, lon) in zip(rows, points):
+            self.assertEqual(row['distance_m'], get_feature_index().nearest(lat, lon)['distance_m'])
+
+    def test_backfill_existing_rows(self):
+        """
+        Test: Le rattrapage remplit les incidents sans élément
+        Importance: Vérifie la mise à jour des lignes existantes
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.execute(
+            "INSERT INTO incidents (type, description, latitude, longitude, timestamp) VALUES (?, ?, ?, ?, ?)",
+            ('Ancien', 'Sans élément', 51.08, -115.35, '2024-01-01T00:00:00Z'))
+        incident_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        self.assertGreaterEqual(backfill_nearest_features(), 1)
+        conn = sqlite3.connect(self.db_path)
+        layer, distance = conn.execute('SELECT feature_layer, distance_m FROM incidents WHERE id = ?',
+                                       (incident_id,)).fetchone()
+        conn.close()
+        self.assertIsNotNone(layer)
+        self.assertEqual(distance, get_feature_index().nearest(51.08, -115.35)['distance_m'])
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,207 @@
+"""
+test_feature_join.py
+Tests pour le rapport par élément - Jointure spatiale, zone tampon des sentiers, mise à jour incrémentale
+
+Importance: Les tests de la jointure spatiale vérifient que chaque parc, sentier, bâtiment et terrain
+de sport compte ses incidents ouverts, et que les compteurs suivent les ajouts, les changements de
+statut et les suppressions sans recalcul complet.
+"""
+
+import unittest
+import json
+import random
+import sqlite3
+import sys
+import os
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.feature_index import FeatureIndex, get_feature_index, segment_distances
+from server.feature_join import IncidentFeatureJoin, get_feature_join
+from server.routes import incidents_api
+from server.geofence import is_inside_canmore
+
+
+def feature(fid, kind, coordinates):
+    """Construit une entité GeoJSON de test"""
+    return {'type': 'Feature', 'properties': {'FID': fid}, 'geometry': {'type': kind, 'coordinates': coordinates}}
+
+
+def row(incident_id, latitude, longitude, status='unsolved'):
+    """Construit une ligne d'incident"""
+    return {'id': incident_id, 'latitude': latitude, 'longitude': longitude, 'status': status}
+
+
+class TestIncidentFeatureJoin(unittest.TestCase):
+    """
+    Tests de la jointure en mémoire
+
+    Vérifie que:
+    - Un point dans un parc est rattaché au parc, un point près d'un sentier au sentier
+    - Les compteurs suivent les changements de statut et les suppressions
+    - La recherche par rayon correspond à une recherche exhaustive
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.join = IncidentFeatureJoin(FeatureIndex({
+            'trails': [feature(7, 'LineString', [[-115.36, 51.08], [-115.35, 51.08]])],
+            'parcs': [feature(3, 'Polygon', [[[-115.34, 51.07], [-115.33, 51.07], [-115.33, 51.075],
+                                              [-115.34, 51.075], [-115.34, 51.07]]])],
+        }))
+
+    def test_polygon_and_buffered_line(self):
+        """
+        Test: Le parc compte le point qu'il contient, le sentier celui à ~11 m mais pas celui à ~56 m
+        Importance: Vérifie la zone tampon des lignes
+        """
+        self.join.add_rows([row(1, 51.072, -115.335), row(2, 51.0801, -115.355), row(3, 51.0805, -115.355)])
+        self.assertEqual(self.join.layer_counts('parcs'), {3: (1, 1)})
+        self.assertEqual(self.join.layer_counts('trails'), {7: (1, 1)})
+
+    def test_incremental_updates(self):
+        """
+        Test: Résoudre puis supprimer un incident met à jour les compteurs
+        Importance: Vérifie la maintenance incrémentale sans reconstruction
+        """
+        self.join.add_rows([row(1, 51.072, -115.335), row(2, 51.073, -115.336, 'solved')])
+        self.assertEqual(self.join.layer_counts('parcs'), {3: (1, 2)})
+        self.join.set_status(1, 'résolu')
+        self.assertEqual(self.join.layer_counts('parcs'), {3: (0, 2)})
+        self.join.set_status(2, 'unsolved')
+        self.join.remove(1)
+        self.assertEqual(self.join.layer_counts('parcs'), {3: (1, 1)})
+        # Un incident déjà joint n'est pas compté deux fois
+        self.join.add_rows([row(2, 51.073, -115.336)])
+        self.assertEqual(self.join.layer_counts('parcs'), {3: (1, 1)})
+
+    def test_features_within_matches_brute_force(self):
+        """
+        Test: Les éléments à moins de 50 m correspondent à une recherche exhaustive des segments
+        Importance: Vérifie que l'élagage des feuilles ne manque aucun élément
+        """
+        index = get_feature_index()
+        rng = random.Random(11)
+        for _ in range(200):
+            lat, lon = rng.uniform(51.04, 51.12), rng.uniform(-115.39, -115.30)
+            found = index.features_within(lat, lon, 50.0)
+            x = (lon - index.lon0) * index.kx
+            y = (lat - index.lat0) * index.ky
+            distances = segment_distances(x, y, index.x1, index.y1, index.x2, index.y2)
+            expected = {index.features[int(owner)] for owner in index.owner[distances <= 50.0]}
+            expected |= {index.features[owner] for _area, owner, polygon in index.polygons
+                         if polygon.contains(lon, lat)}
+            self.assertEqual(set(found), expected)
+
+
+class TestIncidentsByFeatureReport(unittest.TestCase):
+    """
+    Tests de GET /report/incidents_by_feature
+
+    Vérifie que:
+    - Un incident signalé dans un parc augmente ses compteurs
+    - Le statut et la suppression sont répercutés, y compris ceux d'un autre worker
+    - Une couche inconnue retourne 400
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        get_feature_join()
+
+    def park_counts(self, fid):
+        features = self.client.get('/report/incidents_by_feature?layer=parcs').get_json()['features']
+        return next((f['open'], f['total']) for f in features if f['feature_id'] == fid)
+
+    def point_in_park(self):
+        """Trouve un point de Canmore à l'intérieur d'un parc"""
+        for _area, owner, polygon in get_feature_index().polygons:
+            layer, fid = get_feature_index().features[owner]
+            if layer != 'parcs':
+                continue
+            minx, miny, maxx, maxy = polygon.bbox
+            for i in range(1, 20):
+                for j in range(1, 20):
+                    lon, lat = minx + (maxx - minx) * i / 20, miny + (maxy - miny) * j / 20
+                    if polygon.contains(lon, lat) and is_inside_canmore(lat, lon):
+                        return fid, lat, lon
+        self.skipTest('Aucun parc dans Canmore')
+
+    def test_report_follows_incident_changes(self):
+        """
+        Test: Ajout, résolution et suppression d'un incident dans un parc
+        Importance: Vérifie que le rapport reflète chaque modification
+        """
+        fid, lat, lon = self.point_in_park()
+        before = self.park_counts(fid)
+        response = self.client.post('/api/incidents', data=json.dumps({
+            'type': 'Banc brisé', 'description': 'Test rapport par élément',
+            'latitude': lat, 'longitude': lon, 'timestamp': '2024-02-02T10:00:00Z'
+        }), content_type='application/json')
+        incident_id = response.get_json()['id']
+        self.assertEqual(self.park_counts(fid), (before[0] + 1, before[1] + 1))
+        self.client.patch(f'/api/incidents/{incident_id}', data=json.dumps({'status': 'solved'}),
+                          content_type='application/json')
+        self.assertEqual(self.park_counts(fid), (before[0], before[1] + 1))
+        self.client.delete(f'/api/incidents/{incident_id}')
+        self.assertEqual(self.park_counts(fid), before)
+
+    def test_report_follows_other_workers(self):
+        """
+        Test: Des écritures faites par une autre connexion (un autre worker) sont reflétées par le rapport
+        Importance: En multi-worker, chaque worker a sa propre jointure en mémoire
+        """
+        fid, lat, lon = self.point_in_park()
+        before = self.park_counts(fid)
+        conn = sqlite3.connect(incidents_api.DB_PATH)
+        cursor = conn.execute("INSERT INTO incidents (type, latitude, longitude, timestamp) "
+                              "VALUES ('Banc brisé', ?, ?, '2024-02-02T10:00:00Z')", (lat, lon))
+        incident_id = cursor.lastrowid
+        conn.commit()
+        self.assertEqual(self.park_counts(fid), (before[0] + 1, before[1] + 1))
+        conn.execute("UPDATE incidents SET status = 'solved' WHERE id = ?", (incident_id,))
+        conn.commit()
+        self.assertEqual(self.park_counts(fid), (before[0], before[1] + 1))
+        conn.execute('DELETE FROM incidents WHERE id = ?', (incident_id,))
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.park_counts(fid), before)
+
+    def test_trails_report_format(self):
+        """
+        Test: Le rapport des sentiers indique la zone tampon et couvre tous les sentiers
+        Importance: Vérifie le format consommé par la page de rapport
+        """
+        data = self.client.get('/report/incidents_by_feature?layer=trails').get_json()
+        self.assertEqual(data['layer'], 'trails')
+        self.assertGreater(data['buffer_m'], 0)
+        self.assertEqual(len(data['features']), len(get_feature_index().features) - sum(
+            1 for layer, _fid in get_feature_index().features if layer != 'trails'))
+        self.assertEqual(set(data['features'][0]), {'feature_id', 'name', 'open', 'total'})
+
+    def test_unknown_layer(self):
+        """
+        Test: Une couche absente ou inconnue retourne 400
+        Importance: Vérifie la validation du paramètre layer
+        """
+        self.assertEqual(self.client.get('/report/incidents_by_feature').status_code, 400)
+        self.assertEqual(self.client.get('/report/incidents_by_feature?layer=addresses').status_code, 400)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,275 @@
+"""
+test_federated_search.py
+Tests pour la recherche globale - Sources parallèles, budgets de temps, fusion par score, cache LRU
+
+Importance: Les tests de recherche globale vérifient qu'une seule requête interroge tous les jeux
+de données et les incidents, qu'une source lente n'empêche pas la réponse, et que le cache ne sert
+jamais un résultat obsolète après le rechargement d'un jeu de données ou la modification d'un incident.
+"""
+
+import unittest
+import json
+import sqlite3
+import time
+import uuid
+import sys
+import os
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server import federated_search as fs
+from server.dataset_catalog import catalog
+from server.routes import incidents_api
+
+
+class TestFederatedSearch(unittest.TestCase):
+    """
+    Tests de la fusion des sources
+
+    Vérifie que:
+    - Les résultats de plusieurs sources sont typés et triés par score
+    - Une source qui dépasse son budget est signalée et ignorée
+    - Une source en erreur est signalée et journalisée
+    - Le cache LRU est vidé au rechargement d'un jeu de données
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Construit les index avant les tests pour respecter les budgets de temps"""
+        fs.warm_indexes()
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        fs.invalidate_search_cache()
+
+    def test_typed_hits_from_several_sources(self):
+        """
+        Test: « milenium » trouve le parc et le terrain de sport Millenium Park
+        Importance: Vérifie que toutes les sources sont interrogées sans choisir de catégorie
+        """
+        response = fs.federated_search('milenium')
+        types = {hit['type'] for hit in response['results'] if hit['value'] == 'Millenium Park'}
+        self.assertEqual(types, {'parcs', 'sports_fields'})
+        scores = [hit['score'] for hit in response['results']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(set(response['sources']), set(fs.SOURCE_BUDGETS))
+
+    def test_slow_source_is_skipped(self):
+        """
+        Test: Une source plus lente que son budget est marquée timeout
+        Importance: Vérifie que la réponse n'attend pas la source la plus lente
+        """
+        original = fs.run_source
+
+        def slow_addresses(name, query, limit):
+            if name == 'addresses':
+                time.sleep(0.5)
+            return original(name, query, limit)
+
+        with mock.patch.object(fs, 'run_source', slow_addresses):
+            start = time.monotonic()
+            response = fs.federated_search('millenium park')
+            elapsed = time.monotonic() - start
+        self.assertEqual(response['sources']['addresses'], {'status': 'timeout'})
+        self.assertEqual(response['sources']['parcs']['status'], 'ok')
+        self.assertLess(elapsed, 0.45)
+        # Une réponse partielle n'est pas mise en cache
+        self.assertIsNot(fs.federated_search('millenium park'), response)
+
+    def test_failing_source_is_logged(self):
+        """
+        Test: Une source qui lève une exception est marquée error et journalisée avec sa trace
+        Importance: Vérifie qu'une source en panne ne casse pas la recherche et reste visible dans les journaux
+        """
+        original = fs.run_source
+
+        def broken_trails(name, query, limit):
+            if name == 'trails':
+                raise RuntimeError('index corrompu')
+            return original(name, query, limit)
+
+        with mock.patch.object(fs, 'run_source', broken_trails), \
+                self.assertLogs('server.federated_search', 'ERROR') as logs:
+            response = fs.federated_search('millenium park')
+        self.assertEqual(response['sources']['trails'], {'status': 'error'})
+        self.assertEqual(response['sources']['parcs']['status'], 'ok')
+        self.assertIn('index corrompu', logs.output[0])
+
+    def test_cache_and_invalidation_on_reload(self):
+        """
+        Test: Une requête répétée est servie depuis le cache, vidé au rechargement d'un jeu de données
+        Importance: Vérifie que le cache ne sert pas de résultats obsolètes
+        """
+        first = fs.federated_search('legacy')
+        self.assertIs(fs.federated_search('legacy'), first)
+        for callback in catalog._listeners:
+            callback(catalog.get('trails.csv'))
+        self.assertIsNot(fs.federated_search('legacy'), first)
+
+    def test_lru_eviction(self):
+        """
+        Test: L'entrée la moins récemment utilisée est retirée quand le cache est plein
+        Importance: Vérifie que la mémoire du cache reste bornée
+        """
+        cache = fs.SearchCache(size=2)
+        cache.put('a', 1, cache.generation)
+        cache.put('b', 2, cache.generation)
+        cache.get('a')
+        cache.put('c', 3, cache.generation)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        # Une réponse calculée avant une invalidation n'est pas stockée
+        generation = cache.generation
+        cache.clear()
+        cache.put('d', 4, generation)
+        self.assertIsNone(cache.get('d'))
+
+
+class TestIncidentIndex(unittest.TestCase):
+    """
+    Tests de l'index des incidents tenu à jour ligne par ligne
+
+    Vérifie que:
+    - Ajout, modification et suppression sont appliqués sans reconstruction
+    - Les écritures d'une autre connexion (autre worker) sont appliquées depuis le journal
+    """
+
+    def make_incident(self, incident_id, incident_type, status='unsolved'):
+        return {'id': incident_id, 'type': incident_type, 'description': None, 'latitude': 51.089,
+                'longitude': -115.359, 'status': status, 'nearest_address': None}
+
+    def ids(self, index, query):
+        return [incident['id'] for incident, _text, _distance in index.search(query, 10)]
+
+    def test_incremental_updates(self):
+        """
+        Test: upsert et remove modifient les résultats de l'index existant
+        Importance: Une écriture ne doit pas coûter la reconstruction de tout l'index
+        """
+        index = fs.IncidentIndex([self.make_incident(1, 'Lampadaire renversé'),
+                                  self.make_incident(2, 'Graffiti')])
+        index.upsert([self.make_incident(3, 'Lampadaire clignotant')])
+        self.assertEqual(sorted(self.ids(index, 'lampadaire')), [1, 3])
+
+        # Changement de statut : texte inchangé, mise à jour sur place
+        index.upsert([self.make_incident(1, 'Lampadaire renversé', 'solved')])
+        self.assertEqual(index.search('renverse', 1)[0][0]['status'], 'solved')
+        self.assertEqual(len(index.trigrams), 3)
+
+        # Texte modifié : l'ancienne version n'est plus trouvée
+        index.upsert([self.make_incident(2, 'Nid de poule')])
+        self.assertEqual(self.ids(index, 'graffiti'), [])
+        self.assertEqual(self.ids(index, 'nid de poule'), [2])
+
+        index.remove([3])
+        self.assertEqual(self.ids(index, 'lampadaire'), [1])
+        self.assertEqual(len(index), 2)
+
+        # Adresse ajoutée par l'enrichissement
+        index.upsert([dict(self.make_incident(1, 'Lampadaire renversé'), nearest_address='100 Main Street')])
+        self.assertEqual(self.ids(index, 'main street'), [1])
+        self.assertEqual(len(index), 2)
+
+    def test_write_does_not_rebuild(self):
+        """
+        Test: Après une écriture, la recherche sert le même index, mis à jour depuis le journal
+        Importance: La reconstruction (~350 ms à 10 000 incidents) dépassait le budget de la source
+        """
+        index = fs.get_incident_index()
+        token = uuid.uuid4().hex[:12]
+        with mock.patch.object(fs, 'build_incident_index', side_effect=AssertionError('reconstruction')):
+            incident_id = app.test_client().post('/api/incidents', json={
+                'type': 'Borne fontaine ' + token, 'description': 'Test index incrémental',
+                'latitude': 51.089, 'longitude': -115.359, 'timestamp': '2024-02-02T10:00:00Z'
+            }).get_json()['id']
+            response = fs.federated_search('borne fontaine ' + token)
+            self.assertIs(fs.get_incident_index(), index)
+        self.assertEqual(response['sources']['incidents']['status'], 'ok')
+        self.assertEqual([hit['id'] for hit in response['results'] if hit['type'] == 'incidents'], [incident_id])
+        app.test_client().delete(f'/api/incidents/{incident_id}')
+
+    def test_other_worker_writes(self):
+        """
+        Test: Un incident écrit puis supprimé par une autre connexion (un autre worker) est vu par la recherche
+        Importance: En multi-worker, le cache et l'index de chaque worker doivent suivre toutes les écritures
+        """
+        fs.warm_indexes()
+        token = uuid.uuid4().hex[:12]
+        query = 'poubelle debordante ' + token
+        self.assertFalse([hit for hit in fs.federated_search(query)['results'] if hit['type'] == 'incidents'])
+        conn = sqlite3.connect(incidents_api.DB_PATH)
+        cursor = conn.execute("INSERT INTO incidents (type, latitude, longitude, timestamp) "
+                              "VALUES (?, 51.089, -115.359, '2024-02-02T10:00:00Z')", ('Poubelle débordante ' + token,))
+        conn.commit()
+        hits = [hit for hit in fs.federated_search(query)['results'] if hit['type'] == 'incidents']
+        self.assertEqual([hit['id'] for hit in hits], [cursor.lastrowid])
+        conn.execute('DELETE FROM incidents WHERE id = ?', (cursor.lastrowid,))
+        conn.commit()
+        conn.close()
+        self.assertFalse([hit for hit in fs.federated_search(query)['results'] if hit['type'] == 'incidents'])
+
+
+class TestFederatedSearchAPI(unittest.TestCase):
+    """
+    Tests de GET /api/search
+
+    Vérifie que:
+    - Un incident ajouté est trouvé immédiatement (cache invalidé)
+    - Les paramètres invalides retournent 400
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        fs.warm_indexes()
+
+    def test_new_incident_is_searchable(self):
+        """
+        Test: Un incident ajouté après une recherche apparaît dans la recherche suivante
+        Importance: Vérifie l'invalidation du cache lors d'une modification d'incident
+        """
+        # Jeton unique : la base des incidents est conservée d'une exécution à l'autre
+        token = uuid.uuid4().hex[:12]
+        query = 'lampadaire renverse ' + token
+        before = self.client.get('/api/search', query_string={'q': query}).get_json()
+        self.assertFalse([hit for hit in before['results'] if hit['type'] == 'incidents'])
+        self.client.post('/api/incidents', data=json.dumps({
+            'type': 'Lampadaire renversé ' + token.upper(),
+            'description': 'Test recherche globale',
+            'latitude': 51.089,
+            'longitude': -115.359,
+            'timestamp': '2024-02-02T10:00:00Z'
+        }), content_type='application/json')
+        after = self.client.get('/api/search', query_string={'q': query}).get_json()
+        hits = [hit for hit in after['results'] if hit['type'] == 'incidents']
+        self.assertTrue(hits)
+        self.assertEqual(hits[0]['distance'], 0)
+        self.assertIn('id', hits[0])
+
+    def test_invalid_parameters(self):
+        """
+        Test: q manquant ou limit invalide retournent 400
+        Importance: Vérifie la validation des paramètres
+        """
+        self.assertEqual(self.client.get('/api/search').status_code, 400)
+        self.assertEqual(self.client.get('/api/search?q=%20').status_code, 400)
+        self.assertEqual(self.client.get('/api/search?q=parc&limit=0').status_code, 400)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
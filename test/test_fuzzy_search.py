@@ -0,0 +1,151 @@
+"""
+test_fuzzy_search.py
+Tests pour la recherche approximative - Normalisation, index de trigrammes, distance d'édition bornée
+
+Importance: Les tests de recherche approximative vérifient que les fautes de frappe, les accents
+et la casse n'empêchent pas de trouver un parc, un sentier ou une adresse, et que seuls les
+candidats proposés par l'index de trigrammes sont vérifiés.
+"""
+
+import unittest
+import random
+import sys
+import os
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.fuzzy_search import fold, substring_distance, TrigramIndex, allowed_distance
+from server.search_index import get_search_index
+
+
+def reference_distance(query, text):
+    """Distance d'édition sous-chaîne calculée sans borne (référence)"""
+    previous = list(range(len(query) + 1))
+    best = previous[-1]
+    for char in text:
+        current = [0]
+        for i in range(1, len(query) + 1):
+            current.append(min(previous[i] + 1, current[i - 1] + 1, previous[i - 1] + (query[i - 1] != char)))
+        previous = current
+        best = min(best, current[-1])
+    return best
+
+
+class TestFuzzyPrimitives(unittest.TestCase):
+    """
+    Tests des fonctions de base
+
+    Vérifie que:
+    - Les accents, la casse et les espaces sont normalisés
+    - La distance bornée est identique à la distance complète sous la borne
+    - L'index de trigrammes ne propose que des valeurs partageant des trigrammes
+    """
+
+    def test_fold(self):
+        """
+        Test: Accents, majuscules et espaces multiples sont normalisés
+        Importance: Vérifie que « Sécurité » et « securite » se comparent à égalité
+        """
+        self.assertEqual(fold('  Sécurité   PUBLIQUE '), 'securite publique')
+        self.assertEqual(fold(None), '')
+
+    def test_bounded_distance_matches_reference(self):
+        """
+        Test: La coupure d'Ukkonen ne change pas le résultat
+        Importance: Vérifie l'exactitude de la vérification bornée
+        """
+        rng = random.Random(3)
+        for _ in range(2000):
+            query = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 8)))
+            text = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 15)))
+            bound = rng.randint(0, 3)
+            expected = reference_distance(query, text)
+            self.assertEqual(substring_distance(query, text, bound), expected if expected <= bound else None)
+
+    def test_allowed_distance(self):
+        """
+        Test: Aucune faute tolérée sous 4 caractères, au plus 3 ensuite
+        Importance: Vérifie que les requêtes courtes ne retournent pas tout le jeu de données
+        """
+        self.assertEqual(allowed_distance('abc'), 0)
+        self.assertEqual(allowed_distance('settler wy'), 2)
+        self.assertEqual(allowed_distance('x' * 40), 3)
+
+    def test_trigram_index(self):
+        """
+        Test: La recherche retourne la valeur la plus proche en premier
+        Importance: Vérifie le classement par distance puis par début de valeur
+        """
+        index = TrigramIndex([fold(v) for v in ['Millenium Park', 'Quarry Lake Park', 'Riverside Park']])
+        self.assertEqual(index.search('Milenium Park')[0], (0, 1))
+        self.assertEqual(index.search('zzzz'), [])
+
+
+class TestFuzzyDatasetSearch(unittest.TestCase):
+    """
+    Tests de la recherche approximative sur les jeux de données et via l'API
+
+    Vérifie que:
+    - « Milenium Park » et « settler wy » trouvent leur valeur
+    - Les préfixes exacts restent en tête des suggestions
+    - L'API retourne la distance de chaque résultat
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_park_typo(self):
+        """
+        Test: « Milenium Park » trouve « Millenium Park »
+        Importance: Vérifie la tolérance à une lettre manquante
+        """
+        self.assertEqual(get_search_index('parcs').fuzzy('Milenium Park')[0], ('Millenium Park', 1))
+
+    def test_address_typo_and_accents(self):
+        """
+        Test: « settler wy » et « Sêttler way » trouvent des adresses de SETTLER WAY
+        Importance: Vérifie la recherche dans les ~14 000 adresses
+        """
+        index = get_search_index('addresses')
+        for query in ('settler wy', 'Sêttler way'):
+            results = index.fuzzy(query, 5)
+            self.assertEqual(len(results), 5)
+            self.assertTrue(all(value.endswith('SETTLER WAY') for value, _distance in results))
+
+    def test_prefix_matches_first(self):
+        """
+        Test: Les correspondances par préfixe sont retournées avant les approximatives
+        Importance: Vérifie que l'ancien comportement des suggestions est conservé
+        """
+        index = get_search_index('addresses')
+        prefix = index.prefix('111', 3)
+        self.assertEqual([value for value, _distance in index.fuzzy('111', 3)], prefix)
+
+    def test_fuzzy_api(self):
+        """
+        Test: GET /api/search/parcs?q= retourne valeur et distance
+        Importance: Vérifie le format utilisé par la page info
+        """
+        response = self.client.get('/api/search/parcs?q=milenium%20prk&limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['results'][0], {'value': 'Millenium Park', 'distance': 2})
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,201 @@
+"""
+test_geocoder.py
+Tests pour le géocodage inverse - Conversion Web Mercator, arbre k-d, API et enrichissement des incidents
+
+Importance: Les tests du géocodeur vérifient que les adresses de Addresses.csv sont correctement
+converties en latitude/longitude, que l'arbre k-d retourne exactement les mêmes adresses qu'une
+recherche exhaustive, et que chaque incident reçoit son adresse la plus proche en arrière-plan.
+"""
+
+import unittest
+import json
+import math
+import random
+import sqlite3
+import sys
+import os
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.geocoder import get_geocoder, enrich_incidents, ReverseGeocoder, NO_ADDRESS
+from server.projection import mercator_to_wgs84
+from server import tasks
+
+
+class TestReverseGeocoder(unittest.TestCase):
+    """
+    Tests de l'index des adresses
+
+    Vérifie que:
+    - La conversion Web Mercator → WGS84 est exacte
+    - Toutes les adresses du CSV sont indexées dans Canmore
+    - Les k plus proches correspondent à une recherche exhaustive
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.geocoder = get_geocoder()
+
+    def brute_force(self, latitude, longitude, k):
+        """Distances des k adresses les plus proches, calculées sur toutes les adresses"""
+        g = self.geocoder
+        x = (longitude - g.lon0) * g.kx
+        y = (latitude - g.lat0) * g.ky
+        distances = sorted(
+            math.hypot((lon - g.lon0) * g.kx - x, (lat - g.lat0) * g.ky - y)
+            for lat, lon in zip(g.lats.tolist(), g.lons.tolist())
+        )
+        return [round(d, 1) for d in distances[:k]]
+
+    def test_mercator_conversion(self):
+        """
+        Test: L'origine et un point connu sont convertis correctement
+        Importance: Vérifie la formule inverse de la projection Web Mercator
+        """
+        lons, lats = mercator_to_wgs84([0.0, -12839092.5419], [0.0, 6636709.452])
+        self.assertAlmostEqual(lons[0], 0.0)
+        self.assertAlmostEqual(lats[0], 0.0)
+        self.assertAlmostEqual(lons[1], -115.3355, places=3)
+        self.assertAlmostEqual(lats[1], 51.0871, places=3)
+
+    def test_all_addresses_indexed(self):
+        """
+        Test: Les ~14 000 adresses sont indexées et situées autour de Canmore
+        Importance: Vérifie qu'aucune ligne valide n'est perdue à la construction
+        """
+        self.assertGreater(len(self.geocoder), 14000)
+        self.assertTrue(50.9 < self.geocoder.lats.min() and self.geocoder.lats.max() < 51.2)
+
+    def test_matches_brute_force(self):
+        """
+        Test: Les distances retournées sont celles d'une recherche exhaustive
+        Importance: Vérifie que l'élagage de l'arbre ne manque aucune adresse
+        """
+        rng = random.Random(7)
+        for _ in range(100):
+            lat, lon = rng.uniform(51.0, 51.15), rng.uniform(-115.45, -115.25)
+            for k in (1, 5):
+                found = [r['distance_m'] for r in self.geocoder.nearest(lat, lon, k)]
+                self.assertEqual(found, self.brute_force(lat, lon, k))
+
+    def test_shared_position(self):
+        """
+        Test: Plusieurs adresses à la même position sont toutes retournées
+        Importance: Vérifie le regroupement des unités d'un même bâtiment
+        """
+        geocoder = ReverseGeocoder(
+            [{'address': 'A', 'fid': 1}, {'address': 'B', 'fid': 2}, {'address': 'C', 'fid': 3}],
+            [-115.0, -115.0, -115.1], [51.0, 51.0, 51.0]
+        )
+        found = geocoder.nearest(51.0, -115.0, 2)
+        self.assertEqual(sorted(r['address'] for r in found), ['A', 'B'])
+        self.assertEqual(found[0]['distance_m'], 0.0)
+        self.assertEqual(len(geocoder.nearest(51.0, -115.0, 10)), 3)
+
+
+class TestReverseGeocodeAPI(unittest.TestCase):
+    """
+    Tests de /api/geocode/reverse et de l'enrichissement des incidents
+
+    Vérifie que:
+    - L'API retourne les adresses triées par distance
+    - Les paramètres invalides retournent 400
+    - Un nouvel incident reçoit son adresse la plus proche en arrière-plan
+    - Un incident sans adresse est marqué une fois pour toutes
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            from server.routes.incidents_api import init_db, DB_PATH
+            self.db_path = DB_PATH
+            init_db()
+
+    def test_reverse_geocode(self):
+        """
+        Test: GET /api/geocode/reverse retourne k adresses triées
+        Importance: Vérifie le format de réponse utilisé par le frontend
+        """
+        response = self.client.get('/api/geocode/reverse?lat=51.089&lon=-115.359&k=3')
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual(len(results), 3)
+        distances = [r['distance_m'] for r in results]
+        self.assertEqual(distances, sorted(distances))
+        self.assertIn('address', results[0])
+
+    def test_invalid_parameters(self):
+        """
+        Test: lat manquant, non numérique ou k hors limites retournent 400
+        Importance: Vérifie la validation des paramètres de requête
+        """
+        for query in ('lon=-115.359', 'lat=abc&lon=-115.359', 'lat=51.089&lon=-115.359&k=0',
+                      'lat=51.089&lon=-115.359&k=500', 'lat=95&lon=-115.359'):
+            self.assertEqual(self.client.get('/api/geocode/reverse?' + query).status_code, 400)
+
+    def test_incident_enriched_with_nearest_address(self):
+        """
+        Test: Après insertion, l'incident reçoit nearest_address et nearest_address_m
+        Importance: Vérifie l'enrichissement en arrière-plan hors du chemin critique
+        """
+        response = self.client.post('/api/incidents', data=json.dumps({
+            'type': 'Nid de poule',
+            'description': 'Test géocodage',
+            'latitude': 51.089,
+            'longitude': -115.359,
+            'timestamp': '2024-02-02T10:00:00Z'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(tasks.drain(timeout=10))
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT * FROM incidents ORDER BY id DESC LIMIT 1').fetchone()
+        conn.close()
+        expected = get_geocoder().nearest(51.089, -115.359)[0]
+        self.assertEqual(row['nearest_address'], expected['address'])
+        self.assertAlmostEqual(row['nearest_address_m'], expected['distance_m'])
+
+    def test_miss_is_not_retried(self):
+        """
+        Test: Un incident sans adresse possible reçoit NO_ADDRESS et sort de l'index partiel
+        Importance: Sinon chaque écriture relirait ces incidents (et toute la table) indéfiniment
+        """
+        conn = sqlite3.connect(self.db_path)
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id, latitude, longitude FROM incidents WHERE nearest_address IS NULL'))
+        self.assertIn('idx_incidents_unenriched', plan)
+        cursor = conn.execute("INSERT INTO incidents (type, latitude, longitude, timestamp) "
+                              "VALUES ('Test géocodage', 'inconnue', 'inconnue', '2024-02-02T10:00:00Z')")
+        incident_id = cursor.lastrowid
+        conn.commit()
+        try:
+            enrich_incidents()
+            row = conn.execute('SELECT nearest_address, nearest_address_m FROM incidents WHERE id = ?',
+                               (incident_id,)).fetchone()
+            self.assertEqual(row, (NO_ADDRESS, None))
+            pending = conn.execute('SELECT COUNT(*) FROM incidents WHERE nearest_address IS NULL').fetchone()[0]
+            self.assertEqual(pending, 0)
+        finally:
+            conn.execute('DELETE FROM incidents WHERE id = ?', (incident_id,))
+            conn.commit()
+            conn.close()
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,203 @@
+"""
+test_geofence.py
+Tests pour la validation côté serveur de la limite de Canmore - Grille précalculée, mode vectorisé, API
+
+Importance: Les tests du geofence vérifient que le test point-dans-polygone accéléré par grille
+donne exactement le même résultat que le lancer de rayon complet, que l'API refuse les incidents
+hors de Canmore et que l'import en lot valide toutes les positions en un seul appel.
+"""
+
+import unittest
+import json
+import random
+import sys
+import os
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.geofence import Geofence, get_geofence, ray_cast, is_valid_coordinate
+
+# Point à l'intérieur de Canmore et point hors de la limite (Calgary)
+INSIDE = (51.089, -115.359)
+OUTSIDE = (51.0447, -114.0719)
+
+
+class TestGeofenceIndex(unittest.TestCase):
+    """
+    Tests de l'index point-dans-polygone
+
+    Vérifie que:
+    - La grille donne le même résultat que le lancer de rayon sur toutes les arêtes
+    - Le mode vectorisé correspond au mode scalaire
+    - Les trous d'un polygone sont exclus
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.geofence = get_geofence()
+
+    def random_points(self, count):
+        """Génère des points aléatoires dans une emprise un peu plus large que la limite"""
+        minx, miny, maxx, maxy = self.geofence.bbox
+        rng = random.Random(42)
+        return [
+            (rng.uniform(minx - 0.01, maxx + 0.01), rng.uniform(miny - 0.01, maxy + 0.01))
+            for _ in range(count)
+        ]
+
+    def test_known_points(self):
+        """
+        Test: Un point du centre-ville est dedans, Calgary est dehors
+        Importance: Vérifie l'orientation (longitude, latitude) de l'index
+        """
+        self.assertTrue(self.geofence.contains(INSIDE[1], INSIDE[0]))
+        self.assertFalse(self.geofence.contains(OUTSIDE[1], OUTSIDE[0]))
+
+    def test_grid_matches_brute_force(self):
+        """
+        Test: Le résultat avec grille est identique au lancer de rayon complet
+        Importance: Vérifie que l'accélération ne change aucune réponse
+        """
+        for x, y in self.random_points(5000):
+            self.assertEqual(self.geofence.contains(x, y), ray_cast(x, y, self.geofence.edges))
+
+    def test_contains_many_matches_contains(self):
+        """
+        Test: Le mode vectorisé retourne les mêmes booléens que le mode scalaire
+        Importance: Vérifie la validation en lot utilisée par l'import
+        """
+        points = self.random_points(5000)
+        result = self.geofence.contains_many([p[0] for p in points], [p[1] for p in points])
+        self.assertEqual(result.tolist(), [self.geofence.contains(x, y) for x, y in points])
+
+    def test_polygon_with_hole(self):
+        """
+        Test: Un point dans le trou d'un polygone est dehors
+        Importance: Vérifie la règle pair-impair sur les anneaux intérieurs
+        """
+        outer = [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+        hole = [(4, 4), (6, 4), (6, 6), (4, 6), (4, 4)]
+        geofence = Geofence([outer, hole], grid_size=8)
+        self.assertTrue(geofence.contains(2, 2))
+        self.assertFalse(geofence.contains(5, 5))
+        self.assertEqual(geofence.contains_many([2, 5, 11], [2, 5, 5]).tolist(), [True, False, False])
+
+    def test_invalid_coordinates(self):
+        """
+        Test: Les valeurs non numériques, non finies ou hors plage sont refusées
+        Importance: Vérifie que les données mal formées n'atteignent pas le geofence
+        """
+        self.assertTrue(is_valid_coordinate(*INSIDE))
+        for lat, lon in [('51', -115), (None, -115), (float('nan'), -115), (91, -115), (51, 181), (True, -115)]:
+            self.assertFalse(is_valid_coordinate(lat, lon))
+
+
+class TestGeofenceAPI(unittest.TestCase):
+    """
+    Tests de la validation de la limite par l'API
+
+    Vérifie que:
+    - Un incident hors de Canmore est rejeté avec 400
+    - L'import en lot insère les incidents valides et rejette les autres
+    - /api/geofence/contains valide une liste de points
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            from server.routes.incidents_api import init_db
+            init_db()
+
+    def incident(self, latitude, longitude):
+        """Construit un incident de test à la position donnée"""
+        return {
+            'type': 'Nid de poule',
+            'description': 'Test geofence',
+            'latitude': latitude,
+            'longitude': longitude,
+            'timestamp': '2024-02-02T10:00:00Z'
+        }
+
+    def test_incident_outside_canmore_rejected(self):
+        """
+        Test: POST /api/incidents hors de la limite retourne 400
+        Importance: Vérifie que la validation ne dépend plus du navigateur
+        """
+        response = self.client.post('/api/incidents', data=json.dumps(self.incident(*OUTSIDE)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Canmore', response.get_json()['error'])
+
+    def test_non_numeric_coordinates_rejected(self):
+        """
+        Test: Une latitude textuelle retourne 400
+        Importance: Vérifie que les coordonnées sont validées avant le test de la limite
+        """
+        response = self.client.post('/api/incidents', data=json.dumps(self.incident('abc', -115.359)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_import_partial(self):
+        """
+        Test: L'import en lot insère les incidents dans Canmore et rejette les autres par index
+        Importance: Vérifie la validation vectorisée et le rapport d'erreurs
+        """
+        before = len(self.client.get('/api/incidents').get_json())
+        payload = [self.incident(*INSIDE), self.incident(*OUTSIDE), {'type': 'Incomplet'}, self.incident(51.08, -115.35)]
+        response = self.client.post('/api/incidents/bulk', data=json.dumps(payload),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        body = response.get_json()
+        self.assertEqual(body['inserted'], 2)
+        self.assertEqual([item['index'] for item in body['rejected']], [1, 2])
+        after = len(self.client.get('/api/incidents').get_json())
+        self.assertEqual(after - before, 2)
+
+    def test_bulk_import_all_rejected(self):
+        """
+        Test: Un lot sans aucun incident valide retourne 400
+        Importance: Vérifie que rien n'est inséré quand tout est hors limite
+        """
+        response = self.client.post('/api/incidents/bulk', data=json.dumps([self.incident(*OUTSIDE)]),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['inserted'], 0)
+
+    def test_contains_endpoint(self):
+        """
+        Test: /api/geofence/contains retourne un booléen par point
+        Importance: Vérifie la validation en lot exposée au frontend
+        """
+        response = self.client.post('/api/geofence/contains', data=json.dumps({'points': [INSIDE, OUTSIDE]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['inside'], [True, False])
+
+    def test_contains_endpoint_invalid(self):
+        """
+        Test: Un corps sans liste de points retourne 400
+        Importance: Vérifie la gestion des requêtes mal formées
+        """
+        response = self.client.post('/api/geofence/contains', data=json.dumps({'points': [['a']]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,173 @@
+"""
+test_geojson_stream.py
+Tests pour la lecture incrémentale des fichiers GeoJSON - Entités une à une, comptage, bbox, mémoire
+
+Importance: Les tests de lecture incrémentale vérifient que les entités lues en flux sont identiques
+à celles d'un chargement complet, quelle que soit la taille des blocs lus, et que la mémoire utilisée
+reste bornée même pour un fichier de plusieurs mégaoctets.
+"""
+
+import unittest
+import json
+import sys
+import os
+import tempfile
+import tracemalloc
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.geojson_stream import (
+    iter_features, iter_geojson, count_features, compute_bbox, scan, GeoJSONStreamError
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'data')
+LAYERS = ['buildings', 'parcs', 'sports_fields', 'trails', 'city_boundary']
+
+
+class TestStreamingMatchesFullLoad(unittest.TestCase):
+    """
+    Tests de cohérence avec json.load
+
+    Vérifie que:
+    - Les entités lues en flux sont identiques à celles du document complet
+    - Le découpage en petits blocs ne change pas le résultat
+    - Le comptage et la bbox correspondent au document complet
+    """
+
+    def load(self, layer):
+        """Charge le document complet pour comparaison"""
+        with open(os.path.join(DATA_DIR, layer + '.geojson'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_features_identical_for_all_layers(self):
+        """
+        Test: Les entités lues en flux sont identiques pour chaque couche
+        Importance: Vérifie que le lecteur incrémental est un remplacement exact de json.load
+        """
+        for layer in LAYERS:
+            path = os.path.join(DATA_DIR, layer + '.geojson')
+            self.assertEqual(list(iter_features(path)), self.load(layer)['features'], layer)
+
+    def test_small_chunks_give_same_result(self):
+        """
+        Test: Des blocs de 7 caractères donnent les mêmes entités
+        Importance: Vérifie la reprise correcte des valeurs coupées entre deux blocs (nombres, chaînes)
+        """
+        path = os.path.join(DATA_DIR, 'parcs.geojson')
+        self.assertEqual(list(iter_features(path, chunk_size=7)), self.load('parcs')['features'])
+
+    def test_count_and_bbox(self):
+        """
+        Test: Le comptage et l'emprise retournent le nombre d'entités et l'emprise exacts
+        Importance: Vérifie count_features() et compute_bbox() sur la couche des sentiers
+        """
+        path = os.path.join(DATA_DIR, 'trails.geojson')
+        self.assertEqual(count_features(path), 644)
+        count, bbox = scan(path)
+        self.assertEqual(count, 644)
+        self.assertEqual(bbox, compute_bbox(path))
+        xs = []
+        ys = []
+        for feature in self.load('trails')['features']:
+            lines = feature['geometry']['coordinates']
+            if feature['geometry']['type'] == 'LineString':
+                lines = [lines]
+            for line in lines:
+                xs.extend(p[0] for p in line)
+                ys.extend(p[1] for p in line)
+        self.assertEqual(bbox, [min(xs), min(ys), max(xs), max(ys)])
+
+    def test_top_level_members_are_reported(self):
+        """
+        Test: Les membres de premier niveau (type, crs) sont aussi produits
+        Importance: Vérifie que les métadonnées de la couche restent accessibles
+        """
+        path = os.path.join(DATA_DIR, 'city_boundary.geojson')
+        members = dict((key, value) for key, value in iter_geojson(path) if key != 'feature')
+        self.assertEqual(members['type'], 'FeatureCollection')
+        self.assertIn('crs', members)
+
+
+class TestStreamingEdgeCases(unittest.TestCase):
+    """
+    Tests des cas limites
+
+    Vérifie que:
+    - Une collection vide ne produit aucune entité
+    - Un fichier tronqué lève une erreur
+    - Le comptage sans décodage ignore les accolades et guillemets des chaînes
+    - La mémoire reste bornée sur un grand fichier
+    """
+
+    def write(self, text):
+        """Écrit un fichier temporaire et retourne son chemin"""
+        f = tempfile.NamedTemporaryFile('w', suffix='.geojson', delete=False, encoding='utf-8')
+        f.write(text)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_empty_collection(self):
+        """
+        Test: Une FeatureCollection sans entité retourne 0
+        Importance: Vérifie le cas limite d'une couche vide
+        """
+        path = self.write('{"type": "FeatureCollection", "features": [ ]}')
+        self.assertEqual(count_features(path), 0)
+        self.assertIsNone(compute_bbox(path))
+
+    def test_truncated_file_raises(self):
+        """
+        Test: Un fichier tronqué lève GeoJSONStreamError
+        Importance: Vérifie qu'un fichier corrompu n'est pas lu silencieusement en partie
+        """
+        path = self.write('{"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": ')
+        with self.assertRaises(GeoJSONStreamError):
+            list(iter_features(path))
+        with self.assertRaises(GeoJSONStreamError):
+            count_features(path)
+
+    def test_count_skips_tricky_strings(self):
+        """
+        Test: Accolades et guillemets échappés dans les chaînes, blocs de 1 à 40 caractères
+        Importance: Vérifie que le comptage sans décodage ne confond pas le texte des chaînes et la structure
+        """
+        features = [
+            {'type': 'Feature', 'properties': {'NOM': 'a "}{" \\ é', 'v': [1, {'k': '}'}]},
+             'geometry': {'type': 'Point', 'coordinates': [1.5, -2]}},
+            {'type': 'Feature', 'properties': None, 'geometry': None},
+            {'type': 'Feature', 'properties': {'\\': '"'}, 'geometry': None, 'id': '"}"'},
+        ]
+        path = self.write(json.dumps({'type': 'FeatureCollection', 'features': features,
+                                      'crs': {'name': '}'}}, ensure_ascii=False))
+        for chunk_size in range(1, 41):
+            self.assertEqual(count_features(path, chunk_size), 3, chunk_size)
+
+    def test_memory_is_bounded_on_large_file(self):
+        """
+        Test: Le comptage d'un fichier d'environ 8 Mo utilise moins de 1 Mo de mémoire
+        Importance: Vérifie que la mémoire ne dépend pas de la taille du fichier
+        """
+        feature = {
+            'type': 'Feature',
+            'properties': {'FID': 1, 'NAME': 'Sentier'},
+            'geometry': {'type': 'LineString', 'coordinates': [[-115.35 + i * 1e-5, 51.08] for i in range(20)]}
+        }
+        text = json.dumps(feature)
+        path = self.write('{"type": "FeatureCollection", "features": [' + ','.join([text] * 14000) + ']}')
+        self.assertGreater(os.path.getsize(path), 8_000_000)
+        tracemalloc.start()
+        try:
+            count = count_features(path)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(count, 14000)
+        self.assertLess(peak, 1_000_000)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+"""
+test_incident_changes.py
+Tests pour le journal des modifications des incidents - Déclencheurs, lecture incrémentale, purge
+
+Importance: En multi-worker, l'index de recherche et le rapport par élément de chaque worker ne
+voient les écritures des autres qu'à travers ce journal. Ces tests vérifient que toute écriture
+y est inscrite, que la lecture ne retourne que les modifications suivantes, et qu'un lecteur trop
+en retard (journal purgé) est détecté pour être reconstruit.
+"""
+
+import unittest
+import sqlite3
+import sys
+import os
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import incident_changes
+from server.incident_changes import init_change_log, read_changes, read_snapshot, rows_by_id
+
+
+class TestIncidentChanges(unittest.TestCase):
+    """
+    Tests du journal sur une base en mémoire
+
+    Vérifie que:
+    - Ajout, modification et suppression sont journalisés par les déclencheurs
+    - read_changes retourne la dernière modification de chaque incident
+    - Un journal purgé au-delà du lecteur retourne None
+    """
+
+    def setUp(self):
+        """Base en mémoire avec la table incidents et le journal (fenêtre de 5 modifications)"""
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('CREATE TABLE incidents (id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT)')
+        with mock.patch.object(incident_changes, 'CHANGE_LOG_KEEP', 5):
+            init_change_log(self.conn)
+        self.addCleanup(self.conn.close)
+
+    def insert(self):
+        return self.conn.execute("INSERT INTO incidents (status) VALUES ('unsolved')").lastrowid
+
+    def test_writes_are_logged(self):
+        """
+        Test: Les modifications après un instantané sont lues, la plus récente de chaque incident l'emporte
+        Importance: Un cache doit appliquer exactement ce qui a changé depuis sa construction
+        """
+        first = self.insert()
+        seq, rows = read_snapshot(self.conn, 'SELECT id FROM incidents')
+        self.assertEqual((seq, [row['id'] for row in rows]), (1, [first]))
+        second = self.insert()
+        self.conn.execute("UPDATE incidents SET status = 'solved' WHERE id = ?", (first,))
+        self.conn.execute('DELETE FROM incidents WHERE id = ?', (second,))
+        self.assertEqual(read_changes(self.conn, seq), (4, {first: False, second: True}))
+        self.assertEqual(read_changes(self.conn, 4), (4, {}))
+
+    def test_pruned_log(self):
+        """
+        Test: Au-delà de la fenêtre conservée, un lecteur en retard reçoit None
+        Importance: Il ne doit pas manquer silencieusement des modifications purgées
+        """
+        for _ in range(8):
+            self.insert()
+        count = self.conn.execute('SELECT COUNT(*) FROM incident_changes').fetchone()[0]
+        self.assertEqual(count, 5)
+        self.assertIsNone(read_changes(self.conn, 0))
+        self.assertEqual(read_changes(self.conn, 3)[0], 8)
+
+    def test_rows_by_id_in_chunks(self):
+        """
+        Test: Les lignes d'une longue liste d'identifiants sont lues par paquets
+        Importance: SQLite limite le nombre de paramètres d'une requête
+        """
+        ids = [self.insert() for _ in range(12)]
+        with mock.patch.object(incident_changes, 'IDS_PER_QUERY', 5):
+            rows = rows_by_id(self.conn, 'SELECT id FROM incidents', ids)
+        self.assertEqual(sorted(row['id'] for row in rows), ids)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,120 @@
+"""
+test_incident_events.py
+Tests pour les notifications temps réel - Incidents complets dans les événements Socket.IO
+
+Importance: La carte met à jour ses marqueurs sur place à partir des événements : chaque ajout,
+import, changement de statut ou suppression doit transmettre l'identifiant de l'incident et
+toutes ses colonnes, sans que le client ait à recharger la liste complète.
+"""
+
+import unittest
+import json
+import sys
+import os
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server import realtime
+
+
+class TestIncidentEvents(unittest.TestCase):
+    """
+    Tests des événements incident_added, incidents_imported, incident_updated, incident_deleted
+
+    Vérifie que:
+    - Les événements contiennent l'identifiant et les colonnes de l'incident
+    - La réponse de POST /api/incidents contient l'incident enregistré
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test : les émissions Socket.IO sont enregistrées"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        patcher = mock.patch.object(self.app.socketio, 'emit')
+        self.emit = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Événements laissés en attente par un test précédent
+        app.event_coalescer.flush()
+        self.emit.reset_mock()
+        # Un client sans abonnement explicite reçoit tous les événements
+        app.subscriptions.subscribe(realtime.Subscription('client-test'))
+        self.addCleanup(app.subscriptions.unsubscribe, 'client-test')
+
+    def incident(self, description='Test événement'):
+        """Construit un incident de test"""
+        return {'type': 'Nid de poule', 'description': description, 'latitude': 51.089,
+                'longitude': -115.359, 'timestamp': '2024-02-02T10:00:00Z'}
+
+    def frames(self):
+        """Trames incidents_batch émises, après envoi des événements en attente (vidées après lecture)"""
+        app.event_coalescer.flush()
+        found = [call.args[1] for call in self.emit.call_args_list if call.args[0] == realtime.BATCH_EVENT]
+        self.emit.reset_mock()
+        return found
+
+    def events(self, name):
+        """Incidents des événements de ce type contenus dans les trames émises"""
+        return [event['incident'] for frame in self.frames() for event in frame['events'] if event['type'] == name]
+
+    def test_added_and_updated_carry_full_incident(self):
+        """
+        Test: incident_added puis incident_updated transmettent l'incident complet
+        Importance: Vérifie que le client peut créer puis modifier le marqueur sans rechargement
+        """
+        response = self.client.post('/api/incidents', data=json.dumps(self.incident()),
+                                    content_type='application/json')
+        body = response.get_json()
+        added = self.events('incident_added')
+        self.assertEqual(len(added), 1)
+        self.assertEqual(added[0]['id'], body['id'])
+        self.assertEqual(body['incident'], added[0])
+        for field in ('type', 'description', 'latitude', 'longitude', 'timestamp', 'status', 'feature_layer'):
+            self.assertIn(field, added[0])
+        self.assertEqual(added[0]['status'], 'unsolved')
+
+        self.client.patch(f"/api/incidents/{body['id']}", data=json.dumps({'status': 'solved'}),
+                          content_type='application/json')
+        updated = self.events('incident_updated')
+        self.assertEqual(updated[0]['id'], body['id'])
+        self.assertEqual(updated[0]['status'], 'solved')
+        self.assertEqual(updated[0]['latitude'], 51.089)
+
+        self.client.delete(f"/api/incidents/{body['id']}")
+        deleted = self.events('incident_deleted')
+        self.assertEqual([event['id'] for event in deleted], [body['id']])
+        # La position est transmise pour acheminer l'événement aux clients abonnés à la zone
+        self.assertEqual(deleted[0]['latitude'], 51.089)
+
+    def test_bulk_import_carries_incidents(self):
+        """
+        Test: Un import en lot produit une seule trame contenant chaque incident inséré avec son id
+        Importance: Vérifie que l'import en lot n'oblige pas le client à tout recharger
+        """
+        batch = [self.incident('Lot A'), self.incident('Lot B'), dict(self.incident(), latitude=0.0)]
+        response = self.client.post('/api/incidents/bulk', data=json.dumps(batch), content_type='application/json')
+        self.assertEqual(response.get_json()['inserted'], 2)
+        frames = self.frames()
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0]['count'], 2)
+        incidents = [event['incident'] for event in frames[0]['events'] if event['type'] == 'incident_added']
+        self.assertEqual([incident['description'] for incident in incidents], ['Lot A', 'Lot B'])
+        self.assertLess(incidents[0]['id'], incidents[1]['id'])
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,253 @@
+"""
+test_incident_taxonomy.py
+Tests pour la taxonomie des types d'incidents - Identifiants stables, encodage compact, réponse versionnée
+
+Importance: Les tests de taxonomie vérifient que chaque sujet et détail reçoit un identifiant entier stable,
+que les incidents stockent ces identifiants au lieu du texte complet tout en étant relus à l'identique,
+et que l'API des types d'incidents peut être mise en cache par le navigateur.
+"""
+
+import unittest
+import json
+import sqlite3
+import sys
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server import incident_taxonomy
+from server.routes import incidents_api
+from server.incident_taxonomy import get_taxonomy
+
+
+class TestTaxonomyIds(unittest.TestCase):
+    """
+    Tests des identifiants de la taxonomie
+
+    Vérifie que:
+    - Chaque sujet et détail du CSV a un identifiant entier
+    - Les identifiants ne changent pas d'un chargement à l'autre
+    - La taxonomie n'est pas reconstruite si le CSV n'a pas changé
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        with self.app.app_context():
+            from server.routes.incidents_api import init_db
+            init_db()
+
+    def test_every_subject_and_detail_has_an_id(self):
+        """
+        Test: Les 2 sujets et 8 détails du CSV ont un identifiant entier
+        Importance: Vérifie que toute la taxonomie est encodable
+        """
+        taxonomy = get_taxonomy()
+        self.assertEqual([s['subject'] for s in taxonomy.subjects], ['Infrastructure', 'Sécurité publique'])
+        ids = [i for s in taxonomy.subjects for i in s['detail_ids']]
+        self.assertEqual(len(ids), 8)
+        self.assertEqual(len(set(ids)), 8)
+        self.assertTrue(all(isinstance(i, int) for i in ids))
+
+    def test_ids_are_stable(self):
+        """
+        Test: Les identifiants sont relus depuis les tables de correspondance
+        Importance: Vérifie qu'un rechargement n'attribue pas de nouveaux identifiants
+        """
+        from server.incident_taxonomy import assign_ids, read_subjects
+        from server.routes.incidents_api import get_db_connection
+        taxonomy = get_taxonomy()
+        conn = get_db_connection()
+        try:
+            entries = assign_ids(conn, read_subjects(taxonomy.source))
+        finally:
+            conn.close()
+        self.assertEqual(entries, taxonomy.subjects)
+
+    def test_taxonomy_is_cached(self):
+        """
+        Test: Deux appels retournent le même objet
+        Importance: Vérifie que le CSV n'est pas relu à chaque requête
+        """
+        self.assertIs(get_taxonomy(), get_taxonomy())
+
+
+class TestCompactIncidentTypes(unittest.TestCase):
+    """
+    Tests de l'encodage compact des incidents
+
+    Vérifie que:
+    - Un incident de la taxonomie est stocké avec type_id et detail_id
+    - L'API retourne le texte d'origine
+    - Un type inconnu reste stocké en texte
+    - Un rechargement de la taxonomie n'écrit jamais pendant la transaction d'insertion
+    - Après un changement de base, les identifiants sont ceux des tables de la nouvelle base
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            from server.routes.incidents_api import init_db, DB_PATH
+            self.db_path = DB_PATH
+            init_db()
+
+    def post(self, subject, detail):
+        """Crée un incident et retourne la ligne brute stockée en base"""
+        self.client.post('/api/incidents', data=json.dumps({
+            'type': subject,
+            'description': detail,
+            'latitude': 51.089,
+            'longitude': -115.359,
+            'timestamp': '2024-02-02T10:00:00Z'
+        }), content_type='application/json')
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT * FROM incidents ORDER BY id DESC LIMIT 1').fetchone()
+        conn.close()
+        return row
+
+    def test_known_type_is_stored_as_ids(self):
+        """
+        Test: Un sujet et un détail connus sont stockés sous forme d'identifiants
+        Importance: Vérifie que le texte complet n'est plus répété dans chaque ligne
+        """
+        row = self.post('Sécurité publique', 'Faune sauvage')
+        taxonomy = get_taxonomy()
+        self.assertEqual(row['type_id'], taxonomy.subject_ids['Sécurité publique'])
+        self.assertIsNotNone(row['detail_id'])
+        self.assertEqual(row['type'], '')
+        self.assertIsNone(row['description'])
+
+    def test_known_type_is_decoded_by_api(self):
+        """
+        Test: GET /api/incidents retourne le texte du sujet et du détail
+        Importance: Vérifie que l'encodage est transparent pour le frontend
+        """
+        row = self.post('Infrastructure', 'Banc endommagé')
+        incidents = self.client.get('/api/incidents').get_json()
+        incident = next(inc for inc in incidents if inc['id'] == row['id'])
+        self.assertEqual(incident['type'], 'Infrastructure')
+        self.assertEqual(incident['description'], 'Banc endommagé')
+
+    def test_unknown_type_is_stored_as_text(self):
+        """
+        Test: Un type absent de la taxonomie reste stocké en texte
+        Importance: Vérifie la compatibilité avec les types libres
+        """
+        row = self.post('Autre', 'Description libre')
+        self.assertIsNone(row['type_id'])
+        self.assertEqual(row['type'], 'Autre')
+        self.assertEqual(row['description'], 'Description libre')
+
+    def test_taxonomy_reload_during_insert(self):
+        """
+        Test: Une taxonomie qui écrit dans la base (rechargement du CSV) ne bloque pas l'insertion
+        Importance: Elle attendait le verrou de la transaction ouverte : 5 s, puis erreur 500
+        """
+        real_get_taxonomy = incident_taxonomy.get_taxonomy
+
+        def reloading_taxonomy():
+            # Comme assign_ids : écriture par une autre connexion, délai d'attente court
+            conn = sqlite3.connect(self.db_path, timeout=0.2)
+            conn.execute("INSERT OR IGNORE INTO incident_subjects (name) VALUES ('Infrastructure')")
+            conn.commit()
+            conn.close()
+            return real_get_taxonomy()
+
+        incident = {'type': 'Infrastructure', 'description': 'Banc endommagé', 'latitude': 51.089,
+                    'longitude': -115.359, 'timestamp': '2024-02-02T10:00:00Z'}
+        with mock.patch.object(incident_taxonomy, 'get_taxonomy', reloading_taxonomy), \
+                mock.patch.object(incidents_api, 'get_taxonomy', reloading_taxonomy):
+            response = self.client.post('/api/incidents', json=incident)
+            bulk = self.client.post('/api/incidents/bulk', json=[incident, incident])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['incident']['description'], 'Banc endommagé')
+        self.assertEqual(bulk.status_code, 201)
+        self.assertEqual(bulk.get_json()['inserted'], 2)
+
+    def test_new_database_gets_its_own_ids(self):
+        """
+        Test: Après configure_storage vers une base neuve, un incident encodé y trouve ses sujet et détail
+        Importance: Des identifiants de l'ancienne base rendraient la ligne indéchiffrable (texte effacé)
+        """
+        get_taxonomy()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.addCleanup(incidents_api.configure_storage, incidents_api.DB_PATH)
+        self.db_path = os.path.join(tmp_dir, 'incidents.db')
+        incidents_api.configure_storage(self.db_path)
+        incidents_api.init_db()
+        row = self.post('Infrastructure', 'Banc endommagé')
+        conn = sqlite3.connect(self.db_path)
+        subject = conn.execute('SELECT name FROM incident_subjects WHERE id = ?', (row['type_id'],)).fetchone()
+        detail = conn.execute('SELECT name FROM incident_details WHERE id = ?', (row['detail_id'],)).fetchone()
+        conn.close()
+        self.assertEqual((subject, detail), (('Infrastructure',), ('Banc endommagé',)))
+
+
+class TestVersionedIncidentTypesAPI(unittest.TestCase):
+    """
+    Tests de la réponse versionnée de /api/incident_types
+
+    Vérifie que:
+    - La réponse porte un ETag égal à la version de la taxonomie
+    - Une requête conditionnelle retourne 304
+    - L'URL versionnée est mise en cache de façon permanente
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_etag_and_conditional_request(self):
+        """
+        Test: If-None-Match avec l'ETag courant retourne 304
+        Importance: Vérifie que le navigateur peut revalider sans retélécharger la liste
+        """
+        response = self.client.get('/api/incident_types')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Taxonomy-Version'], get_taxonomy().version)
+        again = self.client.get('/api/incident_types', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_versioned_url_is_immutable(self):
+        """
+        Test: /api/incident_types?v=<version> est servi avec Cache-Control immutable
+        Importance: Vérifie que les clics sur la carte ne refont aucune requête
+        """
+        response = self.client.get('/api/incident_types?v=' + get_taxonomy().version)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+    def test_map_page_uses_versioned_url(self):
+        """
+        Test: La page carte contient l'URL versionnée des types d'incidents
+        Importance: Vérifie que le frontend utilise l'URL qui peut être mise en cache
+        """
+        html = self.client.get('/map').data.decode('utf-8')
+        self.assertIn('/api/incident_types?v=' + get_taxonomy().version, html)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,165 @@
+"""
+test_message_queue.py
+Tests pour la file de messages Socket.IO - Livraison des événements entre workers
+
+Importance: Avec plusieurs workers, un incident enregistré par le worker A doit atteindre les
+clients connectés au worker B. Ces tests simulent deux workers reliés par la file en mémoire
+(local://) et vérifient qu'une trame émise par l'un est livrée aux clients de l'autre.
+"""
+
+import unittest
+import sys
+import os
+import time
+import uuid
+from unittest import mock
+from flask import Flask
+from flask_socketio import SocketIO
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.message_queue import LocalQueueManager, socketio_options
+from server.realtime import (EventCoalescer, SubscriptionRegistry, Subscription, BATCH_EVENT, NAMESPACE,
+                             cell_of, cell_room, group_room)
+
+DOWNTOWN = (51.089, -115.359)
+DOWNTOWN_BBOX = [-115.362, 51.087, -115.356, 51.091]
+
+
+class TestMessageQueue(unittest.TestCase):
+    """
+    Tests de deux workers reliés par une file de messages
+
+    Vérifie que:
+    - Une émission du worker A est livrée au client du worker B
+    - Le regroupeur en mode partagé vise les salons sans connaître les abonnés distants
+    - Les filtres de statut et de type d'un client distant sont respectés
+    - La configuration choisit la bonne file selon l'URL
+    """
+
+    def setUp(self):
+        """Crée deux workers sur un canal propre au test et un client connecté au worker B"""
+        url = f'local://test-{uuid.uuid4().hex}'
+        self.managers = [LocalQueueManager(url), LocalQueueManager(url)]
+        # Mode threading explicite : sans monkey-patching, eventlet installé ne ferait jamais tourner l'écoute
+        self.worker_a = SocketIO(Flask('worker_a'), client_manager=self.managers[0], async_mode='threading')
+        self.worker_b = SocketIO(Flask('worker_b'), client_manager=self.managers[1], async_mode='threading')
+        for manager in self.managers:
+            self.addCleanup(manager.close)
+        server_b = self.worker_b.server
+        server_b._handle_eio_connect('eio-b', {})
+        self.sid = server_b.manager.connect('eio-b', NAMESPACE)
+        patcher = mock.patch.object(server_b, '_send_eio_packet')
+        self.sent = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def received(self, timeout=2.0):
+        """Paquets reçus par le client du worker B (attend la livraison par la file)"""
+        deadline = time.monotonic() + timeout
+        while not self.sent.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return [call.args[1].data for call in self.sent.call_args_list]
+
+    def test_cross_worker_delivery(self):
+        """
+        Test: Une trame émise par le worker A vers un salon est reçue par le client du worker B
+        Importance: Vérifie le déploiement multi-worker
+        """
+        self.worker_b.server.enter_room(self.sid, 'all', namespace=NAMESPACE)
+        self.worker_a.emit(BATCH_EVENT, {'count': 1, 'events': []}, to='all', namespace=NAMESPACE)
+        packets = self.received()
+        self.assertEqual(len(packets), 1)
+        self.assertIn(BATCH_EVENT, packets[0])
+
+    def subscribe_b(self, statuses=None, types=None):
+        """Abonne le client du worker B (emprise du centre-ville) comme le ferait le gestionnaire « subscribe »"""
+        joined, left = SubscriptionRegistry(shared=True).subscribe(
+            Subscription(self.sid, DOWNTOWN_BBOX, statuses, types, shared=True))
+        for room in joined:
+            self.worker_b.server.enter_room(self.sid, room, namespace=NAMESPACE)
+
+    def coalescer_a(self):
+        """Regroupeur du worker A en mode partagé, sans abonné local"""
+        return EventCoalescer(
+            lambda target, frame: self.worker_a.emit(BATCH_EVENT, frame, to=target, namespace=NAMESPACE),
+            SubscriptionRegistry(shared=True), window=0)
+
+    def test_shared_coalescer_reaches_remote_subscriber(self):
+        """
+        Test: Le regroupeur du worker A, sans abonné local, livre l'incident au client abonné à sa cellule
+        Importance: Vérifie que le routage par zone fonctionne quand les abonnés sont sur un autre worker
+        """
+        self.subscribe_b()
+        self.coalescer_a().add('incident_added', {'id': 1, 'latitude': DOWNTOWN[0], 'longitude': DOWNTOWN[1],
+                                                  'status': 'unsolved', 'type': 'Nid de poule'})
+        packets = self.received()
+        self.assertEqual(len(packets), 1)
+        self.assertIn('"incident_added"', packets[0])
+
+    def test_remote_status_filter(self):
+        """
+        Test: Un client du worker B abonné aux incidents résolus ne reçoit pas un incident non résolu du worker A
+        Importance: Vérifie que les filtres de statut ne sont pas perdus avec une file de messages
+        """
+        self.subscribe_b(statuses=frozenset({'solved'}))
+        coalescer = self.coalescer_a()
+        incident = {'id': 1, 'latitude': DOWNTOWN[0], 'longitude': DOWNTOWN[1], 'type': 'Nid de poule'}
+        coalescer.add('incident_added', dict(incident, status='unsolved'))
+        self.assertEqual(self.received(timeout=0.5), [])
+        coalescer.add('incident_updated', dict(incident, status='solved'))
+        packets = self.received()
+        self.assertEqual(len(packets), 1)
+        self.assertIn('"solved"', packets[0])
+
+    def test_remote_type_filter(self):
+        """
+        Test: Un client du worker B abonné à un type ne reçoit pas les incidents d'un autre type
+        Importance: Vérifie que les filtres de type ne sont pas perdus avec une file de messages
+        """
+        self.subscribe_b(types=frozenset({'Graffiti'}))
+        self.coalescer_a().add('incident_added', {'id': 1, 'latitude': DOWNTOWN[0], 'longitude': DOWNTOWN[1],
+                                                  'status': 'unsolved', 'type': 'Nid de poule'})
+        self.assertEqual(self.received(timeout=0.5), [])
+
+    def test_shared_registry_routes_rooms(self):
+        """
+        Test: En mode partagé, le routage vise les salons de groupe qui acceptent le statut et le type
+        Importance: Vérifie qu'un abonné local filtrant n'empêche pas la livraison aux autres workers
+        """
+        registry = SubscriptionRegistry(shared=True)
+        registry.subscribe(Subscription('local', None, frozenset({'solved'}), shared=True))
+        [rooms] = registry.route(*DOWNTOWN, ('unsolved',), 'Nid de poule')
+        cell = cell_room(cell_of(*DOWNTOWN))
+        self.assertIn(group_room('all'), rooms)
+        self.assertIn(group_room(cell, 'unsolved', 'Nid de poule'), rooms)
+        self.assertNotIn(group_room('all', 'solved'), rooms)
+        self.assertEqual(Subscription('x', None, frozenset({'solved'}), shared=True).rooms, {group_room('all', 'solved')})
+
+    def test_options(self):
+        """
+        Test: Les options de SocketIO suivent l'URL de la file
+        Importance: Vérifie la configuration par SOCKETIO_MESSAGE_QUEUE
+        """
+        self.assertEqual(socketio_options(None), {})
+        self.assertEqual(socketio_options('redis://localhost:6379/0', 'canal'),
+                         {'message_queue': 'redis://localhost:6379/0', 'channel': 'canal'})
+        manager = socketio_options('local://canal-test')['client_manager']
+        self.addCleanup(manager.close)
+        self.assertEqual(manager.channel, 'canal-test')
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,158 @@
+"""
+test_metrics.py
+Tests pour l'instrumentation - Format Prometheus, requêtes HTTP, SQLite, Socket.IO, caches
+
+Importance: En production, /metrics est la seule visibilité sur la latence des routes et de la
+base. Ces tests vérifient le format texte lu par Prometheus, que chaque source de mesures
+alimente bien ses séries, et qu'avec CANMORE_METRICS=0 rien n'est installé.
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.app_factory import create_app
+from server.dataset_catalog import catalog
+from server.routes import incidents_api
+from server.metrics import Registry, TimedConnection, statement_labels
+
+# Incident valide (dans la limite de Canmore)
+INCIDENT = {'type': 'Nid de poule', 'description': 'Test', 'latitude': 51.089, 'longitude': -115.359,
+            'timestamp': '2024-02-02T10:00:00Z'}
+
+
+def sample(text, prefix):
+    """Valeur de la première ligne de mesure qui commence par prefix (None si absente)"""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class TestPrometheusFormat(unittest.TestCase):
+    """
+    Tests du format texte (compteurs, histogrammes cumulatifs, collecteurs)
+    """
+
+    def test_counter_and_histogram(self):
+        """
+        Test: Un compteur et un histogramme produisent les séries attendues par Prometheus
+        Importance: Un format incorrect fait échouer tout le scrape
+        """
+        registry = Registry()
+        counter = registry.counter('demo_total', 'Démo', ('route',))
+        histogram = registry.histogram('demo_seconds', 'Durée', buckets=(0.1, 1))
+        counter.inc(('/a',))
+        counter.inc(('/a',), 2)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        registry.add_collector(lambda: [('demo_gauge', 'gauge', 'Jauge', [({'kind': 'x"y'}, 3), ({}, None)])])
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE demo_total counter', lines)
+        self.assertIn('demo_total{route="/a"} 3', lines)
+        self.assertIn('demo_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('demo_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('demo_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('demo_seconds_sum 5.55', lines)
+        self.assertIn('demo_seconds_count 3', lines)
+        self.assertIn('demo_gauge{kind="x\\"y"} 3', lines)
+        self.assertNotIn('demo_gauge None', lines)
+
+    def test_statement_labels(self):
+        """
+        Test: Les étiquettes SQL sont le type d'instruction et la table, jamais les valeurs
+        Importance: Des étiquettes à cardinalité non bornée saturent Prometheus
+        """
+        self.assertEqual(statement_labels('SELECT * FROM incidents WHERE id = ?'), ('SELECT', 'incidents'))
+        self.assertEqual(statement_labels('  insert into incidents (type) VALUES (?)'), ('INSERT', 'incidents'))
+        self.assertEqual(statement_labels('UPDATE incidents SET status = ?'), ('UPDATE', 'incidents'))
+        self.assertEqual(statement_labels('PRAGMA table_info(incidents)'), ('PRAGMA', 'incidents'))
+        self.assertEqual(statement_labels('COMMIT'), ('COMMIT', ''))
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """
+    Tests de /metrics sur une application à base temporaire
+
+    Vérifie que:
+    - Les requêtes sont comptées par route (modèle) et code de statut, avec leur latence
+    - Les requêtes SQLite sont chronométrées et leurs lignes comptées
+    - Les événements Socket.IO, caches et écritures admises sont exposés
+    """
+
+    def setUp(self):
+        """Application sur dossier temporaire ; la base et le catalogue principaux sont restaurés"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(incidents_api.configure_storage, incidents_api.DB_PATH)
+        self.addCleanup(setattr, catalog, 'compiled_dir', catalog.compiled_dir)
+
+    def make_app(self, **config):
+        return create_app(dict({'DATA_DIR': self.tmp_dir, 'WARM_UP': 'off', 'TESTING': True}, **config))
+
+    def test_metrics_exposed(self):
+        """
+        Test: Après quelques requêtes, /metrics contient les séries HTTP, SQLite, Socket.IO et caches
+        Importance: Vérifie de bout en bout l'instrumentation utilisée en production
+        """
+        factory_app = self.make_app()
+        client = factory_app.test_client()
+        incident_id = client.post('/api/incidents', json=INCIDENT).get_json()['id']
+        client.patch(f'/api/incidents/{incident_id}', json={'status': 'solved'})
+        client.get('/api/incidents')
+        factory_app.event_coalescer.flush()
+
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertEqual(sample(text, 'canmore_http_requests_total{method="POST",route="/api/incidents",'
+                                      'status="201"}'), 1)
+        self.assertEqual(sample(text, 'canmore_http_requests_total{method="PATCH",'
+                                      'route="/api/incidents/<int:incident_id>",status="200"}'), 1)
+        self.assertEqual(sample(text, 'canmore_http_request_duration_seconds_count{method="GET",'
+                                      'route="/api/incidents"}'), 1)
+        self.assertGreaterEqual(sample(text, 'canmore_sqlite_query_duration_seconds_count{operation="INSERT",'
+                                             'table="incidents"}'), 1)
+        self.assertGreaterEqual(sample(text, 'canmore_sqlite_rows_returned_total{operation="SELECT",'
+                                             'table="incidents"}'), 1)
+        self.assertEqual(sample(text, 'canmore_socketio_event_fanout_count'), 1)
+        self.assertEqual(sample(text, 'canmore_incident_events_total{stage="received"}'), 2)
+        self.assertEqual(sample(text, 'canmore_write_admission_total{outcome="admitted"}'), 2)
+        self.assertIsNotNone(sample(text, 'canmore_dataset_cache_total{result="hit"}'))
+        self.assertIsNotNone(sample(text, 'canmore_user_settings_cache_total{result="miss"}'))
+
+    def test_metrics_disabled(self):
+        """
+        Test: Avec METRICS désactivé, /metrics répond 404 et les connexions ne sont pas chronométrées
+        Importance: Aucun coût quand l'instrumentation est coupée
+        """
+        factory_app = self.make_app(METRICS=False)
+        self.assertIsNone(factory_app.metrics)
+        self.assertIs(incidents_api.CONNECTION_FACTORY, sqlite3.Connection)
+        self.assertEqual(factory_app.test_client().get('/metrics').status_code, 404)
+
+        self.make_app()
+        self.assertIs(incidents_api.CONNECTION_FACTORY, TimedConnection)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,163 @@
+"""
+test_projection.py
+Tests pour les conversions de coordonnées - Web Mercator ↔ WGS84, projection locale, colonnes précalculées
+
+Importance: Les tests de projection vérifient que les adresses (EPSG:3857) et les incidents (EPSG:4326)
+sont comparés dans le même système, que les conversions par colonnes entières sont exactes dans
+les deux sens et que l'API convertit un lot de points en un seul appel.
+"""
+
+import unittest
+import json
+import random
+import sys
+import os
+import numpy as np
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.projection import (mercator_to_wgs84, wgs84_to_mercator, transform, LocalProjection,
+                               WEB_MERCATOR, WGS84)
+from server.dataset_catalog import catalog
+from server.search_index import get_search_index
+
+
+class TestProjection(unittest.TestCase):
+    """
+    Tests des conversions vectorisées
+
+    Vérifie que:
+    - Un aller-retour Web Mercator → WGS84 → Web Mercator est exact
+    - La projection locale en mètres est réversible
+    - Les colonnes longitude/latitude de Addresses.csv sont précalculées
+    """
+
+    def test_round_trip(self):
+        """
+        Test: Des points aléatoires reviennent à leur position à moins d'un millimètre
+        Importance: Vérifie la cohérence des deux sens de conversion
+        """
+        rng = np.random.default_rng(2)
+        xs = rng.uniform(-12845000, -12830000, 1000)
+        ys = rng.uniform(6628000, 6640000, 1000)
+        lons, lats = mercator_to_wgs84(xs, ys)
+        back_x, back_y = wgs84_to_mercator(lons, lats)
+        np.testing.assert_allclose(back_x, xs, atol=1e-3)
+        np.testing.assert_allclose(back_y, ys, atol=1e-3)
+
+    def test_known_point(self):
+        """
+        Test: L'origine et le pôle sont bornés correctement
+        Importance: Vérifie les cas limites de Web Mercator
+        """
+        xs, ys = wgs84_to_mercator([0.0, 180.0], [0.0, 90.0])
+        self.assertAlmostEqual(xs[0], 0.0)
+        self.assertAlmostEqual(xs[1], 20037508.342789244)
+        self.assertTrue(np.isfinite(ys[1]))
+        with self.assertRaises(ValueError):
+            transform([0], [0], WGS84, 'EPSG:2154')
+
+    def test_local_projection(self):
+        """
+        Test: 0,001° de latitude fait ~111 m et la projection inverse redonne le point
+        Importance: Vérifie la projection partagée par le géocodeur et l'index des éléments
+        """
+        projection = LocalProjection(-115.35, 51.08)
+        x, y = projection.forward(-115.35, 51.081)
+        self.assertAlmostEqual(float(y), 111.32)
+        self.assertAlmostEqual(float(x), 0.0)
+        lons, lats = projection.inverse(*projection.forward([-115.36, -115.30], [51.05, 51.10]))
+        np.testing.assert_allclose(lons, [-115.36, -115.30])
+        np.testing.assert_allclose(lats, [51.05, 51.10])
+
+    def test_precomputed_address_columns(self):
+        """
+        Test: Les colonnes latitude/longitude compilées égalent la conversion des colonnes X, Y
+        Importance: Vérifie que les adresses ne sont converties qu'une fois
+        """
+        table = catalog.get('Addresses.csv').records
+        lons, lats = mercator_to_wgs84(table.numbers('X'), table.numbers('Y'))
+        np.testing.assert_array_equal(table.numbers('longitude'), lons)
+        np.testing.assert_array_equal(table.numbers('latitude'), lats)
+        self.assertFalse(table.numbers('latitude').flags.owndata)
+        with self.assertRaises(KeyError):
+            catalog.get('parcs.csv').records.numbers('latitude')
+
+    def test_address_search_has_position(self):
+        """
+        Test: Une adresse trouvée par la recherche porte sa latitude et sa longitude
+        Importance: Vérifie que la recherche utilise les colonnes précalculées
+        """
+        record = get_search_index('addresses').exact('111B SETTLER WAY')
+        self.assertAlmostEqual(record['longitude'], -115.3355, places=3)
+        self.assertAlmostEqual(record['latitude'], 51.0871, places=3)
+
+
+class TestProjectionAPI(unittest.TestCase):
+    """
+    Tests de POST /api/projection
+
+    Vérifie que:
+    - Un lot de points est converti dans l'ordre
+    - Les systèmes inconnus et les points invalides retournent 400
+    - Les coordonnées non finies, en entrée comme en sortie, retournent 400
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def post(self, body):
+        return self.client.post('/api/projection', data=json.dumps(body), content_type='application/json')
+
+    def test_batch_conversion(self):
+        """
+        Test: Des positions WGS84 aléatoires converties en Web Mercator puis retour
+        Importance: Vérifie l'API dans les deux sens
+        """
+        rng = random.Random(4)
+        points = [[rng.uniform(-115.4, -115.3), rng.uniform(51.04, 51.12)] for _ in range(50)]
+        mercator = self.post({'from': WGS84, 'to': WEB_MERCATOR, 'points': points}).get_json()['points']
+        back = self.post({'from': WEB_MERCATOR, 'to': WGS84, 'points': mercator}).get_json()['points']
+        np.testing.assert_allclose(back, points)
+
+    def test_invalid_requests(self):
+        """
+        Test: Système inconnu, points manquants ou mal formés retournent 400
+        Importance: Vérifie la validation des paramètres
+        """
+        self.assertEqual(self.post({'from': 'EPSG:2154', 'points': [[0, 0]]}).status_code, 400)
+        self.assertEqual(self.post({'points': 'abc'}).status_code, 400)
+        self.assertEqual(self.post({'points': [['x', 1]]}).status_code, 400)
+        self.assertEqual(self.post({'points': [[1]]}).status_code, 400)
+
+    def test_non_finite_coordinates(self):
+        """
+        Test: « nan », « inf », « 1e400 » ou une conversion qui déborde retournent 400
+        Importance: Vérifie que la réponse reste du JSON valide (NaN et Infinity n'en font pas partie)
+        """
+        for value in ('nan', 'inf', '-Infinity', '1e400'):
+            response = self.post({'from': WGS84, 'to': WEB_MERCATOR, 'points': [[value, 51.0]]})
+            self.assertEqual(response.status_code, 400, value)
+        response = self.post({'from': WGS84, 'to': WEB_MERCATOR, 'points': [[1e308, 51.0]]})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(b'Infinity', response.data)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
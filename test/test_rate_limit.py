@@ -0,0 +1,228 @@
+"""
+test_rate_limit.py
+Tests pour le contrôle d'admission des écritures - Seaux de jetons, 429, délestage (503)
+
+Importance: Un client ou un script qui inonde POST/PATCH /api/incidents bloque l'écriture SQLite
+pour tous les utilisateurs. Ces tests vérifient que chaque client est limité séparément, que la
+limite globale s'applique, et que l'application refuse tôt quand la base sature.
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.app_factory import create_app
+from server.dataset_catalog import catalog
+from server.routes import incidents_api
+from server import tasks
+from server.rate_limit import MemoryBucketStore, RateLimiter, LoadShedder, bucket_store
+
+# Incident valide (dans la limite de Canmore)
+INCIDENT = {'type': 'Nid de poule', 'description': 'Test', 'latitude': 51.089, 'longitude': -115.359,
+            'timestamp': '2024-02-02T10:00:00Z'}
+
+
+class FakeClock:
+    """Horloge contrôlée par le test"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBuckets(unittest.TestCase):
+    """
+    Tests des seaux de jetons
+
+    Vérifie que:
+    - Une rafale est admise puis refusée avec le délai avant le prochain jeton
+    - Les jetons se rechargent au débit configuré
+    - Chaque client a son seau ; le seau global s'applique à tous
+    - Le nombre de seaux en mémoire est borné, et un refus ne dépense aucun jeton
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = MemoryBucketStore(clock=self.clock)
+
+    def test_burst_then_refill(self):
+        """
+        Test: 3 jetons de rafale à 2/s : la 4e requête attend 0,5 s, puis est admise
+        Importance: Vérifie le calcul du seau et de Retry-After
+        """
+        self.assertEqual([self.store.take('a', 2, 3) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(self.store.take('a', 2, 3), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(self.store.take('a', 2, 3), 0)
+        self.clock.now += 100
+        self.assertEqual([self.store.take('a', 2, 3) for _ in range(3)], [0, 0, 0])
+
+    def test_per_client_and_global(self):
+        """
+        Test: Un client épuise son seau sans gêner les autres, jusqu'à la limite globale
+        Importance: Un client abusif ne doit pas priver les autres utilisateurs
+        """
+        limiter = RateLimiter(self.store, client_rate=1, client_burst=2, global_rate=1, global_burst=5)
+        self.assertEqual([limiter.check('abusif') for _ in range(2)], [0, 0])
+        self.assertGreater(limiter.check('abusif'), 0)
+        self.assertEqual([limiter.check(f'client{index}') for index in range(3)], [0, 0, 0])
+        self.assertGreater(limiter.check('dernier'), 0)
+
+    def test_buckets_bounded(self):
+        """
+        Test: 1000 clients admis une fois chacun ne laissent que max_keys seaux, les plus récents
+        Importance: Des adresses toujours nouvelles (X-Forwarded-For) ne doivent pas épuiser la mémoire
+        """
+        store = MemoryBucketStore(clock=self.clock, max_keys=100)
+        self.assertEqual([store.take(f'client{index}', 1, 2) for index in range(1000)], [0] * 1000)
+        self.assertEqual(len(store.buckets), 100)
+        self.assertIn('client999', store.buckets)
+        self.assertNotIn('client0', store.buckets)
+
+    def test_global_refusal_keeps_client_token(self):
+        """
+        Test: Une requête refusée par la limite globale ne retire pas de jeton au seau du client
+        Importance: Un client ne doit pas être pénalisé pour la charge des autres
+        """
+        limiter = RateLimiter(self.store, client_rate=1, client_burst=2, global_rate=1, global_burst=1)
+        self.assertEqual(limiter.check('a'), 0)
+        self.assertAlmostEqual(limiter.check('a'), 1.0)
+        self.assertEqual(self.store.buckets['client:a'][0], 1)
+        self.clock.now += 1
+        self.assertEqual(limiter.check('a'), 0)
+        self.assertEqual(self.store.buckets['client:a'][0], 1)
+
+    def test_disabled_rates(self):
+        """
+        Test: Un débit de 0 désactive le seau correspondant
+        Importance: Permet de couper la limitation par configuration
+        """
+        limiter = RateLimiter(self.store, client_rate=0, global_rate=0)
+        self.assertEqual([limiter.check('a') for _ in range(1000)], [0] * 1000)
+
+    def test_store_configuration(self):
+        """
+        Test: 'memory' donne un magasin en mémoire ; un schéma inconnu est refusé
+        Importance: Vérifie la configuration CANMORE_RATE_LIMIT_STORE
+        """
+        self.assertIsInstance(bucket_store('memory'), MemoryBucketStore)
+        with self.assertRaises(ValueError):
+            bucket_store('ftp://ailleurs')
+
+
+class TestLoadShedder(unittest.TestCase):
+    """
+    Tests du délestage (écritures en cours, p99 de latence)
+    """
+
+    def test_in_flight_limit(self):
+        """
+        Test: Le délestage commence quand max_in_flight écritures sont en cours
+        Importance: La file d'écriture SQLite ne doit pas grossir sans limite
+        """
+        shedder = LoadShedder(max_in_flight=2, p99_limit=1)
+        shedder.start()
+        self.assertFalse(shedder.shed())
+        shedder.start()
+        self.assertTrue(shedder.shed())
+        shedder.finish(0.01)
+        self.assertFalse(shedder.shed())
+
+    def test_p99_limit_expires(self):
+        """
+        Test: Un p99 trop élevé déclenche le délestage, qui cesse quand les mesures expirent
+        Importance: Le délestage ne doit pas durer indéfiniment faute de nouvelles mesures
+        """
+        clock = FakeClock()
+        shedder = LoadShedder(max_in_flight=0, p99_limit=0.5, window=10, min_samples=20, clock=clock)
+        for _ in range(19):
+            shedder.start()
+            shedder.finish(2.0)
+        self.assertFalse(shedder.shed())
+        shedder.start()
+        shedder.finish(2.0)
+        self.assertTrue(shedder.shed())
+        self.assertEqual(shedder.stats()['p99_ms'], 2000.0)
+        clock.now += 11
+        self.assertFalse(shedder.shed())
+
+
+class TestAdmissionControl(unittest.TestCase):
+    """
+    Tests des routes d'écriture avec des limites serrées (application sur base temporaire)
+    """
+
+    def setUp(self):
+        """Application sur dossier temporaire ; la base et le catalogue principaux sont restaurés"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(incidents_api.configure_storage, incidents_api.DB_PATH)
+        self.addCleanup(setattr, catalog, 'compiled_dir', catalog.compiled_dir)
+        # Enrichissement planifié par les écritures terminé avant de supprimer la base temporaire
+        self.addCleanup(tasks.drain, 10)
+        self.app = create_app({'DATA_DIR': self.tmp_dir, 'WARM_UP': 'off', 'TESTING': True,
+                               'CLIENT_RATE': 0.01, 'CLIENT_BURST': 2, 'TRUST_PROXY': True})
+        self.client = self.app.test_client()
+
+    def post(self, address):
+        return self.client.post('/api/incidents', json=INCIDENT, headers={'X-Forwarded-For': address})
+
+    def test_too_many_writes(self):
+        """
+        Test: La 3e écriture d'un client reçoit 429 et Retry-After ; un autre client passe encore
+        Importance: C'est le comportement attendu par les clients (réessayer plus tard)
+        """
+        self.assertEqual([self.post('10.0.0.1').status_code for _ in range(2)], [201, 201])
+        response = self.post('10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertIn('error', response.get_json())
+        self.assertEqual(self.post('10.0.0.2').status_code, 201)
+        # Les lectures ne sont pas limitées
+        self.assertEqual(self.client.get('/api/incidents').status_code, 200)
+        self.assertEqual(self.app.load_shedder.stats()['limited'], 1)
+
+    def test_shed_when_saturated(self):
+        """
+        Test: Quand trop d'écritures sont en cours, la requête reçoit 503 tout de suite
+        Importance: Refuser tôt plutôt que laisser la requête expirer
+        """
+        shedder = self.app.load_shedder
+        for _ in range(shedder.max_in_flight):
+            shedder.start()
+        response = self.post('10.0.0.3')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(shedder.stats()['shed'], 1)
+
+    def test_in_flight_released(self):
+        """
+        Test: Après une écriture (réussie ou refusée par la route), plus rien n'est compté en cours
+        Importance: Un compteur qui fuit finirait par tout délester
+        """
+        self.post('10.0.0.4')
+        self.client.post('/api/incidents', json={'type': 'Nid de poule'})
+        self.assertEqual(self.app.load_shedder.stats()['in_flight'], 0)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
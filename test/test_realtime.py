@@ -0,0 +1,291 @@
+"""
+test_realtime.py
+Tests pour les abonnements temps réel - Salons par cellule de grille, filtres de statut et de type
+
+Importance: Un tableau de bord qui suit un quartier ne doit recevoir que les incidents de ce
+quartier. Ces tests vérifient le découpage de l'emprise en cellules, l'acheminement d'un
+événement vers les seuls clients intéressés et la validation des messages d'abonnement.
+"""
+
+import unittest
+import json
+import sys
+import os
+from unittest import mock
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server import realtime
+from server.realtime import (Subscription, SubscriptionRegistry, SubscriptionError, EventCoalescer, ALL_ROOM,
+                             cell_of, cell_room)
+
+# Centre-ville de Canmore et un point à ~3 km (autre quartier)
+DOWNTOWN = (51.089, -115.359)
+FAR_AWAY = (51.07, -115.33)
+DOWNTOWN_BBOX = [-115.365, 51.085, -115.355, 51.095]
+
+
+class TestSubscriptionRegistry(unittest.TestCase):
+    """
+    Tests du registre des abonnements (sans serveur Socket.IO)
+
+    Vérifie que:
+    - L'emprise est couverte par les salons de ses cellules
+    - Un événement ne va qu'aux clients de sa cellule et de leurs filtres
+    - Un salon entier est utilisé quand tous ses membres sont intéressés
+    """
+
+    def setUp(self):
+        """Registre vide à chaque test"""
+        self.registry = SubscriptionRegistry()
+
+    def test_bbox_rooms(self):
+        """
+        Test: L'emprise rejoint les salons des cellules qui la couvrent ; trop grande, le salon « all »
+        Importance: Vérifie le coût borné d'un abonnement
+        """
+        subscription = Subscription('a', DOWNTOWN_BBOX)
+        self.assertIn(cell_room(cell_of(*DOWNTOWN)), subscription.rooms)
+        self.assertNotIn(cell_room(cell_of(*FAR_AWAY)), subscription.rooms)
+        self.assertLessEqual(len(subscription.rooms), 4)
+        self.assertEqual(Subscription('b').rooms, {ALL_ROOM})
+        self.assertEqual(Subscription('c', [-180.0, -80.0, 180.0, 80.0]).rooms, {ALL_ROOM})
+
+    def test_route_by_cell(self):
+        """
+        Test: Un incident n'est envoyé qu'au salon de sa cellule et au salon « all »
+        Importance: Vérifie que le coût d'envoi suit le nombre de clients intéressés
+        """
+        self.registry.subscribe(Subscription('downtown', DOWNTOWN_BBOX))
+        self.registry.subscribe(Subscription('report'))
+        targets = self.registry.route(*DOWNTOWN, ('unsolved',), 'Nid de poule')
+        self.assertEqual(sorted(targets), sorted([ALL_ROOM, cell_room(cell_of(*DOWNTOWN))]))
+        self.assertEqual(self.registry.route(*FAR_AWAY, ('unsolved',), 'Nid de poule'), [ALL_ROOM])
+
+    def test_route_filters_members(self):
+        """
+        Test: Dans un salon mixte, seuls les clients dont les filtres correspondent sont visés
+        Importance: Vérifie le filtrage par statut et par type
+        """
+        self.registry.subscribe(Subscription('solved-only', DOWNTOWN_BBOX, frozenset({'solved'})))
+        self.registry.subscribe(Subscription('potholes', DOWNTOWN_BBOX, None, frozenset({'Nid de poule'})))
+        self.assertEqual(self.registry.route(*DOWNTOWN, ('unsolved',), 'Nid de poule'), ['potholes'])
+        self.assertEqual(self.registry.route(*DOWNTOWN, ('unsolved',), 'Graffiti'), [])
+        # Changement de statut : les abonnés à l'ancien comme au nouveau statut sont prévenus
+        self.assertEqual(sorted(self.registry.route(*DOWNTOWN, ('solved', 'unsolved'), 'Nid de poule')),
+                         [cell_room(cell_of(*DOWNTOWN))])
+
+    def test_resubscribe_and_unsubscribe(self):
+        """
+        Test: Un nouvel abonnement quitte les anciens salons ; la déconnexion les vide
+        Importance: Vérifie qu'un déplacement de carte ne laisse pas de salons orphelins
+        """
+        joined, left = self.registry.subscribe(Subscription('a', DOWNTOWN_BBOX))
+        self.assertEqual(left, set())
+        far_bbox = [FAR_AWAY[1] - 0.001, FAR_AWAY[0] - 0.001, FAR_AWAY[1] + 0.001, FAR_AWAY[0] + 0.001]
+        joined2, left2 = self.registry.subscribe(Subscription('a', far_bbox))
+        self.assertEqual(left2, joined)
+        self.assertEqual(self.registry.route(*DOWNTOWN, ('unsolved',), None), [])
+        self.registry.unsubscribe('a')
+        self.assertEqual(self.registry.members, {})
+
+    def test_invalid_messages(self):
+        """
+        Test: Les messages mal formés lèvent SubscriptionError
+        Importance: Vérifie qu'un client ne peut pas corrompre le registre
+        """
+        for data in (['x'], {'bbox': [1, 2, 3]}, {'bbox': [3, 0, 1, 1]}, {'bbox': 'abc'},
+                     {'statuses': 'solved'}, {'types': [1]}):
+            with self.assertRaises(SubscriptionError):
+                Subscription.from_message('a', data)
+        subscription = Subscription.from_message('a', {'bbox': DOWNTOWN_BBOX, 'statuses': ['solved']})
+        self.assertEqual(subscription.statuses, frozenset({'solved'}))
+
+
+class FakeClock:
+    """Horloge manuelle : sleep() avance le temps au lieu d'attendre"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestEventCoalescer(unittest.TestCase):
+    """
+    Tests du regroupement des événements (horloge simulée)
+
+    Vérifie que:
+    - Les événements d'un même incident sont fusionnés
+    - Une seule trame est envoyée par destinataire et par fenêtre
+    - Le délai maximal est respecté même si les événements continuent d'arriver
+    """
+
+    def setUp(self):
+        """Regroupeur avec un seul client sans emprise et des tâches exécutées à la demande"""
+        self.registry = SubscriptionRegistry()
+        self.registry.subscribe(Subscription('report'))
+        self.sent = []
+        self.tasks = []
+        self.clock = FakeClock()
+        self.coalescer = EventCoalescer(lambda target, frame: self.sent.append((target, frame)), self.registry,
+                                        window=0.2, max_delay=1.0, start_task=self.tasks.append,
+                                        sleep=self.clock.sleep, clock=self.clock)
+
+    def incident(self, incident_id, status='unsolved'):
+        """Incident de test au centre-ville"""
+        return {'id': incident_id, 'latitude': DOWNTOWN[0], 'longitude': DOWNTOWN[1], 'status': status,
+                'type': 'Nid de poule'}
+
+    def test_merge_rules(self):
+        """
+        Test: Mises à jour successives fusionnées ; ajout puis suppression annulés
+        Importance: Vérifie qu'un nettoyage de statuts en rafale produit une seule trame compacte
+        """
+        self.coalescer.add('incident_added', self.incident(1))
+        self.coalescer.add('incident_updated', self.incident(1, 'solved'))
+        for status in ('solved', 'unsolved', 'solved'):
+            self.coalescer.add('incident_updated', self.incident(2, status))
+        self.coalescer.add('incident_added', self.incident(3))
+        self.coalescer.add('incident_deleted', self.incident(3))
+        self.assertEqual(len(self.tasks), 1)
+        self.tasks[0]()
+        self.assertEqual(len(self.sent), 1)
+        target, frame = self.sent[0]
+        self.assertEqual(target, ALL_ROOM)
+        self.assertEqual([(event['type'], event['incident']['id'], event['incident']['status'])
+                          for event in frame['events']],
+                         [('incident_added', 1, 'solved'), ('incident_updated', 2, 'solved')])
+        stats = self.coalescer.stats()
+        self.assertEqual((stats['events'], stats['sent'], stats['frames'], stats['coalesced']), (7, 2, 1, 5))
+
+    def test_max_delay(self):
+        """
+        Test: Un flux continu d'événements est envoyé au plus tard après le délai maximal
+        Importance: Vérifie que la fenêtre glissante ne retarde pas les clients indéfiniment
+        """
+        self.coalescer.add('incident_updated', self.incident(1))
+        self.clock.now = 0.9
+        self.coalescer.add('incident_updated', self.incident(1, 'solved'))
+        self.tasks[0]()
+        self.assertAlmostEqual(self.clock.now, 1.0)
+        self.assertEqual(len(self.sent), 1)
+        self.assertAlmostEqual(self.coalescer.stats()['max_latency_ms'], 1000.0)
+
+    def test_zero_window_sends_immediately(self):
+        """
+        Test: Une fenêtre de 0 envoie chaque appel sans attendre
+        Importance: Vérifie le mode sans regroupement (CANMORE_EVENT_WINDOW_MS=0)
+        """
+        self.coalescer.window = 0
+        self.coalescer.add_many([('incident_added', self.incident(1), None),
+                                 ('incident_added', self.incident(2), None)])
+        self.assertEqual(self.tasks, [])
+        self.assertEqual([frame['count'] for _target, frame in self.sent], [2])
+
+
+class TestSubscriptionRouting(unittest.TestCase):
+    """
+    Tests de bout en bout : API incidents → émissions Socket.IO ciblées
+
+    Vérifie que:
+    - Un incident n'est émis qu'aux clients abonnés à sa zone
+    - Un import en lot est découpé par client
+    - Le message « subscribe » est acquitté
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test : les émissions Socket.IO sont enregistrées"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        patcher = mock.patch.object(self.app.socketio, 'emit')
+        self.emit = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Événements laissés en attente par un test précédent
+        app.event_coalescer.flush()
+        self.emit.reset_mock()
+        for sid, bbox in (('downtown', DOWNTOWN_BBOX),
+                          ('far', [FAR_AWAY[1] - 0.001, FAR_AWAY[0] - 0.001, FAR_AWAY[1] + 0.001,
+                                   FAR_AWAY[0] + 0.001])):
+            app.subscriptions.subscribe(Subscription(sid, bbox))
+            self.addCleanup(app.subscriptions.unsubscribe, sid)
+
+    def incident(self, latitude, longitude):
+        """Construit un incident de test"""
+        return {'type': 'Nid de poule', 'description': 'Test abonnement', 'latitude': latitude,
+                'longitude': longitude, 'timestamp': '2024-02-02T10:00:00Z'}
+
+    def test_incident_routed_to_its_cell(self):
+        """
+        Test: Un incident du centre-ville n'est émis qu'au salon de sa cellule
+        Importance: Vérifie que le client d'un autre quartier ne reçoit rien
+        """
+        response = self.client.post('/api/incidents', data=json.dumps(self.incident(*DOWNTOWN)),
+                                    content_type='application/json')
+        incident_id = response.get_json()['id']
+        app.event_coalescer.flush()
+        targets = [call.kwargs['to'] for call in self.emit.call_args_list if call.args[0] == realtime.BATCH_EVENT]
+        self.assertEqual(targets, [cell_room(cell_of(*DOWNTOWN))])
+        self.client.delete(f'/api/incidents/{incident_id}')
+
+    def test_bulk_split_per_client(self):
+        """
+        Test: Chaque zone ne reçoit qu'une trame, avec la partie du lot qui la concerne
+        Importance: Vérifie l'import en lot avec plusieurs zones
+        """
+        batch = [self.incident(*DOWNTOWN), self.incident(*DOWNTOWN), self.incident(*FAR_AWAY)]
+        self.client.post('/api/incidents/bulk', data=json.dumps(batch), content_type='application/json')
+        app.event_coalescer.flush()
+        received = {call.kwargs['to']: call.args[1] for call in self.emit.call_args_list
+                    if call.args[0] == realtime.BATCH_EVENT}
+        self.assertEqual(received[cell_room(cell_of(*DOWNTOWN))]['count'], 2)
+        self.assertEqual(received[cell_room(cell_of(*FAR_AWAY))]['count'], 1)
+        for frame in received.values():
+            for event in frame['events']:
+                self.client.delete(f"/api/incidents/{event['incident']['id']}")
+
+    def test_stats_endpoint(self):
+        """
+        Test: GET /api/realtime/stats retourne les abonnés et les mesures du regroupement
+        Importance: Vérifie que l'efficacité du regroupement est observable
+        """
+        stats = self.client.get('/api/realtime/stats').get_json()
+        self.assertGreaterEqual(stats['subscribers'], 2)
+        for key in ('events', 'sent', 'frames', 'coalesced', 'max_latency_ms'):
+            self.assertIn(key, stats['coalescing'])
+
+    def test_subscribe_acknowledged(self):
+        """
+        Test: Le message « subscribe » est acquitté, avec une erreur pour un abonnement invalide
+        Importance: Vérifie les gestionnaires Socket.IO enregistrés par main.py
+        """
+        socket_client = self.app.socketio.test_client(self.app)
+        try:
+            ack = socket_client.emit('subscribe', {'bbox': DOWNTOWN_BBOX}, callback=True)
+            self.assertTrue(ack['ok'])
+            self.assertEqual(ack['rooms'], len(Subscription('x', DOWNTOWN_BBOX).rooms))
+            self.assertFalse(socket_client.emit('subscribe', {'bbox': [1, 2]}, callback=True)['ok'])
+        finally:
+            socket_client.disconnect()
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
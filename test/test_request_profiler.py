@@ -0,0 +1,137 @@
+"""
+test_request_profiler.py
+Tests pour le profilage à la demande - Déclenchement, jeton d'administration, profils enregistrés
+
+Importance: Quand une route est lente en production, on doit pouvoir profiler une requête réelle
+sans redéployer. Ces tests vérifient que le profil n'est pris que sur demande authentifiée ou par
+échantillonnage, qu'il est lisible par pstats, et que les routes d'administration sont protégées.
+"""
+
+import unittest
+import sys
+import os
+import io
+import pstats
+import shutil
+import tempfile
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.app_factory import create_app
+from server.dataset_catalog import catalog
+from server.routes import incidents_api
+
+# Jeton d'administration des tests
+TOKEN = 'jeton-de-test'
+ADMIN = {'X-Admin-Token': TOKEN}
+
+
+class TestRequestProfiler(unittest.TestCase):
+    """
+    Tests du profilage sur une application à base temporaire
+
+    Vérifie que:
+    - Une requête avec X-Profile: 1 (ou ?_profile=1) et le jeton est profilée
+    - Sans jeton valide, rien n'est profilé
+    - L'échantillonnage profile sans demande
+    - Les routes d'administration listent et servent les profils
+    """
+
+    def setUp(self):
+        """Application sur dossier temporaire ; la base et le catalogue principaux sont restaurés"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(incidents_api.configure_storage, incidents_api.DB_PATH)
+        self.addCleanup(setattr, catalog, 'compiled_dir', catalog.compiled_dir)
+
+    def make_app(self, **config):
+        factory_app = create_app(dict({'DATA_DIR': self.tmp_dir, 'WARM_UP': 'off', 'TESTING': True,
+                                       'ADMIN_TOKEN': TOKEN}, **config))
+        return factory_app, factory_app.test_client()
+
+    def test_profile_on_demand(self):
+        """
+        Test: X-Profile: 1 avec le jeton enregistre un profil pstats lisible, listé par l'administration
+        Importance: C'est le parcours de diagnostic d'une route lente
+        """
+        factory_app, client = self.make_app()
+        response = client.get('/api/incidents', headers=dict(ADMIN, **{'X-Profile': '1'}))
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers['X-Profile-Id']
+        self.assertIn('GET_api_incidents', profile_id)
+
+        listing = client.get('/api/admin/profiles', headers=ADMIN).get_json()['profiles']
+        self.assertEqual(listing[0]['id'], profile_id)
+        self.assertEqual(listing[0]['route'], '/api/incidents')
+        self.assertEqual(listing[0]['status'], 200)
+        self.assertEqual(listing[0]['reason'], 'demande')
+
+        downloaded = client.get(f'/api/admin/profiles/{profile_id}', headers=ADMIN)
+        self.assertEqual(downloaded.status_code, 200)
+        path = os.path.join(factory_app.config['PROFILE_DIR'], profile_id + '.pstats')
+        with open(path, 'rb') as f:
+            self.assertEqual(downloaded.data, f.read())
+        # send_file garde le fichier ouvert jusqu'à la fermeture de la réponse
+        downloaded.close()
+        stats = pstats.Stats(path, stream=io.StringIO())
+        self.assertTrue(any(name == 'get_incidents' for _file, _line, name in stats.stats))
+
+        text = client.get(f'/api/admin/profiles/{profile_id}?format=text', headers=ADMIN)
+        self.assertIn('get_incidents', text.get_data(as_text=True))
+
+    def test_query_flag_requires_token(self):
+        """
+        Test: ?_profile=1 profile avec le jeton ; sans jeton ou avec un mauvais jeton, rien n'est fait
+        Importance: Le profilage ne doit pas être déclenchable par n'importe qui
+        """
+        factory_app, client = self.make_app()
+        self.assertNotIn('X-Profile-Id', client.get('/api/incidents?_profile=1').headers)
+        self.assertNotIn('X-Profile-Id', client.get('/api/incidents?_profile=1',
+                                                    headers={'X-Admin-Token': 'faux'}).headers)
+        self.assertIn('X-Profile-Id', client.get('/api/incidents?_profile=1', headers=ADMIN).headers)
+        self.assertEqual(len(factory_app.profiler.recent()), 1)
+
+    def test_admin_routes_protected(self):
+        """
+        Test: Les routes d'administration répondent 403 sans jeton, 404 sans jeton configuré
+        Importance: Les profils révèlent le code et les données de production
+        """
+        _app, client = self.make_app()
+        self.assertEqual(client.get('/api/admin/profiles').status_code, 403)
+        self.assertEqual(client.get('/api/admin/profiles/inconnu', headers=ADMIN).status_code, 404)
+
+        disabled_app, client = self.make_app(ADMIN_TOKEN=None)
+        self.assertEqual(client.get('/api/admin/profiles', headers=ADMIN).status_code, 404)
+        self.assertFalse(disabled_app.profiler.enabled)
+        self.assertNotIn('X-Profile-Id', client.get('/api/incidents?_profile=1', headers=ADMIN).headers)
+
+    def test_sampling_and_retention(self):
+        """
+        Test: Avec un taux d'échantillonnage de 1, chaque requête est profilée ; seuls les plus récents restent
+        Importance: Le disque ne doit pas se remplir de profils
+        """
+        factory_app, client = self.make_app(PROFILE_SAMPLE_RATE=1.0, PROFILE_KEEP=2)
+        for _ in range(4):
+            client.get('/api/incidents')
+        recent = factory_app.profiler.recent()
+        self.assertEqual(len(recent), 2)
+        self.assertEqual({entry['reason'] for entry in recent}, {'échantillon'})
+        self.assertEqual(sorted(os.listdir(factory_app.config['PROFILE_DIR'])),
+                         sorted(entry['id'] + '.pstats' for entry in recent))
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,145 @@
+"""
+test_search_api.py
+Tests pour la recherche côté serveur du portail d'information - Index trié, préfixe, correspondance exacte
+
+Importance: Les tests de recherche vérifient que les suggestions et la recherche exacte du portail
+d'information sont calculées par le serveur (recherche binaire sur des clés normalisées) et que
+la page n'a plus besoin de télécharger les CSV complets.
+"""
+
+import unittest
+import sys
+import os
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.search_index import PrefixIndex, get_search_index, normalize
+
+
+class TestPrefixIndex(unittest.TestCase):
+    """
+    Tests de l'index trié
+
+    Vérifie que:
+    - Les suggestions par préfixe correspondent à un parcours linéaire
+    - La recherche exacte ignore la casse et les espaces superflus
+    - Les valeurs vides sont ignorées et les doublons regroupés
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        rows = [{'NAME': name, 'FID': str(i)} for i, name in enumerate(
+            ['Spring Creek', 'spring  creek', 'Quarry Lake', '', 'Spray Lakes', 'Larch Island', 'Spring Creek'])]
+        self.index = PrefixIndex(rows, 'NAME', ['FID', 'NAME'])
+
+    def test_prefix_matches_linear_scan(self):
+        """
+        Test: Les suggestions sont celles d'un filtre startsWith, triées
+        Importance: Vérifie que la recherche binaire reproduit l'ancien partialSearch
+        """
+        self.assertEqual(self.index.prefix('SP'), ['Spray Lakes', 'Spring Creek', 'spring  creek'])
+        self.assertEqual(self.index.prefix('spring c', limit=1), ['Spring Creek'])
+        self.assertEqual(self.index.prefix('x'), [])
+        self.assertEqual(self.index.prefix(''), [])
+
+    def test_exact_match(self):
+        """
+        Test: La correspondance exacte ignore la casse
+        Importance: Vérifie que l'ancien binarySearch est reproduit côté serveur
+        """
+        self.assertEqual(self.index.exact('quarry lake')['FID'], '2')
+        self.assertIsNone(self.index.exact('Quarry'))
+
+    def test_empty_values_ignored(self):
+        """
+        Test: Les lignes sans valeur ne sont pas indexées
+        Importance: Vérifie que les sentiers sans nom ne polluent pas les suggestions
+        """
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(normalize('  Spring   Creek '), 'spring creek')
+
+    def test_addresses_index(self):
+        """
+        Test: L'index des adresses contient toutes les adresses et reste trié
+        Importance: Vérifie la construction sur le plus gros jeu de données
+        """
+        index = get_search_index('addresses')
+        self.assertGreater(len(index), 14000)
+        self.assertEqual(index.keys, sorted(index.keys))
+        self.assertIs(index, get_search_index('addresses'))
+
+
+class TestSearchAPI(unittest.TestCase):
+    """
+    Tests de /api/search/<dataset>
+
+    Vérifie que:
+    - Les suggestions sont limitées et légères
+    - La recherche exacte retourne l'enregistrement ou 404
+    - Les paramètres invalides sont rejetés
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_prefix_suggestions(self):
+        """
+        Test: ?prefix= retourne au plus limit adresses commençant par le préfixe
+        Importance: Vérifie que chaque frappe coûte quelques centaines d'octets
+        """
+        response = self.client.get('/api/search/addresses?prefix=1&limit=5')
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r.startswith('1') for r in results))
+        self.assertLess(len(response.data), 1000)
+
+    def test_exact_lookup(self):
+        """
+        Test: ?exact= retourne les champs de l'enregistrement
+        Importance: Vérifie l'affichage de la fiche d'un parc
+        """
+        name = get_search_index('parcs').values[0]
+        response = self.client.get('/api/search/parcs', query_string={'exact': name.upper()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['PARK_NAME'], name)
+        missing = self.client.get('/api/search/parcs?exact=Parc%20inexistant')
+        self.assertEqual(missing.status_code, 404)
+
+    def test_invalid_requests(self):
+        """
+        Test: Un jeu de données inconnu retourne 404, une limite invalide 400
+        Importance: Vérifie que seuls les jeux configurés sont consultables
+        """
+        self.assertEqual(self.client.get('/api/search/incidents?prefix=a').status_code, 404)
+        self.assertEqual(self.client.get('/api/search/parcs?prefix=a&limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/parcs?prefix=a&limit=1000').status_code, 400)
+
+    def test_info_page_does_not_download_csv(self):
+        """
+        Test: La page info n'inclut plus les URL des CSV
+        Importance: Vérifie que le navigateur ne télécharge plus Addresses.csv
+        """
+        html = self.client.get('/info').data.decode('utf-8')
+        self.assertNotIn('Addresses.csv', html)
+        self.assertIn('/api/search/', html)
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
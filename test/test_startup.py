@@ -0,0 +1,137 @@
+"""
+test_startup.py
+Tests pour le démarrage de l'application - Budget de temps, chargement différé, profilage
+
+Importance: Un worker redémarré doit servir rapidement ses premières requêtes. Ces tests
+vérifient que create_app() reste sous un budget de temps sans préchauffage, que les données de
+référence ne sont alors chargées qu'au premier usage, et que --profile-startup produit son rapport.
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.app_factory import PROJECT_DIR
+from server.routes import incidents_api
+from server.startup_profile import ImportTimer, phase, phases, report
+
+# Budget du démarrage sans préchauffage (imports + create_app), en secondes. Mesuré à environ
+# 0,3 s ; la marge absorbe les machines d'intégration lentes tout en détectant un import lourd.
+STARTUP_BUDGET = 3.0
+
+# Démarrage mesuré dans un processus neuf : imports, create_app() sans préchauffage, état du catalogue
+STARTUP_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+from server.app_factory import create_app
+from server.dataset_catalog import catalog
+create_app({'DATA_DIR': sys.argv[1], 'WARM_UP': 'off'})
+print(time.perf_counter() - start)
+print(bool(catalog._datasets))
+'''
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Tests du démarrage dans un processus neuf
+
+    Vérifie que:
+    - Le démarrage sans préchauffage respecte le budget
+    - Le catalogue n'est pas chargé avant le premier usage
+    - python main.py --profile-startup affiche les imports et les phases
+    """
+
+    def setUp(self):
+        """Dossier de données temporaire"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def run_python(self, args, **env):
+        return subprocess.run([sys.executable] + args, cwd=PROJECT_DIR, capture_output=True, text=True,
+                              timeout=120, env=dict(os.environ, CANMORE_DATA_DIR=self.tmp_dir, **env))
+
+    def test_startup_budget_and_lazy_catalog(self):
+        """
+        Test: create_app() sans préchauffage démarre sous le budget et ne charge pas le catalogue
+        Importance: Détecte une régression du temps de démarrage (import lourd, travail à l'import)
+        """
+        result = self.run_python(['-c', STARTUP_SCRIPT, self.tmp_dir])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        seconds, loaded = result.stdout.split()[-2:]
+        self.assertLess(float(seconds), STARTUP_BUDGET)
+        self.assertEqual(loaded, 'False')
+
+    def test_profile_startup_report(self):
+        """
+        Test: python main.py --profile-startup affiche les imports et les phases, puis s'arrête
+        Importance: Vérifie l'outil de diagnostic du démarrage
+        """
+        result = self.run_python(['main.py', '--profile-startup'])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('Imports les plus lents', result.stdout)
+        self.assertIn('server.app_factory', result.stdout)
+        self.assertIn('base de données', result.stdout)
+        self.assertIn('warm_up: catalogue', result.stdout)
+        self.assertNotIn('Running on', result.stdout)
+
+
+class TestStartupProfile(unittest.TestCase):
+    """
+    Tests des outils de mesure (server/startup_profile.py)
+    """
+
+    def test_phase_is_recorded(self):
+        """
+        Test: phase() enregistre le nom et la durée, même si la phase échoue
+        Importance: Une phase en erreur doit rester visible dans le rapport
+        """
+        with self.assertRaises(RuntimeError):
+            with phase('phase en erreur'):
+                raise RuntimeError('échec')
+        self.assertEqual(phases[-1][0], 'phase en erreur')
+        self.assertIn('phase en erreur', report())
+
+    def test_import_timer(self):
+        """
+        Test: ImportTimer mesure les modules importés pendant son installation
+        Importance: Vérifie la mesure par module du rapport de démarrage
+        """
+        timer = ImportTimer()
+        sys.modules.pop('xml.dom.minidom', None)
+        timer.install()
+        try:
+            import xml.dom.minidom  # noqa: F401
+        finally:
+            timer.uninstall()
+        self.assertNotIn(timer, sys.meta_path)
+        self.assertIn('xml.dom.minidom', timer.imports)
+        self.assertIn('xml.dom.minidom', report(timer))
+
+    def test_unused_requests_import_removed(self):
+        """
+        Test: L'API des incidents n'importe plus requests
+        Importance: Les imports inutiles ralentissent le démarrage
+        """
+        self.assertFalse(hasattr(incidents_api, 'requests'))
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
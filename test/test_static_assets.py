@@ -0,0 +1,145 @@
+"""
+test_static_assets.py
+Tests pour les ressources statiques versionnées - Manifeste, helper asset_url, cache immutable
+
+Importance: Les tests de ressources statiques vérifient que chaque fichier est servi avec une URL
+qui change avec son contenu, et que ces URLs sont mises en cache de façon permanente par le navigateur.
+Sans cela, les visites répétées revalident chaque fichier ou utilisent une copie périmée.
+"""
+
+import unittest
+import sys
+import os
+import re
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from server.routes.static_assets import (
+    asset_hash, asset_url, build_manifest, IMMUTABLE_CACHE_CONTROL
+)
+
+
+class TestAssetManifest(unittest.TestCase):
+    """
+    Tests du manifeste des fichiers statiques
+
+    Vérifie que:
+    - Tous les fichiers statiques sont présents dans le manifeste
+    - L'empreinte dépend du contenu
+    - asset_url() ajoute l'empreinte à l'URL
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+
+    def test_manifest_contains_static_files(self):
+        """
+        Test: Le manifeste contient les scripts et les données GeoJSON
+        Importance: Vérifie que toutes les ressources référencées par les templates sont versionnées
+        """
+        manifest = build_manifest()
+        self.assertIn('js/map_incidents.js', manifest)
+        self.assertIn('data/trails.geojson', manifest)
+
+    def test_different_files_have_different_hashes(self):
+        """
+        Test: Deux fichiers au contenu différent ont des empreintes différentes
+        Importance: Vérifie que l'empreinte est bien dérivée du contenu
+        """
+        with self.app.test_request_context():
+            self.assertNotEqual(asset_hash('js/map_incidents.js'), asset_hash('js/theme_toggle.js'))
+
+    def test_asset_url_contains_hash(self):
+        """
+        Test: asset_url() retourne l'URL statique suffixée de l'empreinte
+        Importance: Vérifie le format des URLs générées dans les templates
+        """
+        with self.app.test_request_context():
+            url = asset_url('js/map_incidents.js')
+            self.assertEqual(url, '/static/js/map_incidents.js?v=' + asset_hash('js/map_incidents.js'))
+
+    def test_asset_url_unknown_file_has_no_hash(self):
+        """
+        Test: Un fichier absent du dossier static/ n'a pas d'empreinte
+        Importance: Vérifie que le helper ne plante pas sur une ressource manquante
+        """
+        with self.app.test_request_context():
+            self.assertEqual(asset_url('audio/inexistant.mp3'), '/static/audio/inexistant.mp3')
+
+
+class TestImmutableCaching(unittest.TestCase):
+    """
+    Tests des en-têtes de cache des ressources statiques
+
+    Vérifie que:
+    - Les URLs avec la bonne empreinte sont mises en cache de façon permanente
+    - Les URLs sans empreinte ou avec une empreinte périmée ne le sont pas
+    - Les templates utilisent les URLs versionnées
+    """
+
+    def setUp(self):
+        """Configuration avant chaque test"""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_hashed_url_is_immutable(self):
+        """
+        Test: Une URL versionnée est servie avec Cache-Control immutable
+        Importance: Vérifie que les visites répétées ne refont aucune requête statique
+        """
+        with self.app.test_request_context():
+            url = asset_url('js/map_incidents.js')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        response.close()
+
+    def test_stale_hash_is_not_cached(self):
+        """
+        Test: Une empreinte périmée n'est pas mise en cache
+        Importance: Vérifie qu'un ancien lien ne fige pas une version différente du fichier
+        """
+        response = self.client.get('/static/js/map_incidents.js?v=000000000000')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+        response.close()
+
+    def test_plain_url_is_not_immutable(self):
+        """
+        Test: Une URL statique sans empreinte garde le comportement par défaut
+        Importance: Vérifie que les ressources non versionnées restent revalidées
+        """
+        response = self.client.get('/static/js/map_incidents.js')
+        self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+        response.close()
+
+    def test_templates_use_hashed_urls(self):
+        """
+        Test: Les pages ne référencent plus de ressource statique sans empreinte
+        Importance: Vérifie que chaque ressource locale des templates passe par asset_url()
+        """
+        for route in ['/', '/map', '/report', '/info']:
+            html = self.client.get(route).data.decode('utf-8')
+            for url in re.findall(r"""['"](/static/[^'"]+)['"]""", html):
+                if os.path.exists(os.path.join(os.path.dirname(__file__), '..', url.lstrip('/').split('?')[0])):
+                    self.assertIn('?v=', url, f"{route} référence {url} sans empreinte")
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,217 @@
+"""
+test_user_settings.py
+Tests pour les préférences utilisateur - Stockage par utilisateur, cache LRU, écritures regroupées
+
+Importance: Les préférences (mode sombre, musique) sont enregistrées à chaque bascule. Ces tests
+vérifient que chaque navigateur a ses propres préférences, que les lectures sont servies par le
+cache, que des bascules rapides ne produisent qu'une écriture et qu'aucune mise à jour n'est perdue.
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import gc
+import tempfile
+import threading
+
+# Ajoute le répertoire parent au chemin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Crée les répertoires nécessaires
+data_dir = os.path.join(os.path.dirname(__file__), '..', 'server', 'data')
+os.makedirs(data_dir, exist_ok=True)
+
+try:
+    from main import app
+except ImportError as e:
+    print(f"Erreur d'import: {e}")
+    sys.exit(1)
+
+from config import user_settings
+from config.user_settings import UserSettingsStore, SettingsError, MAX_SETTINGS_BYTES, flush_at_exit
+
+
+class TestUserSettingsStore(unittest.TestCase):
+    """
+    Tests du magasin de préférences sur une base temporaire
+
+    Vérifie que:
+    - Les préférences sont fusionnées, écrites en JSON et relues par un nouveau magasin
+    - Les lectures répétées sont servies par le cache LRU
+    - Les mises à jour rapprochées produisent une seule écriture
+    - Les préférences non écrites ne sont pas évincées du cache
+    - Le hook d'arrêt écrit les préférences en attente sans garder les magasins libérés
+    """
+
+    def setUp(self):
+        """Base temporaire ; les écritures différées sont déclenchées à la main"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.db_path = os.path.join(self.tmp_dir, 'settings.db')
+        self.tasks = []
+        self.store = UserSettingsStore(self.db_path, cache_size=2, write_delay=0.5,
+                                       start_task=self.tasks.append, sleep=lambda seconds: None)
+
+    def stored_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute('SELECT user_id, settings FROM user_settings ORDER BY user_id').fetchall()
+        finally:
+            conn.close()
+
+    def test_rapid_updates_coalesce_into_one_write(self):
+        """
+        Test: Dix bascules rapides du mode sombre produisent une seule écriture
+        Importance: C'est le but du regroupement (theme_toggle.js envoie à chaque bascule)
+        """
+        for index in range(10):
+            self.store.update('alice', {'darkModeGlobal': index % 2 == 0})
+        self.store.update('alice', {'musicOn': True})
+        self.assertEqual(len(self.tasks), 1)
+        self.assertEqual(self.stored_rows(), [])
+
+        self.tasks[0]()
+        self.assertEqual(self.stored_rows(), [('alice', '{"darkModeGlobal": false, "musicOn": true}')])
+        stats = self.store.stats()
+        self.assertEqual(stats['updates'], 11)
+        self.assertEqual(stats['writes'], 1)
+        self.assertEqual(stats['coalesced'], 10)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_persisted_and_reloaded(self):
+        """
+        Test: Un nouveau magasin relit les préférences écrites ; chaque utilisateur a les siennes
+        Importance: Vérifie la persistance par utilisateur (plus de fichier global partagé)
+        """
+        self.store.update('alice', {'darkModeGlobal': True})
+        self.store.update('bob', {'musicOn': False})
+        self.assertEqual(self.store.flush(), 2)
+        reloaded = UserSettingsStore(self.db_path)
+        self.assertEqual(reloaded.get('alice'), {'darkModeGlobal': True})
+        self.assertEqual(reloaded.get('bob'), {'musicOn': False})
+        self.assertEqual(reloaded.get('carol'), {})
+
+    def test_flushed_at_exit(self):
+        """
+        Test: Le hook d'arrêt écrit les préférences en attente ; un magasin libéré n'y est plus
+        Importance: Un seul hook par processus, même quand create_app() est appelé de nombreuses fois
+        """
+        flush_at_exit(self.store)
+        self.store.update('alice', {'musicOn': True})
+        user_settings._flush_all()
+        self.assertEqual(self.stored_rows(), [('alice', '{"musicOn": true}')])
+
+        released = UserSettingsStore(self.db_path)
+        flush_at_exit(released)
+        gc.collect()
+        count = len(user_settings._flush_at_exit)
+        del released
+        gc.collect()
+        self.assertEqual(len(user_settings._flush_at_exit), count - 1)
+
+    def test_reads_served_from_cache(self):
+        """
+        Test: Les lectures répétées ne lisent la base qu'une fois ; l'entrée la moins récente est évincée
+        Importance: Les requêtes GET ne touchent plus le disque à chaque fois
+        """
+        for user_id in ('alice', 'alice', 'alice', 'bob', 'carol', 'alice'):
+            self.store.get(user_id)
+        stats = self.store.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 4)
+        self.assertEqual(list(self.store.cache), ['carol', 'alice'])
+
+    def test_pending_settings_not_evicted(self):
+        """
+        Test: Des préférences pas encore écrites restent en mémoire malgré la taille du cache
+        Importance: L'éviction ne doit jamais perdre une mise à jour
+        """
+        self.store.update('alice', {'musicOn': True})
+        for user_id in ('bob', 'carol', 'dave'):
+            self.store.get(user_id)
+        self.assertEqual(list(self.store.cache), ['alice', 'dave'])
+        self.assertEqual(self.store.get('alice'), {'musicOn': True})
+        self.store.flush()
+        self.store.get('erin')
+        self.assertLessEqual(len(self.store.cache), 2)
+
+    def test_concurrent_updates_not_lost(self):
+        """
+        Test: Des mises à jour simultanées de clés différentes sont toutes conservées
+        Importance: L'ancien lire-modifier-écrire du fichier perdait des mises à jour
+        """
+        def toggle(index):
+            self.store.update('alice', {f'option{index}': True})
+
+        threads = [threading.Thread(target=toggle, args=(index,)) for index in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.store.flush()
+        reloaded = UserSettingsStore(self.db_path)
+        self.assertEqual(len(reloaded.get('alice')), 20)
+
+    def test_invalid_settings_rejected(self):
+        """
+        Test: Une liste ou des préférences trop volumineuses sont refusées
+        Importance: Évite de stocker n'importe quoi pour un utilisateur
+        """
+        with self.assertRaises(SettingsError):
+            self.store.update('alice', ['darkModeGlobal'])
+        with self.assertRaises(SettingsError):
+            self.store.update('alice', {'note': 'x' * MAX_SETTINGS_BYTES})
+        self.assertEqual(self.store.get('alice'), {})
+        self.assertEqual(self.tasks, [])
+
+
+class TestUserSettingsAPI(unittest.TestCase):
+    """
+    Tests des routes /save_user_settings et /get_user_settings
+    """
+
+    def setUp(self):
+        """Les écritures en attente sont faites après chaque test"""
+        app.config['TESTING'] = True
+        self.addCleanup(app.user_settings.flush)
+
+    def test_settings_per_browser(self):
+        """
+        Test: Chaque navigateur (session) retrouve ses propres préférences
+        Importance: Un utilisateur ne doit plus voir le mode sombre d'un autre
+        """
+        first, second = app.test_client(), app.test_client()
+        self.assertEqual(first.get('/get_user_settings').get_json(), {})
+        response = first.post('/save_user_settings', json={'darkModeGlobal': True})
+        self.assertEqual(response.get_json(), {'status': 'ok'})
+        first.post('/save_user_settings', json={'musicOn': True})
+        second.post('/save_user_settings', json={'darkModeGlobal': False})
+
+        self.assertEqual(first.get('/get_user_settings').get_json(), {'darkModeGlobal': True, 'musicOn': True})
+        self.assertEqual(second.get('/get_user_settings').get_json(), {'darkModeGlobal': False})
+
+    def test_invalid_payload(self):
+        """
+        Test: Un corps qui n'est pas un objet JSON est refusé (400)
+        Importance: Vérifie la gestion d'erreur de la route
+        """
+        client = app.test_client()
+        response = client.post('/save_user_settings', data='pas du json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.get_json())
+
+    def test_stats(self):
+        """
+        Test: /api/user_settings/stats expose les mesures du cache et des écritures
+        Importance: Permet de vérifier le regroupement en exploitation
+        """
+        stats = app.test_client().get('/api/user_settings/stats').get_json()
+        self.assertTrue({'hits', 'misses', 'updates', 'writes', 'coalesced', 'pending'} <= set(stats))
+
+
+# ========== EXÉCUTION DES TESTS ==========
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
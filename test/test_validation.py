@@ -41,8 +41,8 @@ class TestRequiredFieldsValidation(unittest.TestCase):
         # Données valides de référence
         self.valid_incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': 'Trou dans la route',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -139,7 +139,7 @@ class TestInvalidTypeValidation(unittest.TestCase):
         incident = {
             'type': 'Nid de poule',
             'latitude': 'not_a_number',  # Chaîne au lieu d'un nombre
-            'longitude': -115.3667,
+            'longitude': -115.359,
             'description': 'Test',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -158,7 +158,7 @@ class TestInvalidTypeValidation(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
+            'latitude': 51.089,
             'longitude': 'not_a_number',  # Chaîne au lieu d'un nombre
             'description': 'Test',
             'timestamp': '2024-02-02T10:00:00Z'
@@ -177,8 +177,8 @@ class TestInvalidTypeValidation(unittest.TestCase):
         """
         incident = {
             'type': 123,  # Nombre au lieu d'une chaîne
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': 'Test',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -199,7 +199,7 @@ class TestInvalidTypeValidation(unittest.TestCase):
         incident = {
             'type': 'Nid de poule',
             'latitude': 150.0,  # Hors de la plage valide
-            'longitude': -115.3667,
+            'longitude': -115.359,
             'description': 'Test',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -219,7 +219,7 @@ class TestInvalidTypeValidation(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
+            'latitude': 51.089,
             'longitude': 200.0,  # Hors de la plage valide
             'description': 'Test',
             'timestamp': '2024-02-02T10:00:00Z'
@@ -250,8 +250,8 @@ class TestExtraFieldsHandling(unittest.TestCase):
         
         self.valid_incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': 'Trou dans la route',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -347,8 +347,8 @@ class TestOptionalFieldsHandling(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': '',  # Vide
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -367,8 +367,8 @@ class TestOptionalFieldsHandling(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': None,  # Null
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -386,8 +386,8 @@ class TestOptionalFieldsHandling(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'timestamp': '2024-02-02T10:00:00Z'
             # description n'est pas incluse
         }
@@ -405,8 +405,8 @@ class TestOptionalFieldsHandling(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': '   ',  # Seulement des espaces
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -441,8 +441,8 @@ class TestEdgeCaseValidation(unittest.TestCase):
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': 'Réel incident à Canmore',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -461,7 +461,7 @@ class TestEdgeCaseValidation(unittest.TestCase):
         incident = {
             'type': 'Nid de poule',
             'latitude': 90.0,
-            'longitude': -115.3667,
+            'longitude': -115.359,
             'description': 'Au pôle nord',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -481,7 +481,7 @@ class TestEdgeCaseValidation(unittest.TestCase):
         incident = {
             'type': 'Nid de poule',
             'latitude': -90.0,
-            'longitude': -115.3667,
+            'longitude': -115.359,
             'description': 'Au pôle sud',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -494,8 +494,8 @@ class TestEdgeCaseValidation(unittest.TestCase):
 
     def test_zero_coordinates(self):
         """
-        Test: Coordonnées zéro (équateur et méridien) sont acceptées
-        Importance: Vérifie que zéro est une valeur valide
+        Test: Coordonnées zéro (équateur et méridien) sont rejetées proprement
+        Importance: Vérifie que zéro est traité comme un nombre valide, mais hors de Canmore
         """
         incident = {
             'type': 'Nid de poule',
@@ -509,8 +509,8 @@ class TestEdgeCaseValidation(unittest.TestCase):
                                    data=json.dumps(incident),
                                    content_type='application/json')
         
-        # Zéro devrait être accepté comme valeur valide
-        self.assertIn(response.status_code, [200, 201])
+        # Zéro est une coordonnée valide, mais en dehors de la limite municipale
+        self.assertEqual(response.status_code, 400)
 
     def test_very_long_description(self):
         """
@@ -521,8 +521,8 @@ class TestEdgeCaseValidation(unittest.TestCase):
         
         incident = {
             'type': 'Nid de poule',
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': long_description,
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -543,8 +543,8 @@ class TestEdgeCaseValidation(unittest.TestCase):
         
         incident = {
             'type': long_type,
-            'latitude': 51.0447,
-            'longitude': -115.3667,
+            'latitude': 51.089,
+            'longitude': -115.359,
             'description': 'Test',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -558,13 +558,14 @@ class TestEdgeCaseValidation(unittest.TestCase):
 
     def test_negative_coordinates_accepted(self):
         """
-        Test: Coordonnées négatives (hémisphères sud et ouest) sont acceptées
-        Importance: Vérifie que l'Amérique du Nord (coordonnées négatives) est supportée
+        Test: Longitude négative (hémisphère ouest) acceptée, latitude sud rejetée
+        Importance: Vérifie que l'Amérique du Nord (longitude négative) est supportée
+        et qu'un point de l'hémisphère sud est refusé car hors de Canmore
         """
         incident = {
             'type': 'Nid de poule',
-            'latitude': -51.0447,  # Négatif
-            'longitude': -115.3667,  # Négatif (ouest)
+            'latitude': -51.089,  # Négatif
+            'longitude': -115.359,  # Négatif (ouest)
             'description': 'Test hémisphère sud',
             'timestamp': '2024-02-02T10:00:00Z'
         }
@@ -573,6 +574,13 @@ class TestEdgeCaseValidation(unittest.TestCase):
                                    data=json.dumps(incident),
                                    content_type='application/json')
         
+        self.assertEqual(response.status_code, 400)
+
+        incident['latitude'] = 51.089
+        response = self.client.post('/api/incidents',
+                                   data=json.dumps(incident),
+                                   content_type='application/json')
+
         self.assertIn(response.status_code, [200, 201])
 
 
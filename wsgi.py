@@ -0,0 +1,30 @@
+"""
+wsgi.py
+Point d'entrée WSGI de production de l'application Canmore Incident Management
+(gunicorn, un worker par processus) :
+
+    gunicorn -k gthread --threads 100 -w 1 -b 127.0.0.1:5000 wsgi:app
+    SOCKETIO_ASYNC_MODE=eventlet gunicorn -k eventlet -w 1 -b 127.0.0.1:5000 wsgi:app
+
+La configuration est lue dans les variables d'environnement (CANMORE_DATA_DIR,
+CANMORE_DB_PATH, SOCKETIO_ASYNC_MODE, SOCKETIO_MESSAGE_QUEUE, FLASK_SECRET_KEY...).
+"""
+
+import os
+
+# Mode asynchrone : la bibliothèque standard (sockets, threads, time) est rendue coopérative
+# avant tout autre import, sinon un appel bloquant arrête tous les WebSockets du worker
+ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE')
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from config.logging_config import configure_logging
+configure_logging()
+
+from server.app_factory import create_app
+
+app = create_app()